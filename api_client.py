@@ -1,8 +1,9 @@
-import requests
 import os
 from dotenv import load_dotenv
 import argparse
 
+from minisc.sdk import MiniscAPIError, MiniscClient
+
 # Load environment variables
 load_dotenv()
 
@@ -11,22 +12,35 @@ BASE_URL = os.environ.get("API_BASE_URL", "http://127.0.0.1:8000")
 
 def deploy_cluster(provider="azure"):
     """Deploy a complete Kubernetes cluster on the specified cloud provider"""
-    if provider.lower() == "azure":
-        head_node_response = deploy_azure_head_node()
-        if head_node_response:
-            join_token = input("\nEnter the Kubernetes join token from the head node: ").strip()
-            deploy_azure_worker_nodes(join_token)
-    elif provider.lower() == "aws":
-        deploy_aws_master_node()
-        deploy_aws_worker_nodes()
-    else:
-        print(f"Unsupported provider: {provider}")
+    # One pooled session for every step of the deployment
+    with MiniscClient(BASE_URL) as client:
+        if provider.lower() == "azure":
+            head_node_response = deploy_azure_head_node(client)
+            if head_node_response:
+                join_token = input("\nEnter the Kubernetes join token from the head node: ").strip()
+                deploy_azure_worker_nodes(client, join_token)
+        elif provider.lower() == "aws":
+            deploy_aws_master_node(client)
+            deploy_aws_worker_nodes(client)
+        else:
+            print(f"Unsupported provider: {provider}")
+
+def run_step(deploy, payload, success_message, failure_message):
+    """Send one deploy request and report its outcome"""
+    try:
+        response = deploy(payload)
+    except MiniscAPIError as e:
+        print(f"❌ {failure_message}")
+        print("Error:", e.detail)
+        return False
+    print(f"✅ {success_message}")
+    print("Response:", response)
+    return True
 
-def deploy_azure_head_node():
+def deploy_azure_head_node(client):
     """Deploy a Kubernetes head node on Azure"""
     print("\n=== Deploying Azure Kubernetes Head Node ===")
     
-    url = f"{BASE_URL}/deploy/head-node"
     payload = {
         "provider": "azure",
         "cluster_name": os.environ.get("AZURE_HEAD_NODE_NAME", "k8s-master"),
@@ -39,21 +53,12 @@ def deploy_azure_head_node():
         "admin_password": os.environ.get("AZURE_ADMIN_PASSWORD", "KubeAdm1n2024!")
     }
     
-    response = requests.post(url, json=payload)
-    if response.status_code == 200:
-        print("✅ Head node deployed successfully!")
-        print("Response:", response.json())
-        return True
-    else:
-        print("❌ Failed to deploy head node.")
-        print("Error:", response.text)
-        return False
+    return run_step(client.deploy_head_node, payload, "Head node deployed successfully!", "Failed to deploy head node.")
 
-def deploy_azure_worker_nodes(join_token):
+def deploy_azure_worker_nodes(client, join_token):
     """Deploy Kubernetes worker nodes on Azure"""
     print("\n=== Deploying Azure Kubernetes Worker Nodes ===")
     
-    url = f"{BASE_URL}/deploy/worker-nodes"
     payload = {
         "provider": "azure",
         "cluster_name": os.environ.get("AZURE_WORKER_NODES_NAME", "k8s-workers"),
@@ -68,21 +73,12 @@ def deploy_azure_worker_nodes(join_token):
         "admin_password": os.environ.get("AZURE_ADMIN_PASSWORD", "KubeAdm1n2024!")
     }
     
-    response = requests.post(url, json=payload)
-    if response.status_code == 200:
-        print("✅ Worker nodes deployed successfully!")
-        print("Response:", response.json())
-        return True
-    else:
-        print("❌ Failed to deploy worker nodes.")
-        print("Error:", response.text)
-        return False
+    return run_step(client.deploy_worker_nodes, payload, "Worker nodes deployed successfully!", "Failed to deploy worker nodes.")
 
-def deploy_aws_master_node():
+def deploy_aws_master_node(client):
     """Deploy a Kubernetes master node on AWS"""
     print("\n=== Deploying AWS Kubernetes Master Node ===")
     
-    url = f"{BASE_URL}/deploy/head-node"
     payload = {
         "provider": "aws",
         "cluster_name": os.environ.get("AWS_CLUSTER_NAME", "k8s-cluster"),
@@ -91,21 +87,12 @@ def deploy_aws_master_node():
         "ssh_key_name": os.environ.get("AWS_KEY_NAME", "your-key-pair")
     }
     
-    response = requests.post(url, json=payload)
-    if response.status_code == 200:
-        print("✅ Master node deployed successfully!")
-        print("Response:", response.json())
-        return True
-    else:
-        print("❌ Failed to deploy master node.")
-        print("Error:", response.text)
-        return False
+    return run_step(client.deploy_head_node, payload, "Master node deployed successfully!", "Failed to deploy master node.")
 
-def deploy_aws_worker_nodes():
+def deploy_aws_worker_nodes(client):
     """Deploy Kubernetes worker nodes on AWS"""
     print("\n=== Deploying AWS Kubernetes Worker Nodes ===")
     
-    url = f"{BASE_URL}/deploy/worker-nodes"
     payload = {
         "provider": "aws",
         "cluster_name": os.environ.get("AWS_CLUSTER_NAME", "k8s-cluster"),
@@ -115,15 +102,7 @@ def deploy_aws_worker_nodes():
         "worker_count": int(os.environ.get("AWS_WORKER_COUNT", "2"))
     }
     
-    response = requests.post(url, json=payload)
-    if response.status_code == 200:
-        print("✅ Worker nodes deployed successfully!")
-        print("Response:", response.json())
-        return True
-    else:
-        print("❌ Failed to deploy worker nodes.")
-        print("Error:", response.text)
-        return False
+    return run_step(client.deploy_worker_nodes, payload, "Worker nodes deployed successfully!", "Failed to deploy worker nodes.")
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Deploy Kubernetes clusters on cloud providers")
@@ -134,7 +113,16 @@ if __name__ == "__main__":
         choices=["azure", "aws"],
         help="Cloud provider to use (azure or aws)"
     )
+    parser.add_argument(
+        "--fleet",
+        type=str,
+        help="Deploy every cluster in this fleet spec (YAML or JSON) concurrently instead"
+    )
     args = parser.parse_args()
     
+    if args.fleet:
+        from minisc.fleet import main as deploy_fleet
+        raise SystemExit(deploy_fleet([args.fleet, "--api-url", BASE_URL]))
+    
     print(f"=== Kubernetes Deployment on {args.provider.upper()} ===")
     deploy_cluster(args.provider)
\ No newline at end of file
@@ -0,0 +1,71 @@
+"""Compare two deploy benchmark result files, e.g. from the base and head commits of a change.
+
+    python -m benchmarks.compare benchmarks/results/base.json benchmarks/results/head.json --threshold 20
+
+Exits with status 1 when any p50 or p95 got slower by more than ``--threshold`` percent.
+"""
+import argparse
+import json
+import sys
+
+# Differences below this many seconds are noise, whatever the percentage
+MIN_DELTA_SECONDS = 0.005
+
+
+def load(path):
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def scenario_key(scenario):
+    return scenario["provider"], scenario["concurrency"], scenario["workers"]
+
+
+def compare(base, head, threshold):
+    """Return rows of (scenario, metric, stat, base, head, change %, regressed) for scenarios in both runs"""
+    base_scenarios = {scenario_key(scenario): scenario for scenario in base["scenarios"]}
+    rows = []
+    for scenario in head["scenarios"]:
+        key = scenario_key(scenario)
+        if key not in base_scenarios:
+            continue
+        for group in ("latency", "phases"):
+            for metric, stats in scenario[group].items():
+                base_stats = base_scenarios[key][group].get(metric, {})
+                for stat in ("p50", "p95"):
+                    old, new = base_stats.get(stat), stats.get(stat)
+                    if old is None or new is None:
+                        continue
+                    change = (new - old) / old * 100 if old else 0.0
+                    regressed = change > threshold and new - old > MIN_DELTA_SECONDS
+                    rows.append((key, metric, stat, old, new, change, regressed))
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare two deploy benchmark result files")
+    parser.add_argument("base", help="Baseline result file")
+    parser.add_argument("head", help="Result file to compare against the baseline")
+    parser.add_argument("--threshold", type=float, default=20.0, help="Allowed slowdown in percent")
+    args = parser.parse_args(argv)
+
+    base, head = load(args.base), load(args.head)
+    print(f"base {(base.get('commit') or 'unknown')[:8]}  ->  head {(head.get('commit') or 'unknown')[:8]}")
+
+    rows = compare(base, head, args.threshold)
+    current = None
+    for key, metric, stat, old, new, change, regressed in rows:
+        if key != current:
+            current = key
+            print(f"\n{key[0]}  concurrency={key[1]}  workers={key[2]}")
+        marker = "  REGRESSION" if regressed else ""
+        print(f"  {metric:14}{stat:>4} {old:9.3f} -> {new:9.3f}  {change:+7.1f}%{marker}")
+
+    regressions = [row for row in rows if row[-1]]
+    if regressions:
+        print(f"\n{len(regressions)} metric(s) slower by more than {args.threshold:.0f}%.")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,213 @@
+"""Benchmark head-node and worker deploys through the API against the offline cloud simulator.
+
+Runs every combination of ``--concurrency`` and ``--workers`` and reports
+p50/p95/p99 latencies per request and per phase (network, AMI lookup,
+launch, bootstrap), plus deploy throughput. Results are written to
+``benchmarks/results/<timestamp>-<commit>.json``; compare two runs with
+``python -m benchmarks.compare``.
+
+    python -m benchmarks.deploy_benchmark --provider sim-aws --concurrency 1,8,32 --workers 10,200
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+# Checkpoints from benchmark runs must not mix with real deployments
+os.environ.setdefault("MINISC_STATE_DIR", tempfile.mkdtemp(prefix="minisc-bench-"))
+
+import httpx
+
+from benchmarks.phases import PHASES, recording_deployments, summarize
+from minisc.api.main import app
+from minisc.simulator.cloud import SimulatorConfig, configure_simulator
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+
+REQUESTS = ["head_node", "worker_nodes", "total"]
+
+
+def cluster_body(provider, cluster_name, node_size=None):
+    if provider == "sim-azure":
+        return {
+            "provider": provider,
+            "region": "westeurope",
+            "cluster_name": cluster_name,
+            "node_size": node_size or "Standard_D2s_v3",
+            "resource_group_name": f"{cluster_name}-rg",
+            "vnet_name": f"{cluster_name}-vnet",
+            "subnet_name": f"{cluster_name}-subnet",
+            "admin_username": "azureuser",
+            "admin_password": "Benchmark1234!",
+        }
+    return {
+        "provider": provider,
+        "region": "us-east-1",
+        "cluster_name": cluster_name,
+        "node_size": node_size or "t3.medium",
+        "ssh_key_name": "benchmark",
+    }
+
+
+async def deploy_cluster(client, provider, cluster_name, workers, recorders, worker_options):
+    """Deploy one head node and its workers; returns latencies, phase durations and errors"""
+    body = cluster_body(provider, cluster_name)
+    errors = []
+
+    started = time.perf_counter()
+    head = await client.post("/deploy/head-node", json=body)
+    head_done = time.perf_counter()
+    if head.status_code != 200:
+        errors.append({"request": "head_node", "status": head.status_code, "detail": head.json().get("detail")})
+
+    worker_done = head_done
+    worker_latency = None
+    if not errors:
+        response = await client.post("/deploy/worker-nodes", json={**body, "worker_count": workers, **worker_options})
+        worker_done = time.perf_counter()
+        worker_latency = worker_done - head_done
+        if response.status_code != 200:
+            errors.append({"request": "worker_nodes", "status": response.status_code,
+                           "detail": response.json().get("detail")})
+
+    recorder = recorders.get(cluster_name)
+    return {
+        "latency": {
+            "head_node": head_done - started,
+            "worker_nodes": worker_latency,
+            "total": worker_done - started,
+        },
+        "phases": recorder.durations(worker_done) if recorder else {},
+        "errors": errors,
+    }
+
+
+async def run_scenario(provider, concurrency, workers, deploys, run_id, worker_options):
+    """Run ``deploys`` cluster deploys with at most ``concurrency`` in flight"""
+    recorders = {}
+    semaphore = asyncio.Semaphore(concurrency)
+    transport = httpx.ASGITransport(app=app)
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=None) as client:
+        async def bounded(index):
+            async with semaphore:
+                name = f"bench-{run_id}-c{concurrency}-w{workers}-{index}"
+                return await deploy_cluster(client, provider, name, workers, recorders, worker_options)
+
+        started = time.perf_counter()
+        with recording_deployments(recorders):
+            results = await asyncio.gather(*(bounded(index) for index in range(deploys)))
+        wall = time.perf_counter() - started
+
+    succeeded = [result for result in results if not result["errors"]]
+    return {
+        "provider": provider,
+        "concurrency": concurrency,
+        "workers": workers,
+        "deploys": deploys,
+        "succeeded": len(succeeded),
+        "failed": deploys - len(succeeded),
+        "wall_seconds": wall,
+        "deploys_per_minute": len(succeeded) / wall * 60 if wall else None,
+        "latency": {
+            request: summarize([r["latency"][request] for r in succeeded if r["latency"][request] is not None])
+            for request in REQUESTS
+        },
+        "phases": {phase: summarize([r["phases"][phase] for r in succeeded if r["phases"]]) for phase in PHASES},
+        "errors": [error for result in results for error in result["errors"]][:10],
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def format_seconds(value):
+    return "-" if value is None else f"{value:8.3f}"
+
+
+def print_scenario(scenario):
+    print(f"\n{scenario['provider']}  concurrency={scenario['concurrency']}  workers={scenario['workers']}  "
+          f"deploys={scenario['succeeded']}/{scenario['deploys']}  "
+          f"wall={scenario['wall_seconds']:.2f}s  throughput={scenario['deploys_per_minute'] or 0:.1f}/min")
+    print(f"  {'':14}{'p50':>9}{'p95':>9}{'p99':>9}")
+    for group in ("latency", "phases"):
+        for name, stats in scenario[group].items():
+            print(f"  {name:14}{format_seconds(stats['p50'])} {format_seconds(stats['p95'])} {format_seconds(stats['p99'])}")
+    for error in scenario["errors"][:3]:
+        print(f"  error: {error}")
+
+
+def parse_counts(value):
+    return [int(count) for count in value.split(",") if count]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark deploys through the API against the cloud simulator")
+    parser.add_argument("--provider", default="sim-aws", choices=["sim-aws", "sim-azure"], help="Simulated provider")
+    parser.add_argument("--concurrency", type=parse_counts, default=[1, 4, 16],
+                        help="Comma-separated numbers of concurrent deploys")
+    parser.add_argument("--workers", type=parse_counts, default=[3, 50], help="Comma-separated worker counts per cluster")
+    parser.add_argument("--rounds", type=int, default=3, help="Deploys per scenario, as a multiple of its concurrency")
+    parser.add_argument("--capacity-type", default="on-demand", choices=["on-demand", "spot", "mixed"])
+    parser.add_argument("--time-scale", type=float, default=0.01,
+                        help="Multiplier for simulated delays (overrides MINISC_SIM_TIME_SCALE)")
+    parser.add_argument("--output", help="Result file (default: benchmarks/results/<timestamp>-<commit>.json)")
+    parser.add_argument("--no-save", action="store_true", help="Only print the results")
+    parser.add_argument("--verbose", action="store_true", help="Show the deployers' output")
+    args = parser.parse_args(argv)
+
+    # Latency, fault rates and quotas come from the MINISC_SIM_* variables
+    config = SimulatorConfig.from_env().model_copy(update={"time_scale": args.time_scale})
+    worker_options = {"capacity_type": args.capacity_type} if args.capacity_type != "on-demand" else {}
+    run_id = datetime.now(timezone.utc).strftime("%H%M%S")
+
+    scenarios = []
+    for workers in args.workers:
+        for concurrency in args.concurrency:
+            # A fresh simulated cloud per scenario, so quotas and resources do not carry over
+            configure_simulator(config)
+            output = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(io.StringIO())
+            with output:
+                scenario = asyncio.run(run_scenario(
+                    args.provider, concurrency, workers, concurrency * args.rounds, run_id, worker_options
+                ))
+            scenarios.append(scenario)
+            print_scenario(scenario)
+    configure_simulator()
+
+    commit = git_commit()
+    results = {
+        "commit": commit,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "simulator": config.model_dump(),
+        "scenarios": scenarios,
+    }
+    if not args.no_save:
+        path = args.output or os.path.join(
+            RESULTS_DIR, f"{datetime.now(timezone.utc).strftime('%Y%m%d-%H%M%S')}-{(commit or 'unknown')[:8]}.json"
+        )
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nResults written to {path}")
+    return results
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
@@ -0,0 +1,229 @@
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+from minisc.api import main as api
+from minisc.simulator.cloud import get_simulated_cloud
+
+PHASES = ["network", "ami_lookup", "launch", "bootstrap"]
+
+# EC2 operations by phase; anything else is not attributed
+AWS_PHASES = {
+    "create_vpc": "network",
+    "modify_vpc_attribute": "network",
+    "create_internet_gateway": "network",
+    "attach_internet_gateway": "network",
+    "create_subnet": "network",
+    "create_route_table": "network",
+    "create_route": "network",
+    "associate_route_table": "network",
+    "create_security_group": "network",
+    "authorize_security_group_ingress": "network",
+    "get_waiter": "network",
+    "describe_images": "ami_lookup",
+    "run_instances": "launch",
+    "create_launch_template": "launch",
+    "create_fleet": "launch",
+}
+
+# ARM operation groups by phase
+AZURE_PHASES = {
+    "resource_groups": "network",
+    "virtual_networks": "network",
+    "subnets": "network",
+    "public_ip_addresses": "network",
+    "network_interfaces": "network",
+    "virtual_machines": "launch",
+    "virtual_machine_scale_sets": "launch",
+    "virtual_machine_scale_set_vms": "launch",
+}
+
+
+def percentile(values, pct):
+    """Linearly interpolated percentile of ``values`` (``pct`` in 0-100)"""
+    if not values:
+        return None
+    values = sorted(values)
+    rank = (len(values) - 1) * pct / 100
+    low = int(rank)
+    high = min(low + 1, len(values) - 1)
+    return values[low] + (values[high] - values[low]) * (rank - low)
+
+
+def summarize(values):
+    return {
+        "count": len(values),
+        "p50": percentile(values, 50),
+        "p95": percentile(values, 95),
+        "p99": percentile(values, 99),
+        "max": max(values) if values else None,
+    }
+
+
+class PhaseRecorder:
+    """Collects the cloud calls of one deployment and reports the wall time spent per phase.
+
+    Calls of a phase made concurrently (e.g. launch chunks) overlap, so a
+    phase's duration is the length of the union of its call intervals.
+    """
+
+    def __init__(self):
+        self._intervals = defaultdict(list)
+        self._ready_at = []
+        self._lock = threading.Lock()
+
+    def record(self, phase, start, end):
+        with self._lock:
+            self._intervals[phase].append((start, end))
+
+    def instances_ready_at(self, ready_at):
+        with self._lock:
+            self._ready_at.extend(ready_at)
+
+    @contextmanager
+    def timing(self, phase):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(phase, start, time.perf_counter())
+
+    def durations(self, finished_at):
+        """Seconds per phase; bootstrap is how long instances kept booting after ``finished_at``"""
+        with self._lock:
+            durations = {phase: _union_length(self._intervals.get(phase, [])) for phase in PHASES}
+            if self._ready_at:
+                # ReadyAt is on the monotonic clock, the intervals on perf_counter
+                offset = time.perf_counter() - time.monotonic()
+                durations["bootstrap"] = max(0.0, max(self._ready_at) + offset - finished_at)
+        return durations
+
+
+def _union_length(intervals):
+    total = 0.0
+    current_start = current_end = None
+    for start, end in sorted(intervals):
+        if current_end is None or start > current_end:
+            if current_end is not None:
+                total += current_end - current_start
+            current_start, current_end = start, end
+        else:
+            current_end = max(current_end, end)
+    if current_end is not None:
+        total += current_end - current_start
+    return total
+
+
+class RecordingEC2:
+    """Wraps a deployer's (simulated) EC2 client, timing every call by phase"""
+
+    def __init__(self, ec2, recorder, region):
+        self._ec2 = ec2
+        self._recorder = recorder
+        self._region = region
+
+    def __getattr__(self, name):
+        attr = getattr(self._ec2, name)
+        phase = AWS_PHASES.get(name)
+        if phase is None:
+            return attr
+        if name == "get_waiter":
+            return lambda *args, **kwargs: _TimedWaiter(attr(*args, **kwargs), self._recorder, phase)
+
+        def call(*args, **kwargs):
+            with self._recorder.timing(phase):
+                response = attr(*args, **kwargs)
+            self._record_instances(name, response)
+            return response
+        return call
+
+    def _record_instances(self, name, response):
+        if name == "run_instances":
+            instance_ids = [instance["InstanceId"] for instance in response["Instances"]]
+        elif name == "create_fleet":
+            instance_ids = [i for group in response.get("Instances", []) for i in group["InstanceIds"]]
+        else:
+            return
+        resources = get_simulated_cloud("aws", self._region).resources
+        self._recorder.instances_ready_at([
+            resources[("ec2", self._region, "instance", instance_id)]["ReadyAt"] for instance_id in instance_ids
+        ])
+
+
+class _TimedWaiter:
+    def __init__(self, waiter, recorder, phase):
+        self._waiter = waiter
+        self._recorder = recorder
+        self._phase = phase
+
+    def wait(self, **kwargs):
+        with self._recorder.timing(self._phase):
+            return self._waiter.wait(**kwargs)
+
+
+class RecordingOperations:
+    """Wraps a (simulated) ARM operation group, timing calls and long-running operation polling"""
+
+    def __init__(self, operations, recorder, phase):
+        self._operations = operations
+        self._recorder = recorder
+        self._phase = phase
+
+    def __getattr__(self, name):
+        attr = getattr(self._operations, name)
+        if not callable(attr) or name.startswith("_"):
+            return attr
+
+        def call(*args, **kwargs):
+            with self._recorder.timing(self._phase):
+                result = attr(*args, **kwargs)
+            return _TimedPoller(result, self._recorder, self._phase) if name.startswith("begin_") else result
+        return call
+
+
+class _TimedPoller:
+    def __init__(self, poller, recorder, phase):
+        self._poller = poller
+        self._recorder = recorder
+        self._phase = phase
+
+    def result(self, timeout=None):
+        with self._recorder.timing(self._phase):
+            resource = self._poller.result(timeout)
+        if self._phase == "launch":
+            self._recorder.instances_ready_at([resource.ready_at])
+        return resource
+
+
+def instrument_provider(provider, recorder, region):
+    """Route every cloud call of the provider's deployers through ``recorder``"""
+    for deployer in provider.values():
+        if hasattr(deployer, "ec2"):
+            if not isinstance(deployer.ec2, RecordingEC2):
+                deployer.ec2 = RecordingEC2(deployer.ec2, recorder, region)
+            continue
+        for client_name in ("resource_client", "compute_client", "network_client"):
+            client = getattr(deployer, client_name)
+            for group_name, phase in AZURE_PHASES.items():
+                group = getattr(client, group_name, None)
+                if group is not None and not isinstance(group, RecordingOperations):
+                    setattr(client, group_name, RecordingOperations(group, recorder, phase))
+
+
+@contextmanager
+def recording_deployments(recorders):
+    """Give every cluster deployed through the API a PhaseRecorder in ``recorders``, keyed by cluster name"""
+    prepare_deployers = api.prepare_deployers
+
+    def instrumented(provider, provider_type, config, idempotency_key=None):
+        recorder = recorders.setdefault(config.cluster_name, PhaseRecorder())
+        # The AWS simulator is keyed by the API's region setting, like the real clients
+        instrument_provider(provider, recorder, api.get_settings()["region"])
+        return prepare_deployers(provider, provider_type, config, idempotency_key)
+
+    api.prepare_deployers = instrumented
+    try:
+        yield recorders
+    finally:
+        api.prepare_deployers = prepare_deployers
@@ -1,17 +1,100 @@
-from fastapi import FastAPI, HTTPException, Depends
+from fastapi import FastAPI, HTTPException, Depends, Header, Request
+from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse
 from pydantic import BaseModel
+import hashlib
 import os
+import time
 from functools import lru_cache
+from typing import Optional
 from dotenv import load_dotenv
 
 from minisc.common.provider_factory import CloudProviderFactory
-from minisc.common.models import ClusterConfig, WorkerNodesConfig
+from minisc.aws.pulumi_deployer import pulumi_available
+from minisc.common.models import ClusterConfig, WorkerNodesConfig, ScaleWorkersConfig
+from minisc.common.ipam import AddressManager, default_pod_network
+from minisc.common.join import KeyVaultJoinStore, SsmJoinStore
+from minisc.common.network_plan import plan_subnets
+from minisc.common.performance import PROFILES
+from minisc.common.interruption_watcher import InterruptionWatcher, ssh_cordon_nodes
+from minisc.common.checkpoints import Checkpoint
+from minisc.aws.kubernetes_deployer import VPC_CIDR
+from minisc.azure.kubernetes_deployer import VNET_CIDR
+from minisc.common.cluster_autoscaler import NodeGroupBounds, aws_manifest, azure_manifest
+from minisc.common.exceptions import DeploymentError
+from minisc.common.operations import OperationStore, OperationConflict, IN_PROGRESS, SUCCEEDED
+from minisc.common.metrics import REGISTRY, HTTP_REQUEST_SECONDS
+from minisc.common.tracing import configure_tracing, span
+from minisc.common.profiling import profiling_enabled, profile_request, profiled, profile_path, render_profile
 
 # Load environment variables from .env file
 load_dotenv()
 
+# Export spans when MINISC_TRACE_EXPORTER is set and OpenTelemetry is installed
+configure_tracing()
+
 app = FastAPI()
 
+@app.middleware("http")
+async def record_request_duration(request: Request, call_next):
+    start = time.perf_counter()
+    status = 500
+    # Continues the caller's trace when it sent a traceparent header
+    with span(f"{request.method} {request.url.path}", kind="server", headers=dict(request.headers), **{
+        "http.method": request.method, "http.target": request.url.path
+    }) as current:
+        try:
+            response = await call_next(request)
+            status = response.status_code
+            return response
+        finally:
+            # Label by route template so path parameters don't create new series
+            path = getattr(request.scope.get("route"), "path", "unmatched")
+            HTTP_REQUEST_SECONDS.observe(
+                time.perf_counter() - start, method=request.method, path=path, status=status
+            )
+            if current is not None:
+                current.update_name(f"{request.method} {path}")
+                current.set_attribute("http.route", path)
+                current.set_attribute("http.status_code", status)
+
+@app.middleware("http")
+async def profile_requests(request: Request, call_next):
+    """Profile requests sent with ``X-Minisc-Profile: 1`` or ``?profile=1`` when MINISC_PROFILING is on"""
+    flag = request.headers.get("x-minisc-profile") or request.query_params.get("profile")
+    if not profiling_enabled() or flag not in ("1", "true", "yes"):
+        return await call_next(request)
+    with profile_request(f"{request.method} {request.url.path}") as profile:
+        response = await call_next(request)
+    if profile is not None and profile.save():
+        response.headers["X-Minisc-Profile"] = profile.id
+    return response
+
+# Profile sort orders accepted by GET /profiles/{profile_id}
+PROFILE_SORT_KEYS = ("cumulative", "tottime", "ncalls")
+
+# Spot interruption watchers keyed by cluster_id
+interruption_watchers = {}
+
+# Deploy operations keyed by Idempotency-Key
+operations = OperationStore()
+
+# Network and pod CIDRs of the clusters deployed with "ipam"
+address_manager = AddressManager()
+
+# Deployment engines each provider supports; Pulumi deploys to real AWS only
+DEPLOYMENT_ENGINES = {
+    "azure": ("sdk", "arm"),
+    "sim-azure": ("sdk", "arm"),
+    "aws": ("sdk", "cloudformation", "pulumi"),
+    "sim-aws": ("sdk", "cloudformation"),
+}
+
+# Provider deployer of each engine deploying a cluster as one stack
+STACK_DEPLOYERS = {"cloudformation": "stack_deployer", "pulumi": "pulumi_deployer"}
+
+# How long a retried request waits for the original in-flight operation before getting a 202
+IDEMPOTENCY_WAIT_SECONDS = float(os.environ.get("MINISC_IDEMPOTENCY_WAIT", 300))
+
 # Configuration loading
 @lru_cache()
 def get_settings():
@@ -31,11 +114,266 @@ def get_settings():
         "aws_secret_access_key": os.environ.get("AWS_SECRET_ACCESS_KEY", ""),
     }
 
+def cluster_id(provider_type, config):
+    """Identifies a cluster across providers and regions, which may reuse its name"""
+    return f"{provider_type}-{config.region}-{config.cluster_name}"
+
+# Checkpoint steps recorded by worker requests; everything else belongs to the head node
+WORKER_STEP_PREFIXES = ('worker_', 'vmss:')
+
+def is_worker_step(step):
+    return step.startswith(WORKER_STEP_PREFIXES)
+
+def prepare_deployers(provider, provider_type, config, idempotency_key=None):
+    """Share one checkpoint per cluster between the provider's deployers.
+
+    Without ``resume`` only the current request's steps are discarded, so a
+    fresh worker deploy keeps the head node's steps and the reverse.
+    """
+    checkpoint = Checkpoint(cluster_id(provider_type, config))
+    if not config.resume:
+        workers = isinstance(config, WorkerNodesConfig)
+        checkpoint.clear(is_worker_step if workers else lambda step: not is_worker_step(step))
+    store = join_store(provider_type, config)
+    aws = CloudProviderFactory.base_provider(provider_type) == "aws"
+    for deployer in provider.values():
+        deployer.use_checkpoint(checkpoint)
+        if idempotency_key:
+            deployer.use_idempotency_key(idempotency_key)
+        if store:
+            deployer.use_join_store(store)
+        if aws and config.instance_profile:
+            deployer.use_instance_profile(config.instance_profile)
+        if config.performance_profile:
+            deployer.use_performance_profile(PROFILES[config.performance_profile])
+    return checkpoint
+
+def join_store(provider_type, config):
+    """Where the head node publishes its join command for workers, or None without ``auto_join``"""
+    if not config.auto_join:
+        return None
+    if CloudProviderFactory.base_provider(provider_type) == "azure":
+        return KeyVaultJoinStore(
+            config.cluster_name, config.key_vault_name, config.managed_identity_id, config.join_token_rotation_hours
+        )
+    return SsmJoinStore(config.cluster_name, config.region, config.instance_profile, config.join_token_rotation_hours)
+
+def run_idempotent(endpoint, config, idempotency_key, deploy):
+    """Run ``deploy`` once per Idempotency-Key; retries get the original operation's response"""
+    if not idempotency_key:
+        return deploy()
+
+    fingerprint = hashlib.sha256(f"{endpoint}:{config.model_dump_json()}".encode()).hexdigest()
+    try:
+        operation, started = operations.begin(idempotency_key, fingerprint)
+    except OperationConflict as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+    if not started:
+        if operation["status"] == IN_PROGRESS:
+            operation = operations.wait(idempotency_key, IDEMPOTENCY_WAIT_SECONDS)
+        if operation["status"] == SUCCEEDED:
+            return operation["result"]
+        if operation["status"] == IN_PROGRESS:
+            return JSONResponse(status_code=202, content=operation_status(operation))
+        raise HTTPException(status_code=operation["status_code"] or 500, detail=operation["error"])
+
+    try:
+        result = deploy()
+    except HTTPException as e:
+        operations.finish(idempotency_key, error=e.detail, status_code=e.status_code)
+        raise
+    except Exception as e:
+        operations.finish(idempotency_key, error=str(e), status_code=500)
+        raise
+    operations.finish(idempotency_key, result=result)
+    return result
+
+def operation_status(operation):
+    return {
+        key: operation.get(key)
+        for key in ("key", "status", "created_at", "updated_at", "result", "error", "status_code")
+    }
+
+def check_deployment_engine(provider_type, config):
+    engines = DEPLOYMENT_ENGINES.get(provider_type.lower(), ("sdk",))
+    if config.deployment_engine not in engines:
+        raise HTTPException(
+            status_code=422,
+            detail=f"deployment_engine must be one of {', '.join(engines)} for provider '{provider_type}'"
+        )
+    if config.deployment_engine == "pulumi" and not pulumi_available():
+        raise HTTPException(
+            status_code=422,
+            detail="deployment_engine 'pulumi' needs the pulumi and pulumi-aws packages and the pulumi CLI"
+        )
+
+def check_cluster_autoscaler(provider_type, config):
+    if not config.cluster_autoscaler:
+        return
+    if config.deployment_engine in STACK_DEPLOYERS:
+        # Stack templates pin the worker group to its WorkerCount
+        raise HTTPException(status_code=422, detail="cluster_autoscaler is not supported with stack deployment engines")
+    aws = CloudProviderFactory.base_provider(provider_type) == "aws"
+    if not isinstance(config, WorkerNodesConfig):
+        if aws and not config.instance_profile:
+            # The autoscaler runs on the head node and calls AWS with its instance role
+            raise HTTPException(status_code=422, detail="cluster_autoscaler needs an instance_profile on AWS")
+        return
+    if aws and not config.auto_scaling_group:
+        raise HTTPException(status_code=422, detail="cluster_autoscaler needs an auto_scaling_group worker pool on AWS")
+    if not config.min_workers <= config.worker_count <= autoscaler_bounds(config).max_size:
+        raise HTTPException(status_code=422, detail="worker_count must lie between min_workers and max_workers")
+
+def check_warm_pool(provider_type, config):
+    if not config.warm_pool_size:
+        return
+    if config.deployment_engine != "sdk":
+        raise HTTPException(status_code=422, detail="warm_pool_size needs the 'sdk' deployment engine")
+    if config.capacity_type != "on-demand":
+        # Stopped Spot instances may not get capacity back when started
+        raise HTTPException(status_code=422, detail="warm_pool_size needs an on-demand worker pool")
+    if CloudProviderFactory.base_provider(provider_type) == "azure":
+        if config.cluster_autoscaler:
+            # Instances the autoscaler adds would stop after bootstrapping like warm ones
+            raise HTTPException(status_code=422, detail="warm_pool_size is not supported with cluster_autoscaler on Azure")
+    elif not config.auto_scaling_group:
+        raise HTTPException(status_code=422, detail="warm_pool_size needs an auto_scaling_group worker pool on AWS")
+
+def check_interruption_watcher(config):
+    if config.watch_interruptions and not config.master_ip:
+        # The watcher cordons and drains reclaimed workers on the master
+        raise HTTPException(status_code=422, detail="watch_interruptions needs master_ip")
+
+def check_auto_join(provider_type, config):
+    if not config.auto_join:
+        return
+    if config.deployment_engine != "sdk":
+        raise HTTPException(status_code=422, detail="auto_join needs the 'sdk' deployment engine")
+    if config.join_token_rotation_hours < 1:
+        raise HTTPException(status_code=422, detail="join_token_rotation_hours must be at least 1")
+    if CloudProviderFactory.base_provider(provider_type) == "azure":
+        if not (config.key_vault_name and config.managed_identity_id):
+            raise HTTPException(status_code=422, detail="auto_join needs key_vault_name and managed_identity_id on Azure")
+    elif not config.instance_profile:
+        raise HTTPException(status_code=422, detail="auto_join needs an instance_profile on AWS")
+
+def check_control_plane(provider_type, config):
+    if config.control_plane_nodes == 1:
+        return
+    if config.control_plane_nodes < 3 or config.control_plane_nodes % 2 == 0:
+        # etcd keeps quorum only with a majority of an odd number of members
+        raise HTTPException(status_code=422, detail="control_plane_nodes must be 1 or an odd number of at least 3")
+    if config.deployment_engine != "sdk":
+        raise HTTPException(status_code=422, detail="control_plane_nodes needs the 'sdk' deployment engine")
+    if not config.auto_join:
+        # Control-plane nodes join the first one with the join command it publishes
+        raise HTTPException(status_code=422, detail="control_plane_nodes needs auto_join")
+
+def check_performance_profile(config):
+    if config.performance_profile is None:
+        return
+    if config.performance_profile not in PROFILES:
+        raise HTTPException(
+            status_code=422, detail=f"performance_profile must be one of {', '.join(PROFILES)}"
+        )
+    if config.deployment_engine != "sdk":
+        raise HTTPException(status_code=422, detail="performance_profile needs the 'sdk' deployment engine")
+
+def check_network_layout(provider_type, config):
+    if not (config.availability_zones or config.max_nodes or config.ipam):
+        return
+    if config.deployment_engine != "sdk":
+        raise HTTPException(
+            status_code=422, detail="availability_zones, max_nodes and ipam need the 'sdk' deployment engine"
+        )
+    if config.ipam:
+        # The allocated network is sized for the layout
+        return
+    try:
+        if CloudProviderFactory.base_provider(provider_type) == "azure":
+            plan_subnets(VNET_CIDR, max_nodes=config.max_nodes)
+        else:
+            plan_subnets(VPC_CIDR, config.availability_zones, config.max_nodes)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+def allocate_addresses(provider_type, config):
+    """The cluster's network and pod CIDRs from the IPAM pools, or None without ``ipam``"""
+    if not config.ipam:
+        return None
+    nodes = config.max_nodes
+    if nodes is None and isinstance(config, WorkerNodesConfig):
+        nodes = (config.worker_count if config.max_workers is None else config.max_workers) + 1
+    # An Azure subnet spans every zone, so only AWS needs a subnet per zone
+    zones = config.availability_zones if CloudProviderFactory.base_provider(provider_type) == "aws" else None
+    try:
+        return address_manager.allocate(
+            cluster_id(provider_type, config), nodes,
+            zones=len(zones or [None]), max_pods=pods_per_node(config)
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+def network_kwargs(config, allocation=None):
+    # Only passed when set, so a default request creates the single-subnet network
+    return {
+        name: value for name, value in (
+            ("zones", config.availability_zones),
+            ("max_nodes", config.max_nodes),
+            ("cidr", allocation.network if allocation else None)
+        )
+        if value
+    }
+
+def pods_per_node(config):
+    """The request's max_pods, else its performance profile's, else None for kubelet's default"""
+    if config.max_pods is None and config.performance_profile:
+        return PROFILES[config.performance_profile].max_pods
+    return config.max_pods
+
+def pod_network_kwargs(config, allocation=None):
+    # Without IPAM, a performance profile splits the default pod network for its pods per node
+    if allocation:
+        return {"pod_network": allocation.pods}
+    if config.performance_profile:
+        return {"pod_network": default_pod_network(pods_per_node(config))}
+    return {}
+
+def autoscaler_bounds(config):
+    if not config.cluster_autoscaler:
+        return None
+    max_workers = config.worker_count if config.max_workers is None else config.max_workers
+    return NodeGroupBounds(config.cluster_name, config.min_workers, max_workers)
+
+def head_manifests(provider_type, config, settings):
+    """Add-on manifests the head node applies once the cluster is up"""
+    if not config.cluster_autoscaler:
+        return None
+    if CloudProviderFactory.base_provider(provider_type) == "azure":
+        manifest = azure_manifest(
+            config.cluster_name, settings["subscription_id"], config.resource_group_name,
+            settings["tenant_id"], settings["client_id"], settings["client_secret"]
+        )
+    else:
+        manifest = aws_manifest(config.cluster_name, config.region)
+    return {"cluster-autoscaler": manifest}
+
+def deployment_error(e):
+    return HTTPException(
+        status_code=500,
+        detail={"step": e.step, "error": e.message, "completed": e.completed}
+    )
+
 # Provider adapters to normalize differences
-def deploy_head_node_azure(provider, config):
+def deploy_head_node_azure(provider, config, manifests=None, allocation=None):
     head_deployer = provider["head_node_deployer"]
     head_deployer.create_resource_group(config.resource_group_name, config.region)
-    return head_deployer.create_kubernetes_head_node(
+    if config.deployment_engine == "arm":
+        deploy = head_deployer.create_kubernetes_head_node_from_template
+    else:
+        deploy = head_deployer.create_kubernetes_head_node
+    return deploy(
         config.resource_group_name,
         config.cluster_name,
         config.region,
@@ -43,60 +381,249 @@ def deploy_head_node_azure(provider, config):
         config.vnet_name,
         config.subnet_name,
         config.admin_username,
-        config.admin_password
+        config.admin_password,
+        manifests=manifests,
+        **network_kwargs(config, allocation),
+        **pod_network_kwargs(config, allocation)
     )
 
-def deploy_head_node_aws(provider, config):
+def deploy_control_plane_azure(provider, config, manifests=None, allocation=None):
+    head_deployer = provider["head_node_deployer"]
+    head_deployer.create_resource_group(config.resource_group_name, config.region)
+    return head_deployer.create_control_plane(
+        config.resource_group_name,
+        config.cluster_name,
+        config.region,
+        config.node_size,
+        config.vnet_name,
+        config.subnet_name,
+        config.admin_username,
+        config.admin_password,
+        count=config.control_plane_nodes,
+        manifests=manifests,
+        **network_kwargs(config, allocation),
+        **pod_network_kwargs(config, allocation)
+    )
+
+def deploy_head_node_aws(provider, config, manifests=None, allocation=None):
     kubernetes_deployer = provider["kubernetes_deployer"]
     head_deployer = provider["head_node_deployer"]
     
-    vpc_id, subnet_id = kubernetes_deployer.create_vpc_and_subnet()
+    vpc_id, subnet_id = kubernetes_deployer.create_vpc_and_subnet(**network_kwargs(config, allocation))
     security_group_id = kubernetes_deployer.create_security_group(vpc_id)
     
     return head_deployer.deploy_master_node(
+        security_group_id=security_group_id,
+        # With one subnet per zone, the master runs in the first zone
+        subnet_id=subnet_id[0] if isinstance(subnet_id, list) else subnet_id,
+        key_name=config.ssh_key_name,
+        instance_type=config.node_size,
+        manifests=manifests,
+        **pod_network_kwargs(config, allocation)
+    )
+
+def deploy_control_plane_aws(provider, config, manifests=None, allocation=None):
+    kubernetes_deployer = provider["kubernetes_deployer"]
+    head_deployer = provider["head_node_deployer"]
+
+    vpc_id, subnet_id = kubernetes_deployer.create_vpc_and_subnet(**network_kwargs(config, allocation))
+    security_group_id = kubernetes_deployer.create_security_group(vpc_id)
+
+    # With one subnet per zone, the nodes are spread across the zones
+    return head_deployer.deploy_control_plane(
+        config.cluster_name,
+        vpc_id,
         security_group_id=security_group_id,
         subnet_id=subnet_id,
         key_name=config.ssh_key_name,
-        instance_type=config.node_size
+        count=config.control_plane_nodes,
+        instance_type=config.node_size,
+        manifests=manifests,
+        **pod_network_kwargs(config, allocation)
+    )
+
+def worker_launch_kwargs(config, chunked=True):
+    # Only pass settings that differ from the deployer defaults; template and stack
+    # deployments create each pool whole, so the chunking settings do not apply to them
+    kwargs = {}
+    if config.capacity_type != "on-demand":
+        kwargs.update({
+            "capacity_type": config.capacity_type,
+            "on_demand_base": config.on_demand_base,
+            "spot_max_price": config.spot_max_price
+        })
+    if chunked and config.launch_batch_size:
+        kwargs["batch_size"] = config.launch_batch_size
+    if chunked and config.max_parallel_launches:
+        kwargs["max_parallel_launches"] = config.max_parallel_launches
+    if config.warm_pool_size:
+        kwargs["warm_pool_size"] = config.warm_pool_size
+    return kwargs
+
+def worker_result(provider, results, **extra):
+    """Sum the deployers' results over a pool's scale sets; ``partial`` when some workers did not launch"""
+    results = results if isinstance(results, list) else [results]
+    requested = sum(result["requested"] for result in results)
+    launched = sum(result["launched"] for result in results)
+    failed = sum(result["failed"] for result in results)
+    if failed:
+        message = f"{launched} of {requested} worker nodes launched, {failed} failed."
+    else:
+        message = f"{launched} worker nodes deployment complete!"
+    return {
+        "message": message,
+        "provider": provider,
+        "requested": requested,
+        "launched": launched,
+        "failed": failed,
+        "errors": [error for result in results for error in result["errors"]],
+        "partial": bool(failed),
+        **extra
+    }
+
+def aws_node_cordoner(config):
+    """Drain removed workers on the master over SSH, when the request names the master"""
+    if not config.master_ip:
+        return None
+    return lambda names: ssh_cordon_nodes(
+        config.master_ip, 'ec2-user', names,
+        key_filename=os.path.expanduser(f'~/.ssh/{config.ssh_key_name}.pem')
     )
 
+def start_interruption_watcher(provider_type, worker_deployer, config):
+    azure = CloudProviderFactory.base_provider(provider_type) == "azure"
+    if not azure and not worker_deployer.worker_instances:
+        # Without the workers' IDs the watcher would handle every reclaimed spot instance in the region
+        return None
+    key = cluster_id(provider_type, config)
+    if key in interruption_watchers:
+        interruption_watchers[key].stop()
+
+    if azure:
+        vmss_name = f"{config.cluster_name}-workers"
+        if config.capacity_type == "mixed":
+            vmss_name = f"{vmss_name}-spot"
+        watcher = InterruptionWatcher(
+            detect=lambda: worker_deployer.find_evicted_workers(config.resource_group_name, vmss_name),
+            cordon=lambda names: ssh_cordon_nodes(
+                config.master_ip, config.admin_username, names, password=config.admin_password
+            ),
+            replace=lambda count: worker_deployer.replace_workers(config.resource_group_name, vmss_name, count)
+        )
+    else:  # AWS
+        watcher = InterruptionWatcher(
+            detect=worker_deployer.find_interrupted_workers,
+            cordon=lambda names: ssh_cordon_nodes(
+                config.master_ip, 'ec2-user', names,
+                key_filename=os.path.expanduser(f'~/.ssh/{config.ssh_key_name}.pem')
+            ),
+            replace=worker_deployer.replace_workers
+        )
+
+    interruption_watchers[key] = watcher
+    watcher.start()
+    return watcher
+
 # API endpoints
 @app.post("/deploy/head-node")
-def deploy_head_node(config: ClusterConfig):
+@profiled
+def deploy_head_node(config: ClusterConfig, idempotency_key: Optional[str] = Header(None)):
+    return run_idempotent(
+        "/deploy/head-node", config, idempotency_key,
+        lambda: _deploy_head_node(config, idempotency_key)
+    )
+
+def _deploy_head_node(config, idempotency_key=None):
     settings = get_settings()
     provider_type = config.provider or settings["default_provider"]
+    check_deployment_engine(provider_type, config)
+    check_cluster_autoscaler(provider_type, config)
+    check_auto_join(provider_type, config)
+    check_performance_profile(config)
+    check_control_plane(provider_type, config)
+    check_network_layout(provider_type, config)
+    manifests = head_manifests(provider_type, config, settings)
+    allocation = allocate_addresses(provider_type, config)
     
     try:
         provider = CloudProviderFactory.get_provider(provider_type, settings)
+        prepare_deployers(provider, provider_type, config, idempotency_key)
         
-        if provider_type == "azure":
-            head_node, head_node_ip = deploy_head_node_azure(provider, config)
+        if config.control_plane_nodes > 1:
+            if CloudProviderFactory.base_provider(provider_type) == "azure":
+                _, endpoint = deploy_control_plane_azure(provider, config, manifests, allocation)
+            else:
+                endpoint = deploy_control_plane_aws(provider, config, manifests, allocation)
+            return {
+                "message": f"Kubernetes control plane of {config.control_plane_nodes} nodes deployed!",
+                "provider": CloudProviderFactory.base_provider(provider_type),
+                "api_endpoint": endpoint
+            }
+        elif CloudProviderFactory.base_provider(provider_type) == "azure":
+            head_node, head_node_ip = deploy_head_node_azure(provider, config, manifests, allocation)
             return {
                 "message": "Kubernetes head node deployment complete!",
                 "provider": "azure",
                 "head_node_ip": head_node_ip
             }
+        elif config.deployment_engine in STACK_DEPLOYERS:
+            outputs = provider[STACK_DEPLOYERS[config.deployment_engine]].deploy_master_stack(
+                config.cluster_name, config.ssh_key_name, config.node_size
+            )
+            return {
+                "message": "Kubernetes master node deployment complete!",
+                "provider": "aws",
+                "instance_id": outputs["MasterInstanceId"],
+                "head_node_ip": outputs["MasterPublicIp"]
+            }
         else:  # AWS
-            instance = deploy_head_node_aws(provider, config)
+            instance = deploy_head_node_aws(provider, config, manifests, allocation)
             return {
                 "message": "Kubernetes master node deployment complete!",
                 "provider": "aws",
                 "instance_id": instance.id if instance else None
             }
+    except DeploymentError as e:
+        raise deployment_error(e)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/deploy/worker-nodes")
-def deploy_worker_nodes(config: WorkerNodesConfig):
+@profiled
+def deploy_worker_nodes(config: WorkerNodesConfig, idempotency_key: Optional[str] = Header(None)):
+    result = run_idempotent(
+        "/deploy/worker-nodes", config, idempotency_key,
+        lambda: _deploy_worker_nodes(config, idempotency_key)
+    )
+    if isinstance(result, dict) and result.get("partial"):
+        # Some workers did not launch: the deployment is not reported as a success
+        return JSONResponse(status_code=207, content=result)
+    return result
+
+def _deploy_worker_nodes(config, idempotency_key=None):
     settings = get_settings()
     provider_type = config.provider or settings["default_provider"]
+    check_deployment_engine(provider_type, config)
+    check_cluster_autoscaler(provider_type, config)
+    check_warm_pool(provider_type, config)
+    check_interruption_watcher(config)
+    check_auto_join(provider_type, config)
+    check_performance_profile(config)
+    check_network_layout(provider_type, config)
+    autoscaler = autoscaler_bounds(config)
+    allocation = allocate_addresses(provider_type, config)
     
     try:
         provider = CloudProviderFactory.get_provider(provider_type, settings)
+        prepare_deployers(provider, provider_type, config, idempotency_key)
         
-        if provider_type == "azure":
+        if CloudProviderFactory.base_provider(provider_type) == "azure":
             worker_deployer = provider["worker_nodes_deployer"]
-            worker_deployer.create_worker_nodes(
+            if config.deployment_engine == "arm":
+                deploy = worker_deployer.create_worker_nodes_from_template
+            else:
+                deploy = worker_deployer.create_worker_nodes
+            results = deploy(
                 config.resource_group_name,
                 f"{config.cluster_name}-workers",
                 config.region,
@@ -106,28 +633,171 @@ def deploy_worker_nodes(config: WorkerNodesConfig):
                 config.subnet_name,
                 config.join_token,
                 config.admin_username,
-                config.admin_password
+                config.admin_password,
+                master_ip=config.master_ip,
+                autoscaler=autoscaler,
+                **network_kwargs(config, allocation),
+                **worker_launch_kwargs(config, chunked=config.deployment_engine == "sdk")
+            )
+            if config.watch_interruptions and config.capacity_type != "on-demand":
+                start_interruption_watcher(provider_type, worker_deployer, config)
+            return worker_result("azure", results)
+        elif config.deployment_engine in STACK_DEPLOYERS:
+            # The Auto Scaling group replaces reclaimed spot workers itself, so no watcher is started
+            # The stack is complete once its Auto Scaling group exists; the group then launches the workers
+            provider[STACK_DEPLOYERS[config.deployment_engine]].deploy_worker_stack(
+                config.cluster_name,
+                key_name=config.ssh_key_name,
+                num_workers=config.worker_count,
+                instance_type=config.node_size,
+                master_ip=config.master_ip,
+                join_token=config.join_token,
+                **worker_launch_kwargs(config, chunked=False)
             )
-            return {"message": "Worker nodes deployment complete!", "provider": "azure"}
+            return {
+                "message": f"Worker stack deployed; its Auto Scaling group launches {config.worker_count} worker nodes.",
+                "provider": "aws",
+                "requested": config.worker_count
+            }
         else:  # AWS
             kubernetes_deployer = provider["kubernetes_deployer"]
             worker_deployer = provider["worker_nodes_deployer"]
             
-            vpc_id, subnet_id = kubernetes_deployer.create_vpc_and_subnet()
+            vpc_id, subnet_id = kubernetes_deployer.create_vpc_and_subnet(**network_kwargs(config, allocation))
             security_group_id = kubernetes_deployer.create_security_group(vpc_id)
-            
-            worker_deployer.deploy_worker_nodes(
+
+            if config.auto_scaling_group:
+                # The group replaces reclaimed spot workers itself, so no watcher is started
+                result = worker_deployer.deploy_worker_group(
+                    config.cluster_name,
+                    security_group_id=security_group_id,
+                    subnet_id=subnet_id,
+                    key_name=config.ssh_key_name,
+                    num_workers=config.worker_count,
+                    instance_type=config.node_size,
+                    master_ip=config.master_ip,
+                    join_token=config.join_token,
+                    cordon=aws_node_cordoner(config),
+                    autoscaler=autoscaler,
+                    **worker_launch_kwargs(config, chunked=False),
+                    **({"spot_instance_types": config.spot_instance_types} if config.spot_instance_types else {})
+                )
+                return worker_result("aws", result, auto_scaling_group=f"{config.cluster_name}-workers")
+
+            result = worker_deployer.deploy_worker_nodes(
                 security_group_id=security_group_id,
                 subnet_id=subnet_id,
                 key_name=config.ssh_key_name,
                 num_workers=config.worker_count,
-                instance_type=config.node_size
+                instance_type=config.node_size,
+                **worker_launch_kwargs(config),
+                **({"spot_instance_types": config.spot_instance_types} if config.spot_instance_types else {})
+            )
+            if config.watch_interruptions and config.capacity_type != "on-demand":
+                start_interruption_watcher(provider_type, worker_deployer, config)
+            return worker_result("aws", result)
+    except DeploymentError as e:
+        raise deployment_error(e)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/scale/worker-nodes")
+@profiled
+def scale_worker_nodes(config: ScaleWorkersConfig):
+    """Set the desired size of a cluster's Auto Scaling group or scale set worker pool"""
+    settings = get_settings()
+    provider_type = config.provider or settings["default_provider"]
+    azure = CloudProviderFactory.base_provider(provider_type) == "azure"
+    if azure and not config.resource_group_name:
+        raise HTTPException(status_code=422, detail="Scaling an Azure worker pool needs its resource_group_name")
+
+    try:
+        provider = CloudProviderFactory.get_provider(provider_type, settings)
+        if azure:
+            result = provider["worker_nodes_deployer"].scale_worker_pool(
+                config.resource_group_name, f"{config.cluster_name}-workers", config.worker_count,
+                warm_pool_size=config.warm_pool_size
+            )
+        else:
+            result = provider["worker_nodes_deployer"].scale_worker_group(
+                config.cluster_name, config.worker_count, cordon=aws_node_cordoner(config),
+                warm_pool_size=config.warm_pool_size
             )
-            return {"message": f"{config.worker_count} worker nodes deployment complete!", "provider": "aws"}
+        return {
+            "message": f"Worker group scaled to {result['launched']} workers.",
+            "provider": "azure" if azure else "aws",
+            **result
+        }
+    except DeploymentError as e:
+        raise deployment_error(e)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/teardown")
+def teardown(config: ClusterConfig):
+    """Delete a cluster deployed as a CloudFormation or Pulumi stack, with everything in it"""
+    settings = get_settings()
+    provider_type = config.provider or settings["default_provider"]
+    check_deployment_engine(provider_type, config)
+    if config.deployment_engine not in STACK_DEPLOYERS:
+        raise HTTPException(
+            status_code=422, detail=f"Teardown needs deployment_engine {' or '.join(map(repr, STACK_DEPLOYERS))}"
+        )
+
+    try:
+        provider = CloudProviderFactory.get_provider(provider_type, settings)
+        prepare_deployers(provider, provider_type, config)
+        stack_deployer = provider[STACK_DEPLOYERS[config.deployment_engine]]
+        stack_deployer.delete_stack(config.cluster_name)
+        # The cluster is gone, so a later deploy must not resume from its steps
+        stack_deployer.checkpoint.clear()
+        return {"message": f"Cluster '{config.cluster_name}' deleted.", "provider": "aws"}
+    except DeploymentError as e:
+        raise deployment_error(e)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/ipam/allocations")
+def get_address_allocations():
+    """Network and pod CIDRs allocated to each cluster, keyed by <provider>-<region>-<cluster>"""
+    return {
+        cluster_id: {"network": allocation.network, **allocation.pods._asdict()}
+        for cluster_id, allocation in address_manager.allocations().items()
+    }
+
+@app.delete("/ipam/allocations/{cluster_id}")
+def release_address_allocation(cluster_id: str):
+    """Return a deleted cluster's CIDRs to the IPAM pools"""
+    if not address_manager.release(cluster_id):
+        raise HTTPException(status_code=404, detail=f"No addresses are allocated to '{cluster_id}'")
+    return {"message": f"Addresses of '{cluster_id}' released."}
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    """Prometheus metrics: deploy step and cloud call durations, retries and throttles"""
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/operations/{idempotency_key}")
+def get_operation(idempotency_key: str):
+    operation = operations.get(idempotency_key)
+    if operation is None:
+        raise HTTPException(status_code=404, detail=f"Unknown operation '{idempotency_key}'")
+    return operation_status(operation)
+
+@app.get("/profiles/{profile_id}")
+def get_profile(profile_id: str, sort: str = "cumulative", limit: int = 50, format: str = "text"):
+    """A stored request profile as pstats text, or the raw ``.prof`` file with ``format=raw``"""
+    path = profile_path(profile_id)
+    if path is None:
+        raise HTTPException(status_code=404, detail=f"Unknown profile '{profile_id}'")
+    if format == "raw":
+        return FileResponse(path, media_type="application/octet-stream", filename=f"{profile_id}.prof")
+    if sort not in PROFILE_SORT_KEYS:
+        raise HTTPException(status_code=422, detail=f"sort must be one of {', '.join(PROFILE_SORT_KEYS)}")
+    return PlainTextResponse(render_profile(path, sort, limit))
+
 @app.post("/cluster-info")
+@profiled
 def get_cluster_info(config: ClusterConfig):
     settings = get_settings()
     provider_type = config.provider or settings["default_provider"]
@@ -135,7 +805,7 @@ def get_cluster_info(config: ClusterConfig):
     try:
         provider = CloudProviderFactory.get_provider(provider_type, settings)
         
-        if provider_type == "azure":
+        if CloudProviderFactory.base_provider(provider_type) == "azure":
             # Implement Azure cluster info retrieval
             return {"message": "Azure cluster info retrieval not implemented yet"}
         else:  # AWS
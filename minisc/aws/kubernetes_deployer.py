@@ -1,93 +1,209 @@
-import boto3
-import sys
+import os
+from string import Template
+from minisc.common.checkpoints import run_step
+from minisc.common.cloud_init import AWS_PROVIDER_ID, AWS_WARM_POOL_POWER_OFF, with_commands, with_manifests
+from minisc.common.exceptions import NetworkDeploymentError, SecurityGroupDeploymentError
+from minisc.common.ipam import DEFAULT_POD_NETWORK
+from minisc.common.join import START_JOIN, with_control_plane, with_join, with_join_publisher
+from minisc.common.metrics import timed_step
+from minisc.common.network_plan import SubnetPlan, plan_subnets
+from minisc.common.performance import with_node_profile, with_performance_profile
+from minisc.common.operations import client_token
+from minisc.common.throttling import throttled_boto3_client
+
+VPC_CIDR = '10.0.0.0/16'
+
+
+def _zone_step(name, zone, separator=':'):
+    # A regional subnet keeps the unsuffixed checkpoint step and name of a single-subnet VPC
+    return f"{name}{separator}{zone}" if zone else name
+
+
+def instances_distribution(capacity_type, num_workers, on_demand_base=0):
+    """The worker group's (on-demand base capacity, on-demand percentage above base)"""
+    if capacity_type == 'on-demand':
+        return num_workers, 100
+    return (min(on_demand_base, num_workers) if capacity_type == 'mixed' else 0), 0
 
 
 class KubernetesDeployer:
-    def __init__(self, region='us-east-1'):
-        self.ec2 = boto3.client('ec2', region_name=region)
+    def __init__(self, region='us-east-1', ec2=None):
+        # ``ec2`` replaces the boto3 client, e.g. with the offline simulator's
+        self.ec2 = ec2 or throttled_boto3_client('ec2', region)
         self.region = region
+        self.checkpoint = None
+        self.idempotency_key = None
+        self.join_store = None
+        self.performance_profile = None
+        self.instance_profile = None
+
+    def use_checkpoint(self, checkpoint):
+        """Record completed steps in ``checkpoint`` and skip them when a deployment is resumed"""
+        self.checkpoint = checkpoint
+
+    def use_idempotency_key(self, key):
+        """Send EC2 client tokens derived from ``key`` so a retried create is not duplicated"""
+        self.idempotency_key = key
+
+    def use_join_store(self, store):
+        """Have the master publish its join command to ``store`` and workers join with it at boot"""
+        self.join_store = store
+
+    def use_instance_profile(self, name):
+        """Launch nodes with the IAM instance profile ``name``, whose role their processes call AWS with"""
+        self.instance_profile = name
+
+    def use_performance_profile(self, profile):
+        """Render ``profile``'s control-plane and kubelet limits into the nodes' user data"""
+        self.performance_profile = profile
+
+    def _client_token_kwargs(self, step):
+        return {'ClientToken': client_token(self.idempotency_key, step)} if self.idempotency_key else {}
+
+    def _instance_profile_kwargs(self):
+        # Nodes need an instance profile to read or write the join command, and the head node
+        # for the cluster-autoscaler to resize the worker groups
+        name = self.instance_profile or (self.join_store.instance_profile if self.join_store else None)
+        return {'IamInstanceProfile': {'Name': name}} if name else {}
+
+    def _completed(self):
+        return self.checkpoint.completed() if self.checkpoint else {}
+
+    def _render_master_user_data(self, manifests=None, pod_network=None, endpoint=None, first=True):
+        # Load cloud-init YAML template; with an ``endpoint`` the master is one of several control-plane nodes
+        pod_network = pod_network or DEFAULT_POD_NETWORK
+        template_path = os.path.join(os.path.dirname(__file__), '../templates/cloud-init_head_node.yaml')
+        with open(template_path, 'r') as f:
+            template = Template(f.read())
+            user_data = with_manifests(template.substitute(
+                POD_NETWORK_CIDR=pod_network.cidr,
+                NODE_CIDR_MASK_SIZE=pod_network.node_mask,
+                MAX_PODS=pod_network.max_pods,
+                ADMIN_USERNAME='ec2-user',
+                NETWORK_PLUGIN_URL='https://github.com/flannel-io/flannel/releases/latest/download/kube-flannel.yml'
+            ), manifests)
+        if self.performance_profile:
+            user_data = with_performance_profile(user_data, self.performance_profile)
+        if endpoint:
+            return with_control_plane(user_data, self.join_store, endpoint, first)
+        return with_join_publisher(user_data, self.join_store) if self.join_store else user_data
+
+    def _render_worker_user_data(self, master_ip, join_token, warm_pool=False, after_join=None):
+        # Load cloud-init YAML template
+        template_path = os.path.join(os.path.dirname(__file__), '../templates/cloud-init_worker_node.yaml')
+        with open(template_path, 'r') as f:
+            template = Template(f.read())
+            user_data = template.substitute(
+                MASTER_IP=master_ip or "",
+                JOIN_TOKEN=join_token or ""
+            )
+        if self.performance_profile:
+            user_data = with_node_profile(user_data, self.performance_profile)
+        user_data = with_commands(user_data, [AWS_PROVIDER_ID], after='apt-mark hold')
+        commands = [AWS_WARM_POOL_POWER_OFF] if warm_pool else []
+        if self.join_store:
+            user_data = with_join(user_data, self.join_store, after_join)
+            commands.append(START_JOIN)
+        return with_commands(user_data, commands)
+
+    @timed_step('aws')
+    def create_vpc_and_subnet(self, zones=None, max_nodes=None, cidr=None):
+        """Create the cluster VPC and return ``(vpc_id, subnet_id)``.
 
-    def create_vpc_and_subnet(self):
+        ``cidr`` replaces the VPC's default 10.0.0.0/16. With ``zones``,
+        ``max_nodes`` or ``cidr``, the VPC is laid out by ``plan_subnets`` with
+        one subnet per availability zone, and a list of subnet IDs in zone
+        order is returned instead of a single ID.
+        """
+        planned = bool(zones or max_nodes or cidr)
         try:
             # Create VPC
-            vpc_response = self.ec2.create_vpc(
-                CidrBlock='10.0.0.0/16',
+            vpc_id = run_step(self.checkpoint, 'vpc_id', lambda: self.ec2.create_vpc(
+                CidrBlock=cidr or VPC_CIDR,
                 TagSpecifications=[
                     {
                         'ResourceType': 'vpc',
                         'Tags': [{'Key': 'Name', 'Value': 'kubernetes-vpc'}]
                     }
                 ]
-            )
-            vpc_id = vpc_response['Vpc']['VpcId']
+            )['Vpc']['VpcId'])
 
             # Wait for VPC to be available
             waiter = self.ec2.get_waiter('vpc_available')
             waiter.wait(VpcIds=[vpc_id])
 
             # Enable DNS hostnames
-            self.ec2.modify_vpc_attribute(
+            run_step(self.checkpoint, 'vpc_dns_hostnames', lambda: self.ec2.modify_vpc_attribute(
                 VpcId=vpc_id,
                 EnableDnsHostnames={'Value': True}
-            )
+            ))
 
             # Create Internet Gateway
-            igw_response = self.ec2.create_internet_gateway()
-            igw_id = igw_response['InternetGateway']['InternetGatewayId']
+            igw_id = run_step(self.checkpoint, 'internet_gateway_id', lambda: self.ec2.create_internet_gateway(
+            )['InternetGateway']['InternetGatewayId'])
 
             # Attach Internet Gateway to VPC
-            self.ec2.attach_internet_gateway(
+            run_step(self.checkpoint, 'internet_gateway_attached', lambda: self.ec2.attach_internet_gateway(
                 InternetGatewayId=igw_id,
                 VpcId=vpc_id
-            )
+            ))
 
-            # Create Subnet
-            subnet_response = self.ec2.create_subnet(
-                VpcId=vpc_id,
-                CidrBlock='10.0.1.0/24',
-                TagSpecifications=[
-                    {
-                        'ResourceType': 'subnet',
-                        'Tags': [{'Key': 'Name', 'Value': 'kubernetes-subnet'}]
-                    }
-                ]
-            )
-            subnet_id = subnet_response['SubnetId']
+            # Create Subnets
+            subnets = plan_subnets(cidr or VPC_CIDR, zones, max_nodes) if planned else [SubnetPlan(None, '10.0.1.0/24')]
+            subnet_ids = [self._create_subnet(vpc_id, subnet) for subnet in subnets]
 
             # Create Route Table
-            route_table_response = self.ec2.create_route_table(VpcId=vpc_id)
-            route_table_id = route_table_response['RouteTable']['RouteTableId']
+            route_table_id = run_step(self.checkpoint, 'route_table_id', lambda: self.ec2.create_route_table(
+                VpcId=vpc_id,
+                **self._client_token_kwargs('route-table')
+            )['RouteTable']['RouteTableId'])
 
             # Create Route to Internet Gateway
-            self.ec2.create_route(
+            run_step(self.checkpoint, 'internet_route', lambda: self.ec2.create_route(
                 RouteTableId=route_table_id,
                 DestinationCidrBlock='0.0.0.0/0',
                 GatewayId=igw_id
-            )
+            ))
 
-            # Associate Route Table with Subnet
-            self.ec2.associate_route_table(
-                RouteTableId=route_table_id,
-                SubnetId=subnet_id
-            )
+            # Associate Route Table with Subnets
+            for subnet, subnet_id in zip(subnets, subnet_ids):
+                run_step(self.checkpoint, _zone_step('route_table_association_id', subnet.zone),
+                         lambda: self.ec2.associate_route_table(
+                             RouteTableId=route_table_id,
+                             SubnetId=subnet_id
+                         )['AssociationId'])
 
-            return vpc_id, subnet_id
+            return vpc_id, subnet_ids if planned else subnet_ids[0]
         except Exception as e:
             print(f"Error creating VPC and Subnet: {str(e)}")
-            sys.exit(1)
+            raise NetworkDeploymentError('create_vpc_and_subnet', str(e), self._completed()) from e
+
+    def _create_subnet(self, vpc_id, subnet):
+        zone_kwargs = {'AvailabilityZone': subnet.zone} if subnet.zone else {}
+        return run_step(self.checkpoint, _zone_step('subnet_id', subnet.zone), lambda: self.ec2.create_subnet(
+            VpcId=vpc_id,
+            CidrBlock=subnet.cidr,
+            TagSpecifications=[
+                {
+                    'ResourceType': 'subnet',
+                    'Tags': [{'Key': 'Name', 'Value': _zone_step('kubernetes-subnet', subnet.zone, '-')}]
+                }
+            ],
+            **zone_kwargs
+        )['Subnet']['SubnetId'])
 
+    @timed_step('aws')
     def create_security_group(self, vpc_id):
         try:
             # Create Security Group
-            response = self.ec2.create_security_group(
+            security_group_id = run_step(self.checkpoint, 'security_group_id', lambda: self.ec2.create_security_group(
                 GroupName='kubernetes-sg',
                 Description='Security group for Kubernetes cluster',
                 VpcId=vpc_id
-            )
-            security_group_id = response['GroupId']
+            )['GroupId'])
 
             # Add Inbound Rules
-            self.ec2.authorize_security_group_ingress(
+            run_step(self.checkpoint, 'security_group_ingress', lambda: self.ec2.authorize_security_group_ingress(
                 GroupId=security_group_id,
                 IpPermissions=[
                     {
@@ -97,8 +213,8 @@ class KubernetesDeployer:
                         'IpRanges': [{'CidrIp': '0.0.0.0/0'}]
                     }
                 ]
-            )
+            ))
             return security_group_id
         except Exception as e:
             print(f"Error creating Security Group: {str(e)}")
-            sys.exit(1)
\ No newline at end of file
+            raise SecurityGroupDeploymentError('create_security_group', str(e), self._completed()) from e
@@ -1,57 +1,150 @@
 import os
-import sys
 import paramiko
 import time
-from string import Template
 from minisc.aws.kubernetes_deployer import KubernetesDeployer
+from minisc.common.batching import launch_in_chunks
+from minisc.common.checkpoints import run_step
+from minisc.common.exceptions import NetworkDeploymentError, NodeDeploymentError
+from minisc.common.join import API_SERVER_PORT
+from minisc.common.metrics import timed_step
+from minisc.common.throttling import throttled_boto3_client
 
 
 class MasterNodeDeployer(KubernetesDeployer):
-    def __init__(self, region='us-east-1'):
-        super().__init__(region)
+    def __init__(self, region='us-east-1', ec2=None, elbv2=None):
+        super().__init__(region, ec2)
+        # ``elbv2`` replaces the boto3 client, e.g. with the offline simulator's
+        self.elbv2 = elbv2 or throttled_boto3_client('elbv2', region)
         self.master_instance = None
 
-    def deploy_master_node(self, security_group_id, subnet_id, key_name, instance_type='t2.medium'):
+    @timed_step('aws')
+    def deploy_master_node(self, security_group_id, subnet_id, key_name, instance_type='t2.medium', manifests=None,
+                           pod_network=None):
+        """Launch the master; ``manifests`` are Kubernetes add-ons it applies once the cluster is up"""
         try:
-            # Load cloud-init YAML template
-            template_path = os.path.join(os.path.dirname(__file__), '../templates/cloud-init_head_node.yaml')
-            with open(template_path, 'r') as f:
-                template = Template(f.read())
-                user_data = template.substitute()
-
-            # Get latest Amazon Linux 2 AMI
-            response = self.ec2.describe_images(
-                Filters=[
-                    {'Name': 'name', 'Values': ['amzn2-ami-hvm-*-x86_64-gp2']},
-                    {'Name': 'state', 'Values': ['available']}
-                ],
-                Owners=['amazon']
-            )
-            ami_id = sorted(response['Images'], key=lambda x: x['CreationDate'], reverse=True)[0]['ImageId']
-
-            # Launch Master Node
-            master_response = self.ec2.run_instances(
-                ImageId=ami_id,
-                InstanceType=instance_type,
-                KeyName=key_name,
-                MinCount=1,
-                MaxCount=1,
-                SecurityGroupIds=[security_group_id],
-                SubnetId=subnet_id,
-                UserData=user_data,
-                TagSpecifications=[
-                    {
-                        'ResourceType': 'instance',
-                        'Tags': [{'Key': 'Name', 'Value': 'k8s-master'}]
-                    }
-                ]
+            instance_id = self.checkpoint.get('master_instance_id') if self.checkpoint else None
+            if instance_id:
+                # Resuming: the master was already launched by a previous attempt
+                self.master_instance = self.ec2.describe_instances(
+                    InstanceIds=[instance_id]
+                )['Reservations'][0]['Instances'][0]
+                print(f"Master node already launched: {instance_id}")
+                return
+
+            self.master_instance = self._launch_master(
+                self._get_master_ami(), instance_type, key_name, security_group_id, subnet_id,
+                self._render_master_user_data(manifests, pod_network), 'k8s-master', 'master'
             )
-            self.master_instance = master_response['Instances'][0]
+            if self.checkpoint:
+                self.checkpoint.record('master_instance_id', self.master_instance['InstanceId'])
             print(f"Master node launched: {self.master_instance['InstanceId']}")
         except Exception as e:
             print(f"Error deploying Master Node: {str(e)}")
-            sys.exit(1)
+            raise NodeDeploymentError('deploy_master_node', str(e), self._completed()) from e
+
+    @timed_step('aws')
+    def deploy_control_plane(self, cluster_name, vpc_id, security_group_id, subnet_id, key_name, count=3,
+                             instance_type='t2.medium', manifests=None, pod_network=None):
+        """Launch ``count`` control-plane nodes with stacked etcd behind a network load balancer.
+
+        The nodes are launched at once, in turn in each subnet of ``subnet_id``.
+        The first runs kubeadm init and the others join it through the load
+        balancer, with the join command it publishes to the join store.
+        Returns the load balancer's DNS name, the cluster's API endpoint.
+        """
+        subnet_ids = subnet_id if isinstance(subnet_id, list) else [subnet_id]
+        name = f"{cluster_name}-api"[:32]
+        try:
+            balancer_arn = run_step(self.checkpoint, 'api_load_balancer_arn', lambda: self.elbv2.create_load_balancer(
+                Name=name, Subnets=subnet_ids, Scheme='internet-facing', Type='network'
+            )['LoadBalancers'][0]['LoadBalancerArn'])
+            endpoint = self.elbv2.describe_load_balancers(
+                LoadBalancerArns=[balancer_arn]
+            )['LoadBalancers'][0]['DNSName']
+            # IP targets do not keep the client's address, so a node can reach the API through the load
+            # balancer even when it is routed to itself
+            target_group_arn = run_step(self.checkpoint, 'api_target_group_arn', lambda: self.elbv2.create_target_group(
+                Name=name, Protocol='TCP', Port=API_SERVER_PORT, VpcId=vpc_id, TargetType='ip',
+                HealthCheckProtocol='TCP'
+            )['TargetGroups'][0]['TargetGroupArn'])
+            run_step(self.checkpoint, 'api_listener_arn', lambda: self.elbv2.create_listener(
+                LoadBalancerArn=balancer_arn, Protocol='TCP', Port=API_SERVER_PORT,
+                DefaultActions=[{'Type': 'forward', 'TargetGroupArn': target_group_arn}]
+            )['Listeners'][0]['ListenerArn'])
+            print(f"API load balancer '{name}' created: {endpoint}")
+        except Exception as e:
+            print(f"Error creating the API load balancer: {str(e)}")
+            raise NetworkDeploymentError('create_api_load_balancer', str(e), self._completed()) from e
+
+        try:
+            instance_ids = self.checkpoint.get('control_plane_instance_ids') if self.checkpoint else None
+            if instance_ids:
+                # Resuming: the nodes were already launched by a previous attempt
+                instances = [instance for reservation in self.ec2.describe_instances(
+                    InstanceIds=instance_ids
+                )['Reservations'] for instance in reservation['Instances']]
+                print(f"Control-plane nodes already launched: {', '.join(instance_ids)}")
+            else:
+                ami_id = self._get_master_ami()
+
+                def launch(index, _):
+                    user_data = self._render_master_user_data(manifests, pod_network, endpoint, first=index == 0)
+                    return [self._launch_master(
+                        ami_id, instance_type, key_name, security_group_id, subnet_ids[index % len(subnet_ids)],
+                        user_data, f'k8s-master-{index}', f'master-{index}'
+                    )]
+
+                result = launch_in_chunks(launch, count, chunk_size=1, max_parallel=count, pace_seconds=0)
+                if result['failed']:
+                    raise RuntimeError(f"{result['failed']} of {count} control-plane nodes failed to launch: "
+                                       f"{result['errors']}")
+                instances = result['launched']
+                if self.checkpoint:
+                    self.checkpoint.record('control_plane_instance_ids', [i['InstanceId'] for i in instances])
+                print(f"{count} control-plane nodes launched.")
+
+            run_step(self.checkpoint, 'api_targets', lambda: self.elbv2.register_targets(
+                TargetGroupArn=target_group_arn,
+                Targets=[{'Id': instance['PrivateIpAddress'], 'Port': API_SERVER_PORT} for instance in instances]
+            ))
+            self.master_instance = instances[0]
+        except Exception as e:
+            print(f"Error deploying the control plane: {str(e)}")
+            raise NodeDeploymentError('deploy_control_plane', str(e), self._completed()) from e
+        return endpoint
+
+    def _get_master_ami(self):
+        # Latest Amazon Linux 2 AMI
+        response = self.ec2.describe_images(
+            Filters=[
+                {'Name': 'name', 'Values': ['amzn2-ami-hvm-*-x86_64-gp2']},
+                {'Name': 'state', 'Values': ['available']}
+            ],
+            Owners=['amazon']
+        )
+        return sorted(response['Images'], key=lambda x: x['CreationDate'], reverse=True)[0]['ImageId']
+
+    def _launch_master(self, ami_id, instance_type, key_name, security_group_id, subnet_id, user_data, name, step):
+        return self.ec2.run_instances(
+            ImageId=ami_id,
+            InstanceType=instance_type,
+            KeyName=key_name,
+            MinCount=1,
+            MaxCount=1,
+            SecurityGroupIds=[security_group_id],
+            SubnetId=subnet_id,
+            UserData=user_data,
+            TagSpecifications=[
+                {
+                    'ResourceType': 'instance',
+                    'Tags': [{'Key': 'Name', 'Value': name}]
+                }
+            ],
+            **self._instance_profile_kwargs(),
+            **self._client_token_kwargs(step)
+        )['Instances'][0]
 
+    @timed_step('aws')
     def setup_helm_charts(self, key_name):
         """Install and configure common Helm charts"""
         try:
@@ -166,6 +259,7 @@ class MasterNodeDeployer(KubernetesDeployer):
             print(f"Error setting up Helm charts: {str(e)}")
             return False
 
+    @timed_step('aws')
     def get_cluster_info(self, key_name):
         """Get cluster information including Helm releases"""
         try:
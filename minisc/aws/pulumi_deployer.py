@@ -0,0 +1,229 @@
+import base64
+import os
+import shutil
+from minisc.aws.kubernetes_deployer import KubernetesDeployer, instances_distribution
+from minisc.common.checkpoints import get_state_dir
+from minisc.common.exceptions import NodeDeploymentError
+from minisc.common.metrics import timed_step
+
+# Pulumi is optional: without it the "pulumi" deployment engine is unavailable
+try:
+    import pulumi
+    import pulumi_aws as aws
+    from pulumi import automation as auto
+except ImportError:
+    pulumi = aws = auto = None
+
+# Pulumi project of every cluster stack; config keys below live in its namespace
+PROJECT_NAME = 'minisc'
+
+# SSM parameter holding the latest Amazon Linux 2 AMI, as in the CloudFormation template
+AMI_PARAMETER = '/aws/service/ami-amazon-linux-latest/amzn2-ami-hvm-x86_64-gp2'
+
+
+def pulumi_available():
+    """Whether the Pulumi SDK, its AWS provider and the pulumi CLI are all installed"""
+    return pulumi is not None and shutil.which('pulumi') is not None
+
+
+class PulumiDeployer(KubernetesDeployer):
+    """Deploys a cluster as one Pulumi stack, ``minisc-<cluster>``, with the Automation API.
+
+    The cluster's resources are declared by ``program``; each request sets
+    the stack config it owns and runs ``pulumi up``, which applies only the
+    difference from the recorded state and creates independent resources in
+    parallel. State is kept by the local file backend under the minisc state
+    directory, so no Pulumi Cloud account is needed.
+    """
+
+    def __init__(self, region='us-east-1', ec2=None, state_dir=None, parallel=None):
+        super().__init__(region, ec2)
+        self.state_dir = os.path.join(state_dir or get_state_dir(), 'pulumi')
+        # Maximum concurrent resource operations; None keeps Pulumi's default
+        self.parallel = parallel
+
+    @staticmethod
+    def stack_name(cluster_name):
+        return f"minisc-{cluster_name}"
+
+    @timed_step('aws')
+    def deploy_master_stack(self, cluster_name, key_name=None, instance_type='t2.medium'):
+        """Bring the stack's network and master node up to date; returns the stack outputs"""
+        return self._up(cluster_name, 'deploy_master_stack', {
+            'clusterName': cluster_name,
+            'keyName': key_name or '',
+            'deployMaster': 'true',
+            'masterInstanceType': instance_type,
+        })
+
+    @timed_step('aws')
+    def deploy_worker_stack(self, cluster_name, key_name=None, num_workers=2, instance_type='t2.medium',
+                            master_ip=None, join_token=None, capacity_type='on-demand', on_demand_base=0,
+                            spot_max_price=None):
+        """Add or resize the stack's worker Auto Scaling group; returns the stack outputs"""
+        on_demand = instances_distribution(capacity_type, num_workers, on_demand_base)
+        return self._up(cluster_name, 'deploy_worker_stack', {
+            'clusterName': cluster_name,
+            'keyName': key_name or '',
+            # Without one, workers join the master of the same stack
+            'masterIp': master_ip or '',
+            'joinToken': join_token or '',
+            'workerInstanceType': instance_type,
+            'workerCount': str(num_workers),
+            'onDemandBaseCapacity': str(on_demand[0]),
+            'onDemandPercentageAboveBase': str(on_demand[1]),
+            'spotMaxPrice': spot_max_price or '',
+        })
+
+    @timed_step('aws')
+    def delete_stack(self, cluster_name):
+        """Destroy every resource of the cluster stack and remove the stack"""
+        stack = self._stack(cluster_name)
+        try:
+            stack.destroy(on_output=print, color='never', **self._parallel_kwargs())
+            stack.workspace.remove_stack(stack.name)
+        except Exception as e:
+            print(f"Error destroying stack '{stack.name}': {str(e)}")
+            raise NodeDeploymentError('delete_stack', str(e), self._completed()) from e
+
+    def stack_outputs(self, cluster_name):
+        return {key: output.value for key, output in self._stack(cluster_name).outputs().items()}
+
+    def program(self):
+        """Declare the cluster's resources from the stack config"""
+        config = pulumi.Config()
+        cluster_name = config.require('clusterName')
+        key_name = config.get('keyName') or None
+        image_id = aws.ssm.get_parameter(name=AMI_PARAMETER).value
+        tags = {'minisc:cluster': cluster_name}
+
+        vpc = aws.ec2.Vpc('vpc', cidr_block='10.0.0.0/16', enable_dns_hostnames=True,
+                          tags={**tags, 'Name': 'kubernetes-vpc'})
+        gateway = aws.ec2.InternetGateway('internet-gateway', vpc_id=vpc.id, tags=tags)
+        subnet = aws.ec2.Subnet('subnet', vpc_id=vpc.id, cidr_block='10.0.0.0/24',
+                                map_public_ip_on_launch=True, tags=tags)
+        route_table = aws.ec2.RouteTable('route-table', vpc_id=vpc.id, routes=[
+            aws.ec2.RouteTableRouteArgs(cidr_block='0.0.0.0/0', gateway_id=gateway.id)
+        ], tags=tags)
+        association = aws.ec2.RouteTableAssociation('subnet-route-table', subnet_id=subnet.id,
+                                                    route_table_id=route_table.id)
+        security_group = aws.ec2.SecurityGroup(
+            'security-group',
+            description='Security group for Kubernetes cluster',
+            vpc_id=vpc.id,
+            ingress=[aws.ec2.SecurityGroupIngressArgs(protocol='-1', from_port=0, to_port=0, cidr_blocks=['0.0.0.0/0'])],
+            egress=[aws.ec2.SecurityGroupEgressArgs(protocol='-1', from_port=0, to_port=0, cidr_blocks=['0.0.0.0/0'])],
+            tags=tags
+        )
+        pulumi.export('VpcId', vpc.id)
+        pulumi.export('SubnetId', subnet.id)
+        pulumi.export('SecurityGroupId', security_group.id)
+
+        # Instances need the internet route to fetch packages during cloud-init
+        after_routes = pulumi.ResourceOptions(depends_on=[association])
+        master_ip = config.get('masterIp') or None
+        if config.get_bool('deployMaster'):
+            master = aws.ec2.Instance(
+                'master',
+                ami=image_id,
+                instance_type=config.get('masterInstanceType') or 't2.medium',
+                subnet_id=subnet.id,
+                vpc_security_group_ids=[security_group.id],
+                key_name=key_name,
+                user_data=self._render_master_user_data(),
+                tags={**tags, 'Name': 'k8s-master'},
+                opts=after_routes
+            )
+            pulumi.export('MasterInstanceId', master.id)
+            pulumi.export('MasterPublicIp', master.public_ip)
+            pulumi.export('MasterPrivateIp', master.private_ip)
+            master_ip = master_ip or master.private_ip
+
+        worker_count = config.get_int('workerCount') or 0
+        if worker_count:
+            user_data = pulumi.Output.all(master_ip, config.get_secret('joinToken')).apply(
+                lambda values: base64.b64encode(self._render_worker_user_data(*values).encode()).decode()
+            )
+            launch_template = aws.ec2.LaunchTemplate(
+                'worker-launch-template',
+                name=f'{cluster_name}-workers',
+                image_id=image_id,
+                instance_type=config.get('workerInstanceType') or 't2.medium',
+                key_name=key_name,
+                vpc_security_group_ids=[security_group.id],
+                user_data=user_data,
+                tag_specifications=[aws.ec2.LaunchTemplateTagSpecificationArgs(
+                    resource_type='instance', tags={**tags, 'Name': 'k8s-worker'}
+                )]
+            )
+            percentage_above_base = config.get_int('onDemandPercentageAboveBase')
+            group = aws.autoscaling.Group(
+                'worker-group',
+                name=f'{cluster_name}-workers',
+                min_size=worker_count,
+                max_size=worker_count,
+                desired_capacity=worker_count,
+                vpc_zone_identifiers=[subnet.id],
+                mixed_instances_policy=aws.autoscaling.GroupMixedInstancesPolicyArgs(
+                    launch_template=aws.autoscaling.GroupMixedInstancesPolicyLaunchTemplateArgs(
+                        launch_template_specification=aws.autoscaling.GroupMixedInstancesPolicyLaunchTemplateLaunchTemplateSpecificationArgs(
+                            launch_template_id=launch_template.id,
+                            version=launch_template.latest_version.apply(str)
+                        )
+                    ),
+                    instances_distribution=aws.autoscaling.GroupMixedInstancesPolicyInstancesDistributionArgs(
+                        on_demand_base_capacity=config.get_int('onDemandBaseCapacity') or 0,
+                        on_demand_percentage_above_base_capacity=100 if percentage_above_base is None else percentage_above_base,
+                        spot_allocation_strategy='price-capacity-optimized',
+                        spot_max_price=config.get('spotMaxPrice') or None
+                    )
+                ),
+                opts=after_routes
+            )
+            pulumi.export('WorkerGroupName', group.name)
+
+    def _up(self, cluster_name, step, config):
+        stack_name = self.stack_name(cluster_name)
+        try:
+            stack = self._stack(cluster_name)
+            stack.set_config('aws:region', auto.ConfigValue(self.region))
+            # Keys set by the other request keep their values in the stack settings
+            stack.set_all_config({
+                key: auto.ConfigValue(value, secret=key == 'joinToken') for key, value in config.items()
+            })
+            print(f"Updating stack '{stack_name}'...")
+            result = stack.up(on_output=print, color='never', **self._parallel_kwargs())
+            changes = ', '.join(f"{count} {operation}" for operation, count in (result.summary.resource_changes or {}).items())
+            print(f"Stack '{stack_name}' is up to date ({changes or 'no changes'}).")
+            return {key: output.value for key, output in result.outputs.items()}
+        except Exception as e:
+            print(f"Error deploying stack '{stack_name}': {str(e)}")
+            raise NodeDeploymentError(step, str(e), self._completed()) from e
+
+    def _stack(self, cluster_name):
+        backend_dir = os.path.join(self.state_dir, 'backend')
+        # The stack settings, and with them the config of earlier requests, persist in the work dir
+        work_dir = os.path.join(self.state_dir, 'workspace')
+        os.makedirs(backend_dir, exist_ok=True)
+        os.makedirs(work_dir, exist_ok=True)
+
+        env_vars = {}
+        if 'PULUMI_CONFIG_PASSPHRASE' not in os.environ and 'PULUMI_CONFIG_PASSPHRASE_FILE' not in os.environ:
+            # The file backend encrypts secrets such as the join token with a passphrase
+            env_vars['PULUMI_CONFIG_PASSPHRASE'] = ''
+        return auto.create_or_select_stack(
+            stack_name=self.stack_name(cluster_name),
+            project_name=PROJECT_NAME,
+            program=self.program,
+            opts=auto.LocalWorkspaceOptions(
+                work_dir=work_dir,
+                env_vars=env_vars,
+                project_settings=auto.ProjectSettings(
+                    name=PROJECT_NAME, runtime='python',
+                    backend=auto.ProjectBackend(url=f'file://{backend_dir}')
+                )
+            )
+        )
+
+    def _parallel_kwargs(self):
+        return {'parallel': self.parallel} if self.parallel else {}
@@ -0,0 +1,185 @@
+import json
+import os
+import time
+from botocore.exceptions import ClientError
+from minisc.aws.kubernetes_deployer import KubernetesDeployer, instances_distribution
+from minisc.common.exceptions import NodeDeploymentError
+from minisc.common.metrics import timed_step
+from minisc.common.operations import client_token
+from minisc.common.throttling import throttled_boto3_client
+
+# CloudFormation template creating the cluster network, master node and worker Auto Scaling group
+CLUSTER_TEMPLATE_PATH = os.path.join(os.path.dirname(__file__), '../templates/cloudformation/cluster.json')
+
+# Stack statuses of a finished operation; any other status not ending in _IN_PROGRESS is a failure
+STACK_SUCCEEDED = ('CREATE_COMPLETE', 'UPDATE_COMPLETE', 'DELETE_COMPLETE')
+
+
+def load_cluster_template():
+    with open(CLUSTER_TEMPLATE_PATH, 'r') as f:
+        return f.read()
+
+
+def template_parameters():
+    return list(json.loads(load_cluster_template())['Parameters'])
+
+
+class StackDeployer(KubernetesDeployer):
+    """Deploys a cluster as one CloudFormation stack, ``minisc-<cluster>``.
+
+    The head node request creates the stack with the network and master; the
+    worker request updates it to add the worker Auto Scaling group. Each is
+    a single API call, after which CloudFormation creates the resources in
+    parallel and the deployer follows the stack's events until it settles.
+    Deleting the stack tears the whole cluster down.
+    """
+
+    def __init__(self, region='us-east-1', ec2=None, cloudformation=None, poll_interval=5.0):
+        super().__init__(region, ec2)
+        # ``cloudformation`` replaces the boto3 client, e.g. with the offline simulator's
+        self.cloudformation = cloudformation or throttled_boto3_client('cloudformation', region)
+        self.poll_interval = poll_interval
+
+    @staticmethod
+    def stack_name(cluster_name):
+        return f"minisc-{cluster_name}"
+
+    @timed_step('aws')
+    def deploy_master_stack(self, cluster_name, key_name=None, instance_type='t2.medium'):
+        """Create or update the cluster stack with its network and master node; returns the stack outputs"""
+        return self._deploy_stack(cluster_name, 'deploy_master_stack', {
+            'ClusterName': cluster_name,
+            'KeyName': key_name or '',
+            'DeployMaster': 'true',
+            'MasterInstanceType': instance_type,
+            'MasterUserData': self._render_master_user_data(),
+        })
+
+    @timed_step('aws')
+    def deploy_worker_stack(self, cluster_name, key_name=None, num_workers=2, instance_type='t2.medium',
+                            master_ip=None, join_token=None, capacity_type='on-demand', on_demand_base=0,
+                            spot_max_price=None):
+        """Add or resize the cluster stack's worker Auto Scaling group; returns the stack outputs"""
+        if master_ip is None:
+            # Workers join the master created by the same stack
+            master_ip = self.stack_outputs(cluster_name).get('MasterPrivateIp')
+        on_demand = instances_distribution(capacity_type, num_workers, on_demand_base)
+
+        return self._deploy_stack(cluster_name, 'deploy_worker_stack', {
+            'ClusterName': cluster_name,
+            'KeyName': key_name or '',
+            'WorkerInstanceType': instance_type,
+            'WorkerUserData': self._render_worker_user_data(master_ip, join_token),
+            'WorkerCount': str(num_workers),
+            'OnDemandBaseCapacity': str(on_demand[0]),
+            'OnDemandPercentageAboveBase': str(on_demand[1]),
+            'SpotMaxPrice': spot_max_price or '',
+        })
+
+    @timed_step('aws')
+    def delete_stack(self, cluster_name):
+        """Delete the cluster stack and every resource in it"""
+        stack = self._describe_stack(self.stack_name(cluster_name))
+        if stack is None:
+            print(f"Stack '{self.stack_name(cluster_name)}' does not exist.")
+            return
+        seen = self._event_ids(stack['StackId'])
+        self.cloudformation.delete_stack(
+            StackName=stack['StackId'], **self._request_token_kwargs(f"stack-delete-{stack['StackId']}")
+        )
+        self._wait_for_stack(stack['StackId'], seen, 'delete_stack')
+
+    def stack_outputs(self, cluster_name):
+        stack = self._describe_stack(self.stack_name(cluster_name))
+        return {output['OutputKey']: output['OutputValue'] for output in (stack or {}).get('Outputs', [])}
+
+    def _deploy_stack(self, cluster_name, step, parameters):
+        stack_name = self.stack_name(cluster_name)
+        try:
+            stack = self._describe_stack(stack_name)
+            if stack is not None and stack['StackStatus'] == 'ROLLBACK_COMPLETE':
+                # A stack whose creation rolled back cannot be updated, only replaced
+                print(f"Deleting stack '{stack_name}' left by a failed creation...")
+                self.delete_stack(cluster_name)
+                stack = None
+
+            if stack is None:
+                seen = set()
+                stack_id = self.cloudformation.create_stack(
+                    StackName=stack_name,
+                    TemplateBody=load_cluster_template(),
+                    Parameters=[{'ParameterKey': key, 'ParameterValue': value} for key, value in parameters.items()],
+                    Tags=[{'Key': 'minisc:cluster', 'Value': cluster_name}],
+                    **self._request_token_kwargs(f'stack-create-{step}')
+                )['StackId']
+                print(f"Creating stack '{stack_name}'...")
+            else:
+                stack_id = stack['StackId']
+                seen = self._event_ids(stack_id)
+                try:
+                    self.cloudformation.update_stack(
+                        StackName=stack_id,
+                        TemplateBody=load_cluster_template(),
+                        # Parameters set by the other request keep their values
+                        Parameters=[
+                            {'ParameterKey': key, 'ParameterValue': parameters[key]} if key in parameters
+                            else {'ParameterKey': key, 'UsePreviousValue': True}
+                            for key in template_parameters()
+                        ],
+                        **self._request_token_kwargs(f'stack-update-{step}')
+                    )
+                except ClientError as e:
+                    if 'No updates are to be performed' not in str(e):
+                        raise
+                    print(f"Stack '{stack_name}' is already up to date.")
+                    return self.stack_outputs(cluster_name)
+                print(f"Updating stack '{stack_name}'...")
+
+            if self.checkpoint:
+                self.checkpoint.record('stack_id', stack_id)
+            stack = self._wait_for_stack(stack_id, seen, step)
+            return {output['OutputKey']: output['OutputValue'] for output in stack.get('Outputs', [])}
+        except NodeDeploymentError:
+            raise
+        except Exception as e:
+            print(f"Error deploying stack '{stack_name}': {str(e)}")
+            raise NodeDeploymentError(step, str(e), self._completed()) from e
+
+    def _wait_for_stack(self, stack_id, seen, step):
+        """Print the stack's new events until it settles; raises with the failed resources' reasons"""
+        failures = []
+        while True:
+            stack = self._describe_stack(stack_id)
+            # The first page holds the newest events, enough for one poll interval
+            events = self.cloudformation.describe_stack_events(StackName=stack_id)['StackEvents']
+            for event in reversed(events):
+                if event['EventId'] in seen:
+                    continue
+                seen.add(event['EventId'])
+                reason = f" ({event['ResourceStatusReason']})" if event.get('ResourceStatusReason') else ''
+                print(f"  {event['ResourceStatus']:<20} {event['ResourceType']:<40} {event['LogicalResourceId']}{reason}")
+                if event['ResourceStatus'].endswith('_FAILED') and event.get('ResourceStatusReason'):
+                    failures.append(f"{event['LogicalResourceId']}: {event['ResourceStatusReason']}")
+
+            status = stack['StackStatus']
+            if status in STACK_SUCCEEDED:
+                return stack
+            if not status.endswith('_IN_PROGRESS'):
+                raise NodeDeploymentError(step, f"stack {status}: {'; '.join(failures) or 'no reason given'}",
+                                          self._completed())
+            time.sleep(self.poll_interval)
+
+    def _describe_stack(self, stack_name):
+        try:
+            return self.cloudformation.describe_stacks(StackName=stack_name)['Stacks'][0]
+        except ClientError as e:
+            if 'does not exist' in str(e):
+                return None
+            raise
+
+    def _event_ids(self, stack_id):
+        return {event['EventId'] for event in self.cloudformation.describe_stack_events(StackName=stack_id)['StackEvents']}
+
+    def _request_token_kwargs(self, step):
+        # With an idempotency key a retried call is recognized by CloudFormation instead of repeated
+        return {'ClientRequestToken': client_token(self.idempotency_key, step)} if self.idempotency_key else {}
@@ -1,54 +1,503 @@
-import os
-import sys
-from string import Template
-from minisc.aws.kubernetes_deployer import KubernetesDeployer
+import base64
+import math
+import time
+import uuid
+from botocore.exceptions import ClientError
+from minisc.aws.kubernetes_deployer import KubernetesDeployer, instances_distribution
+from minisc.common.batching import launch_in_chunks
+from minisc.common.checkpoints import run_step
+from minisc.common.cloud_init import aws_complete_lifecycle_action
+from minisc.common.cluster_autoscaler import aws_group_tags
+from minisc.common.exceptions import NodeDeploymentError
+from minisc.common.metrics import timed_step
+from minisc.common.throttling import is_capacity_error, throttled_boto3_client
+
+# Spot request status codes that mean the instance is being (or has been) reclaimed
+SPOT_INTERRUPTION_CODES = [
+    'marked-for-termination',
+    'marked-for-stop',
+    'instance-terminated-by-price',
+    'instance-terminated-no-capacity',
+    'instance-terminated-capacity-oversubscribed',
+    'instance-stopped-by-price',
+    'instance-stopped-no-capacity',
+    'instance-stopped-capacity-oversubscribed',
+]
+
+# Lifecycle hooks of an Auto Scaling group worker pool: with auto_join, new instances wait until
+# they have joined the cluster and completed the hook themselves, and removed ones wait until they
+# are drained. Past the heartbeat timeout the group carries on regardless, so a worker that fails
+# to join or a deployer that goes away never blocks the pool.
+JOIN_HOOK = 'minisc-join'
+DRAIN_HOOK = 'minisc-drain'
+LIFECYCLE_HEARTBEAT_TIMEOUT = 300
+
+
+def _subnet_ids(subnet_id):
+    return subnet_id if isinstance(subnet_id, list) else [subnet_id]
 
 
 class WorkerNodesDeployer(KubernetesDeployer):
-    def __init__(self, region='us-east-1'):
-        super().__init__(region)
+    def __init__(self, region='us-east-1', ec2=None, autoscaling=None, poll_interval=5.0,
+                 settle_timeout=2 * LIFECYCLE_HEARTBEAT_TIMEOUT):
+        super().__init__(region, ec2)
+        # ``autoscaling`` replaces the boto3 client, e.g. with the offline simulator's
+        self.autoscaling = autoscaling or throttled_boto3_client('autoscaling', region)
+        # How often, and for how long, an Auto Scaling group pool is polled for lifecycle actions
+        self.poll_interval = poll_interval
+        self.settle_timeout = settle_timeout
         self.worker_instances = []
+        self.launch_template_id = None
+        self._last_launch = None
 
-    def deploy_worker_nodes(self, security_group_id, subnet_id, key_name, num_workers=2, instance_type='t2.medium', master_ip=None, join_token=None):
+    @timed_step('aws')
+    def deploy_worker_nodes(self, security_group_id, subnet_id, key_name, num_workers=2, instance_type='t2.medium', master_ip=None, join_token=None,
+                            capacity_type='on-demand', on_demand_base=0, spot_max_price=None, spot_instance_types=None,
+                            batch_size=50, max_parallel_launches=4):
+        """Launch the workers; a list of ``subnet_id`` spreads them evenly across the subnets' zones"""
         try:
-            # Load cloud-init YAML template
-            template_path = os.path.join(os.path.dirname(__file__), '../templates/cloud-init_worker_node.yaml')
-            with open(template_path, 'r') as f:
-                template = Template(f.read())
-                user_data = template.substitute(
-                    MASTER_IP=master_ip or "",
-                    JOIN_TOKEN=join_token or ""
+            self._last_launch = {
+                'security_group_id': security_group_id,
+                'subnet_id': subnet_id,
+                'key_name': key_name,
+                'instance_type': instance_type,
+                'master_ip': master_ip,
+                'join_token': join_token,
+                'spot_max_price': spot_max_price,
+                'spot_instance_types': spot_instance_types,
+            }
+            # Resuming: only launch the workers a previous attempt did not
+            launched_ids = self.checkpoint.get('worker_instance_ids', []) if self.checkpoint else []
+            self.worker_instances = [{'InstanceId': instance_id} for instance_id in launched_ids]
+            remaining = num_workers - len(launched_ids)
+            if remaining <= 0:
+                print(f"{len(launched_ids)} worker nodes already launched.")
+                return {'requested': num_workers, 'launched': len(launched_ids), 'failed': 0, 'errors': []}
+
+            user_data = self._render_worker_user_data(master_ip, join_token)
+            ami_id = self._get_latest_ami()
+            on_demand_count = 0
+            subnet_ids = _subnet_ids(subnet_id)
+
+            if capacity_type == 'on-demand':
+                # Chunks go to the subnets in turn, so each zone gets an even share
+                batch_size = min(batch_size, math.ceil(remaining / len(subnet_ids)))
+
+                def launch(index, count):
+                    # A zone without capacity is not retried; the chunk tries each other zone once
+                    for attempt in range(len(subnet_ids)):
+                        subnet = subnet_ids[(index + attempt) % len(subnet_ids)]
+                        try:
+                            # A new client token per zone, as a token is bound to its request's parameters
+                            return self._run_workers(
+                                ami_id, instance_type, key_name, security_group_id, subnet, user_data, count,
+                                f'workers-{remaining}-{index}' + (f'-{attempt}' if attempt else '')
+                            )
+                        except ClientError as e:
+                            if not is_capacity_error(e) or attempt == len(subnet_ids) - 1:
+                                raise
+                            print(f"No capacity for chunk {index} in {subnet}, trying the next zone...")
+            else:
+                self.launch_template_id = self._create_launch_template(
+                    ami_id, instance_type, key_name, security_group_id, user_data
                 )
+                on_demand_count = min(on_demand_base, remaining) if capacity_type == 'mixed' else 0
+                instance_types = [instance_type] + list(spot_instance_types or [])
 
-            # Get latest Amazon Linux 2 AMI
-            response = self.ec2.describe_images(
-                Filters=[
-                    {'Name': 'name', 'Values': ['amzn2-ami-hvm-*-x86_64-gp2']},
-                    {'Name': 'state', 'Values': ['available']}
-                ],
-                Owners=['amazon']
+                def launch(index, count):
+                    # The on-demand base is taken up by the first chunks
+                    chunk_start = index * batch_size
+                    chunk_on_demand = max(0, min(count, on_demand_count - chunk_start))
+                    return self._launch_fleet(
+                        subnet_ids, instance_types, count, chunk_on_demand, spot_max_price,
+                        client_token_step=f'fleet-{remaining}-{index}'
+                    )
+
+            result = launch_in_chunks(launch, remaining, chunk_size=batch_size, max_parallel=max_parallel_launches)
+            if result['launched'] and self.checkpoint:
+                self.checkpoint.record(
+                    'worker_instance_ids', launched_ids + [instance['InstanceId'] for instance in result['launched']]
+                )
+            if not result['launched']:
+                raise Exception(f"no worker nodes launched: {result['errors']}")
+
+            self.worker_instances.extend(result['launched'])
+            if capacity_type == 'on-demand':
+                print(f"{len(result['launched'])} worker nodes launched.")
+            else:
+                print(f"{len(result['launched'])} worker nodes launched "
+                      f"({on_demand_count} on-demand base, remainder spot).")
+            if result['failed']:
+                print(f"Warning: {result['failed']} of {remaining} worker nodes failed to launch.")
+
+            return {
+                'requested': num_workers,
+                'launched': len(launched_ids) + len(result['launched']),
+                'failed': result['failed'],
+                'errors': result['errors'],
+            }
+        except Exception as e:
+            print(f"Error deploying Worker Nodes: {str(e)}")
+            raise NodeDeploymentError('deploy_worker_nodes', str(e), self._completed()) from e
+
+    @timed_step('aws')
+    def deploy_worker_group(self, cluster_name, security_group_id, subnet_id, key_name, num_workers=2,
+                            instance_type='t2.medium', master_ip=None, join_token=None, capacity_type='on-demand',
+                            on_demand_base=0, spot_max_price=None, spot_instance_types=None, cordon=None,
+                            autoscaler=None, warm_pool_size=0):
+        """Run the workers as the Auto Scaling group ``<cluster>-workers``, built from a launch template.
+
+        The group replaces unhealthy or reclaimed workers itself. Its lifecycle
+        hooks hold removed workers until ``cordon`` has drained them and, with
+        a join store, new workers until they have run ``kubeadm join``: each
+        completes its own launch action once joined. An existing group is resized.
+        With ``autoscaler`` bounds, the group is sized within them and tagged
+        for the cluster-autoscaler. With ``warm_pool_size``, that many workers
+        are kept bootstrapped and stopped in the group's warm pool, and
+        scale-outs start them instead of launching new instances.
+        """
+        group_name = f"{cluster_name}-workers"
+        try:
+            if self._describe_group(group_name) is not None:
+                return self.scale_worker_group(cluster_name, num_workers, cordon, warm_pool_size=warm_pool_size or None)
+
+            self.launch_template_id = run_step(self.checkpoint, 'worker_launch_template_id', lambda: self._create_launch_template(
+                self._get_latest_ami(), instance_type, key_name, security_group_id,
+                self._render_worker_user_data(
+                    master_ip, join_token, warm_pool=bool(warm_pool_size),
+                    after_join=[aws_complete_lifecycle_action(self.region, group_name, JOIN_HOOK)]
+                )
+            ))
+            on_demand = instances_distribution(capacity_type, num_workers, on_demand_base)
+            distribution = {
+                'OnDemandBaseCapacity': on_demand[0],
+                'OnDemandPercentageAboveBaseCapacity': on_demand[1],
+                'SpotAllocationStrategy': 'price-capacity-optimized',
+            }
+            if spot_max_price:
+                distribution['SpotMaxPrice'] = spot_max_price
+            launch_template = {'LaunchTemplateId': self.launch_template_id, 'Version': '$Latest'}
+            if warm_pool_size:
+                # Warm pools cannot be added to a group with a mixed instances policy
+                launch = {'LaunchTemplate': launch_template}
+            else:
+                launch = {
+                    'MixedInstancesPolicy': {
+                        'LaunchTemplate': {
+                            'LaunchTemplateSpecification': launch_template,
+                            'Overrides': [{'InstanceType': t} for t in [instance_type] + list(spot_instance_types or [])],
+                        },
+                        'InstancesDistribution': distribution,
+                    },
+                    # Spot workers at risk of reclamation are replaced before they are lost
+                    'CapacityRebalance': capacity_type != 'on-demand',
+                }
+            tags = {'Name': 'k8s-worker', 'minisc:cluster': cluster_name}
+            if autoscaler is not None:
+                tags.update(aws_group_tags(autoscaler.cluster_name))
+            try:
+                self.autoscaling.create_auto_scaling_group(
+                    AutoScalingGroupName=group_name,
+                    MinSize=autoscaler.min_size if autoscaler else 0,
+                    MaxSize=autoscaler.max_size if autoscaler else num_workers,
+                    DesiredCapacity=num_workers,
+                    VPCZoneIdentifier=','.join(_subnet_ids(subnet_id)),
+                    **launch,
+                    LifecycleHookSpecificationList=[
+                        {
+                            'LifecycleHookName': name,
+                            'LifecycleTransition': transition,
+                            'HeartbeatTimeout': LIFECYCLE_HEARTBEAT_TIMEOUT,
+                            'DefaultResult': 'CONTINUE',
+                        }
+                        for name, transition in ((JOIN_HOOK, 'autoscaling:EC2_INSTANCE_LAUNCHING'),
+                                                 (DRAIN_HOOK, 'autoscaling:EC2_INSTANCE_TERMINATING'))
+                    ],
+                    Tags=[{'Key': key, 'Value': value, 'PropagateAtLaunch': True} for key, value in tags.items()]
+                )
+            except ClientError as e:
+                # A retried create whose first response was lost
+                if e.response['Error']['Code'] != 'AlreadyExists':
+                    raise
+            if warm_pool_size:
+                self._put_warm_pool(group_name, warm_pool_size)
+            if self.checkpoint:
+                self.checkpoint.record('worker_group_name', group_name)
+            print(f"Auto Scaling group '{group_name}' created with {num_workers} workers.")
+            return self._settle_group(group_name, num_workers, cordon, warm_pool_size)
+        except NodeDeploymentError:
+            raise
+        except Exception as e:
+            print(f"Error deploying worker group: {str(e)}")
+            raise NodeDeploymentError('deploy_worker_group', str(e), self._completed()) from e
+
+    @timed_step('aws')
+    def scale_worker_group(self, cluster_name, num_workers, cordon=None, warm_pool_size=None):
+        """Set the desired capacity of the cluster's worker group and wait for it to settle.
+
+        Prepared workers in the group's warm pool are started first. With
+        ``warm_pool_size``, the pool is resized; otherwise it keeps its size.
+        """
+        group_name = f"{cluster_name}-workers"
+        try:
+            group = self._describe_group(group_name)
+            if group is None:
+                raise Exception(f"worker group '{group_name}' does not exist")
+            if warm_pool_size is None:
+                warm_pool_size = self._warm_pool_size(group_name)
+            else:
+                self._put_warm_pool(group_name, warm_pool_size)
+            self.autoscaling.update_auto_scaling_group(
+                AutoScalingGroupName=group_name,
+                MaxSize=max(group['MaxSize'], num_workers),
+                DesiredCapacity=num_workers
             )
-            ami_id = sorted(response['Images'], key=lambda x: x['CreationDate'], reverse=True)[0]['ImageId']
-
-            # Launch Worker Nodes
-            worker_response = self.ec2.run_instances(
-                ImageId=ami_id,
-                InstanceType=instance_type,
-                KeyName=key_name,
-                MinCount=num_workers,
-                MaxCount=num_workers,
-                SecurityGroupIds=[security_group_id],
-                SubnetId=subnet_id,
-                UserData=user_data,
-                TagSpecifications=[
+            print(f"Scaling worker group '{group_name}' from {group['DesiredCapacity']} to {num_workers} workers...")
+            return self._settle_group(group_name, num_workers, cordon, warm_pool_size)
+        except NodeDeploymentError:
+            raise
+        except Exception as e:
+            print(f"Error scaling worker group: {str(e)}")
+            raise NodeDeploymentError('scale_worker_group', str(e), self._completed()) from e
+
+    @timed_step('aws')
+    def find_interrupted_workers(self):
+        """Return the spot workers of this deployment that AWS has reclaimed or marked for reclamation"""
+        instance_ids = [instance['InstanceId'] for instance in self.worker_instances]
+        if not instance_ids:
+            # Without a filter on its workers, every reclaimed spot instance in the region would match
+            return []
+
+        requests = self.ec2.describe_spot_instance_requests(Filters=[
+            {'Name': 'status-code', 'Values': SPOT_INTERRUPTION_CODES},
+            {'Name': 'instance-id', 'Values': instance_ids},
+        ])['SpotInstanceRequests']
+        interrupted_ids = [request['InstanceId'] for request in requests if request.get('InstanceId')]
+        if not interrupted_ids:
+            return []
+
+        reservations = self.ec2.describe_instances(InstanceIds=interrupted_ids)['Reservations']
+        return [
+            {'id': instance['InstanceId'], 'node_name': instance.get('PrivateDnsName')}
+            for reservation in reservations
+            for instance in reservation['Instances']
+        ]
+
+    @timed_step('aws')
+    def replace_workers(self, count):
+        """Launch spot replacements for reclaimed workers using the last launch settings"""
+        if not self._last_launch or count <= 0:
+            return []
+
+        launch = self._last_launch
+        if not self.launch_template_id:
+            self.launch_template_id = self._create_launch_template(
+                self._get_latest_ami(), launch['instance_type'], launch['key_name'],
+                launch['security_group_id'], self._render_worker_user_data(launch['master_ip'], launch['join_token'])
+            )
+        replacements = self._launch_fleet(
+            _subnet_ids(launch['subnet_id']), [launch['instance_type']] + list(launch['spot_instance_types'] or []),
+            count, 0, launch['spot_max_price']
+        )
+        self.worker_instances.extend(replacements)
+        print(f"{len(replacements)} replacement worker nodes launched.")
+        return replacements
+
+    def _settle_group(self, group_name, num_workers, cordon=None, warm_pool_size=0):
+        """Complete the group's lifecycle actions until every member is in service and the warm pool is prepared"""
+        deadline = time.monotonic() + self.settle_timeout
+        completed, errors = set(), []
+        while True:
+            states = {instance['InstanceId']: instance['LifecycleState']
+                      for instance in self._describe_group(group_name)['Instances']}
+            warm = {}
+            if warm_pool_size:
+                warm = {instance['InstanceId']: instance['LifecycleState']
+                        for instance in self._describe_warm_pool(group_name)['Instances']}
+            # Warm workers leave the pool through the launch hook again, so actions are keyed by state too
+            joining = [i for i, state in states.items() if state == 'Pending:Wait' and (i, state) not in completed]
+            warming = [i for i, state in warm.items() if state == 'Warmed:Pending:Wait' and (i, state) not in completed]
+            draining = [i for i, state in states.items() if state == 'Terminating:Wait' and (i, state) not in completed]
+
+            # With a join store, a worker completes its launch action itself once kubeadm join has succeeded.
+            # Without one, workers are joined by hand later, so they are let into service once running.
+            # A warm worker is prepared once it has bootstrapped and stopped itself; removed workers are drained first
+            ready = []
+            if not self.join_store:
+                ready = [instance['InstanceId'] for instance in self._describe_workers(joining)
+                         if instance['State']['Name'] == 'running']
+            prepared = [instance['InstanceId'] for instance in self._describe_workers(warming)
+                        if instance['State']['Name'] == 'stopped']
+            if draining and cordon:
+                node_names = [instance.get('PrivateDnsName') for instance in self._describe_workers(draining)]
+                try:
+                    cordon([name for name in node_names if name])
+                except Exception as e:
+                    print(f"Error draining removed workers: {str(e)}")
+            for hook, instance_ids, pending in ((JOIN_HOOK, ready, states), (JOIN_HOOK, prepared, warm),
+                                                (DRAIN_HOOK, draining, states)):
+                for instance_id in instance_ids:
+                    self._complete_lifecycle_action(group_name, hook, instance_id)
+                    completed.add((instance_id, pending[instance_id]))
+
+            in_service = [i for i, state in states.items() if state == 'InService']
+            warmed = [i for i, state in warm.items() if state == 'Warmed:Stopped']
+            if len(in_service) == len(states) == num_workers and len(warmed) >= warm_pool_size:
+                print(f"Worker group '{group_name}' has {num_workers} workers in service"
+                      f"{f' and {len(warmed)} in its warm pool' if warm_pool_size else ''}.")
+                break
+            if time.monotonic() >= deadline:
+                errors.append(f"{len(in_service)} of {num_workers} workers in service after {self.settle_timeout:g}s")
+                if len(warmed) < warm_pool_size:
+                    errors.append(f"{len(warmed)} of {warm_pool_size} warm pool workers prepared")
+                print(f"Warning: worker group '{group_name}' has {'; '.join(errors)}.")
+                break
+            time.sleep(self.poll_interval)
+
+        if num_workers and not in_service:
+            raise Exception(f"no workers of group '{group_name}' came into service")
+        result = {
+            'requested': num_workers,
+            'launched': len(in_service),
+            'failed': max(0, num_workers - len(in_service)),
+            'errors': errors,
+        }
+        if warm_pool_size:
+            result['warm'] = len(warmed)
+        return result
+
+    def _complete_lifecycle_action(self, group_name, hook, instance_id):
+        try:
+            self.autoscaling.complete_lifecycle_action(
+                LifecycleHookName=hook,
+                AutoScalingGroupName=group_name,
+                LifecycleActionResult='CONTINUE',
+                InstanceId=instance_id
+            )
+        except ClientError as e:
+            # The action timed out, and the group went on without it
+            print(f"Could not complete {hook} for {instance_id}: {str(e)}")
+
+    def _put_warm_pool(self, group_name, size):
+        # With the prepared capacity no larger than its minimum, the pool holds
+        # exactly ``size`` workers whatever the group's desired capacity
+        self.autoscaling.put_warm_pool(
+            AutoScalingGroupName=group_name,
+            MinSize=size,
+            MaxGroupPreparedCapacity=size,
+            PoolState='Stopped'
+        )
+        print(f"Warm pool of {size} stopped workers set for '{group_name}'.")
+
+    def _describe_warm_pool(self, group_name):
+        return self.autoscaling.describe_warm_pool(AutoScalingGroupName=group_name)
+
+    def _warm_pool_size(self, group_name):
+        configuration = self._describe_warm_pool(group_name).get('WarmPoolConfiguration')
+        return configuration['MinSize'] if configuration else 0
+
+    def _describe_group(self, group_name):
+        groups = self.autoscaling.describe_auto_scaling_groups(AutoScalingGroupNames=[group_name])['AutoScalingGroups']
+        return groups[0] if groups else None
+
+    def _describe_workers(self, instance_ids):
+        if not instance_ids:
+            return []
+        reservations = self.ec2.describe_instances(InstanceIds=instance_ids)['Reservations']
+        return [instance for reservation in reservations for instance in reservation['Instances']]
+
+    def _get_latest_ami(self):
+        # Get latest Amazon Linux 2 AMI
+        response = self.ec2.describe_images(
+            Filters=[
+                {'Name': 'name', 'Values': ['amzn2-ami-hvm-*-x86_64-gp2']},
+                {'Name': 'state', 'Values': ['available']}
+            ],
+            Owners=['amazon']
+        )
+        return sorted(response['Images'], key=lambda x: x['CreationDate'], reverse=True)[0]['ImageId']
+
+    def _create_launch_template(self, ami_id, instance_type, key_name, security_group_id, user_data):
+        # With an idempotency key the name and token are stable, so a retry reuses the template
+        token_kwargs = self._client_token_kwargs('launch-template')
+        suffix = token_kwargs['ClientToken'][:12] if token_kwargs else uuid.uuid4().hex[:8]
+        response = self.ec2.create_launch_template(
+            LaunchTemplateName=f"k8s-worker-{suffix}",
+            **token_kwargs,
+            LaunchTemplateData={
+                'ImageId': ami_id,
+                'InstanceType': instance_type,
+                'KeyName': key_name,
+                'SecurityGroupIds': [security_group_id],
+                'UserData': base64.b64encode(user_data.encode()).decode(),
+                'TagSpecifications': [
                     {
                         'ResourceType': 'instance',
                         'Tags': [{'Key': 'Name', 'Value': 'k8s-worker'}]
                     }
-                ]
-            )
-            self.worker_instances = worker_response['Instances']
-            print(f"{num_workers} worker nodes launched.")
-        except Exception as e:
-            print(f"Error deploying Worker Nodes: {str(e)}")
-            sys.exit(1)
\ No newline at end of file
+                ],
+                **self._instance_profile_kwargs()
+            }
+        )
+        return response['LaunchTemplate']['LaunchTemplateId']
+
+    def _run_workers(self, ami_id, instance_type, key_name, security_group_id, subnet_id, user_data, count, step):
+        # MinCount=1 lets a chunk succeed partially instead of all-or-nothing
+        return self.ec2.run_instances(
+            ImageId=ami_id,
+            InstanceType=instance_type,
+            KeyName=key_name,
+            MinCount=1,
+            MaxCount=count,
+            SecurityGroupIds=[security_group_id],
+            SubnetId=subnet_id,
+            UserData=user_data,
+            TagSpecifications=[
+                {
+                    'ResourceType': 'instance',
+                    'Tags': [{'Key': 'Name', 'Value': 'k8s-worker'}]
+                }
+            ],
+            **self._instance_profile_kwargs(),
+            **self._client_token_kwargs(step)
+        )['Instances']
+
+    def _launch_fleet(self, subnet_ids, instance_types, total_count, on_demand_count, spot_max_price=None, client_token_step=None):
+        # Each instance type in each zone is a capacity pool the allocation strategy can choose from
+        overrides = []
+        for subnet_id in subnet_ids:
+            for instance_type in instance_types:
+                override = {'SubnetId': subnet_id, 'InstanceType': instance_type}
+                if spot_max_price:
+                    override['MaxPrice'] = spot_max_price
+                overrides.append(override)
+
+        response = self.ec2.create_fleet(
+            Type='instant',
+            LaunchTemplateConfigs=[
+                {
+                    'LaunchTemplateSpecification': {
+                        'LaunchTemplateId': self.launch_template_id,
+                        'Version': '$Latest'
+                    },
+                    'Overrides': overrides
+                }
+            ],
+            TargetCapacitySpecification={
+                'TotalTargetCapacity': total_count,
+                'OnDemandTargetCapacity': on_demand_count,
+                'SpotTargetCapacity': total_count - on_demand_count,
+                'DefaultTargetCapacityType': 'spot'
+            },
+            SpotOptions={'AllocationStrategy': 'price-capacity-optimized'},
+            OnDemandOptions={'AllocationStrategy': 'lowest-price'},
+            **(self._client_token_kwargs(client_token_step) if client_token_step else {})
+        )
+        for error in response.get('Errors', []):
+            print(f"Fleet launch error: {error.get('ErrorCode')}: {error.get('ErrorMessage')}")
+
+        return [
+            {'InstanceId': instance_id, 'Lifecycle': group.get('Lifecycle')}
+            for group in response.get('Instances', [])
+            for instance_id in group.get('InstanceIds', [])
+        ]
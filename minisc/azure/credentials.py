@@ -0,0 +1,81 @@
+import hashlib
+import os
+import threading
+import time
+
+from azure.identity import ClientSecretCredential, TokenCachePersistenceOptions
+
+# Tokens are refreshed this many seconds before they expire
+REFRESH_MARGIN_SECONDS = 300
+
+
+class SharedTokenCredential:
+    """Credential wrapper handing out one cached AAD token per scope until it nears expiry.
+
+    Concurrent callers needing a new token wait for a single acquisition
+    instead of each asking AAD, so a burst of deploys at expiry costs one
+    token request.
+    """
+
+    def __init__(self, credential, refresh_margin=REFRESH_MARGIN_SECONDS):
+        self._credential = credential
+        self._refresh_margin = refresh_margin
+        self._tokens = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    def get_token(self, *scopes, claims=None, tenant_id=None, **kwargs):
+        # Claims challenges (e.g. continuous access evaluation) always need a fresh token
+        if claims:
+            return self._credential.get_token(*scopes, claims=claims, tenant_id=tenant_id, **kwargs)
+        key = (scopes, tenant_id)
+        token = self._tokens.get(key)
+        if self._valid(token):
+            return token
+        with self._lock:
+            lock = self._locks.setdefault(key, threading.Lock())
+        with lock:
+            token = self._tokens.get(key)
+            if not self._valid(token):
+                token = self._credential.get_token(*scopes, tenant_id=tenant_id, **kwargs)
+                self._tokens[key] = token
+            return token
+
+    def _valid(self, token):
+        return token is not None and token.expires_on - self._refresh_margin > time.time()
+
+    def close(self):
+        self._credential.close()
+
+
+_credentials = {}
+_credentials_lock = threading.Lock()
+
+
+def persistence_options():
+    """Token cache persisted across processes when MINISC_AZURE_TOKEN_CACHE is set.
+
+    The cache is encrypted with the platform's secret store (DPAPI, Keychain or
+    libsecret); MINISC_AZURE_TOKEN_CACHE_ALLOW_UNENCRYPTED=1 falls back to a
+    plain file where no secret store is available.
+    """
+    name = os.environ.get("MINISC_AZURE_TOKEN_CACHE")
+    if not name:
+        return None
+    return TokenCachePersistenceOptions(
+        name=name,
+        allow_unencrypted_storage=os.environ.get("MINISC_AZURE_TOKEN_CACHE_ALLOW_UNENCRYPTED", "").lower() in ("1", "true", "yes"),
+    )
+
+
+def get_credential(tenant_id, client_id, client_secret):
+    """Return the credential shared by every deployer using this service principal"""
+    key = (tenant_id, client_id, hashlib.sha256((client_secret or "").encode()).hexdigest())
+    with _credentials_lock:
+        if key not in _credentials:
+            options = persistence_options()
+            kwargs = {"cache_persistence_options": options} if options else {}
+            _credentials[key] = SharedTokenCredential(
+                ClientSecretCredential(tenant_id, client_id, client_secret, **kwargs)
+            )
+        return _credentials[key]
@@ -1,18 +1,172 @@
 import base64
+import hashlib
+import os
 from string import Template
 from minisc.azure.kubernetes_deployer import KubernetesDeployer
+from minisc.common.batching import launch_in_chunks
+from minisc.common.checkpoints import run_step
+from minisc.common.cloud_init import with_manifests
+from minisc.common.exceptions import NetworkDeploymentError, NodeDeploymentError
+from minisc.common.ipam import DEFAULT_POD_NETWORK
+from minisc.common.join import API_SERVER_PORT, with_control_plane, with_join_publisher
+from minisc.common.metrics import timed_step
+from minisc.common.performance import with_performance_profile
 
 class HeadNodeDeployer(KubernetesDeployer):
-    def create_kubernetes_head_node(self, group_name, vm_name, location, vm_size, vnet_name, subnet_name, admin_username, admin_password):
-        # Ensure VNet and subnet exist
-        self._ensure_network_exists(group_name, location, vnet_name, subnet_name)
-        
-        # Get subnet ID
-        subnet = self.network_client.subnets.get(group_name, vnet_name, subnet_name)
+    @timed_step("azure")
+    def create_kubernetes_head_node(self, group_name, vm_name, location, vm_size, vnet_name, subnet_name, admin_username, admin_password,
+                                    manifests=None, zones=None, max_nodes=None, cidr=None, pod_network=None):
+        """Create the head node; with ``zones`` it is placed in the first of them"""
+        try:
+            # Ensure VNet and subnet exist
+            subnet = self._ensure_network_exists(group_name, location, vnet_name, subnet_name, max_nodes, cidr)
+            nic_id = self._create_nic(group_name, vm_name, location, subnet.id)
+        except Exception as e:
+            print(f"Error creating head node network: {str(e)}")
+            raise NetworkDeploymentError('create_head_node_network', str(e), self._completed()) from e
+
+        cloud_init_script = self._cloud_init(admin_username, manifests, pod_network)
+        vm_params = self._vm_params(vm_name, location, vm_size, nic_id, admin_username, admin_password,
+                                    cloud_init_script, zones[0] if zones else None)
+
+        try:
+            if self.checkpoint and self.checkpoint.get('head_vm_id'):
+                vm = self.compute_client.virtual_machines.get(group_name, vm_name)
+                print(f"Kubernetes head node '{vm_name}' already created.")
+            else:
+                creation = self.compute_client.virtual_machines.begin_create_or_update(
+                    group_name, vm_name, vm_params
+                )
+                vm = creation.result()
+                if self.checkpoint:
+                    self.checkpoint.record('head_vm_id', vm.id)
+                print(f"Kubernetes head node '{vm_name}' created. Installing Kubernetes components...")
+        except Exception as e:
+            print(f"Error creating head node VM: {str(e)}")
+            raise NodeDeploymentError('create_head_node_vm', str(e), self._completed()) from e
+
+        # Retrieve the public IP
+        public_ip_info = self.network_client.public_ip_addresses.get(group_name, f"{vm_name}-ip")
+        print(f"Kubernetes head node created with public IP: {public_ip_info.ip_address}")
+        print(f"SSH access: ssh {admin_username}@{public_ip_info.ip_address}")
+        print("Note: Wait a few minutes for Kubernetes installation to complete.")
         
-        # Create public IP
+        return vm, public_ip_info.ip_address
+
+    @timed_step("azure")
+    def create_control_plane(self, group_name, vm_name, location, vm_size, vnet_name, subnet_name, admin_username,
+                             admin_password, count=3, manifests=None, zones=None, max_nodes=None, cidr=None,
+                             pod_network=None):
+        """Create ``count`` control-plane VMs with stacked etcd behind a Standard load balancer.
+
+        The VMs ``<vm_name>-0`` ... are created at once, in turn in each of
+        ``zones``. The first runs kubeadm init and the others join it through
+        the load balancer, with the join command it publishes to the join
+        store. Returns the VMs and the load balancer's FQDN, the cluster's API
+        endpoint.
+        """
+        try:
+            subnet = self._ensure_network_exists(group_name, location, vnet_name, subnet_name, max_nodes, cidr)
+            endpoint, backend_pool_id = self._create_api_load_balancer(group_name, vm_name, location)
+        except Exception as e:
+            print(f"Error creating the control plane network: {str(e)}")
+            raise NetworkDeploymentError('create_control_plane_network', str(e), self._completed()) from e
+
+        def launch(index, _):
+            name = f"{vm_name}-{index}"
+            nic_id = self._create_nic(group_name, name, location, subnet.id, f":{index}", backend_pool_id)
+            cloud_init_script = self._cloud_init(admin_username, manifests, pod_network, endpoint, first=index == 0)
+            vm_params = self._vm_params(name, location, vm_size, nic_id, admin_username, admin_password,
+                                        cloud_init_script, zones[index % len(zones)] if zones else None)
+            vm_id = run_step(self.checkpoint, f'head_vm_id:{index}', lambda: self.compute_client.virtual_machines.begin_create_or_update(
+                group_name, name, vm_params
+            ).result().id)
+            print(f"Control-plane node '{name}' created.")
+            return [vm_id]
+
+        result = launch_in_chunks(launch, count, chunk_size=1, max_parallel=count, pace_seconds=0)
+        if result['failed']:
+            print(f"Error creating control-plane nodes: {result['errors']}")
+            raise NodeDeploymentError('create_control_plane_vms', str(result['errors']), self._completed())
+        print(f"Kubernetes control plane of {count} nodes created behind {endpoint}.")
+        print("Note: Wait a few minutes for Kubernetes installation to complete.")
+        return result['launched'], endpoint
+
+    @timed_step("azure")
+    def create_kubernetes_head_node_from_template(self, group_name, vm_name, location, vm_size, vnet_name, subnet_name,
+                                                  admin_username, admin_password, manifests=None):
+        """Create the network, public IP, NIC and head node VM with a single ARM template deployment"""
+        try:
+            outputs = self._deploy_template(group_name, f"{vm_name}-head", {
+                "location": location,
+                "vnetName": vnet_name,
+                "subnetName": subnet_name,
+                "adminUsername": admin_username,
+                "adminPassword": admin_password,
+                "deployHeadNode": True,
+                "headNodeName": vm_name,
+                "headNodeSize": vm_size,
+                "headNodeCloudInit": self._cloud_init(admin_username, manifests)
+            })
+        except Exception as e:
+            print(f"Error deploying head node template: {str(e)}")
+            raise NodeDeploymentError('deploy_head_node_template', str(e), self._completed()) from e
+
+        if self.checkpoint:
+            self.checkpoint.record('head_vm_id', outputs['headNodeId'])
+        print(f"Kubernetes head node created with public IP: {outputs['headNodeIp']}")
+        print(f"SSH access: ssh {admin_username}@{outputs['headNodeIp']}")
+        print("Note: Wait a few minutes for Kubernetes installation to complete.")
+
+        return outputs['headNodeId'], outputs['headNodeIp']
+
+    def _create_api_load_balancer(self, group_name, vm_name, location):
+        # Public IP with a DNS name, so the API endpoint in the cluster's certificates is stable
+        public_ip_name = f"{vm_name}-api-ip"
+        # DNS labels are unique per region, so the label is derived from the subscription and group
+        label = f"{vm_name}-{hashlib.sha256(f'{self.subscription_id}/{group_name}'.encode()).hexdigest()[:8]}"
+        run_step(self.checkpoint, 'api_public_ip_id', lambda: self.network_client.public_ip_addresses.begin_create_or_update(
+            group_name,
+            public_ip_name,
+            {
+                "location": location,
+                "sku": {"name": "Standard"},
+                "public_ip_allocation_method": "Static",
+                "dns_settings": {"domain_name_label": label.lower()}
+            }
+        ).result().id)
+        public_ip = self.network_client.public_ip_addresses.get(group_name, public_ip_name)
+
+        lb_name = f"{vm_name}-api-lb"
+        lb_id = (f"/subscriptions/{self.subscription_id}/resourceGroups/{group_name}"
+                 f"/providers/Microsoft.Network/loadBalancers/{lb_name}")
+        run_step(self.checkpoint, 'api_load_balancer_id', lambda: self.network_client.load_balancers.begin_create_or_update(
+            group_name,
+            lb_name,
+            {
+                "location": location,
+                "sku": {"name": "Standard"},
+                "frontend_ip_configurations": [{"name": "api", "public_ip_address": {"id": public_ip.id}}],
+                "backend_address_pools": [{"name": "control-plane"}],
+                "probes": [{
+                    "name": "api", "protocol": "Tcp", "port": API_SERVER_PORT,
+                    "interval_in_seconds": 5, "number_of_probes": 2
+                }],
+                "load_balancing_rules": [{
+                    "name": "api", "protocol": "Tcp", "frontend_port": API_SERVER_PORT, "backend_port": API_SERVER_PORT,
+                    "frontend_ip_configuration": {"id": f"{lb_id}/frontendIPConfigurations/api"},
+                    "backend_address_pool": {"id": f"{lb_id}/backendAddressPools/control-plane"},
+                    "probe": {"id": f"{lb_id}/probes/api"}
+                }]
+            }
+        ).result().id)
+        print(f"API load balancer '{lb_name}' created: {public_ip.dns_settings.fqdn}")
+        return public_ip.dns_settings.fqdn, f"{lb_id}/backendAddressPools/control-plane"
+
+    def _create_nic(self, group_name, vm_name, location, subnet_id, step_suffix="", backend_pool_id=None):
+        # Public IP and NIC of a head node; control-plane nodes are also in the API load balancer's pool
         public_ip_name = f"{vm_name}-ip"
-        public_ip = self.network_client.public_ip_addresses.begin_create_or_update(
+        public_ip_id = run_step(self.checkpoint, f'public_ip_id{step_suffix}', lambda: self.network_client.public_ip_addresses.begin_create_or_update(
             group_name,
             public_ip_name,
             {
@@ -20,37 +174,30 @@ class HeadNodeDeployer(KubernetesDeployer):
                 "sku": {"name": "Standard"},
                 "public_ip_allocation_method": "Static"
             }
-        ).result()
+        ).result().id)
         print(f"Public IP '{public_ip_name}' created.")
-        
-        # Create NIC
+
         nic_name = f"{vm_name}-nic"
-        nic = self.network_client.network_interfaces.begin_create_or_update(
+        ip_configuration = {
+            "name": "ipconfig",
+            "subnet": {"id": subnet_id},
+            "public_ip_address": {"id": public_ip_id}
+        }
+        if backend_pool_id:
+            ip_configuration["load_balancer_backend_address_pools"] = [{"id": backend_pool_id}]
+        nic_id = run_step(self.checkpoint, f'nic_id{step_suffix}', lambda: self.network_client.network_interfaces.begin_create_or_update(
             group_name,
             nic_name,
             {
                 "location": location,
-                "ip_configurations": [
-                    {
-                        "name": "ipconfig",
-                        "subnet": {"id": subnet.id},
-                        "public_ip_address": {"id": public_ip.id}
-                    }
-                ]
+                "ip_configurations": [ip_configuration]
             }
-        ).result()
+        ).result().id)
         print(f"Network interface '{nic_name}' created.")
+        return nic_id
 
-        # Load and render cloud-init template
-        with open("../templates/cloud_init_head_node.yaml", "r") as file:
-            template = Template(file.read())
-            cloud_init_script = template.substitute(
-                POD_NETWORK_CIDR="10.244.0.0/16",
-                ADMIN_USERNAME=admin_username,
-                FLANNEL_URL="https://github.com/flannel-io/flannel/releases/latest/download/kube-flannel.yml"
-            )
-
-        # Create VM
+    def _vm_params(self, vm_name, location, vm_size, nic_id, admin_username, admin_password, cloud_init_script,
+                   zone=None):
         vm_params = {
             'location': location,
             'hardware_profile': {
@@ -79,23 +226,33 @@ class HeadNodeDeployer(KubernetesDeployer):
             'network_profile': {
                 'network_interfaces': [
                     {
-                        'id': nic.id,
+                        'id': nic_id,
                         'primary': True
                     }
                 ]
             }
         }
-        
-        creation = self.compute_client.virtual_machines.begin_create_or_update(
-            group_name, vm_name, vm_params
-        )
-        vm = creation.result()
-        print(f"Kubernetes head node '{vm_name}' created. Installing Kubernetes components...")
+        if zone:
+            vm_params['zones'] = [zone]
+        if self.join_store:
+            vm_params['identity'] = self._identity()
+        return vm_params
 
-        # Retrieve the public IP
-        public_ip_info = self.network_client.public_ip_addresses.get(group_name, public_ip_name)
-        print(f"Kubernetes head node created with public IP: {public_ip_info.ip_address}")
-        print(f"SSH access: ssh {admin_username}@{public_ip_info.ip_address}")
-        print("Note: Wait a few minutes for Kubernetes installation to complete.")
-        
-        return vm, public_ip_info.ip_address
\ No newline at end of file
+    def _cloud_init(self, admin_username, manifests=None, pod_network=None, endpoint=None, first=True):
+        # Load and render cloud-init template; with an ``endpoint`` the head node is one of several control-plane nodes
+        pod_network = pod_network or DEFAULT_POD_NETWORK
+        template_path = os.path.join(os.path.dirname(__file__), "../templates/cloud-init_head_node.yaml")
+        with open(template_path, "r") as file:
+            template = Template(file.read())
+            cloud_init = with_manifests(template.substitute(
+                POD_NETWORK_CIDR=pod_network.cidr,
+                NODE_CIDR_MASK_SIZE=pod_network.node_mask,
+                MAX_PODS=pod_network.max_pods,
+                ADMIN_USERNAME=admin_username,
+                NETWORK_PLUGIN_URL="https://github.com/flannel-io/flannel/releases/latest/download/kube-flannel.yml"
+            ), manifests)
+        if self.performance_profile:
+            cloud_init = with_performance_profile(cloud_init, self.performance_profile)
+        if endpoint:
+            return with_control_plane(cloud_init, self.join_store, endpoint, first)
+        return with_join_publisher(cloud_init, self.join_store) if self.join_store else cloud_init
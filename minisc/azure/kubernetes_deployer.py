@@ -1,35 +1,103 @@
-from azure.identity import ClientSecretCredential
+import json
+import os
+from azure.core.exceptions import ResourceNotFoundError
 from azure.mgmt.compute import ComputeManagementClient
 from azure.mgmt.resource import ResourceManagementClient
 from azure.mgmt.network import NetworkManagementClient
 from azure.mgmt.resource.resources.models import ResourceGroup
+from minisc.azure.credentials import get_credential
+from minisc.azure.network_cache import network_cache
+from minisc.common.throttling import azure_client_kwargs
+from minisc.common.metrics import timed_step
+from minisc.common.network_plan import plan_subnets
+
+# ARM template creating the cluster network, head node and worker scale sets
+CLUSTER_TEMPLATE_PATH = os.path.join(os.path.dirname(__file__), "../templates/arm/cluster.json")
+
+VNET_CIDR = "10.0.0.0/16"
+
+def load_cluster_template():
+    with open(CLUSTER_TEMPLATE_PATH, "r") as file:
+        return json.load(file)
 
 class KubernetesDeployer:
-    def __init__(self, tenant_id, client_id, client_secret, subscription_id):
-        self.credential = ClientSecretCredential(tenant_id, client_id, client_secret)
+    def __init__(self, tenant_id, client_id, client_secret, subscription_id, clients=None):
+        # One credential and token cache per service principal, shared by every deployer
+        self.credential = get_credential(tenant_id, client_id, client_secret)
         self.subscription_id = subscription_id
-        self.resource_client = ResourceManagementClient(self.credential, subscription_id)
-        self.compute_client = ComputeManagementClient(self.credential, subscription_id)
-        self.network_client = NetworkManagementClient(self.credential, subscription_id)
+        if clients is not None:
+            # (resource, compute, network) clients replacing the SDK's, e.g. the offline simulator's
+            self.resource_client, self.compute_client, self.network_client = clients
+        else:
+            # Clients share the subscription's rate limiter and retry throttled (429) calls
+            self.resource_client = ResourceManagementClient(self.credential, subscription_id, **azure_client_kwargs(subscription_id))
+            self.compute_client = ComputeManagementClient(self.credential, subscription_id, **azure_client_kwargs(subscription_id))
+            self.network_client = NetworkManagementClient(self.credential, subscription_id, **azure_client_kwargs(subscription_id))
+        self.checkpoint = None
+        self.idempotency_key = None
+        self.join_store = None
+        self.performance_profile = None
+
+    def use_checkpoint(self, checkpoint):
+        """Record completed steps in ``checkpoint`` and skip them when a deployment is resumed"""
+        self.checkpoint = checkpoint
+
+    def use_idempotency_key(self, key):
+        # Resource names are derived from the request, so a retried PUT updates rather than duplicates
+        self.idempotency_key = key
+
+    def use_join_store(self, store):
+        """Have the head node publish its join command to ``store`` and workers join with it at boot"""
+        self.join_store = store
+
+    def use_performance_profile(self, profile):
+        """Render ``profile``'s control-plane and kubelet limits into the nodes' cloud-init"""
+        self.performance_profile = profile
 
+    def _identity(self):
+        # Nodes read or write the join command as the join store's managed identity
+        if not self.join_store:
+            return None
+        return {"type": "UserAssigned", "user_assigned_identities": {self.join_store.identity_id: {}}}
+
+    def _completed(self):
+        return self.checkpoint.completed() if self.checkpoint else {}
+
+    @timed_step("azure")
     def create_resource_group(self, group_name, location):
         resource_group_params = ResourceGroup(location=location)
         self.resource_client.resource_groups.create_or_update(group_name, resource_group_params)
         print(f"Resource group '{group_name}' created or updated.")
 
-    def _ensure_network_exists(self, group_name, location, vnet_name, subnet_name):
+    @timed_step("azure", "ensure_network_exists")
+    def _ensure_network_exists(self, group_name, location, vnet_name, subnet_name, max_nodes=None, cidr=None):
+        """Return the subnet, creating the VNet and subnet if they do not exist.
+
+        ``cidr`` replaces the VNet's default 10.0.0.0/16. A new subnet is a
+        /24, or laid out by ``plan_subnets`` for ``max_nodes`` or ``cidr``;
+        Azure subnets span every zone of the region, so one is enough.
+        Resolved subnets are cached across deployers, so repeated deploys into
+        the same network skip the VNet and subnet lookups.
+        """
+        key = network_cache.key(self.subscription_id, group_name, vnet_name, subnet_name)
+        subnet = network_cache.get(key, lambda etag: self.network_client.subnets.get(
+            group_name, vnet_name, subnet_name, headers={"If-None-Match": etag} if etag else {}
+        ))
+        if subnet is not None:
+            return subnet
+
         # Check if VNet exists, create if not
         try:
-            vnet = self.network_client.virtual_networks.get(group_name, vnet_name)
+            self.network_client.virtual_networks.get(group_name, vnet_name)
             print(f"Using existing virtual network '{vnet_name}'.")
-        except:
-            vnet = self.network_client.virtual_networks.begin_create_or_update(
+        except ResourceNotFoundError:
+            self.network_client.virtual_networks.begin_create_or_update(
                 group_name,
                 vnet_name,
                 {
                     "location": location,
                     "address_space": {
-                        "address_prefixes": ["10.0.0.0/16"]
+                        "address_prefixes": [cidr or VNET_CIDR]
                     }
                 }
             ).result()
@@ -39,11 +107,35 @@ class KubernetesDeployer:
         try:
             subnet = self.network_client.subnets.get(group_name, vnet_name, subnet_name)
             print(f"Using existing subnet '{subnet_name}'.")
-        except:
+        except ResourceNotFoundError:
             subnet = self.network_client.subnets.begin_create_or_update(
                 group_name,
                 vnet_name,
                 subnet_name,
-                {"address_prefix": "10.0.0.0/24"}
+                {"address_prefix": plan_subnets(cidr or VNET_CIDR, max_nodes=max_nodes)[0].cidr
+                 if max_nodes or cidr else "10.0.0.0/24"}
             ).result()
-            print(f"Created subnet '{subnet_name}'.")
\ No newline at end of file
+            print(f"Created subnet '{subnet_name}'.")
+        return network_cache.put(key, subnet)
+
+    @timed_step("azure", "deploy_template")
+    def _deploy_template(self, group_name, deployment_name, parameters):
+        """Submit the cluster ARM template as one deployment and return its output values.
+
+        ARM creates the template's resources itself, in parallel where their
+        dependencies allow, so the client waits on a single long-running
+        operation. Resubmitting the same deployment updates it in place.
+        """
+        deployment = self.resource_client.deployments.begin_create_or_update(
+            group_name,
+            deployment_name,
+            {
+                "properties": {
+                    "mode": "Incremental",
+                    "template": load_cluster_template(),
+                    "parameters": {name: {"value": value} for name, value in parameters.items()}
+                }
+            }
+        ).result()
+        outputs = deployment.properties.outputs or {}
+        return {name: output["value"] for name, output in outputs.items()}
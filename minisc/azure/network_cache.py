@@ -0,0 +1,61 @@
+import os
+import threading
+import time
+
+from azure.core.exceptions import ResourceNotFoundError, ResourceNotModifiedError
+
+
+class NetworkCache:
+    """Resolved subnets keyed by (subscription, resource group, VNet, subnet).
+
+    An entry is trusted for ``ttl`` seconds. After that, one conditional GET
+    (If-None-Match with the subnet's ETag) revalidates it. A 304 keeps the
+    cached subnet, a 200 replaces it, and a 404 drops it so the network is
+    created again.
+    """
+
+    def __init__(self, ttl=None):
+        self.ttl = float(os.environ.get("MINISC_AZURE_NETWORK_CACHE_TTL", 30)) if ttl is None else ttl
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(subscription_id, group_name, vnet_name, subnet_name):
+        # ARM names are case-insensitive
+        return subscription_id, group_name.lower(), vnet_name.lower(), subnet_name.lower()
+
+    def get(self, key, revalidate):
+        """Return the cached subnet, or None on a miss; ``revalidate(etag)`` re-reads a stale entry"""
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is None:
+            return None
+        subnet, validated_at = entry
+        if time.monotonic() - validated_at < self.ttl:
+            return subnet
+        try:
+            subnet = revalidate(getattr(subnet, "etag", None))
+        except ResourceNotModifiedError:
+            pass
+        except ResourceNotFoundError:
+            self.invalidate(key)
+            return None
+        self.put(key, subnet)
+        return subnet
+
+    def put(self, key, subnet):
+        with self._lock:
+            self._entries[key] = (subnet, time.monotonic())
+        return subnet
+
+    def invalidate(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+# Shared by every deployer in the process; deployers are created per request
+network_cache = NetworkCache()
@@ -1,41 +1,215 @@
 import base64
 import os
+import time
 from string import Template
 from azure.mgmt.compute.models import (
     VirtualMachineScaleSet,
-    VirtualMachineScaleSetSku,
     VirtualMachineScaleSetVMProfile,
     VirtualMachineScaleSetOSProfile,
     VirtualMachineScaleSetNetworkProfile,
-    NetworkInterfaceConfiguration,
-    IPConfiguration
+    VirtualMachineScaleSetNetworkConfiguration,
+    VirtualMachineScaleSetIPConfiguration,
+    VirtualMachineScaleSetUpdate,
+    VirtualMachineScaleSetVMInstanceIDs,
+    VirtualMachineScaleSetVMInstanceRequiredIDs,
+    BillingProfile,
+    Sku
 )
 from minisc.azure.kubernetes_deployer import KubernetesDeployer
+from minisc.common.batching import launch_in_chunks
+from minisc.common.cloud_init import AZURE_PROVIDER_ID, POWER_OFF, with_commands
+from minisc.common.cluster_autoscaler import azure_scale_set_tags
+from minisc.common.exceptions import NodeDeploymentError
+from minisc.common.join import START_JOIN, with_join
+from minisc.common.metrics import timed_step
+from minisc.common.performance import with_node_profile
+
+# Tag recording the warm pool size of a scale set, which later scale-outs keep
+WARM_POOL_TAG = "minisc-warm-pool"
+
+# Power states of workers that are, or are becoming, available to the cluster
+ACTIVE_POWER_STATES = ("starting", "running")
+
+
+def _is_chunk(name, vmss_name):
+    # Large pools are created as several scale sets named "<vmss_name>-<n>"
+    return name.startswith(f"{vmss_name}-") and name[len(vmss_name) + 1:].isdigit()
+
 
 class WorkerNodesDeployer(KubernetesDeployer):
+    def __init__(self, tenant_id, client_id, client_secret, subscription_id, clients=None, poll_interval=5.0,
+                 settle_timeout=600):
+        super().__init__(tenant_id, client_id, client_secret, subscription_id, clients)
+        # (group_name, vmss_name) -> {"capacity": int, "vm_size": str, "computer_names": set}
+        self._scale_sets = {}
+        # How often, and for how long, new warm pool instances are polled until they have bootstrapped
+        self.poll_interval = poll_interval
+        self.settle_timeout = settle_timeout
+
+    def create_worker_nodes(self, group_name, vmss_name, location, vm_size, instance_count,
+                            vnet_name, subnet_name, join_token, admin_username, admin_password,
+                            master_ip=None, capacity_type="on-demand", on_demand_base=0, spot_max_price=None,
+                            batch_size=100, max_parallel_launches=4, autoscaler=None, zones=None, max_nodes=None,
+                            cidr=None, warm_pool_size=0):
+        """Deploy a worker pool, splitting a mixed pool into a regular and a Spot scale set.
+
+        With ``autoscaler`` bounds, each scale set is tagged for the cluster-autoscaler.
+        With ``zones``, each scale set spreads its instances evenly across them.
+        With ``warm_pool_size``, the regular scale set keeps that many extra
+        instances bootstrapped and deallocated, for ``scale_worker_pool`` to start.
+        """
+        pools = self._capacity_pools(vmss_name, instance_count, capacity_type, on_demand_base)
+        tags = self._autoscaler_tags(pools, autoscaler)
+        if autoscaler is not None or warm_pool_size:
+            # The autoscaler sizes each tagged scale set as a whole, and the warm pool is
+            # kept within one scale set, so the pool is not chunked
+            batch_size = max(batch_size, instance_count + warm_pool_size)
+        return [
+            self.create_kubernetes_worker_nodes(
+                group_name, pool_name, location, vm_size, count,
+                vnet_name, subnet_name, admin_username, admin_password,
+                master_ip, join_token, spot=spot, spot_max_price=spot_max_price,
+                batch_size=batch_size, max_parallel_launches=max_parallel_launches, tags=tags.get(pool_name),
+                zones=zones, max_nodes=max_nodes, cidr=cidr, warm_pool_size=0 if spot else warm_pool_size
+            )
+            for pool_name, count, spot in pools if count
+        ]
+
+    @timed_step("azure")
     def create_kubernetes_worker_nodes(self, group_name, vmss_name, location, vm_size, instance_count,
                                        vnet_name, subnet_name, admin_username, admin_password,
-                                       master_ip, join_token=None):
+                                       master_ip, join_token=None, spot=False, spot_max_price=None,
+                                       batch_size=100, max_parallel_launches=4, tags=None, zones=None, max_nodes=None, cidr=None,
+                                       warm_pool_size=0):
         # Ensure VNet and subnet exist
-        self._ensure_network_exists(group_name, location, vnet_name, subnet_name)
+        subnet_id = self._ensure_network_exists(group_name, location, vnet_name, subnet_name, max_nodes, cidr).id
 
-        # Get subnet ID
-        subnet = self.network_client.subnets.get(group_name, vnet_name, subnet_name)
-        subnet_id = subnet.id
+        # Instances of a warm pool scale set stop once bootstrapped, and are then started or deallocated
+        cloud_init_script = self._cloud_init(master_ip, join_token, admin_username, power_off=bool(warm_pool_size))
+        if warm_pool_size:
+            tags = {**(tags or {}), WARM_POOL_TAG: str(warm_pool_size)}
 
-        # Load and render cloud-init template
-        template_path = os.path.join(os.path.dirname(__file__), "../templates/cloud_init_worker_node.yaml")
-        with open(template_path, "r") as file:
-            template = Template(file.read())
-            cloud_init_script = template.substitute(
-                MASTER_IP=master_ip,
-                JOIN_TOKEN=join_token or "",
-                ADMIN_USERNAME=admin_username
-            )
+        # Large pools are split into several scale sets ("<vmss_name>-<n>") created concurrently,
+        # since scale-outs of a single scale set are serialized by ARM
+        chunked = instance_count > batch_size
+
+        def launch(index, count):
+            name = f"{vmss_name}-{index}" if chunked else vmss_name
+            if self.checkpoint and self.checkpoint.get(f"vmss:{name}"):
+                # Resuming: this scale set was created by a previous attempt
+                self._scale_sets[(group_name, name)] = {
+                    "capacity": count,
+                    "vm_size": vm_size,
+                    "computer_names": self._list_computer_names(group_name, name)
+                }
+            else:
+                vmss = self._create_scale_set(
+                    group_name, name, location, vm_size, count + warm_pool_size, subnet_id, cloud_init_script,
+                    admin_username, admin_password, spot, spot_max_price, tags, zones
+                )
+                if warm_pool_size:
+                    self._prepare_instances(group_name, name, list(self._power_states(group_name, name)), count)
+                if self.checkpoint:
+                    self.checkpoint.record(f"vmss:{name}", vmss.id)
+            if warm_pool_size:
+                # Deallocated warm pool instances are not workers of the cluster
+                return [i for i, state in self._power_states(group_name, name).items() if state in ACTIVE_POWER_STATES]
+            return sorted(self._scale_sets[(group_name, name)]["computer_names"])
+
+        result = launch_in_chunks(launch, instance_count, chunk_size=batch_size, max_parallel=max_parallel_launches)
+        if not result['launched']:
+            print(f"Error deploying worker nodes for VMSS '{vmss_name}': {result['errors']}")
+            raise NodeDeploymentError('create_kubernetes_worker_nodes', str(result['errors']), self._completed())
+        if result['failed']:
+            print(f"Warning: {result['failed']} of {instance_count} worker nodes for '{vmss_name}' failed to launch.")
+
+        if not self.join_store:
+            print("Note: For the nodes to join the cluster, you'll need to get the join token from the master node")
+            print("      and manually join each worker or update the VMSS instances.")
+
+        return {
+            'vmss_name': vmss_name,
+            'requested': result['requested'],
+            'launched': len(result['launched']),
+            'failed': result['failed'],
+            'errors': result['errors'],
+        }
+
+    @timed_step("azure")
+    def create_worker_nodes_from_template(self, group_name, vmss_name, location, vm_size, instance_count,
+                                          vnet_name, subnet_name, join_token, admin_username, admin_password,
+                                          master_ip=None, capacity_type="on-demand", on_demand_base=0,
+                                          spot_max_price=None, autoscaler=None):
+        """Create a worker pool's regular and Spot scale sets with a single ARM template deployment"""
+        pools = self._capacity_pools(vmss_name, instance_count, capacity_type, on_demand_base)
+        tags = self._autoscaler_tags(pools, autoscaler)
+        regular = [(name, count) for name, count, spot in pools if not spot]
+        spot = [(name, count) for name, count, spot in pools if spot]
+        parameters = {
+            "location": location,
+            "vnetName": vnet_name,
+            "subnetName": subnet_name,
+            "adminUsername": admin_username,
+            "adminPassword": admin_password,
+            "workerNodeSize": vm_size,
+            "workerCloudInit": self._cloud_init(master_ip, join_token, admin_username)
+        }
+        if regular:
+            parameters.update({"workerScaleSetName": regular[0][0], "workerCount": regular[0][1]})
+            if regular[0][0] in tags:
+                parameters["workerTags"] = tags[regular[0][0]]
+        if spot:
+            parameters.update({
+                "spotScaleSetName": spot[0][0],
+                "spotWorkerCount": spot[0][1],
+                "spotMaxPrice": str(spot_max_price or -1)
+            })
+            if spot[0][0] in tags:
+                parameters["spotWorkerTags"] = tags[spot[0][0]]
+
+        try:
+            self._deploy_template(group_name, vmss_name, parameters)
+        except Exception as e:
+            print(f"Error deploying worker nodes template for '{vmss_name}': {str(e)}")
+            raise NodeDeploymentError('deploy_worker_nodes_template', str(e), self._completed()) from e
+
+        results = []
+        for name, count, spot in pools:
+            if not count:
+                continue
+            self._scale_sets[(group_name, name)] = {
+                "capacity": count,
+                "vm_size": vm_size,
+                "computer_names": self._list_computer_names(group_name, name)
+            }
+            print(f"Kubernetes worker nodes VMSS '{name}' with {count} {'Spot ' if spot else ''}instances created.")
+            results.append({'vmss_name': name, 'requested': count, 'launched': count, 'failed': 0, 'errors': []})
+        return results
+
+    @timed_step("azure", "create_scale_set")
+    def _create_scale_set(self, group_name, vmss_name, location, vm_size, instance_count, subnet_id,
+                          cloud_init_script, admin_username, admin_password, spot=False, spot_max_price=None,
+                          tags=None, zones=None):
+        # Spot instances are deleted on eviction; max_price -1 caps them at the pay-as-you-go price
+        spot_settings = {}
+        if spot:
+            spot_settings = {
+                "priority": "Spot",
+                "eviction_policy": "Delete",
+                "billing_profile": BillingProfile(max_price=float(spot_max_price) if spot_max_price else -1)
+            }
+
+        zone_settings = {}
+        if zones:
+            # Zone balancing keeps the instance counts of the zones within one of each other
+            zone_settings = {"zones": zones, "zone_balance": True, "platform_fault_domain_count": 1}
 
         vmss_params = VirtualMachineScaleSet(
             location=location,
-            sku=VirtualMachineScaleSetSku(name=vm_size, tier='Standard', capacity=instance_count),
+            tags=tags,
+            identity=self._identity(),
+            **zone_settings,
+            sku=Sku(name=vm_size, tier='Standard', capacity=instance_count),
             upgrade_policy={"mode": "Manual"},
             virtual_machine_profile=VirtualMachineScaleSetVMProfile(
                 os_profile=VirtualMachineScaleSetOSProfile(
@@ -61,18 +235,19 @@ class WorkerNodesDeployer(KubernetesDeployer):
                 },
                 network_profile=VirtualMachineScaleSetNetworkProfile(
                     network_interface_configurations=[
-                        NetworkInterfaceConfiguration(
+                        VirtualMachineScaleSetNetworkConfiguration(
                             name='nic',
                             primary=True,
                             ip_configurations=[
-                                IPConfiguration(
+                                VirtualMachineScaleSetIPConfiguration(
                                     name='ipconfig',
                                     subnet={"id": subnet_id}
                                 )
                             ]
                         )
                     ]
-                )
+                ),
+                **spot_settings
             )
         )
 
@@ -80,8 +255,240 @@ class WorkerNodesDeployer(KubernetesDeployer):
             group_name, vmss_name, vmss_params
         )
         vmss = creation.result()
-        print(f"Kubernetes worker nodes VMSS '{vmss_name}' with {instance_count} instances created.")
-        print("Note: For the nodes to join the cluster, you'll need to get the join token from the master node")
-        print("      and manually join each worker or update the VMSS instances.")
+        self._scale_sets[(group_name, vmss_name)] = {
+            "capacity": instance_count,
+            "vm_size": vm_size,
+            "computer_names": self._list_computer_names(group_name, vmss_name)
+        }
+        print(f"Kubernetes worker nodes VMSS '{vmss_name}' with {instance_count} {'Spot ' if spot else ''}instances created.")
+
+        return vmss
+
+    @timed_step("azure")
+    def scale_worker_pool(self, group_name, vmss_name, instance_count, warm_pool_size=None):
+        """Resize a worker scale set, starting deallocated warm instances before adding new ones.
+
+        New instances of a warm pool scale set bootstrap and stop; those still
+        needed are started and the rest refill the pool to ``warm_pool_size``,
+        by default the size the scale set was created with. Workers beyond
+        ``instance_count`` are deleted, newest first.
+        """
+        scale_sets = self.compute_client.virtual_machine_scale_sets
+        chunks = sorted(
+            (scale_set.name for scale_set in scale_sets.list(group_name) if _is_chunk(scale_set.name, vmss_name)),
+            key=lambda name: int(name.rsplit("-", 1)[1])
+        )
+        if chunks:
+            if warm_pool_size:
+                raise NodeDeploymentError('scale_worker_pool', f"worker pool '{vmss_name}' has no warm pool", self._completed())
+            return self._scale_chunks(group_name, vmss_name, chunks, instance_count)
+
+        scale_set = scale_sets.get(group_name, vmss_name)
+        tags = dict(scale_set.tags or {})
+        if WARM_POOL_TAG not in tags:
+            if warm_pool_size:
+                raise NodeDeploymentError('scale_worker_pool', f"scale set '{vmss_name}' has no warm pool", self._completed())
+            scale_sets.begin_update(group_name, vmss_name, VirtualMachineScaleSetUpdate(
+                sku=Sku(name=scale_set.sku.name, tier='Standard', capacity=instance_count)
+            )).result()
+            print(f"Scale set '{vmss_name}' scaled to {instance_count} instances.")
+            return {'requested': instance_count, 'launched': instance_count, 'failed': 0, 'errors': []}
+        if warm_pool_size is None:
+            warm_pool_size = int(tags[WARM_POOL_TAG])
+        tags[WARM_POOL_TAG] = str(warm_pool_size)
+
+        states = self._power_states(group_name, vmss_name)
+        active = [i for i, state in states.items() if state in ACTIVE_POWER_STATES]
+        warm = [i for i, state in states.items() if state not in ACTIVE_POWER_STATES]
+        removed = active[instance_count:]
+        started = warm[:max(0, instance_count - len(active))]
+        warm = warm[len(started):]
+        removed += warm[warm_pool_size:]
+        new = max(0, instance_count - len(active) - len(started)) + max(0, warm_pool_size - len(warm))
+
+        # Warm instances are started first, so they join while the pool is refilled
+        operations = []
+        if started:
+            operations.append(scale_sets.begin_start(
+                group_name, vmss_name, vm_instance_i_ds=VirtualMachineScaleSetVMInstanceIDs(instance_ids=started)
+            ))
+        if removed:
+            operations.append(scale_sets.begin_delete_instances(
+                group_name, vmss_name, vm_instance_i_ds=VirtualMachineScaleSetVMInstanceRequiredIDs(instance_ids=removed)
+            ))
+        for operation in operations:
+            operation.result()
+        print(f"Started {len(started)} warm instances and removed {len(removed)} from scale set '{vmss_name}'.")
+
+        launched, refilled = [], []
+        if new or tags != scale_set.tags:
+            scale_sets.begin_update(group_name, vmss_name, VirtualMachineScaleSetUpdate(
+                sku=Sku(name=scale_set.sku.name, tier='Standard', capacity=len(states) - len(removed) + new), tags=tags
+            )).result()
+        if new:
+            new_ids = [i for i in self._power_states(group_name, vmss_name) if i not in states]
+            launched, refilled = self._prepare_instances(
+                group_name, vmss_name, new_ids, instance_count - min(instance_count, len(active)) - len(started)
+            )
+        running = min(instance_count, len(active)) + len(started) + len(launched)
+        return {
+            'requested': instance_count,
+            'launched': running,
+            'failed': max(0, instance_count - running),
+            'errors': [],
+            'started': len(started),
+            'warm': len(warm[:warm_pool_size]) + len(refilled),
+        }
+
+    def _scale_chunks(self, group_name, vmss_name, chunks, instance_count):
+        # A chunked pool's capacity is spread evenly over its scale sets, which are resized concurrently
+        scale_sets = self.compute_client.virtual_machine_scale_sets
+        counts = [instance_count // len(chunks) + (index < instance_count % len(chunks)) for index in range(len(chunks))]
+        operations = [
+            scale_sets.begin_update(group_name, name, VirtualMachineScaleSetUpdate(
+                sku=Sku(name=scale_sets.get(group_name, name).sku.name, tier='Standard', capacity=count)
+            ))
+            for name, count in zip(chunks, counts)
+        ]
+        errors = []
+        for name, operation in zip(chunks, operations):
+            try:
+                operation.result()
+            except Exception as e:
+                errors.append({'vmss_name': name, 'error': str(e)})
+        launched = sum(len(self._list_computer_names(group_name, name)) for name in chunks)
+        print(f"Worker pool '{vmss_name}' scaled to {launched} instances over {len(chunks)} scale sets.")
+        return {
+            'requested': instance_count,
+            'launched': min(launched, instance_count),
+            'failed': max(0, instance_count - launched),
+            'errors': errors,
+        }
+
+    @timed_step("azure")
+    def find_evicted_workers(self, group_name, vmss_name):
+        """Return workers that disappeared from a Spot pool's scale sets since the last check"""
+        evicted = []
+        for name in self._pool_scale_sets(group_name, vmss_name):
+            scale_set = self._scale_sets[(group_name, name)]
+            current = self._list_computer_names(group_name, name)
+            evicted.extend(sorted(scale_set["computer_names"] - current))
+            scale_set["computer_names"] = current
+        return [{"id": name, "node_name": name.lower()} for name in evicted]
+
+    @timed_step("azure")
+    def replace_workers(self, group_name, vmss_name, count):
+        """Scale a Spot pool's scale sets back up to their requested capacity"""
+        if count <= 0:
+            return []
+
+        scale_sets = []
+        for name in self._pool_scale_sets(group_name, vmss_name):
+            scale_set = self._scale_sets[(group_name, name)]
+            scale_sets.append(self.compute_client.virtual_machine_scale_sets.begin_update(
+                group_name,
+                name,
+                VirtualMachineScaleSetUpdate(
+                    sku=Sku(name=scale_set["vm_size"], tier='Standard', capacity=scale_set["capacity"])
+                )
+            ).result())
+        print(f"Requested {count} replacement instances for worker pool '{vmss_name}'.")
+        return scale_sets
+
+    def _pool_scale_sets(self, group_name, vmss_name):
+        # A pool is either a single scale set or chunks named "<vmss_name>-<n>"
+        return [
+            name for group, name in self._scale_sets
+            if group == group_name and (name == vmss_name or _is_chunk(name, vmss_name))
+        ]
+
+    def _capacity_pools(self, vmss_name, instance_count, capacity_type, on_demand_base):
+        # (scale set name, instance count, spot) for each scale set of the pool
+        if capacity_type == "mixed":
+            regular_count = min(on_demand_base, instance_count)
+            return [(vmss_name, regular_count, False), (f"{vmss_name}-spot", instance_count - regular_count, True)]
+        return [(vmss_name, instance_count, capacity_type == "spot")]
+
+    def _autoscaler_tags(self, pools, autoscaler):
+        # The regular scale set of a mixed pool keeps its on-demand base; the autoscaler sizes the Spot one
+        if autoscaler is None:
+            return {}
+        if len(pools) == 1:
+            return {pools[0][0]: azure_scale_set_tags(autoscaler.cluster_name, autoscaler.min_size, autoscaler.max_size)}
+        (regular_name, base, _), (spot_name, _, _) = pools
+        return {
+            regular_name: azure_scale_set_tags(autoscaler.cluster_name, base, base),
+            spot_name: azure_scale_set_tags(
+                autoscaler.cluster_name, max(0, autoscaler.min_size - base), max(0, autoscaler.max_size - base)
+            ),
+        }
+
+    def _cloud_init(self, master_ip, join_token, admin_username, power_off=False):
+        # Load and render cloud-init template
+        template_path = os.path.join(os.path.dirname(__file__), "../templates/cloud-init_worker_node.yaml")
+        with open(template_path, "r") as file:
+            template = Template(file.read())
+            cloud_init = template.substitute(
+                MASTER_IP=master_ip or "",
+                JOIN_TOKEN=join_token or "",
+                ADMIN_USERNAME=admin_username
+            )
+        if self.performance_profile:
+            cloud_init = with_node_profile(cloud_init, self.performance_profile)
+        cloud_init = with_commands(cloud_init, [AZURE_PROVIDER_ID], after="apt-mark hold")
+        if self.join_store:
+            # A warm instance joins when it is started rather than before it powers off
+            cloud_init = with_join(cloud_init, self.join_store)
+            return with_commands(cloud_init, [POWER_OFF if power_off else START_JOIN])
+        return with_commands(cloud_init, [POWER_OFF] if power_off else None)
+
+    def _power_states(self, group_name, vmss_name):
+        # Instance ID -> power state ("running", "stopped", "deallocated", ...), oldest instance first
+        states = {}
+        for vm in self.compute_client.virtual_machine_scale_set_vms.list(group_name, vmss_name, expand="instanceView"):
+            codes = [status.code for status in (vm.instance_view.statuses if vm.instance_view else [])]
+            states[vm.instance_id] = next(
+                (code.split("/", 1)[1] for code in codes if code.startswith("PowerState/")), "unknown"
+            )
+        return dict(sorted(states.items(), key=lambda item: int(item[0])))
+
+    def _prepare_instances(self, group_name, vmss_name, instance_ids, active_count):
+        """Wait until new warm pool scale set instances have bootstrapped and stopped, then start
+        ``active_count`` of them and deallocate the rest into the warm pool.
+
+        Returns the started and the deallocated instance IDs.
+        """
+        deadline = time.monotonic() + self.settle_timeout
+        while True:
+            states = self._power_states(group_name, vmss_name)
+            stopped = [i for i in instance_ids if states.get(i) == "stopped"]
+            if len(stopped) == len(instance_ids) or time.monotonic() >= deadline:
+                break
+            time.sleep(self.poll_interval)
+        if len(stopped) < len(instance_ids):
+            print(f"Warning: {len(instance_ids) - len(stopped)} instances of '{vmss_name}' had not bootstrapped "
+                  f"after {self.settle_timeout:g}s.")
+
+        started, warm = stopped[:active_count], stopped[active_count:]
+        scale_sets = self.compute_client.virtual_machine_scale_sets
+        operations = []
+        if started:
+            operations.append(scale_sets.begin_start(
+                group_name, vmss_name, vm_instance_i_ds=VirtualMachineScaleSetVMInstanceIDs(instance_ids=started)
+            ))
+        if warm:
+            # Deallocated instances keep their disks but are not billed for compute
+            operations.append(scale_sets.begin_deallocate(
+                group_name, vmss_name, vm_instance_i_ds=VirtualMachineScaleSetVMInstanceIDs(instance_ids=warm)
+            ))
+        for operation in operations:
+            operation.result()
+        print(f"Scale set '{vmss_name}': {len(started)} instances started, {len(warm)} kept in the warm pool.")
+        return started, warm
 
-        return vmss
\ No newline at end of file
+    def _list_computer_names(self, group_name, vmss_name):
+        return {
+            vm.os_profile.computer_name
+            for vm in self.compute_client.virtual_machine_scale_set_vms.list(group_name, vmss_name)
+            if vm.os_profile is not None
+        }
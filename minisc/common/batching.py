@@ -0,0 +1,87 @@
+import contextvars
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from minisc.common.throttling import is_throttling_error
+from minisc.common.tracing import span
+
+
+def split_into_chunks(total, chunk_size):
+    """Split ``total`` nodes into chunk sizes no larger than ``chunk_size``"""
+    return [min(chunk_size, total - start) for start in range(0, total, chunk_size)]
+
+
+class LaunchPacer:
+    """Spaces out chunk submissions, backing off when the provider throttles.
+
+    Every throttled call doubles the interval between submissions (up to
+    ``max_interval``); every successful call shrinks it back towards
+    ``interval``, so launches settle at the fastest rate the provider accepts.
+    """
+
+    def __init__(self, interval=1.0, max_interval=30.0):
+        self.base_interval = interval
+        self.interval = interval
+        self.max_interval = max_interval
+        self._next_slot = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+    def throttled(self):
+        with self._lock:
+            self.interval = min(max(self.interval * 2, 0.5), self.max_interval)
+
+    def succeeded(self):
+        with self._lock:
+            self.interval = max(self.base_interval, self.interval * 0.75)
+
+
+def launch_in_chunks(launch, total, chunk_size=50, max_parallel=4, pace_seconds=1.0):
+    """Launch ``total`` nodes as concurrent chunks and account for partial success.
+
+    ``launch(index, count)`` launches one chunk and returns the list of nodes it
+    actually created, which may be shorter than ``count``. An error fails only
+    that chunk. Throttled calls are retried by the cloud clients themselves, so
+    a chunk still throttled is not retried here; it slows down the later chunks.
+
+    Returns a dict with the ``requested`` count, the ``launched`` nodes, the
+    ``failed`` count and the per-chunk ``errors``.
+    """
+    chunks = split_into_chunks(total, chunk_size)
+    pacer = LaunchPacer(pace_seconds)
+    results = [None] * len(chunks)
+    errors = []
+
+    def run_chunk(index):
+        count = chunks[index]
+        pacer.wait()
+        try:
+            with span("launch_chunk", **{"minisc.chunk": index, "minisc.count": count}):
+                results[index] = launch(index, count)
+            pacer.succeeded()
+        except Exception as e:
+            if is_throttling_error(e):
+                pacer.throttled()
+            errors.append({'chunk': index, 'count': count, 'error': str(e)})
+            print(f"Error launching chunk {index} ({count} nodes): {str(e)}")
+
+    with ThreadPoolExecutor(max_workers=max(1, min(max_parallel, len(chunks)))) as executor:
+        # Each chunk runs in a copy of the caller's context so its spans join the deploy's trace
+        futures = [executor.submit(contextvars.copy_context().run, run_chunk, index) for index in range(len(chunks))]
+        for future in futures:
+            future.result()
+
+    launched = [node for chunk in results if chunk for node in chunk]
+    return {
+        'requested': total,
+        'launched': launched,
+        'failed': total - len(launched),
+        'errors': errors,
+    }
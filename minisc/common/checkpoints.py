@@ -0,0 +1,79 @@
+import json
+import os
+import threading
+
+DEFAULT_STATE_DIR = os.path.expanduser("~/.minisc/state")
+
+
+def get_state_dir():
+    return os.environ.get("MINISC_STATE_DIR", DEFAULT_STATE_DIR)
+
+
+class Checkpoint:
+    """Completed deployment steps for one cluster, persisted as a JSON file.
+
+    Each step records the resource it produced (an ID, a list of IDs, ...). A
+    deployment that fails part way can be retried with the same checkpoint and
+    will skip every step already recorded.
+    """
+
+    def __init__(self, deployment_id, state_dir=None):
+        self.deployment_id = deployment_id
+        self.path = os.path.join(state_dir or get_state_dir(), "checkpoints", f"{deployment_id}.json")
+        self._lock = threading.Lock()
+        self._steps = {}
+        if os.path.exists(self.path):
+            with open(self.path, "r") as f:
+                self._steps = json.load(f)
+
+    def get(self, step, default=None):
+        with self._lock:
+            return self._steps.get(step, default)
+
+    def record(self, step, value=True):
+        with self._lock:
+            self._steps[step] = value
+            self._save()
+        return value
+
+    def completed(self):
+        with self._lock:
+            return dict(self._steps)
+
+    def clear(self, matching=None):
+        """Forget every recorded step, or only those for which ``matching(step)`` is true"""
+        with self._lock:
+            if matching is not None:
+                self._steps = {step: value for step, value in self._steps.items() if not matching(step)}
+                if self._steps:
+                    self._save()
+                    return
+            self._steps = {}
+            if os.path.exists(self.path):
+                os.remove(self.path)
+
+    def _save(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self._steps, f, indent=2)
+        os.replace(tmp_path, self.path)
+
+
+def run_step(checkpoint, step, func):
+    """Run ``func`` unless ``checkpoint`` already recorded ``step``.
+
+    Resource IDs (a string or list of strings) returned by ``func`` are recorded
+    and returned on resume; any other result just marks the step as done.
+    """
+    if checkpoint is None:
+        return func()
+    value = checkpoint.get(step)
+    if value is not None:
+        print(f"Skipping '{step}' (already completed: {value}).")
+        return value
+    result = func()
+    if isinstance(result, (str, list)):
+        return checkpoint.record(step, result)
+    checkpoint.record(step, True)
+    return result
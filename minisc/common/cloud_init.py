@@ -0,0 +1,134 @@
+import yaml
+
+# Where the head node keeps the add-on manifests it applies after kubeadm init
+ADDONS_DIR = "/etc/kubernetes/addons"
+
+KUBECTL = "kubectl --kubeconfig=/etc/kubernetes/admin.conf"
+
+# The head node's kubeadm config, with the API version of each kind of document it may hold
+KUBEADM_CONFIG = "/etc/kubernetes/kubeadm-config.yaml"
+KUBEADM_API_VERSIONS = {
+    "InitConfiguration": "kubeadm.k8s.io/v1beta3",
+    "ClusterConfiguration": "kubeadm.k8s.io/v1beta3",
+    "KubeletConfiguration": "kubelet.config.k8s.io/v1beta1",
+    "KubeProxyConfiguration": "kubeproxy.config.k8s.io/v1alpha1",
+}
+
+# Last command of a worker in an Azure warm pool scale set: every instance stops once
+# bootstrapped, and the deployer starts the ones the pool needs and deallocates the rest
+POWER_OFF = "poweroff"
+
+# Last command of a worker in an AWS Auto Scaling group with a warm pool: instances launched
+# into the warm pool stop once bootstrapped and skip the rest of runcmd, while those launched
+# into the group carry on
+AWS_WARM_POOL_POWER_OFF = (
+    "TOKEN=$(curl -sX PUT http://169.254.169.254/latest/api/token -H 'X-aws-ec2-metadata-token-ttl-seconds: 60'); "
+    "curl -sH \"X-aws-ec2-metadata-token: $TOKEN\" "
+    "http://169.254.169.254/latest/meta-data/autoscaling/target-lifecycle-state | grep -q '^Warmed:' "
+    "&& { poweroff; exit 0; } || true"
+)
+
+
+# Give a worker's kubelet its node's spec.providerID, which the cluster-autoscaler and cloud
+# providers map to the instance and its Auto Scaling group or scale set; kubeadm sets none
+AWS_PROVIDER_ID = (
+    "TOKEN=$(curl -sX PUT http://169.254.169.254/latest/api/token -H 'X-aws-ec2-metadata-token-ttl-seconds: 60'); "
+    "METADATA=http://169.254.169.254/latest/meta-data; "
+    "echo \"KUBELET_EXTRA_ARGS=--provider-id=aws:///"
+    "$(curl -sH \"X-aws-ec2-metadata-token: $TOKEN\" $METADATA/placement/availability-zone)/"
+    "$(curl -sH \"X-aws-ec2-metadata-token: $TOKEN\" $METADATA/instance-id)\" > /etc/default/kubelet"
+)
+AZURE_PROVIDER_ID = (
+    "echo \"KUBELET_EXTRA_ARGS=--provider-id=azure://$(curl -sH Metadata:true "
+    "'http://169.254.169.254/metadata/instance/compute/resourceId?api-version=2021-02-01&format=text')\" "
+    "> /etc/default/kubelet"
+)
+
+def aws_complete_lifecycle_action(region, group_name, hook):
+    """A command completing the instance's pending ``hook`` action in its Auto Scaling group, as its instance role"""
+    return (
+        "TOKEN=$(curl -sX PUT http://169.254.169.254/latest/api/token -H 'X-aws-ec2-metadata-token-ttl-seconds: 60'); "
+        f"aws autoscaling complete-lifecycle-action --region {region} --auto-scaling-group-name {group_name} "
+        f"--lifecycle-hook-name {hook} --lifecycle-action-result CONTINUE --instance-id "
+        "$(curl -sH \"X-aws-ec2-metadata-token: $TOKEN\" http://169.254.169.254/latest/meta-data/instance-id)"
+    )
+
+def with_manifests(cloud_init, manifests):
+    """Add Kubernetes manifests to a head node's cloud-config.
+
+    ``manifests`` maps a name to a YAML manifest. Each is written under
+    ADDONS_DIR and applied at the end of ``runcmd``, once the cluster is up.
+    """
+    if not manifests:
+        return cloud_init
+    config = yaml.safe_load(cloud_init)
+    for name, manifest in manifests.items():
+        path = f"{ADDONS_DIR}/{name}.yaml"
+        config.setdefault("write_files", []).append({"path": path, "permissions": "0600", "content": manifest})
+        config.setdefault("runcmd", []).append(f"{KUBECTL} apply -f {path}")
+    return _dump(config)
+
+
+def with_commands(cloud_init, commands, after=None, instead_of=None):
+    """Add shell commands to a cloud-config's ``runcmd``.
+
+    They are appended, inserted right after the first command starting with
+    ``after``, or replace the first command starting with ``instead_of``.
+    """
+    if not commands and instead_of is None:
+        return cloud_init
+    config = yaml.safe_load(cloud_init)
+    runcmd = config.setdefault("runcmd", [])
+    start = end = len(runcmd)
+    if after is not None:
+        start = end = _find_command(runcmd, after) + 1
+    elif instead_of is not None:
+        start = _find_command(runcmd, instead_of)
+        end = start + 1
+    runcmd[start:end] = commands or []
+    return _dump(config)
+
+
+def with_kubeadm_config(cloud_init, **documents):
+    """Merge settings into the kubeadm config a head node's cloud-config writes.
+
+    ``documents`` maps a kind (``ClusterConfiguration``, ``KubeletConfiguration``,
+    ...) to settings merged into its document; missing documents are added.
+    """
+    config = yaml.safe_load(cloud_init)
+    kubeadm = next(f for f in config["write_files"] if f["path"] == KUBEADM_CONFIG)
+    existing = {document["kind"]: document for document in yaml.safe_load_all(kubeadm["content"])}
+    for kind, settings in documents.items():
+        if kind not in existing:
+            existing[kind] = {"apiVersion": KUBEADM_API_VERSIONS[kind], "kind": kind}
+        _merge(existing[kind], settings)
+    kubeadm["content"] = yaml.safe_dump_all(list(existing.values()), sort_keys=False)
+    return _dump(config)
+
+
+def with_files(cloud_init, files):
+    """Add files to a cloud-config's ``write_files``; ``files`` maps a path to its content and permissions"""
+    if not files:
+        return cloud_init
+    config = yaml.safe_load(cloud_init)
+    config.setdefault("write_files", []).extend(
+        {"path": path, "permissions": permissions, "content": content}
+        for path, (content, permissions) in files.items()
+    )
+    return _dump(config)
+
+
+def _find_command(runcmd, prefix):
+    return next(i for i, command in enumerate(runcmd) if command.startswith(prefix))
+
+
+def _merge(document, settings):
+    for key, value in settings.items():
+        if isinstance(value, dict) and isinstance(document.get(key), dict):
+            _merge(document[key], value)
+        else:
+            document[key] = value
+
+
+def _dump(config):
+    return "#cloud-config\n" + yaml.safe_dump(config, sort_keys=False, width=4096)
@@ -0,0 +1,84 @@
+import json
+import os
+from string import Template
+from typing import NamedTuple
+import yaml
+
+# Matches the Kubernetes minor version the cloud-init templates install
+AUTOSCALER_IMAGE = "registry.k8s.io/autoscaling/cluster-autoscaler:v1.29.0"
+
+MANIFEST_TEMPLATE_PATH = os.path.join(os.path.dirname(__file__), "../templates/cluster-autoscaler.yaml")
+
+
+class NodeGroupBounds(NamedTuple):
+    """Size limits the cluster-autoscaler keeps a cluster's worker pool within"""
+    cluster_name: str
+    min_size: int
+    max_size: int
+
+
+def aws_manifest(cluster_name, region):
+    """The cluster-autoscaler, managing the Auto Scaling groups tagged by ``aws_group_tags``.
+
+    It calls AWS with the head node's instance role.
+    """
+    return _render(
+        "aws",
+        f"asg:tag=k8s.io/cluster-autoscaler/enabled,k8s.io/cluster-autoscaler/{cluster_name}",
+        [{"name": "AWS_REGION", "value": region}]
+    )
+
+
+def azure_manifest(cluster_name, subscription_id, resource_group, tenant_id, client_id, client_secret):
+    """The cluster-autoscaler, managing the scale sets tagged by ``azure_scale_set_tags``.
+
+    It calls Azure with the deployment's service principal, kept in a Secret.
+    """
+    secret = {
+        "ARM_SUBSCRIPTION_ID": subscription_id,
+        "ARM_RESOURCE_GROUP": resource_group,
+        "ARM_TENANT_ID": tenant_id,
+        "ARM_CLIENT_ID": client_id,
+        "ARM_CLIENT_SECRET": client_secret,
+        "ARM_VM_TYPE": "vmss",
+    }
+    deployment = _render(
+        "azure",
+        f"label:cluster-autoscaler-enabled=true,cluster-autoscaler-name={cluster_name}",
+        [
+            {"name": name, "valueFrom": {"secretKeyRef": {"name": "cluster-autoscaler-azure", "key": name}}}
+            for name in secret
+        ]
+    )
+    return yaml.safe_dump({
+        "apiVersion": "v1",
+        "kind": "Secret",
+        "metadata": {"name": "cluster-autoscaler-azure", "namespace": "kube-system"},
+        "stringData": {name: value or "" for name, value in secret.items()},
+    }, sort_keys=False) + "---\n" + deployment
+
+
+def aws_group_tags(cluster_name):
+    """Auto Scaling group tags the cluster's autoscaler discovers the group by"""
+    return {"k8s.io/cluster-autoscaler/enabled": "true", f"k8s.io/cluster-autoscaler/{cluster_name}": "owned"}
+
+
+def azure_scale_set_tags(cluster_name, min_size, max_size):
+    """Scale set tags the cluster's autoscaler discovers the scale set and its size limits by"""
+    return {
+        "cluster-autoscaler-enabled": "true",
+        "cluster-autoscaler-name": cluster_name,
+        "min": str(min_size),
+        "max": str(max_size),
+    }
+
+
+def _render(cloud_provider, node_group_discovery, env):
+    with open(MANIFEST_TEMPLATE_PATH, "r") as f:
+        return Template(f.read()).substitute(
+            IMAGE=AUTOSCALER_IMAGE,
+            CLOUD_PROVIDER=cloud_provider,
+            NODE_GROUP_DISCOVERY=node_group_discovery,
+            # A JSON list is valid YAML in flow style
+            ENV=json.dumps(env)
+        )
@@ -0,0 +1,29 @@
+class MiniscError(Exception):
+    """Base class for errors raised by minisc deployers"""
+
+
+class DeploymentError(MiniscError):
+    """A deployment step failed.
+
+    ``step`` names the step that failed and ``completed`` holds the resources
+    recorded by the steps that finished before it, so the deployment can be
+    resumed (or cleaned up) from there.
+    """
+
+    def __init__(self, step, message, completed=None):
+        super().__init__(f"{step}: {message}")
+        self.step = step
+        self.message = message
+        self.completed = completed or {}
+
+
+class NetworkDeploymentError(DeploymentError):
+    """Creating the VPC/VNet, subnets, gateways or routes failed"""
+
+
+class SecurityGroupDeploymentError(DeploymentError):
+    """Creating or configuring the security group failed"""
+
+
+class NodeDeploymentError(DeploymentError):
+    """Launching master or worker nodes failed"""
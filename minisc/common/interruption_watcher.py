@@ -0,0 +1,80 @@
+import threading
+import paramiko
+from minisc.common.metrics import timed_step
+
+
+@timed_step('ssh')
+def ssh_cordon_nodes(master_ip, username, node_names, key_filename=None, password=None):
+    """Cordon, drain and remove the given nodes by running kubectl on the master node"""
+    ssh = paramiko.SSHClient()
+    ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+    ssh.connect(hostname=master_ip, username=username, key_filename=key_filename, password=password)
+
+    kubectl = "sudo kubectl --kubeconfig=/etc/kubernetes/admin.conf"
+    try:
+        for node_name in node_names:
+            for cmd in (
+                f"{kubectl} cordon {node_name}",
+                f"{kubectl} drain {node_name} --ignore-daemonsets --delete-emptydir-data --force --timeout=90s",
+                f"{kubectl} delete node {node_name} --ignore-not-found",
+            ):
+                _, stdout, stderr = ssh.exec_command(cmd)
+                if stdout.channel.recv_exit_status() != 0:
+                    print(f"Error running '{cmd}': {stderr.read().decode('utf-8')}")
+            print(f"Node {node_name} cordoned and removed from the cluster.")
+    finally:
+        ssh.close()
+
+
+class InterruptionWatcher:
+    """Polls a spot worker pool for reclaimed nodes, cordons them and launches replacements.
+
+    The watcher is provider agnostic: ``detect`` returns a list of ``{"id", "node_name"}``
+    dicts for reclaimed workers, ``cordon`` receives the node names to take out of the
+    cluster and ``replace`` receives the number of workers to launch.
+    """
+
+    def __init__(self, detect, cordon, replace, interval=30):
+        self.detect = detect
+        self.cordon = cordon
+        self.replace = replace
+        self.interval = interval
+        self._handled = set()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def poll_once(self):
+        interrupted = [worker for worker in self.detect() if worker["id"] not in self._handled]
+        if not interrupted:
+            return []
+
+        print(f"Detected {len(interrupted)} interrupted spot workers: {[w['id'] for w in interrupted]}")
+        node_names = [worker["node_name"] for worker in interrupted if worker.get("node_name")]
+        if node_names:
+            try:
+                self.cordon(node_names)
+            except Exception as e:
+                print(f"Error cordoning interrupted nodes: {str(e)}")
+        self.replace(len(interrupted))
+        self._handled.update(worker["id"] for worker in interrupted)
+        return interrupted
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.poll_once()
+            except Exception as e:
+                print(f"Error watching for spot interruptions: {str(e)}")
+            self._stop.wait(self.interval)
+
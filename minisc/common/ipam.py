@@ -0,0 +1,154 @@
+import ipaddress
+import json
+import math
+import os
+import threading
+from typing import NamedTuple
+
+from minisc.common.checkpoints import get_state_dir
+from minisc.common.network_plan import subnet_prefix
+
+DEFAULT_NETWORK_POOL = "10.0.0.0/8"
+# Shared address space (RFC 6598), kept apart from the node networks so pods never clash with them
+DEFAULT_POD_POOL = "100.64.0.0/10"
+
+# kubelet's default pod limit per node
+DEFAULT_MAX_PODS = 110
+
+# Node count a cluster is sized for when the request gives none: one /24, as without IPAM
+DEFAULT_NODES = 250
+
+# Largest network AWS allows for a VPC
+MIN_NETWORK_PREFIX = 16
+
+
+class PodNetwork(NamedTuple):
+    """The cluster's pod CIDR, split by the controller manager into a /node_mask block per node"""
+    cidr: str
+    node_mask: int
+    max_pods: int
+
+
+# kubeadm's pod CIDR with flannel, and the controller manager's default block per node
+DEFAULT_POD_NETWORK = PodNetwork("10.244.0.0/16", 24, DEFAULT_MAX_PODS)
+
+
+class Allocation(NamedTuple):
+    """The address space of one cluster: its VPC or VNet CIDR and its pod network"""
+    network: str
+    pods: PodNetwork
+
+
+class AddressManager:
+    """Non-overlapping network and pod CIDRs for every cluster, persisted as a JSON file.
+
+    Network CIDRs come from ``network_pool`` and pod CIDRs from ``pod_pool``,
+    first fit, each sized to the cluster's node count. Allocations are keyed
+    by cluster, so repeated requests for a cluster get the same one until it
+    is released.
+    """
+
+    def __init__(self, state_dir=None, network_pool=None, pod_pool=None):
+        # Without ``state_dir``, MINISC_STATE_DIR is read on each call, like checkpoints
+        self.state_dir = state_dir
+        self.network_pool = ipaddress.ip_network(
+            network_pool or os.environ.get("MINISC_IPAM_NETWORK_POOL", DEFAULT_NETWORK_POOL)
+        )
+        self.pod_pool = ipaddress.ip_network(pod_pool or os.environ.get("MINISC_IPAM_POD_POOL", DEFAULT_POD_POOL))
+        if self.network_pool.overlaps(self.pod_pool):
+            raise ValueError(f"The network pool {self.network_pool} overlaps the pod pool {self.pod_pool}")
+        self._lock = threading.Lock()
+
+    @property
+    def path(self):
+        return os.path.join(self.state_dir or get_state_dir(), "ipam", "allocations.json")
+
+    def get(self, cluster_id):
+        with self._lock:
+            allocation = self._load().get(cluster_id)
+        return _allocation(allocation) if allocation else None
+
+    def allocations(self):
+        with self._lock:
+            return {cluster_id: _allocation(allocation) for cluster_id, allocation in self._load().items()}
+
+    def allocate(self, cluster_id, nodes=None, zones=1, max_pods=None):
+        """Return the cluster's allocation, allocating one for ``nodes`` nodes in ``zones`` subnets if it has none.
+
+        Raises ValueError when a pool has no free block of the needed size.
+        """
+        with self._lock:
+            allocations = self._load()
+            if cluster_id in allocations:
+                return _allocation(allocations[cluster_id])
+
+            nodes = nodes or DEFAULT_NODES
+            max_pods = max_pods or DEFAULT_MAX_PODS
+            # One subnet per zone with room for its share of the nodes
+            network_prefix = subnet_prefix(math.ceil(nodes / zones)) - math.ceil(math.log2(zones))
+            if network_prefix < MIN_NETWORK_PREFIX:
+                raise ValueError(f"{nodes} nodes need a network larger than /{MIN_NETWORK_PREFIX}")
+            node_mask = node_mask_for(max_pods)
+            pod_prefix = node_mask - math.ceil(math.log2(nodes))
+
+            taken = [ipaddress.ip_network(cidr) for allocation in allocations.values()
+                     for cidr in (allocation["network"], allocation["pods"])]
+            allocation = {
+                "network": str(_first_free(self.network_pool, network_prefix, taken)),
+                "pods": str(_first_free(self.pod_pool, pod_prefix, taken)),
+                "node_mask": node_mask,
+                "max_pods": max_pods,
+            }
+            allocations[cluster_id] = allocation
+            self._save(allocations)
+        print(f"Allocated network {allocation['network']} and pod network {allocation['pods']} to '{cluster_id}'.")
+        return _allocation(allocation)
+
+    def release(self, cluster_id):
+        """Return the cluster's CIDRs to the pools; False if it had none"""
+        with self._lock:
+            allocations = self._load()
+            if allocations.pop(cluster_id, None) is None:
+                return False
+            self._save(allocations)
+        return True
+
+    def _load(self):
+        # Read on every call, so API workers sharing the state directory see each other's allocations
+        if not os.path.exists(self.path):
+            return {}
+        with open(self.path, "r") as f:
+            return json.load(f)
+
+    def _save(self, allocations):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(allocations, f, indent=2)
+        os.replace(tmp_path, self.path)
+
+
+def node_mask_for(max_pods):
+    """The prefix of each node's pod block for ``max_pods`` pods"""
+    # Twice the pod limit per node, so addresses are not reused as soon as pods are replaced
+    return 32 - math.ceil(math.log2(2 * max_pods))
+
+
+def default_pod_network(max_pods):
+    """The default pod CIDR, split into blocks for ``max_pods`` pods per node"""
+    return DEFAULT_POD_NETWORK._replace(node_mask=node_mask_for(max_pods), max_pods=max_pods)
+
+
+def _first_free(pool, prefix, taken):
+    if prefix < pool.prefixlen:
+        raise ValueError(f"A /{prefix} does not fit in the pool {pool}")
+    for candidate in pool.subnets(new_prefix=prefix):
+        if not any(candidate.overlaps(network) for network in taken):
+            return candidate
+    raise ValueError(f"The pool {pool} has no free /{prefix}")
+
+
+def _allocation(allocation):
+    return Allocation(
+        allocation["network"], PodNetwork(allocation["pods"], allocation["node_mask"], allocation["max_pods"])
+    )
@@ -0,0 +1,204 @@
+from typing import NamedTuple
+
+from minisc.common.cloud_init import with_commands, with_files, with_kubeadm_config
+
+# Hours between rotations of the published bootstrap token
+DEFAULT_ROTATION_HOURS = 12
+
+# Last command of a worker that is not parked in a warm pool: join now rather than on the next boot
+START_JOIN = "systemctl start --no-block minisc-join.service"
+
+# Secrets of a join store: the join command of workers, and of control-plane nodes with the certificate key
+JOIN_COMMAND = "join-command"
+CONTROL_PLANE_JOIN_COMMAND = "control-plane-join-command"
+
+KEY_VAULT_API_VERSION = "7.4"
+
+API_SERVER_PORT = 6443
+
+PUBLISH_SCRIPT = "/usr/local/bin/minisc-publish-join"
+JOIN_SCRIPT = "/usr/local/bin/minisc-join"
+
+# Reads the JSON document on stdin and prints one of its fields
+JSON_FIELD = "python3 -c 'import json, sys; print(json.load(sys.stdin)[sys.argv[1]])'"
+
+
+class SsmJoinStore(NamedTuple):
+    """The join command as an SSM Parameter Store SecureString, read and written with the nodes' instance profile"""
+    cluster_name: str
+    region: str
+    instance_profile: str
+    rotation_hours: int = DEFAULT_ROTATION_HOURS
+
+    def parameter(self, secret=JOIN_COMMAND):
+        return f"/minisc/{self.cluster_name}/{secret}"
+
+    def install(self):
+        return ["command -v aws > /dev/null || snap install aws-cli --classic"]
+
+    def publish(self, secret=JOIN_COMMAND):
+        return [
+            f"aws ssm put-parameter --region {self.region} --name {self.parameter(secret)} --type SecureString "
+            "--overwrite --value \"$JOIN_COMMAND\" > /dev/null"
+        ]
+
+    def fetch(self, secret=JOIN_COMMAND):
+        return [
+            f"aws ssm get-parameter --region {self.region} --name {self.parameter(secret)} --with-decryption "
+            "--query Parameter.Value --output text"
+        ]
+
+
+class KeyVaultJoinStore(NamedTuple):
+    """The join command as a Key Vault secret, read and written with the nodes' user-assigned managed identity"""
+    cluster_name: str
+    vault_name: str
+    identity_id: str
+    rotation_hours: int = DEFAULT_ROTATION_HOURS
+
+    def url(self, secret=JOIN_COMMAND):
+        return (f"https://{self.vault_name}.vault.azure.net/secrets/{self.cluster_name}-{secret}"
+                f"?api-version={KEY_VAULT_API_VERSION}")
+
+    def install(self):
+        return []
+
+    def publish(self, secret=JOIN_COMMAND):
+        return self._token() + [
+            f"curl -sf -X PUT -H \"Authorization: Bearer $VAULT_TOKEN\" -H 'Content-Type: application/json' "
+            f"-d \"{{\\\"value\\\": \\\"$JOIN_COMMAND\\\"}}\" '{self.url(secret)}' > /dev/null"
+        ]
+
+    def fetch(self, secret=JOIN_COMMAND):
+        return self._token() + [
+            f"curl -sf -H \"Authorization: Bearer $VAULT_TOKEN\" '{self.url(secret)}' | {JSON_FIELD} value"
+        ]
+
+    def _token(self):
+        # An access token for Key Vault from the instance metadata service, as the node's identity
+        return [
+            "VAULT_TOKEN=$(curl -sf -H Metadata:true "
+            "'http://169.254.169.254/metadata/identity/oauth2/token?api-version=2018-02-01"
+            f"&resource=https%3A%2F%2Fvault.azure.net&msi_res_id={self.identity_id}' | {JSON_FIELD} access_token)"
+        ]
+
+
+def with_join_publisher(cloud_init, store, control_plane=False):
+    """Make a head node publish its join command to ``store`` once kubeadm init is done.
+
+    A systemd timer publishes a new one, with a new bootstrap token, every
+    ``store.rotation_hours``. Tokens live for two rotations, so a worker that
+    fetched the previous command can still use it.
+
+    With ``control_plane``, the node also uploads the control plane's
+    certificates and publishes the join command of control-plane nodes, with
+    the key to them. kubeadm deletes uploaded certificates after two hours, so
+    that command is good for the nodes launched with the control plane.
+    """
+    commands = [
+        f"JOIN_COMMAND=$(kubeadm token create --kubeconfig /etc/kubernetes/admin.conf "
+        f"--ttl {2 * store.rotation_hours}h --print-join-command)",
+        *store.publish(),
+    ]
+    if control_plane:
+        commands += [
+            "CERTIFICATE_KEY=$(kubeadm init phase upload-certs --upload-certs "
+            "--kubeconfig /etc/kubernetes/admin.conf | tail -1)",
+            "JOIN_COMMAND=\"$JOIN_COMMAND --control-plane --certificate-key $CERTIFICATE_KEY\"",
+            *store.publish(CONTROL_PLANE_JOIN_COMMAND),
+        ]
+    publish = "\n".join(["#!/bin/bash", "set -eo pipefail", *commands]) + "\n"
+    service = _unit(
+        Unit={"Description": "Publish the cluster join command"},
+        Service={"Type": "oneshot", "ExecStart": PUBLISH_SCRIPT},
+    )
+    # Also after a reboot, as the timer only counts from the service's last run since boot
+    timer = _unit(
+        Unit={"Description": "Rotate the published cluster join command"},
+        Timer={"OnBootSec": "1min", "OnUnitActiveSec": f"{store.rotation_hours}h"},
+        Install={"WantedBy": "timers.target"},
+    )
+    cloud_init = with_files(cloud_init, {
+        PUBLISH_SCRIPT: (publish, "0700"),
+        "/etc/systemd/system/minisc-publish-join.service": (service, "0644"),
+        "/etc/systemd/system/minisc-publish-join.timer": (timer, "0644"),
+    })
+    return with_commands(cloud_init, store.install() + [
+        "systemctl daemon-reload",
+        "systemctl enable --now minisc-publish-join.timer",
+        "systemctl start minisc-publish-join.service",
+    ], after="kubeadm init")
+
+
+def with_join(cloud_init, store, after_join=None):
+    """Make a worker join the cluster with the join command it fetches from ``store``.
+
+    The join runs as a systemd service enabled for every boot until the node
+    has joined, so a worker that stops in a warm pool joins when it is
+    started. Deployers add START_JOIN to join right away. The ``after_join``
+    commands run once the join has succeeded.
+    """
+    service = _unit(
+        Unit={
+            "Description": "Join the Kubernetes cluster",
+            "Wants": "network-online.target",
+            "After": "network-online.target containerd.service",
+            "ConditionPathExists": "!/etc/kubernetes/kubelet.conf",
+        },
+        Service={"Type": "oneshot", "ExecStart": JOIN_SCRIPT},
+        Install={"WantedBy": "multi-user.target"},
+    )
+    cloud_init = with_files(cloud_init, {
+        JOIN_SCRIPT: (_join_script(store, after_join=after_join), "0700"),
+        "/etc/systemd/system/minisc-join.service": (service, "0644"),
+    })
+    return with_commands(cloud_init, store.install() + [
+        "systemctl daemon-reload",
+        "systemctl enable minisc-join.service",
+    ])
+
+
+def with_control_plane_join(cloud_init, store):
+    """Make a head node join the control plane of the node that published its join command to ``store``.
+
+    The node joins in place of kubeadm init, retrying until the first
+    control-plane node has published the command, so every control-plane
+    node can be launched at once.
+    """
+    cloud_init = with_files(cloud_init, {JOIN_SCRIPT: (_join_script(store, CONTROL_PLANE_JOIN_COMMAND), "0700")})
+    return with_commands(cloud_init, store.install() + [JOIN_SCRIPT], instead_of="kubeadm init")
+
+
+def with_control_plane(cloud_init, store, endpoint, first):
+    """Make a head node one of the control-plane nodes behind the load balancer at ``endpoint``.
+
+    The ``first`` node runs kubeadm init and the others join it. All of them
+    publish the join commands, so rotation goes on if the first is lost.
+    """
+    cloud_init = with_kubeadm_config(cloud_init, ClusterConfiguration={
+        "controlPlaneEndpoint": f"{endpoint}:{API_SERVER_PORT}"
+    })
+    cloud_init = with_join_publisher(cloud_init, store, control_plane=True)
+    return cloud_init if first else with_control_plane_join(cloud_init, store)
+
+
+def _join_script(store, secret=JOIN_COMMAND, after_join=None):
+    # Failed attempts are retried with jitter, so a large pool does not retry in lockstep
+    return "\n".join([
+        "#!/bin/bash",
+        "fetch_join_command() {",
+        *(f"  {command}" for command in store.fetch(secret)),
+        "}",
+        "until JOIN_COMMAND=$(fetch_join_command 2> /dev/null) && [ -n \"$JOIN_COMMAND\" ] && $JOIN_COMMAND; do",
+        "  kubeadm reset -f > /dev/null 2>&1",
+        "  sleep $((10 + RANDOM % 20))",
+        "done",
+        *(after_join or []),
+    ]) + "\n"
+
+
+def _unit(**sections):
+    return "\n".join(
+        f"[{section}]\n" + "".join(f"{key}={value}\n" for key, value in options.items())
+        for section, options in sections.items()
+    )
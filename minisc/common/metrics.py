@@ -0,0 +1,160 @@
+import functools
+import threading
+import time
+from contextlib import contextmanager
+
+from minisc.common.tracing import span
+
+# Seconds; deploy steps range from sub-second API calls to multi-minute scale-outs
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Monotonic counter with labels, rendered in the Prometheus text format"""
+
+    kind = "counter"
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(tuple(str(labels.get(name, "")) for name in self.labelnames), 0)
+
+    def samples(self):
+        with self._lock:
+            return [
+                f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+                for key, value in sorted(self._values.items())
+            ]
+
+
+class Histogram:
+    """Histogram of durations with labels, rendered in the Prometheus text format"""
+
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets) + (float("inf"),)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            counts, total = self._values.get(key, ([0] * len(self.buckets), 0.0))
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[index] += 1
+            self._values[key] = (counts, total + value)
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def count(self, **labels):
+        counts, _ = self._values.get(tuple(str(labels.get(name, "")) for name in self.labelnames), ([0], 0.0))
+        return counts[-1]
+
+    def samples(self):
+        lines = []
+        with self._lock:
+            for key, (counts, total) in sorted(self._values.items()):
+                for bound, count in zip(self.buckets, counts):
+                    le = f'le="{_format_value(bound)}"'
+                    lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {count}")
+                lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(total)}")
+                lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {counts[-1]}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        """Return every metric in the Prometheus text exposition format (version 0.0.4)"""
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+DEPLOY_STEP_SECONDS = REGISTRY.register(Histogram(
+    "minisc_deploy_step_duration_seconds", "Duration of deployer steps.", ["provider", "step", "outcome"]
+))
+CLOUD_CALL_SECONDS = REGISTRY.register(Histogram(
+    "minisc_cloud_call_duration_seconds", "Duration of cloud API calls, including retries.", ["provider", "operation"]
+))
+CLOUD_CALL_ERRORS = REGISTRY.register(Counter(
+    "minisc_cloud_call_errors_total", "Cloud API calls that failed after any retries.", ["provider", "operation"]
+))
+CLOUD_RETRIES = REGISTRY.register(Counter(
+    "minisc_cloud_retries_total", "Retried cloud API attempts.", ["provider", "operation", "reason"]
+))
+CLOUD_THROTTLES = REGISTRY.register(Counter(
+    "minisc_cloud_throttles_total", "Cloud API attempts rejected by provider throttling.", ["provider", "operation"]
+))
+HTTP_REQUEST_SECONDS = REGISTRY.register(Histogram(
+    "minisc_http_request_duration_seconds", "Duration of API requests.", ["method", "path", "status"]
+))
+
+
+def timed_step(provider, step=None):
+    """Decorator recording a deployer method's duration and outcome as a deploy step, inside a span"""
+    def decorator(func):
+        name = step or func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            outcome = "error"
+            try:
+                with span(func.__qualname__, **{"minisc.provider": provider, "minisc.step": name}):
+                    result = func(*args, **kwargs)
+                outcome = "success"
+                return result
+            finally:
+                DEPLOY_STEP_SECONDS.observe(time.perf_counter() - start, provider=provider, step=name, outcome=outcome)
+        return wrapper
+    return decorator
@@ -1,4 +1,4 @@
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List, Literal
 from pydantic import BaseModel
 
 class ClusterConfig(BaseModel):
@@ -20,6 +20,76 @@ class ClusterConfig(BaseModel):
     tags: Optional[Dict[str, str]] = None
     custom_config: Optional[Dict[str, Any]] = None
 
+    # Resume from the cluster's last completed step; False discards it and starts over
+    resume: bool = True
+
+    # "sdk" creates each resource with its own API call; "arm" (Azure) submits one template deployment;
+    # "cloudformation" and "pulumi" (AWS) deploy the cluster as one stack
+    deployment_engine: str = "sdk"
+
+    # Run the cluster-autoscaler on the head node; it resizes the worker pool to fit pending pods
+    cluster_autoscaler: bool = False
+
+    # Network layout: workers are spread across availability_zones ("us-east-1a" on AWS, "1" on Azure),
+    # and subnets are sized for max_nodes. AWS gets a subnet per zone; an Azure subnet spans all zones.
+    availability_zones: Optional[List[str]] = None
+    max_nodes: Optional[int] = None  # Defaults to an even split of the VPC on AWS, a /24 on Azure
+
+    # Allocate the cluster's VPC/VNet and pod CIDRs from the IPAM pools, sized for max_nodes nodes of
+    # max_pods pods, so they do not overlap other clusters'
+    ipam: bool = False
+    max_pods: Optional[int] = None  # Pods per node; kubelet's default is 110
+
+    # Workers join by themselves: the head node publishes its join command, with a bootstrap token
+    # renewed every join_token_rotation_hours, to SSM Parameter Store (AWS) or a Key Vault secret
+    # (Azure), and workers fetch it at boot. Nodes access it as instance_profile or managed_identity_id.
+    auto_join: bool = False
+    join_token_rotation_hours: int = 12
+    instance_profile: Optional[str] = None  # AWS IAM instance profile name, attached to the nodes whenever given
+    key_vault_name: Optional[str] = None  # Azure
+    managed_identity_id: Optional[str] = None  # Azure user-assigned identity resource ID
+
+    # Control-plane nodes with stacked etcd; more than one (an odd number, for etcd quorum) puts them
+    # behind a load balancer that is the cluster's API endpoint, and needs auto_join
+    control_plane_nodes: int = 1
+
+    # Control-plane and kubelet limits: "small", "large" or "batch" (see minisc.common.performance).
+    # Also give it to POST /deploy/worker-nodes, so workers load the modules kube-proxy needs.
+    performance_profile: Optional[str] = None
+
 class WorkerNodesConfig(ClusterConfig):
     worker_count: int
-    join_token: Optional[str] = None  # Required for Azure
\ No newline at end of file
+    join_token: Optional[str] = None  # Required for Azure
+    master_ip: Optional[str] = None
+
+    # Capacity settings
+    capacity_type: Literal["on-demand", "spot", "mixed"] = "on-demand"
+    on_demand_base: int = 0  # Workers kept on-demand in a mixed pool
+    spot_max_price: Optional[str] = None  # Defaults to the on-demand price
+    spot_instance_types: Optional[List[str]] = None  # Extra AWS types to diversify the spot pool
+    watch_interruptions: bool = False  # Cordon and replace reclaimed spot workers
+
+    # AWS: run the workers as an Auto Scaling group, which replaces lost workers itself
+    auto_scaling_group: bool = False
+
+    # Limits the cluster-autoscaler keeps the pool within
+    min_workers: int = 0
+    max_workers: Optional[int] = None  # Defaults to worker_count
+
+    # Extra workers kept bootstrapped and stopped, and started first on scale-out
+    warm_pool_size: int = 0
+
+    # Large pools are launched as concurrent chunks of at most launch_batch_size workers
+    launch_batch_size: Optional[int] = None  # Provider default: 50 on AWS, 100 on Azure
+    max_parallel_launches: Optional[int] = None
+
+class ScaleWorkersConfig(BaseModel):
+    """Desired size of a cluster's worker pool: an AWS Auto Scaling group or an Azure scale set"""
+    provider: str
+    region: str
+    cluster_name: str
+    worker_count: int
+    master_ip: Optional[str] = None  # Removed workers are drained on the master before they terminate
+    ssh_key_name: Optional[str] = None
+    resource_group_name: Optional[str] = None  # Required for Azure
+    warm_pool_size: Optional[int] = None  # Resizes the warm pool; by default it keeps its size
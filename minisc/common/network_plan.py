@@ -0,0 +1,39 @@
+import ipaddress
+import math
+from typing import NamedTuple, Optional
+
+# Addresses AWS and Azure each keep for themselves in every subnet
+RESERVED_ADDRESSES = 5
+
+# Smallest subnet both clouds accept
+MAX_PREFIX = 28
+
+
+class SubnetPlan(NamedTuple):
+    """A subnet of a cluster network; ``zone`` is None for a regional subnet"""
+    zone: Optional[str]
+    cidr: str
+
+
+def subnet_prefix(nodes):
+    """Prefix length of the smallest subnet with an address for each of ``nodes``"""
+    return min(MAX_PREFIX, 32 - math.ceil(math.log2(nodes + RESERVED_ADDRESSES)))
+
+
+def plan_subnets(network_cidr, zones=None, max_nodes=None):
+    """Split ``network_cidr`` into one subnet per zone, in zone order.
+
+    With ``max_nodes``, every subnet has room for an even share of them and
+    the rest of the address space stays free; without, the address space is
+    divided evenly between the zones. Raises ValueError if they do not fit.
+    """
+    network = ipaddress.ip_network(network_cidr)
+    zones = list(zones or [None])
+    if max_nodes:
+        prefix = subnet_prefix(math.ceil(max_nodes / len(zones)))
+    else:
+        prefix = network.prefixlen + math.ceil(math.log2(len(zones)))
+    if prefix < network.prefixlen or 2 ** (prefix - network.prefixlen) < len(zones):
+        raise ValueError(f"{network_cidr} cannot hold {len(zones)} subnets for {max_nodes or 'any'} nodes")
+    subnets = network.subnets(new_prefix=prefix)
+    return [SubnetPlan(zone, str(next(subnets))) for zone in zones]
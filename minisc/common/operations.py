@@ -0,0 +1,106 @@
+import hashlib
+import json
+import os
+import threading
+import time
+
+from minisc.common.checkpoints import get_state_dir
+
+IN_PROGRESS = "in_progress"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+
+
+def client_token(key, step):
+    """Derive a stable EC2 ClientToken (max 64 ASCII characters) for one step of an operation"""
+    return hashlib.sha256(f"{key}:{step}".encode()).hexdigest()[:64]
+
+
+class OperationConflict(Exception):
+    """An idempotency key was reused for a different request"""
+
+
+class OperationStore:
+    """Deploy operations keyed by their Idempotency-Key, persisted as JSON files.
+
+    ``begin`` either starts a new operation (the caller runs it) or returns
+    the existing one, so a retried request attaches to the in-flight or
+    completed operation instead of deploying again. Failed operations can be
+    started again; the deployers resume them from their checkpoints.
+    """
+
+    def __init__(self, state_dir=None, stale_after=None):
+        # Without ``state_dir``, MINISC_STATE_DIR is read on each call, like checkpoints
+        self.state_dir = state_dir
+        self.stale_after = stale_after or float(os.environ.get("MINISC_OPERATION_TIMEOUT", 3600))
+        self._lock = threading.Lock()
+        self._events = {}
+
+    @property
+    def directory(self):
+        return os.path.join(self.state_dir or get_state_dir(), "operations")
+
+    def get(self, key):
+        path = self._path(key)
+        if not os.path.exists(path):
+            return None
+        with open(path, "r") as f:
+            return json.load(f)
+
+    def begin(self, key, fingerprint):
+        """Return ``(operation, started)``; ``started`` is True when the caller should run it"""
+        with self._lock:
+            operation = self.get(key)
+            if operation is not None:
+                if operation["fingerprint"] != fingerprint:
+                    raise OperationConflict(f"Idempotency key '{key}' was already used for a different request")
+                running_here = key in self._events
+                stale = time.time() - operation["updated_at"] > self.stale_after
+                if operation["status"] == SUCCEEDED or (operation["status"] == IN_PROGRESS and (running_here or not stale)):
+                    return operation, False
+
+            operation = {
+                "key": key,
+                "fingerprint": fingerprint,
+                "status": IN_PROGRESS,
+                "created_at": time.time(),
+                "updated_at": time.time(),
+                "result": None,
+                "error": None,
+            }
+            self._save(operation)
+            self._events[key] = threading.Event()
+            return operation, True
+
+    def finish(self, key, result=None, error=None, status_code=None):
+        with self._lock:
+            operation = self.get(key)
+            operation.update({
+                "status": FAILED if error is not None else SUCCEEDED,
+                "updated_at": time.time(),
+                "result": result,
+                "error": error,
+                "status_code": status_code,
+            })
+            self._save(operation)
+            event = self._events.pop(key, None)
+        if event is not None:
+            event.set()
+        return operation
+
+    def wait(self, key, timeout):
+        """Wait for an operation running in this process to finish and return its latest state"""
+        event = self._events.get(key)
+        if event is not None:
+            event.wait(timeout)
+        return self.get(key)
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{hashlib.sha256(key.encode()).hexdigest()}.json")
+
+    def _save(self, operation):
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(operation["key"])
+        with open(f"{path}.tmp", "w") as f:
+            json.dump(operation, f, indent=2)
+        os.replace(f"{path}.tmp", path)
@@ -0,0 +1,77 @@
+from typing import NamedTuple, Optional
+
+from minisc.common.cloud_init import with_commands, with_files, with_kubeadm_config
+
+GIB = 1024 ** 3
+
+# Kernel modules kube-proxy needs in IPVS mode, on every node
+IPVS_MODULES = ["ip_vs", "ip_vs_rr", "ip_vs_wrr", "ip_vs_sh", "nf_conntrack"]
+
+
+class PerformanceProfile(NamedTuple):
+    """Control-plane and kubelet limits for a class of cluster; None keeps the Kubernetes default"""
+    max_pods: int
+    max_requests_inflight: int  # API server; default 400
+    max_mutating_requests_inflight: int  # API server; default 200
+    etcd_quota_bytes: int  # default 2 GiB
+    kube_api_qps: Optional[int] = None  # Controller manager and scheduler; default 20, burst twice as much
+    proxy_mode: str = "iptables"
+    serialize_image_pulls: bool = True
+
+
+PROFILES = {
+    # A small head node: fewer concurrent requests, so a burst cannot exhaust its memory
+    "small": PerformanceProfile(
+        max_pods=110, max_requests_inflight=200, max_mutating_requests_inflight=100, etcd_quota_bytes=2 * GIB
+    ),
+    # Many nodes and services: more concurrent requests, a larger etcd, and IPVS, whose rule
+    # updates do not grow with the number of services like iptables'
+    "large": PerformanceProfile(
+        max_pods=110, max_requests_inflight=800, max_mutating_requests_inflight=400, etcd_quota_bytes=8 * GIB,
+        kube_api_qps=100, proxy_mode="ipvs"
+    ),
+    # Many short-lived pods per node: pod creation is mutation-heavy, and images are pulled in parallel
+    "batch": PerformanceProfile(
+        max_pods=250, max_requests_inflight=800, max_mutating_requests_inflight=600, etcd_quota_bytes=8 * GIB,
+        kube_api_qps=200, proxy_mode="ipvs", serialize_image_pulls=False
+    ),
+}
+
+
+def with_performance_profile(cloud_init, profile):
+    """Render ``profile`` into a head node's kubeadm config.
+
+    Pods per node are set with the pod network, which is sized for
+    ``profile.max_pods``. The KubeletConfiguration and KubeProxyConfiguration
+    are uploaded by kubeadm init and apply to every node that joins.
+    """
+    # kubeadm passes extraArgs to the components as flags, so every value is a string
+    cluster = {
+        "apiServer": {"extraArgs": {
+            "max-requests-inflight": str(profile.max_requests_inflight),
+            "max-mutating-requests-inflight": str(profile.max_mutating_requests_inflight),
+        }},
+        "etcd": {"local": {"extraArgs": {"quota-backend-bytes": str(profile.etcd_quota_bytes)}}},
+    }
+    if profile.kube_api_qps:
+        client_args = {"kube-api-qps": str(profile.kube_api_qps), "kube-api-burst": str(2 * profile.kube_api_qps)}
+        cluster["controllerManager"] = {"extraArgs": dict(client_args)}
+        cluster["scheduler"] = {"extraArgs": dict(client_args)}
+    cloud_init = with_kubeadm_config(
+        cloud_init,
+        ClusterConfiguration=cluster,
+        KubeletConfiguration={"serializeImagePulls": profile.serialize_image_pulls},
+        KubeProxyConfiguration={"mode": profile.proxy_mode},
+    )
+    return with_node_profile(cloud_init, profile)
+
+
+def with_node_profile(cloud_init, profile):
+    """Prepare any node, head or worker, for ``profile``: load the IPVS modules kube-proxy needs"""
+    if profile.proxy_mode != "ipvs":
+        return cloud_init
+    cloud_init = with_files(cloud_init, {"/etc/modules-load.d/ipvs.conf": ("\n".join(IPVS_MODULES) + "\n", "0644")})
+    return with_commands(cloud_init, [
+        f"modprobe -a {' '.join(IPVS_MODULES)}",
+        "apt-get install -y ipset ipvsadm",
+    ], after="modprobe br_netfilter")
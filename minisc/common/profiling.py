@@ -0,0 +1,130 @@
+import contextvars
+import cProfile
+import functools
+import io
+import os
+import pstats
+import re
+import threading
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+from minisc.common.checkpoints import get_state_dir
+
+PROFILE_ID_PATTERN = re.compile(r"^[0-9A-Za-z-]+$")
+
+# The profile of the request being handled, visible to the threads it runs on
+_current = contextvars.ContextVar("minisc_profile", default=None)
+
+# One profiled request at a time: from Python 3.12 a profiler sees every thread
+# and a second one cannot be enabled while it runs
+_profiling_lock = threading.Lock()
+
+
+def profiling_enabled():
+    """Per-request profiling is off unless the server opts in with MINISC_PROFILING"""
+    return os.environ.get("MINISC_PROFILING", "").lower() in ("1", "true", "yes")
+
+
+def get_profile_dir():
+    return os.path.join(get_state_dir(), "profiles")
+
+
+class RequestProfile:
+    """cProfile data for one request, collected from every thread that worked on it"""
+
+    def __init__(self, name):
+        self.id = f"{datetime.now(timezone.utc).strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}"
+        self.name = name
+        self._profiles = []
+        self._lock = threading.Lock()
+
+    def add(self, profiler):
+        with self._lock:
+            self._profiles.append(profiler)
+
+    def stats(self):
+        with self._lock:
+            profiles = list(self._profiles)
+        if not profiles:
+            return None
+        stats = pstats.Stats(profiles[0])
+        for profiler in profiles[1:]:
+            stats.add(profiler)
+        return stats
+
+    def save(self, directory=None):
+        """Write the merged profile as ``<id>.prof`` (readable by pstats and snakeviz); returns the path"""
+        stats = self.stats()
+        if stats is None:
+            return None
+        directory = directory or get_profile_dir()
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"{self.id}.prof")
+        stats.dump_stats(path)
+        return path
+
+
+@contextmanager
+def profile_thread():
+    """Profile the current thread into the current request's profile, if it is being profiled"""
+    profile = _current.get()
+    if profile is None:
+        yield
+        return
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:
+        # Python 3.12+: the request's profiler already covers this thread
+        yield
+        return
+    try:
+        yield
+    finally:
+        profiler.disable()
+        profile.add(profiler)
+
+
+@contextmanager
+def profile_request(name):
+    """Profile a request on this thread and on every handler that runs under ``profiled``.
+
+    Yields None, without profiling, while another request is being profiled.
+    """
+    if not _profiling_lock.acquire(blocking=False):
+        yield None
+        return
+    profile = RequestProfile(name)
+    token = _current.set(profile)
+    try:
+        with profile_thread():
+            yield profile
+    finally:
+        _current.reset(token)
+        _profiling_lock.release()
+
+
+def profiled(func):
+    """Decorator for sync endpoints: their worker thread joins the request's profile"""
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        with profile_thread():
+            return func(*args, **kwargs)
+    return wrapper
+
+
+def profile_path(profile_id, directory=None):
+    """Path of a stored profile, or None for an unknown or malformed id"""
+    if not PROFILE_ID_PATTERN.match(profile_id):
+        return None
+    path = os.path.join(directory or get_profile_dir(), f"{profile_id}.prof")
+    return path if os.path.exists(path) else None
+
+
+def render_profile(path, sort="cumulative", limit=50):
+    """Return the ``limit`` most expensive functions of a stored profile as text"""
+    out = io.StringIO()
+    pstats.Stats(path, stream=out).strip_dirs().sort_stats(sort).print_stats(limit)
+    return out.getvalue()
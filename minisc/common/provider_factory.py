@@ -7,13 +7,32 @@ from minisc.azure.worker_nodes import WorkerNodesDeployer as AzureWorkerNodesDep
 from minisc.aws.master_node_deployer import MasterNodeDeployer as AwsMasterNodeDeployer
 from minisc.aws.worker_nodes_deployer import WorkerNodesDeployer as AwsWorkerNodesDeployer
 from minisc.aws.kubernetes_deployer import KubernetesDeployer as AwsKubernetesDeployer
+from minisc.aws.stack_deployer import StackDeployer as AwsStackDeployer
+from minisc.aws.pulumi_deployer import PulumiDeployer as AwsPulumiDeployer
+from minisc.simulator.autoscaling import simulated_autoscaling_client
+from minisc.simulator.azure import simulated_azure_clients
+from minisc.simulator.cloud import get_simulated_cloud
+from minisc.simulator.cloudformation import simulated_cloudformation_client
+from minisc.simulator.ec2 import simulated_ec2_client
+from minisc.simulator.elbv2 import simulated_elbv2_client
+from minisc.common.tracing import traced
 
 class CloudProvider(Enum):
     AZURE = "azure"
     AWS = "aws"
+    # Offline simulators running the real deployers against in-memory clouds
+    SIM_AZURE = "sim-azure"
+    SIM_AWS = "sim-aws"
 
 class CloudProviderFactory:
     @staticmethod
+    def base_provider(provider_type: str) -> str:
+        """Return the cloud ("azure" or "aws") a provider type deploys to or simulates"""
+        provider_type = provider_type.lower()
+        return provider_type[len("sim-"):] if provider_type.startswith("sim-") else provider_type
+
+    @staticmethod
+    @traced("CloudProviderFactory.get_provider")
     def get_provider(provider_type: str, config: Dict[str, Any]):
         if provider_type.lower() == CloudProvider.AZURE.value:
             return {
@@ -35,7 +54,40 @@ class CloudProviderFactory:
             return {
                 "kubernetes_deployer": AwsKubernetesDeployer(region),
                 "head_node_deployer": AwsMasterNodeDeployer(region),
-                "worker_nodes_deployer": AwsWorkerNodesDeployer(region)
+                "worker_nodes_deployer": AwsWorkerNodesDeployer(region),
+                "stack_deployer": AwsStackDeployer(region),
+                "pulumi_deployer": AwsPulumiDeployer(region)
+            }
+        elif provider_type.lower() == CloudProvider.SIM_AZURE.value:
+            subscription_id = config.get('subscription_id') or "simulator"
+            clients = simulated_azure_clients(subscription_id)
+            time_scale = get_simulated_cloud('azure', subscription_id).config.time_scale
+            return {
+                "head_node_deployer": AzureHeadNodeDeployer(
+                    "simulator", "simulator", "simulator", subscription_id, clients=clients
+                ),
+                # New warm pool instances are polled every 5 simulated seconds
+                "worker_nodes_deployer": AzureWorkerNodesDeployer(
+                    "simulator", "simulator", "simulator", subscription_id, clients=clients,
+                    poll_interval=5 * time_scale, settle_timeout=600 * time_scale
+                )
+            }
+        elif provider_type.lower() == CloudProvider.SIM_AWS.value:
+            region = config.get('region', 'us-east-1')
+            ec2 = simulated_ec2_client(region)
+            time_scale = get_simulated_cloud('aws', region).config.time_scale
+            return {
+                "kubernetes_deployer": AwsKubernetesDeployer(region, ec2=ec2),
+                "head_node_deployer": AwsMasterNodeDeployer(region, ec2=ec2, elbv2=simulated_elbv2_client(region)),
+                # Worker groups and stack events are polled every 5 simulated seconds
+                "worker_nodes_deployer": AwsWorkerNodesDeployer(
+                    region, ec2=ec2, autoscaling=simulated_autoscaling_client(region),
+                    poll_interval=5 * time_scale, settle_timeout=600 * time_scale
+                ),
+                "stack_deployer": AwsStackDeployer(
+                    region, ec2=ec2, cloudformation=simulated_cloudformation_client(region),
+                    poll_interval=5 * time_scale
+                )
             }
         else:
             raise ValueError(f"Unsupported cloud provider: {provider_type}")
\ No newline at end of file
@@ -0,0 +1,300 @@
+import os
+import random
+import sys
+import threading
+import time
+
+import boto3
+from botocore.config import Config
+from botocore.exceptions import ConnectionError as BotocoreConnectionError
+from azure.core.pipeline.policies import RetryPolicy, SansIOHTTPPolicy
+from minisc.common.metrics import CLOUD_CALL_ERRORS, CLOUD_CALL_SECONDS, CLOUD_RETRIES, CLOUD_THROTTLES
+from minisc.common.tracing import end_span, span, start_span
+
+# Error codes that mean "slow down" rather than "this request is invalid"
+THROTTLING_ERROR_CODES = {
+    'RequestLimitExceeded',
+    'Throttling',
+    'ThrottlingException',
+    'TooManyRequests',
+    'TooManyRequestsException',
+    'RequestThrottled',
+}
+
+# Error codes that mean the zone has no capacity for the instance type; retrying the same
+# request does not help, so launches try another zone instead
+CAPACITY_ERROR_CODES = {
+    'InsufficientInstanceCapacity',
+    'InsufficientHostCapacity',
+}
+
+# Server-side errors worth retrying; botocore's own retries are disabled below
+TRANSIENT_ERROR_CODES = {
+    'InternalError',
+    'InternalFailure',
+    'ServiceUnavailable',
+    'Unavailable',
+    'RequestTimeout',
+}
+
+# HTTP statuses the Azure pipeline's RetryPolicy retries besides 429
+TRANSIENT_STATUS_CODES = {408, 500, 502, 503, 504}
+
+# Default (refill rate per second, burst capacity) per provider. EC2 throttles mutating
+# actions (RunInstances, CreateTags, ...) in a bucket of their own, refilled at 5/s with a
+# burst of 50, apart from the 20/s and 100 of Describe calls; ARM refills 25/s per
+# subscription and region. Override with MINISC_<PROVIDER>_API_RATE/_BURST, e.g.
+# MINISC_AWS_MUTATING_API_RATE.
+DEFAULT_LIMITS = {
+    'aws': (20.0, 100),
+    'aws-mutating': (5.0, 50),
+    'azure': (25.0, 250),
+}
+
+# Prefixes of the AWS actions that only read; the others take from the mutating bucket
+READ_ONLY_ACTION_PREFIXES = ('Describe', 'Get', 'List')
+
+
+class TokenBucket:
+    """Thread-safe token bucket: ``acquire`` blocks until a token is available"""
+
+    def __init__(self, rate, capacity):
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens=1):
+        while True:
+            wait = self._take(tokens)
+            if wait == 0:
+                return
+            time.sleep(wait)
+
+    def try_acquire(self, tokens=1):
+        """Take a token without blocking; returns False when the bucket is empty"""
+        return self._take(tokens) == 0
+
+    def _take(self, tokens):
+        # Returns 0 when the tokens were taken, else how long until they are available
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens >= tokens:
+                self._tokens -= tokens
+                return 0
+            return (tokens - self._tokens) / self.rate
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(provider, account, region):
+    """Return the token bucket shared by every client for an account and region"""
+    key = (provider, account or 'default', region or 'global')
+    with _limiters_lock:
+        if key not in _limiters:
+            rate, capacity = DEFAULT_LIMITS[provider]
+            prefix = f"MINISC_{provider.upper().replace('-', '_')}"
+            rate = float(os.environ.get(f"{prefix}_API_RATE", rate))
+            capacity = int(os.environ.get(f"{prefix}_API_BURST", capacity))
+            _limiters[key] = TokenBucket(rate, capacity)
+        return _limiters[key]
+
+
+def is_throttling_error(error):
+    response = getattr(error, 'response', None)
+    if isinstance(response, dict):
+        return response.get('Error', {}).get('Code') in THROTTLING_ERROR_CODES
+    return getattr(error, 'status_code', None) == 429
+
+
+def is_capacity_error(error):
+    response = getattr(error, 'response', None)
+    return isinstance(response, dict) and response.get('Error', {}).get('Code') in CAPACITY_ERROR_CODES
+
+
+def is_retryable_error(error):
+    if is_throttling_error(error) or isinstance(error, BotocoreConnectionError):
+        return True
+    response = getattr(error, 'response', None)
+    if isinstance(response, dict):
+        return response.get('Error', {}).get('Code') in TRANSIENT_ERROR_CODES
+    return getattr(error, 'status_code', None) in TRANSIENT_STATUS_CODES
+
+
+def retry_after_seconds(error):
+    """Return the delay requested by a throttling response, if it sent one"""
+    response = getattr(error, 'response', None)
+    if isinstance(response, dict):
+        headers = response.get('ResponseMetadata', {}).get('HTTPHeaders', {})
+    else:
+        headers = getattr(response, 'headers', None) or {}
+    value = headers.get('retry-after') or headers.get('Retry-After')
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+def backoff_delay(attempt, base_delay=0.5, max_delay=30.0):
+    # "Full jitter": spreads retries of concurrent deployments across the window
+    return random.uniform(0, min(max_delay, base_delay * (2 ** attempt)))
+
+
+def call_with_retry(func, *args, limiter=None, max_attempts=8, base_delay=0.5, max_delay=30.0,
+                    provider=None, operation=None, **kwargs):
+    """Call ``func`` under the rate limiter, retrying throttled and transient failures with jittered back-off.
+
+    ``provider`` and ``operation`` label the call's duration, retry and
+    throttle metrics and its client span.
+    """
+    operation = operation or getattr(func, '__name__', 'unknown')
+    start = time.perf_counter()
+    try:
+        with span(f"{provider or 'cloud'} {operation}", kind="client",
+                  **{"rpc.system": provider, "rpc.method": operation}) as current:
+            for attempt in range(max_attempts):
+                if current is not None:
+                    current.set_attribute("minisc.attempts", attempt + 1)
+                if limiter is not None:
+                    limiter.acquire()
+                try:
+                    return func(*args, **kwargs)
+                except Exception as e:
+                    throttled = is_throttling_error(e)
+                    if throttled:
+                        CLOUD_THROTTLES.inc(provider=provider, operation=operation)
+                    if not is_retryable_error(e) or attempt == max_attempts - 1:
+                        CLOUD_CALL_ERRORS.inc(provider=provider, operation=operation)
+                        raise
+                    CLOUD_RETRIES.inc(provider=provider, operation=operation, reason='throttled' if throttled else 'transient')
+                    delay = retry_after_seconds(e)
+                    if delay is None:
+                        delay = backoff_delay(attempt, base_delay, max_delay)
+                    print(f"{type(e).__name__} from provider, retrying in {delay:.1f}s (attempt {attempt + 1}/{max_attempts})...")
+                    time.sleep(delay)
+    finally:
+        CLOUD_CALL_SECONDS.observe(time.perf_counter() - start, provider=provider, operation=operation)
+
+
+class ThrottledClient:
+    """Wraps a boto3 client so every API operation goes through ``call_with_retry``.
+
+    With a ``mutating_limiter``, operations that change resources take their
+    tokens from it instead of ``limiter``.
+    """
+
+    def __init__(self, client, limiter, mutating_limiter=None):
+        self._client = client
+        self._limiter = limiter
+        self._mutating_limiter = mutating_limiter
+
+    def __getattr__(self, name):
+        attr = getattr(self._client, name)
+        operation = self._client.meta.method_to_api_mapping.get(name)
+        if operation is None:
+            return attr
+        limiter = self._limiter
+        if self._mutating_limiter is not None and not operation.startswith(READ_ONLY_ACTION_PREFIXES):
+            limiter = self._mutating_limiter
+
+        def call(*args, **kwargs):
+            return call_with_retry(attr, *args, limiter=limiter, provider='aws', operation=operation, **kwargs)
+        return call
+
+
+def throttled_boto3_client(service_name, region):
+    """Create a boto3 client sharing the account/region rate limiter.
+
+    botocore's own retries are disabled so every retried attempt is counted
+    against the shared bucket in one place.
+    """
+    session = boto3.session.Session(region_name=region)
+    credentials = session.get_credentials()
+    account = credentials.access_key if credentials else None
+    client = session.client(service_name, config=Config(retries={'total_max_attempts': 1}))
+    return ThrottledClient(
+        client, get_rate_limiter('aws', account, region),
+        get_rate_limiter('aws-mutating', account, region) if service_name == 'ec2' else None
+    )
+
+
+class RateLimitPolicy(SansIOHTTPPolicy):
+    """Azure pipeline policy taking a token from the shared bucket for every attempt.
+
+    It runs after the retry policy, so it also records each attempt's duration
+    and client span and counts throttled (429) responses.
+    """
+
+    def __init__(self, limiter):
+        super().__init__()
+        self._limiter = limiter
+
+    def on_request(self, request):
+        self._limiter.acquire()
+        request.context['minisc_start'] = time.perf_counter()
+        request.context['minisc_span'] = start_span(
+            f"azure {azure_operation(request.http_request)}",
+            **{"rpc.system": "azure", "http.method": request.http_request.method, "http.url": request.http_request.url}
+        )
+
+    def on_response(self, request, response):
+        operation = azure_operation(request.http_request)
+        status = response.http_response.status_code
+        CLOUD_CALL_SECONDS.observe(
+            time.perf_counter() - request.context.get('minisc_start', time.perf_counter()),
+            provider='azure', operation=operation
+        )
+        if status == 429:
+            CLOUD_THROTTLES.inc(provider='azure', operation=operation)
+        end_span(request.context.pop('minisc_span', None), **{"http.status_code": status})
+
+    def on_exception(self, request):
+        CLOUD_CALL_ERRORS.inc(provider='azure', operation=azure_operation(request.http_request))
+        end_span(request.context.pop('minisc_span', None), error=sys.exc_info()[1])
+
+
+def azure_operation(http_request):
+    """Label an ARM request by method and resource type, e.g. ``PUT virtualMachineScaleSets``"""
+    segments = http_request.url.split('?')[0].rstrip('/').split('/')
+    if 'providers' in segments:
+        # .../providers/<namespace>/<type>/<name>[/<child type>/<child name>]
+        types = segments[segments.index('providers') + 2::2]
+        resource_type = '/'.join(types) or 'providers'
+    elif 'operations' in segments or 'operationResults' in segments:
+        resource_type = 'operations'
+    else:
+        resource_type = 'resourceGroups' if 'resourceGroups' in segments else 'subscriptions'
+    return f"{http_request.method} {resource_type}"
+
+
+class JitteredRetryPolicy(RetryPolicy):
+    """Azure retry policy with full-jitter back-off; Retry-After is still honoured"""
+
+    def get_backoff_time(self, settings):
+        return backoff_delay(len(settings['history']) - 1, settings['backoff'], settings['max_backoff'])
+
+    def increment(self, settings, response=None, error=None):
+        retrying = super().increment(settings, response=response, error=error)
+        if retrying and response is not None:
+            # ``response`` is a PipelineRequest when the attempt failed without one
+            status = getattr(getattr(response, 'http_response', None), 'status_code', None)
+            CLOUD_RETRIES.inc(
+                provider='azure', operation=azure_operation(response.http_request),
+                reason='throttled' if status == 429 else 'transient'
+            )
+        return retrying
+
+
+def azure_client_kwargs(subscription_id, region=None):
+    """Keyword arguments adding the shared rate limiter and jittered retry to an Azure client"""
+    return {
+        'custom_hook_policy': RateLimitPolicy(get_rate_limiter('azure', subscription_id, region)),
+        'retry_policy': JitteredRetryPolicy(
+            retry_total=8, retry_status=8, retry_backoff_factor=0.5, retry_backoff_max=30
+        ),
+    }
@@ -0,0 +1,108 @@
+import functools
+import os
+from contextlib import contextmanager
+
+# OpenTelemetry is optional: without it every span below is a no-op
+try:
+    from opentelemetry import propagate, trace
+    from opentelemetry.trace import SpanKind, Status, StatusCode
+except ImportError:
+    propagate = trace = None
+    SpanKind = Status = StatusCode = None
+
+TRACER_NAME = "minisc"
+
+
+def tracing_available():
+    return trace is not None
+
+
+def configure_tracing(service_name=None):
+    """Install a tracer provider exporting to MINISC_TRACE_EXPORTER.
+
+    ``otlp`` sends spans to the collector at OTEL_EXPORTER_OTLP_ENDPOINT,
+    ``file`` appends them as JSON lines to MINISC_TRACE_FILE and ``console``
+    prints them. Returns False when tracing is off or the SDK is missing.
+    """
+    exporter_name = os.environ.get("MINISC_TRACE_EXPORTER", "").lower()
+    if not exporter_name:
+        return False
+    try:
+        from opentelemetry.sdk.resources import Resource
+        from opentelemetry.sdk.trace import TracerProvider
+        from opentelemetry.sdk.trace.export import BatchSpanProcessor, ConsoleSpanExporter
+    except ImportError:
+        print("Warning: MINISC_TRACE_EXPORTER is set but opentelemetry-sdk is not installed; tracing is off.")
+        return False
+
+    if exporter_name == "otlp":
+        try:
+            from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+        except ImportError:
+            print("Warning: opentelemetry-exporter-otlp-proto-http is not installed; tracing is off.")
+            return False
+        exporter = OTLPSpanExporter()
+    elif exporter_name == "file":
+        out = open(os.environ.get("MINISC_TRACE_FILE", "minisc-traces.jsonl"), "a")
+        exporter = ConsoleSpanExporter(out=out, formatter=lambda span: span.to_json(indent=None) + os.linesep)
+    elif exporter_name == "console":
+        exporter = ConsoleSpanExporter()
+    else:
+        print(f"Warning: unknown MINISC_TRACE_EXPORTER '{exporter_name}'; tracing is off.")
+        return False
+
+    service_name = service_name or os.environ.get("OTEL_SERVICE_NAME", "minisc-api")
+    provider = TracerProvider(resource=Resource.create({"service.name": service_name}))
+    provider.add_span_processor(BatchSpanProcessor(exporter))
+    trace.set_tracer_provider(provider)
+    return True
+
+
+def _attributes(attributes):
+    return {key: value for key, value in attributes.items() if value is not None}
+
+
+@contextmanager
+def span(name, kind="internal", headers=None, **attributes):
+    """Run the block in a child span of the current one; ``headers`` continue a remote (W3C) trace"""
+    if trace is None:
+        yield None
+        return
+    context = propagate.extract(headers) if headers is not None else None
+    with trace.get_tracer(TRACER_NAME).start_as_current_span(
+        name, context=context, kind=getattr(SpanKind, kind.upper()), attributes=_attributes(attributes)
+    ) as current:
+        yield current
+
+
+def traced(name=None, **attributes):
+    """Decorator running the function in a span named after it"""
+    def decorator(func):
+        span_name = name or func.__qualname__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(span_name, **attributes):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def start_span(name, kind="client", **attributes):
+    """Start a span that is ended later with ``end_span``, e.g. across pipeline policy callbacks"""
+    if trace is None:
+        return None
+    return trace.get_tracer(TRACER_NAME).start_span(
+        name, kind=getattr(SpanKind, kind.upper()), attributes=_attributes(attributes)
+    )
+
+
+def end_span(current, error=None, **attributes):
+    if current is None:
+        return
+    for key, value in _attributes(attributes).items():
+        current.set_attribute(key, value)
+    if error is not None:
+        current.record_exception(error)
+        current.set_status(Status(StatusCode.ERROR, str(error)))
+    current.end()
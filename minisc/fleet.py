@@ -0,0 +1,263 @@
+"""Deploy a fleet of clusters across clouds and regions concurrently.
+
+    python -m minisc.fleet fleet.yaml --concurrency 8
+
+The fleet spec (YAML or JSON) lists the clusters; ``defaults`` are merged into
+every entry and ``worker_count`` defaults to 0 (head node only)::
+
+    api_url: http://127.0.0.1:8000
+    defaults:
+      ssh_key_name: ops
+    clusters:
+      - {provider: aws, region: us-east-1, cluster_name: edge-use1, node_size: t3.medium, worker_count: 5}
+      - {provider: azure, region: westeurope, cluster_name: edge-weu, node_size: Standard_D2s_v3,
+         resource_group_name: edge-weu-rg, vnet_name: edge-vnet, subnet_name: edge-subnet,
+         admin_username: azureuser, admin_password: ..., worker_count: 3}
+
+Each cluster deploys its head node and then its workers, independently of the
+others. Requests use idempotency keys derived from the cluster's config, so
+running an unchanged spec again attaches to in-flight or finished deploys
+instead of starting new ones.
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import sys
+import time
+from typing import Any, Dict, List, Optional
+
+import httpx
+import yaml
+from pydantic import BaseModel, ValidationError
+
+from minisc.common.models import ClusterConfig, WorkerNodesConfig
+from minisc.sdk import AsyncMiniscClient, MiniscAPIError
+
+PENDING = "pending"
+HEAD_NODE = "head node"
+WORKERS = "workers"
+DONE = "done"
+FAILED = "failed"
+
+
+class FleetCluster(WorkerNodesConfig):
+    worker_count: int = 0
+
+
+class FleetSpec(BaseModel):
+    api_url: Optional[str] = None
+    concurrency: int = 16
+    defaults: Dict[str, Any] = {}
+    clusters: List[Dict[str, Any]]
+
+    def cluster_configs(self):
+        """Validated cluster configs with the defaults applied"""
+        return [FleetCluster(**{**self.defaults, **cluster}) for cluster in self.clusters]
+
+
+def load_fleet(path):
+    """Read a fleet spec; JSON is valid YAML, so one loader handles both"""
+    with open(path, "r") as f:
+        return FleetSpec(**(yaml.safe_load(f) or {}))
+
+
+def idempotency_key(step, request):
+    """Stable key for one step of a cluster; it changes whenever the request does"""
+    digest = hashlib.sha256(f"{step}:{json.dumps(request, sort_keys=True)}".encode()).hexdigest()
+    return f"fleet-{request['cluster_name']}-{step}-{digest[:16]}"
+
+
+def head_node_request(config):
+    return config.model_dump(mode="json", include=set(ClusterConfig.model_fields), exclude_unset=True)
+
+
+def worker_nodes_request(config, head):
+    request = config.model_dump(mode="json", exclude_unset=True)
+    # Azure workers join the head node deployed just before them
+    if not request.get("master_ip") and head.get("head_node_ip"):
+        request["master_ip"] = head["head_node_ip"]
+    return request
+
+
+class ClusterProgress:
+    def __init__(self, config):
+        self.config = config
+        self.status = PENDING
+        self.started = None
+        self.finished = None
+        self.head_seconds = None
+        self.worker_seconds = None
+        self.error = None
+
+    def elapsed(self):
+        if self.started is None:
+            return None
+        return (self.finished or time.monotonic()) - self.started
+
+
+def _seconds(value):
+    return "-" if value is None else f"{value:.1f}s"
+
+
+class ProgressTable:
+    """Prints one row per cluster, redrawn in place on a terminal and line by line otherwise"""
+
+    def __init__(self, clusters, out=None):
+        self.clusters = clusters
+        self.out = out or sys.stdout
+        self.interactive = self.out.isatty()
+        self._drawn = 0
+
+    def rows(self):
+        rows = [("CLUSTER", "PROVIDER", "REGION", "STATUS", "ELAPSED")]
+        for progress in self.clusters:
+            status = progress.status if progress.status != FAILED else f"failed: {progress.error}"[:60]
+            rows.append((progress.config.cluster_name, progress.config.provider, progress.config.region,
+                         status, _seconds(progress.elapsed())))
+        return rows
+
+    def format(self, rows):
+        widths = [max(len(row[column]) for row in rows) for column in range(len(rows[0]))]
+        return ["  ".join(cell.ljust(width) for cell, width in zip(row, widths)).rstrip() for row in rows]
+
+    def update(self, progress=None):
+        if not self.interactive:
+            if progress is not None:
+                print(f"{progress.config.cluster_name}: {progress.status}"
+                      + (f" ({progress.error})" if progress.error else ""), file=self.out)
+            return
+        lines = self.format(self.rows())
+        if self._drawn:
+            # Move back to the first row and redraw over the previous table
+            self.out.write(f"\033[{self._drawn}F")
+        self.out.write("".join(f"\033[2K{line}\n" for line in lines))
+        self.out.flush()
+        self._drawn = len(lines)
+
+
+async def deploy_cluster(client, progress, table, semaphore):
+    config = progress.config
+    async with semaphore:
+        progress.started = time.monotonic()
+        try:
+            progress.status = HEAD_NODE
+            table.update(progress)
+            request = head_node_request(config)
+            head = await client.deploy_head_node(request, idempotency_key=idempotency_key("head", request))
+            progress.head_seconds = time.monotonic() - progress.started
+
+            if config.worker_count:
+                progress.status = WORKERS
+                table.update(progress)
+                request = worker_nodes_request(config, head)
+                worker_started = time.monotonic()
+                await client.deploy_worker_nodes(request, idempotency_key=idempotency_key("workers", request))
+                progress.worker_seconds = time.monotonic() - worker_started
+            progress.status = DONE
+        except (MiniscAPIError, httpx.HTTPError, TimeoutError) as e:
+            progress.status = FAILED
+            progress.error = str(getattr(e, "detail", None) or e)
+        finally:
+            progress.finished = time.monotonic()
+            table.update(progress)
+
+
+async def run_fleet(configs, client, concurrency=16, out=None):
+    """Deploy every cluster with at most ``concurrency`` in flight; returns their ClusterProgress"""
+    clusters = [ClusterProgress(config) for config in configs]
+    table = ProgressTable(clusters, out)
+    semaphore = asyncio.Semaphore(concurrency)
+    table.update()
+
+    async def refresh():
+        # Keep the elapsed column moving on a terminal
+        while table.interactive:
+            await asyncio.sleep(1)
+            table.update()
+
+    ticker = asyncio.ensure_future(refresh())
+    try:
+        await asyncio.gather(*(deploy_cluster(client, progress, table, semaphore) for progress in clusters))
+    finally:
+        ticker.cancel()
+    return clusters
+
+
+def summary(clusters, wall_seconds):
+    return {
+        "wall_seconds": wall_seconds,
+        "succeeded": sum(progress.status == DONE for progress in clusters),
+        "failed": sum(progress.status == FAILED for progress in clusters),
+        "clusters": [
+            {
+                "cluster_name": progress.config.cluster_name,
+                "provider": progress.config.provider,
+                "region": progress.config.region,
+                "status": progress.status,
+                "head_node_seconds": progress.head_seconds,
+                "worker_nodes_seconds": progress.worker_seconds,
+                "total_seconds": progress.elapsed(),
+                "error": progress.error,
+            }
+            for progress in clusters
+        ],
+    }
+
+
+def print_summary(result, out=None):
+    out = out or sys.stdout
+    rows = [("CLUSTER", "PROVIDER", "REGION", "STATUS", "HEAD", "WORKERS", "TOTAL")]
+    for cluster in result["clusters"]:
+        rows.append((cluster["cluster_name"], cluster["provider"], cluster["region"], cluster["status"],
+                     _seconds(cluster["head_node_seconds"]), _seconds(cluster["worker_nodes_seconds"]),
+                     _seconds(cluster["total_seconds"])))
+    print("\n=== Fleet Summary ===", file=out)
+    for line in ProgressTable([], out).format(rows):
+        print(line, file=out)
+    slowest = max((cluster["total_seconds"] or 0 for cluster in result["clusters"]), default=0)
+    print(f"\n{result['succeeded']} succeeded, {result['failed']} failed in {result['wall_seconds']:.1f}s "
+          f"(slowest cluster {slowest:.1f}s)", file=out)
+    for cluster in result["clusters"]:
+        if cluster["error"]:
+            print(f"  {cluster['cluster_name']}: {cluster['error']}", file=out)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Deploy every cluster in a fleet spec concurrently")
+    parser.add_argument("spec", help="Fleet spec (YAML or JSON)")
+    parser.add_argument("--api-url", help="minisc API URL (default: the spec's api_url, then API_BASE_URL)")
+    parser.add_argument("--concurrency", type=int, help="Clusters deployed at once (default: the spec's, 16)")
+    parser.add_argument("--summary-json", help="Also write the summary to this file")
+    args = parser.parse_args(argv)
+
+    try:
+        spec = load_fleet(args.spec)
+        configs = spec.cluster_configs()
+    except (OSError, yaml.YAMLError, ValidationError) as e:
+        print(f"Invalid fleet spec {args.spec}: {e}", file=sys.stderr)
+        return 2
+    names = [config.cluster_name for config in configs]
+    duplicates = sorted({name for name in names if names.count(name) > 1})
+    if duplicates:
+        print(f"Invalid fleet spec {args.spec}: duplicate cluster names {', '.join(duplicates)}", file=sys.stderr)
+        return 2
+
+    async def deploy():
+        base_url = args.api_url or spec.api_url or os.environ.get("API_BASE_URL")
+        async with AsyncMiniscClient(base_url) as client:
+            return await run_fleet(configs, client, args.concurrency or spec.concurrency)
+
+    started = time.monotonic()
+    clusters = asyncio.run(deploy())
+    result = summary(clusters, time.monotonic() - started)
+    print_summary(result)
+    if args.summary_json:
+        with open(args.summary_json, "w") as f:
+            json.dump(result, f, indent=2)
+    return 1 if result["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,296 @@
+"""Python client for the minisc API.
+
+``MiniscClient`` and ``AsyncMiniscClient`` keep one pooled, kept-alive
+connection set per client. Every deploy is sent with an Idempotency-Key, so
+timed-out or failed connections are retried safely, and a request still
+running elsewhere (HTTP 202) is polled until it finishes.
+
+    with MiniscClient("http://127.0.0.1:8000") as client:
+        client.deploy_head_node(cluster)
+        client.deploy_worker_nodes({**cluster, "worker_count": 10})
+
+    async with AsyncMiniscClient() as client:
+        await asyncio.gather(*(client.deploy_cluster(c, workers=10) for c in clusters))
+"""
+import asyncio
+import os
+import time
+import uuid
+
+import httpx
+from pydantic import BaseModel
+
+from minisc.common.throttling import backoff_delay
+
+DEFAULT_BASE_URL = "http://127.0.0.1:8000"
+
+# Deploys hold the request open for minutes; a read timeout is retried with the
+# same Idempotency-Key and then polled, so it only bounds a single wait
+DEFAULT_TIMEOUT = httpx.Timeout(600.0, connect=10.0, write=30.0, pool=60.0)
+
+# Responses worth retrying; deploys are only retried because they carry an Idempotency-Key
+RETRYABLE_STATUS_CODES = {429, 502, 503, 504}
+
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+
+
+class MiniscAPIError(Exception):
+    """The minisc API answered a request with an error.
+
+    ``detail`` is the response's ``detail`` field; for a deploy that failed
+    while the client was polling, ``operation`` holds the failed operation.
+    """
+
+    def __init__(self, status_code, detail, operation=None):
+        super().__init__(f"HTTP {status_code}: {detail}")
+        self.status_code = status_code
+        self.detail = detail
+        self.operation = operation
+
+
+def _payload(config):
+    if isinstance(config, BaseModel):
+        return config.model_dump(mode="json", exclude_unset=True)
+    return dict(config)
+
+
+def _error(response):
+    try:
+        detail = response.json().get("detail")
+    except ValueError:
+        detail = response.text
+    return MiniscAPIError(response.status_code, detail)
+
+
+class _BaseClient:
+    def __init__(self, base_url=None, timeout=DEFAULT_TIMEOUT, max_retries=3, retry_delay=0.5,
+                 poll_interval=2.0, max_connections=100, headers=None, transport=None):
+        self.base_url = base_url or os.environ.get("API_BASE_URL", DEFAULT_BASE_URL)
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self.poll_interval = poll_interval
+        self._options = {
+            "base_url": self.base_url,
+            "timeout": timeout,
+            "headers": headers,
+            "limits": httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+            "transport": transport,
+        }
+
+    def _should_retry(self, attempt, response=None, error=None):
+        if attempt >= self.max_retries:
+            return False
+        if error is not None:
+            return isinstance(error, httpx.TransportError)
+        return response.status_code in RETRYABLE_STATUS_CODES
+
+    def _retry_delay(self, attempt, response=None):
+        retry_after = response.headers.get("retry-after") if response is not None else None
+        try:
+            return float(retry_after) if retry_after else backoff_delay(attempt, self.retry_delay)
+        except ValueError:
+            return backoff_delay(attempt, self.retry_delay)
+
+    @staticmethod
+    def _deploy_request(config, idempotency_key):
+        key = idempotency_key or str(uuid.uuid4())
+        return key, {"json": _payload(config), "headers": {"Idempotency-Key": key}}
+
+    @staticmethod
+    def _operation_result(operation):
+        """The deploy result of a finished operation; raises MiniscAPIError if it failed"""
+        if operation["status"] == FAILED:
+            # Operations stored before status codes were recorded have none
+            raise MiniscAPIError(operation.get("status_code") or 500, operation.get("error"), operation=operation)
+        return operation["result"]
+
+
+class MiniscClient(_BaseClient):
+    """Synchronous client sharing one pooled ``httpx.Client``; use it as a context manager or ``close()`` it"""
+
+    def __init__(self, base_url=None, **options):
+        super().__init__(base_url, **options)
+        self._http = httpx.Client(**self._options)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self._http.close()
+
+    def request(self, method, path, **kwargs):
+        """Send a request, retrying connection errors and 429/502/503/504 with jittered back-off"""
+        attempt = 0
+        while True:
+            try:
+                response = self._http.request(method, path, **kwargs)
+            except httpx.TransportError as e:
+                if not self._should_retry(attempt, error=e):
+                    raise
+                time.sleep(self._retry_delay(attempt))
+            else:
+                if not self._should_retry(attempt, response=response):
+                    return response
+                time.sleep(self._retry_delay(attempt, response))
+            attempt += 1
+
+    def _json(self, method, path, **kwargs):
+        response = self.request(method, path, **kwargs)
+        if response.status_code >= 400:
+            raise _error(response)
+        return response.json()
+
+    def _deploy(self, path, config, idempotency_key, wait):
+        key, kwargs = self._deploy_request(config, idempotency_key)
+        response = self.request("POST", path, **kwargs)
+        if response.status_code == 202:
+            return self.wait_for_operation(key) if wait else response.json()
+        if response.status_code >= 400:
+            raise _error(response)
+        return response.json()
+
+    def deploy_head_node(self, config, idempotency_key=None, wait=True):
+        """Deploy a head node; ``wait=False`` returns the operation status if it is still running"""
+        return self._deploy("/deploy/head-node", config, idempotency_key, wait)
+
+    def deploy_worker_nodes(self, config, idempotency_key=None, wait=True):
+        return self._deploy("/deploy/worker-nodes", config, idempotency_key, wait)
+
+    def deploy_cluster(self, config, workers, **worker_options):
+        """Deploy a head node and then ``workers`` worker nodes; returns both responses"""
+        head = self.deploy_head_node(config)
+        return head, self.deploy_worker_nodes({**_payload(config), "worker_count": workers, **worker_options})
+
+    def cluster_info(self, config):
+        return self._json("POST", "/cluster-info", json=_payload(config))
+
+    def get_operation(self, idempotency_key):
+        return self._json("GET", f"/operations/{idempotency_key}")
+
+    def watch_operation(self, idempotency_key, poll_interval=None):
+        """Yield the operation each time it changes, until it succeeds or fails"""
+        last = None
+        while True:
+            operation = self.get_operation(idempotency_key)
+            if (operation["status"], operation["updated_at"]) != last:
+                last = (operation["status"], operation["updated_at"])
+                yield operation
+            if operation["status"] in (SUCCEEDED, FAILED):
+                return
+            time.sleep(poll_interval or self.poll_interval)
+
+    def wait_for_operation(self, idempotency_key, timeout=None, poll_interval=None):
+        """Poll an operation until it finishes and return its result; raises MiniscAPIError if it failed"""
+        deadline = time.monotonic() + timeout if timeout else None
+        while True:
+            operation = self.get_operation(idempotency_key)
+            if operation["status"] in (SUCCEEDED, FAILED):
+                return self._operation_result(operation)
+            if deadline and time.monotonic() > deadline:
+                raise TimeoutError(f"Operation '{idempotency_key}' still {operation['status']} after {timeout}s")
+            time.sleep(poll_interval or self.poll_interval)
+
+    def metrics(self):
+        response = self.request("GET", "/metrics")
+        if response.status_code >= 400:
+            raise _error(response)
+        return response.text
+
+
+class AsyncMiniscClient(_BaseClient):
+    """Asynchronous client sharing one pooled ``httpx.AsyncClient``, for driving many clusters concurrently"""
+
+    def __init__(self, base_url=None, **options):
+        super().__init__(base_url, **options)
+        self._http = httpx.AsyncClient(**self._options)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
+
+    async def aclose(self):
+        await self._http.aclose()
+
+    async def request(self, method, path, **kwargs):
+        """Send a request, retrying connection errors and 429/502/503/504 with jittered back-off"""
+        attempt = 0
+        while True:
+            try:
+                response = await self._http.request(method, path, **kwargs)
+            except httpx.TransportError as e:
+                if not self._should_retry(attempt, error=e):
+                    raise
+                await asyncio.sleep(self._retry_delay(attempt))
+            else:
+                if not self._should_retry(attempt, response=response):
+                    return response
+                await asyncio.sleep(self._retry_delay(attempt, response))
+            attempt += 1
+
+    async def _json(self, method, path, **kwargs):
+        response = await self.request(method, path, **kwargs)
+        if response.status_code >= 400:
+            raise _error(response)
+        return response.json()
+
+    async def _deploy(self, path, config, idempotency_key, wait):
+        key, kwargs = self._deploy_request(config, idempotency_key)
+        response = await self.request("POST", path, **kwargs)
+        if response.status_code == 202:
+            return await self.wait_for_operation(key) if wait else response.json()
+        if response.status_code >= 400:
+            raise _error(response)
+        return response.json()
+
+    async def deploy_head_node(self, config, idempotency_key=None, wait=True):
+        """Deploy a head node; ``wait=False`` returns the operation status if it is still running"""
+        return await self._deploy("/deploy/head-node", config, idempotency_key, wait)
+
+    async def deploy_worker_nodes(self, config, idempotency_key=None, wait=True):
+        return await self._deploy("/deploy/worker-nodes", config, idempotency_key, wait)
+
+    async def deploy_cluster(self, config, workers, **worker_options):
+        """Deploy a head node and then ``workers`` worker nodes; returns both responses"""
+        head = await self.deploy_head_node(config)
+        return head, await self.deploy_worker_nodes({**_payload(config), "worker_count": workers, **worker_options})
+
+    async def cluster_info(self, config):
+        return await self._json("POST", "/cluster-info", json=_payload(config))
+
+    async def get_operation(self, idempotency_key):
+        return await self._json("GET", f"/operations/{idempotency_key}")
+
+    async def watch_operation(self, idempotency_key, poll_interval=None):
+        """Yield the operation each time it changes, until it succeeds or fails"""
+        last = None
+        while True:
+            operation = await self.get_operation(idempotency_key)
+            if (operation["status"], operation["updated_at"]) != last:
+                last = (operation["status"], operation["updated_at"])
+                yield operation
+            if operation["status"] in (SUCCEEDED, FAILED):
+                return
+            await asyncio.sleep(poll_interval or self.poll_interval)
+
+    async def wait_for_operation(self, idempotency_key, timeout=None, poll_interval=None):
+        """Poll an operation until it finishes and return its result; raises MiniscAPIError if it failed"""
+        deadline = time.monotonic() + timeout if timeout else None
+        while True:
+            operation = await self.get_operation(idempotency_key)
+            if operation["status"] in (SUCCEEDED, FAILED):
+                return self._operation_result(operation)
+            if deadline and time.monotonic() > deadline:
+                raise TimeoutError(f"Operation '{idempotency_key}' still {operation['status']} after {timeout}s")
+            await asyncio.sleep(poll_interval or self.poll_interval)
+
+    async def metrics(self):
+        response = await self.request("GET", "/metrics")
+        if response.status_code >= 400:
+            raise _error(response)
+        return response.text
@@ -0,0 +1,169 @@
+import base64
+import json
+import re
+
+# One token of a template expression: a string literal, an integer, a name or punctuation
+TOKEN = re.compile(r"\s*(?:(?P<string>'(?:[^']|'')*')|(?P<number>-?\d+)|(?P<name>[A-Za-z_]\w*)|(?P<punct>[(),.\[\]]))")
+
+
+def _concat(*values):
+    if values and isinstance(values[0], list):
+        return [item for value in values for item in value]
+    return "".join(str(value) for value in values)
+
+
+FUNCTIONS = {
+    "concat": _concat,
+    "base64": lambda value: base64.b64encode(value.encode()).decode(),
+    "json": json.loads,
+    "string": str,
+    "int": int,
+    "true": lambda: True,
+    "false": lambda: False,
+    "not": lambda value: not value,
+    "and": lambda *values: all(values),
+    "or": lambda *values: any(values),
+    "if": lambda condition, then, otherwise: then if condition else otherwise,
+    "equals": lambda a, b: a == b,
+    "greater": lambda a, b: a > b,
+    "greaterOrEquals": lambda a, b: a >= b,
+    "less": lambda a, b: a < b,
+    "lessOrEquals": lambda a, b: a <= b,
+    "createObject": lambda *pairs: dict(zip(pairs[::2], pairs[1::2])),
+}
+
+
+class TemplateEvaluator:
+    """Evaluates the ``[...]`` expressions of an ARM template.
+
+    Covers the functions minisc's templates use; ``resource_id(type, *names)``
+    and ``reference(resource_id)`` are supplied by the simulated deployment.
+    """
+
+    def __init__(self, template, parameters, resource_id, reference):
+        self.template = template
+        self.functions = dict(FUNCTIONS, resourceId=resource_id, reference=reference,
+                              parameters=self._parameter, variables=self._variable)
+        self._parameters = {name: _parameter_value(value) for name, value in (parameters or {}).items()}
+        self._variables = {}
+
+    def evaluate(self, value):
+        if isinstance(value, dict):
+            return {key: self.evaluate(item) for key, item in value.items()}
+        if isinstance(value, list):
+            return [self.evaluate(item) for item in value]
+        if isinstance(value, str) and value.startswith("[") and value.endswith("]"):
+            if value.startswith("[["):
+                # "[[" escapes a literal string starting with "["
+                return value[1:]
+            return self.expression(value[1:-1])
+        return value
+
+    def expression(self, text):
+        tokens = [(kind, token) for match in TOKEN.finditer(text.strip())
+                  for kind, token in match.groupdict().items() if token is not None]
+        value, position = self._parse(tokens, 0)
+        if position != len(tokens):
+            raise ValueError(f"Unexpected '{tokens[position][1]}' in template expression '{text}'")
+        return value
+
+    def resources(self):
+        """The template's resources whose condition holds, with every expression evaluated"""
+        for resource in self.template.get("resources", []):
+            if self.evaluate(resource.get("condition", True)):
+                yield self.evaluate({key: value for key, value in resource.items() if key != "condition"})
+
+    def outputs(self):
+        return {
+            name: {"type": output.get("type"), "value": self.evaluate(output.get("value"))}
+            for name, output in self.template.get("outputs", {}).items()
+            if self.evaluate(output.get("condition", True))
+        }
+
+    def _parameter(self, name):
+        if name not in self._parameters:
+            definition = self.template.get("parameters", {}).get(name)
+            if definition is None or "defaultValue" not in definition:
+                raise ValueError(f"The template parameter '{name}' has no value.")
+            self._parameters[name] = self.evaluate(definition["defaultValue"])
+        return self._parameters[name]
+
+    def _variable(self, name):
+        if name not in self._variables:
+            self._variables[name] = self.evaluate(self.template.get("variables", {})[name])
+        return self._variables[name]
+
+    def _parse(self, tokens, position):
+        kind, token = tokens[position]
+        position += 1
+        if kind == "string":
+            value = token[1:-1].replace("''", "'")
+        elif kind == "number":
+            value = int(token)
+        elif kind == "name" and position < len(tokens) and tokens[position][1] == "(":
+            args, position = self._arguments(tokens, position + 1)
+            if token not in self.functions:
+                raise ValueError(f"Unsupported template function '{token}'")
+            value = self.functions[token](*args)
+        else:
+            raise ValueError(f"Unexpected '{token}' in template expression")
+
+        # Property and index access: reference(...).ipAddress, parameters('list')[0]
+        while position < len(tokens) and tokens[position][1] in (".", "["):
+            if tokens[position][1] == ".":
+                value = _property(value, tokens[position + 1][1])
+                position += 2
+            else:
+                index, position = self._parse(tokens, position + 1)
+                value = value[index]
+                position += 1  # "]"
+        return value, position
+
+    def _arguments(self, tokens, position):
+        args = []
+        while tokens[position][1] != ")":
+            value, position = self._parse(tokens, position)
+            args.append(value)
+            if tokens[position][1] == ",":
+                position += 1
+        return args, position + 1
+
+
+def _parameter_value(parameter):
+    # Deployment parameters are given as {"value": ...}
+    return parameter.get("value") if isinstance(parameter, dict) else parameter
+
+
+def _property(value, name):
+    return value[name] if isinstance(value, dict) else getattr(value, name)
+
+
+def camel_to_snake(name):
+    # publicIPAddress -> public_ip_address
+    name = re.sub(r"([A-Z]+)([A-Z][a-z])", r"\1_\2", name)
+    return re.sub(r"([a-z0-9])([A-Z])", r"\1_\2", name).lower()
+
+
+def snake_to_camel(name):
+    head, *rest = name.split("_")
+    return head + "".join(part.capitalize() for part in rest)
+
+
+def resource_body(resource):
+    """An evaluated template resource as the snake_case request body the SDK would send.
+
+    ``properties`` are flattened into the resource, as in the SDK's models.
+    """
+    def convert(value):
+        if isinstance(value, dict):
+            flattened = {}
+            for key, item in value.items():
+                if key == "properties" and isinstance(item, dict):
+                    flattened.update(convert(item))
+                else:
+                    flattened[camel_to_snake(key)] = convert(item)
+            return flattened
+        if isinstance(value, list):
+            return [convert(item) for item in value]
+        return value
+    return convert(resource)
@@ -0,0 +1,405 @@
+import base64
+import time
+from types import SimpleNamespace
+
+from minisc.common.throttling import ThrottledClient, get_rate_limiter
+from minisc.simulator.cloud import THROTTLED, TRANSIENT, FAILED, get_simulated_cloud
+from minisc.simulator.ec2 import SimulatedEC2Client, client_error
+
+# Methods of the fake client and the Auto Scaling API operation each one emulates
+API_OPERATIONS = {
+    'create_auto_scaling_group': 'CreateAutoScalingGroup',
+    'update_auto_scaling_group': 'UpdateAutoScalingGroup',
+    'set_desired_capacity': 'SetDesiredCapacity',
+    'describe_auto_scaling_groups': 'DescribeAutoScalingGroups',
+    'complete_lifecycle_action': 'CompleteLifecycleAction',
+    'delete_auto_scaling_group': 'DeleteAutoScalingGroup',
+    'put_warm_pool': 'PutWarmPool',
+    'describe_warm_pool': 'DescribeWarmPool',
+    'delete_warm_pool': 'DeleteWarmPool',
+}
+
+FAULT_ERRORS = {
+    THROTTLED: ('Throttling', 'Rate exceeded', 400),
+    TRANSIENT: ('InternalFailure', 'An internal error has occurred.', 500),
+    FAILED: ('SimulatedFailure', 'The simulator failed this request.', 400),
+}
+
+# Lifecycle transition of each wait state
+LAUNCHING = 'autoscaling:EC2_INSTANCE_LAUNCHING'
+TERMINATING = 'autoscaling:EC2_INSTANCE_TERMINATING'
+
+
+class SimulatedAutoScalingClient:
+    """In-memory stand-in for a boto3 Auto Scaling client, covering the calls the AWS deployers make.
+
+    A group launches instances from its launch template until it reaches its
+    desired capacity, splitting them between on-demand and spot like its
+    instances distribution. With a launching lifecycle hook new instances wait
+    in ``Pending:Wait``, and with a terminating hook removed instances wait in
+    ``Terminating:Wait``, until the action is completed or its heartbeat times
+    out. Members that are terminated from outside the group, e.g. reclaimed
+    spot instances, are replaced on the next call.
+
+    A group with a warm pool keeps that many extra instances launched and,
+    once booted, stopped (``Warmed:Stopped``). Scale-outs start these for
+    ``resume_time`` before launching new instances, and the pool is refilled.
+    """
+
+    def __init__(self, cloud, region='us-east-1'):
+        self.cloud = cloud
+        self.region = region
+        self.ec2 = SimulatedEC2Client(cloud, region)
+        self.meta = SimpleNamespace(region_name=region, method_to_api_mapping=dict(API_OPERATIONS))
+
+    # API
+
+    def create_auto_scaling_group(self, AutoScalingGroupName, MinSize, MaxSize, DesiredCapacity=None,
+                                  LifecycleHookSpecificationList=None, Tags=None, **properties):
+        def create():
+            if self._find_group(AutoScalingGroupName) is not None:
+                raise client_error('AlreadyExists', f"AutoScalingGroup by this name already exists - A group with "
+                                   f"the name {AutoScalingGroupName} already exists", 'CreateAutoScalingGroup')
+            group = self.new_group(AutoScalingGroupName, LifecycleHooks=list(LifecycleHookSpecificationList or []),
+                                   Tags=list(Tags or []))
+            self.configure(group, {
+                'MinSize': MinSize, 'MaxSize': MaxSize,
+                'DesiredCapacity': MinSize if DesiredCapacity is None else DesiredCapacity, **properties
+            }, time.monotonic())
+            return {}
+        return self._mutate('create_auto_scaling_group', create)
+
+    def update_auto_scaling_group(self, AutoScalingGroupName, **properties):
+        def update():
+            group = self._get_group(AutoScalingGroupName, 'update_auto_scaling_group')
+            self._settle(group)
+            self.configure(group, {**group['Properties'], **properties}, time.monotonic())
+            return {}
+        return self._mutate('update_auto_scaling_group', update)
+
+    def set_desired_capacity(self, AutoScalingGroupName, DesiredCapacity, HonorCooldown=False):
+        def scale():
+            group = self._get_group(AutoScalingGroupName, 'set_desired_capacity')
+            if not group['MinSize'] <= DesiredCapacity <= group['MaxSize']:
+                raise client_error('ValidationError', f"New SetDesiredCapacity value {DesiredCapacity} is outside "
+                                   f"of the limits [{group['MinSize']}, {group['MaxSize']}]", 'SetDesiredCapacity')
+            self._settle(group)
+            self.configure(group, {**group['Properties'], 'DesiredCapacity': DesiredCapacity}, time.monotonic())
+            return {}
+        return self._mutate('set_desired_capacity', scale)
+
+    def describe_auto_scaling_groups(self, AutoScalingGroupNames=None):
+        self._request('describe_auto_scaling_groups')
+        with self.cloud.lock:
+            groups = [group for group in self._groups()
+                      if AutoScalingGroupNames is None or group['AutoScalingGroupName'] in AutoScalingGroupNames]
+            for group in groups:
+                self._settle(group)
+            return {'AutoScalingGroups': [self._group_view(group) for group in groups]}
+
+    def complete_lifecycle_action(self, LifecycleHookName, AutoScalingGroupName, LifecycleActionResult,
+                                  InstanceId=None, **kwargs):
+        def complete():
+            group = self._get_group(AutoScalingGroupName, 'complete_lifecycle_action')
+            self._settle(group)
+            hook = self._hook(group, name=LifecycleHookName)
+            state = group['LifecycleStates'].get(InstanceId)
+            waiting = {
+                LAUNCHING: ('Pending:Wait', 'Warmed:Pending:Wait'), TERMINATING: ('Terminating:Wait',)
+            }.get((hook or {}).get('LifecycleTransition'), ())
+            if state is None or state['State'] not in waiting:
+                raise client_error('ValidationError', f"No active Lifecycle Action found with instance ID {InstanceId}",
+                                   'CompleteLifecycleAction')
+            self._finish_action(group, InstanceId, LifecycleActionResult)
+            self._scale(group, time.monotonic())
+            return {}
+        return self._mutate('complete_lifecycle_action', complete)
+
+    def delete_auto_scaling_group(self, AutoScalingGroupName, ForceDelete=False):
+        def delete():
+            self.delete_group(self._get_group(AutoScalingGroupName, 'delete_auto_scaling_group'))
+            return {}
+        return self._mutate('delete_auto_scaling_group', delete)
+
+    def put_warm_pool(self, AutoScalingGroupName, MinSize=0, MaxGroupPreparedCapacity=None, PoolState='Stopped',
+                      **kwargs):
+        def put():
+            group = self._get_group(AutoScalingGroupName, 'put_warm_pool')
+            if 'MixedInstancesPolicy' in group['Properties']:
+                raise client_error('ValidationError', "You can't add a warm pool to an Auto Scaling group that has a "
+                                   "mixed instances policy.", 'PutWarmPool')
+            self._settle(group)
+            group['WarmPool'] = {'MinSize': MinSize, 'PoolState': PoolState}
+            if MaxGroupPreparedCapacity is not None:
+                group['WarmPool']['MaxGroupPreparedCapacity'] = MaxGroupPreparedCapacity
+            self._scale(group, time.monotonic())
+            return {}
+        return self._mutate('put_warm_pool', put)
+
+    def describe_warm_pool(self, AutoScalingGroupName, **kwargs):
+        self._request('describe_warm_pool')
+        with self.cloud.lock:
+            group = self._get_group(AutoScalingGroupName, 'describe_warm_pool')
+            self._settle(group)
+            response = {'Instances': [self._instance_view(group, instance_id) for instance_id in group['WarmInstances']]}
+            if group['WarmPool'] is not None:
+                response['WarmPoolConfiguration'] = dict(group['WarmPool'])
+            return response
+
+    def delete_warm_pool(self, AutoScalingGroupName, ForceDelete=False):
+        def delete():
+            group = self._get_group(AutoScalingGroupName, 'delete_warm_pool')
+            group['WarmPool'] = None
+            self._scale(group, time.monotonic())
+            return {}
+        return self._mutate('delete_warm_pool', delete)
+
+    # Groups, also used by the simulated CloudFormation stacks
+
+    def new_group(self, name, **attributes):
+        group = {
+            'AutoScalingGroupName': name, 'Instances': [], 'LifecycleStates': {}, 'LifecycleHooks': [],
+            'Tags': [], 'Properties': {}, 'WarmPool': None, 'WarmInstances': [], **attributes
+        }
+        self.cloud.resources[('autoscaling', self.region, 'asg', name)] = group
+        return group
+
+    def configure(self, group, properties, started):
+        """Apply the group's settings and launch or remove instances to match its desired capacity.
+
+        Returns how many instances could not be launched for lack of capacity.
+        """
+        policy = properties.get('MixedInstancesPolicy') or {}
+        launch_template = policy.get('LaunchTemplate') or {}
+        distribution = policy.get('InstancesDistribution') or {}
+        subnets = properties.get('VPCZoneIdentifier') or []
+        group.update({
+            'Properties': dict(properties),
+            'MinSize': int(properties['MinSize']),
+            'MaxSize': int(properties['MaxSize']),
+            'DesiredCapacity': int(properties.get('DesiredCapacity', properties['MinSize'])),
+            'VPCZoneIdentifier': subnets.split(',') if isinstance(subnets, str) else list(subnets),
+            'LaunchTemplate': launch_template.get('LaunchTemplateSpecification') or properties['LaunchTemplate'],
+            'InstanceTypes': [override['InstanceType'] for override in launch_template.get('Overrides') or []
+                              if override.get('InstanceType')],
+            'OnDemandBaseCapacity': int(distribution.get('OnDemandBaseCapacity', 0)),
+            'OnDemandPercentageAboveBaseCapacity': int(distribution.get('OnDemandPercentageAboveBaseCapacity', 100)),
+        })
+        return self._scale(group, started)
+
+    def delete_group(self, group):
+        self.cloud.resources.pop(('autoscaling', self.region, 'asg', group['AutoScalingGroupName']), None)
+        self._terminate(group, list(group['LifecycleStates']))
+
+    # Helpers
+
+    def _scale(self, group, started):
+        missing = self._scale_members(group, started)
+        self._fill_warm_pool(group, started)
+        return missing
+
+    def _scale_members(self, group, started):
+        members = group['Instances']
+        if group['DesiredCapacity'] < len(members):
+            # The newest instances are removed first
+            removed = members[group['DesiredCapacity']:]
+            group['Instances'] = members[:group['DesiredCapacity']]
+            hook = self._hook(group, transition=TERMINATING)
+            if hook is None:
+                self._terminate(group, removed)
+            else:
+                for instance_id in removed:
+                    group['LifecycleStates'][instance_id] = self._wait_state('Terminating:Wait', hook)
+            return 0
+
+        hook = self._hook(group, transition=LAUNCHING)
+        # Prepared warm instances are started before any new ones are launched
+        prepared = [instance_id for instance_id in group['WarmInstances']
+                    if group['LifecycleStates'][instance_id]['State'] == 'Warmed:Stopped']
+        for instance_id in prepared[:group['DesiredCapacity'] - len(members)]:
+            group['WarmInstances'].remove(instance_id)
+            self.ec2._get('instance', instance_id, None).update({
+                'State': 'pending', 'ReadyAt': started + self.cloud.config.resume_time * self.cloud.config.time_scale
+            })
+            group['Instances'].append(instance_id)
+            group['LifecycleStates'][instance_id] = \
+                self._wait_state('Pending:Wait', hook) if hook is not None else {'State': 'Pending'}
+
+        wanted = group['DesiredCapacity'] - len(group['Instances'])
+        if wanted == 0:
+            return 0
+        granted = self.cloud.reserve_instances(wanted)
+        for _ in range(granted):
+            index = len(group['Instances'])
+            # The instance is on-demand if it raises the group's on-demand count
+            on_demand = _on_demand_count(group, index + 1) > _on_demand_count(group, index)
+            instance_id = self._launch(group, index, on_demand, started)
+            group['Instances'].append(instance_id)
+            group['LifecycleStates'][instance_id] = \
+                self._wait_state('Pending:Wait', hook) if hook is not None else {'State': 'Pending'}
+        return max(0, wanted - granted)
+
+    def _fill_warm_pool(self, group, started):
+        """Launch or terminate warm instances until the pool has its configured size"""
+        pool = group['WarmPool']
+        size = 0
+        if pool is not None:
+            # Without a prepared capacity, the pool holds what the group could still grow by
+            prepared = pool.get('MaxGroupPreparedCapacity', -1)
+            size = max(pool['MinSize'], (group['MaxSize'] if prepared < 0 else prepared) - group['DesiredCapacity'])
+        warm = group['WarmInstances']
+        if len(warm) > size:
+            group['WarmInstances'] = warm[:size]
+            self._terminate(group, warm[size:])
+            return
+
+        hook = self._hook(group, transition=LAUNCHING)
+        for _ in range(self.cloud.reserve_instances(size - len(warm))):
+            instance_id = self._launch(group, len(group['Instances']) + len(warm), True, started)
+            warm.append(instance_id)
+            group['LifecycleStates'][instance_id] = \
+                self._wait_state('Warmed:Pending:Wait', hook) if hook is not None else {'State': 'Warmed:Pending'}
+
+    def _launch(self, group, index, on_demand, started):
+        template = self.ec2._get('lt', group['LaunchTemplate']['LaunchTemplateId'], None)['LaunchTemplateData']
+        subnets = group['VPCZoneIdentifier']
+        instance = self.ec2._launch_instance(
+            template.get('ImageId'), (group['InstanceTypes'] or [template.get('InstanceType')])[0],
+            subnets[index % len(subnets)] if subnets else None, 'on-demand' if on_demand else 'spot',
+            template.get('IamInstanceProfile')
+        )
+        self.ec2._get('instance', instance['InstanceId'], None)['ReadyAt'] = \
+            started + self.cloud.config.boot_time * self.cloud.config.time_scale
+        return instance['InstanceId']
+
+    def _settle(self, group):
+        """Apply the lifecycle transitions due by now, then replace lost members"""
+        now = time.monotonic()
+        for instance_id, state in list(group['LifecycleStates'].items()):
+            instance = self.ec2._get('instance', instance_id, None)
+            if instance['State'] == 'terminated':
+                # Terminated from outside the group, e.g. a reclaimed spot instance
+                group['LifecycleStates'].pop(instance_id)
+                for members in (group['Instances'], group['WarmInstances']):
+                    if instance_id in members:
+                        members.remove(instance_id)
+            elif state['State'].endswith(':Wait') and now >= state['TimeoutAt']:
+                self._finish_action(group, instance_id, state['DefaultResult'])
+            if instance_id in group['WarmInstances'] and instance['State'] == 'pending' and now >= instance['ReadyAt']:
+                # Booted warm instances are stopped, by their user data or else by the group
+                instance['State'] = 'stopped'
+            state = group['LifecycleStates'].get(instance_id, {}).get('State')
+            if state == 'Pending:Wait' and now >= instance['ReadyAt'] and self._completes_launch_action(group):
+                # The booted worker has joined and completes its launch action itself
+                self._finish_action(group, instance_id, 'CONTINUE')
+                state = 'Pending'
+            if state == 'Pending' and now >= instance['ReadyAt']:
+                group['LifecycleStates'][instance_id] = {'State': 'InService'}
+            elif state == 'Warmed:Pending' and instance['State'] == 'stopped':
+                group['LifecycleStates'][instance_id] = {'State': 'Warmed:Stopped'}
+        self._scale(group, now)
+
+    def _finish_action(self, group, instance_id, result):
+        state = group['LifecycleStates'][instance_id]
+        if state['State'] == 'Terminating:Wait' or result == 'ABANDON':
+            # An abandoned launch is terminated and later replaced
+            for members in (group['Instances'], group['WarmInstances']):
+                if instance_id in members:
+                    members.remove(instance_id)
+            self._terminate(group, [instance_id])
+        elif state['State'] == 'Warmed:Pending:Wait':
+            group['LifecycleStates'][instance_id] = {'State': 'Warmed:Pending'}
+        else:
+            group['LifecycleStates'][instance_id] = {'State': 'Pending'}
+
+    def _completes_launch_action(self, group):
+        # Whether the group's user data has its workers complete their launch lifecycle action
+        hook = self._hook(group, transition=LAUNCHING)
+        template = self.ec2._get('lt', group['LaunchTemplate']['LaunchTemplateId'], None)['LaunchTemplateData']
+        user_data = base64.b64decode(template.get('UserData') or '').decode()
+        return hook is not None and "complete-lifecycle-action" in user_data and hook['LifecycleHookName'] in user_data
+
+    def _terminate(self, group, instance_ids):
+        for instance_id in instance_ids:
+            group['LifecycleStates'].pop(instance_id, None)
+            instance = self.cloud.resources.get(('ec2', self.region, 'instance', instance_id))
+            if instance is not None and instance['State'] != 'terminated':
+                instance['State'] = 'terminated'
+                self.cloud.release_instances(1)
+
+    def _wait_state(self, state, hook):
+        timeout = int(hook.get('HeartbeatTimeout', 3600)) * self.cloud.config.time_scale
+        return {'State': state, 'TimeoutAt': time.monotonic() + timeout,
+                'DefaultResult': hook.get('DefaultResult', 'ABANDON')}
+
+    def _hook(self, group, name=None, transition=None):
+        for hook in group['LifecycleHooks']:
+            if hook['LifecycleHookName'] == name or hook['LifecycleTransition'] == transition:
+                return hook
+        return None
+
+    def _instance_view(self, group, instance_id):
+        return {
+            'InstanceId': instance_id,
+            'InstanceType': self.ec2._get('instance', instance_id, None)['InstanceType'],
+            'LifecycleState': group['LifecycleStates'][instance_id]['State'],
+            'HealthStatus': 'Healthy',
+            'LaunchTemplate': dict(group['LaunchTemplate']),
+        }
+
+    def _group_view(self, group):
+        # Warm pool instances are listed by describe_warm_pool instead
+        instances = [self._instance_view(group, instance_id) for instance_id in group['LifecycleStates']
+                     if instance_id not in group['WarmInstances']]
+        return {
+            'AutoScalingGroupName': group['AutoScalingGroupName'],
+            'MinSize': group['MinSize'],
+            'MaxSize': group['MaxSize'],
+            'DesiredCapacity': group['DesiredCapacity'],
+            'VPCZoneIdentifier': ','.join(group['VPCZoneIdentifier']),
+            'Instances': instances,
+            'Tags': list(group['Tags']),
+        }
+
+    def _groups(self):
+        return [
+            resource for (service, region, kind, _), resource in list(self.cloud.resources.items())
+            if service == 'autoscaling' and region == self.region and kind == 'asg'
+        ]
+
+    def _find_group(self, name):
+        return self.cloud.resources.get(('autoscaling', self.region, 'asg', name))
+
+    def _get_group(self, name, method):
+        group = self._find_group(name)
+        if group is None:
+            raise client_error('ValidationError', f"AutoScalingGroup name not found - {name}", API_OPERATIONS[method])
+        return group
+
+    def _request(self, method, mutating=False):
+        fault = self.cloud.request(f"autoscaling:{API_OPERATIONS[method]}", mutating)
+        if fault == TRANSIENT and mutating:
+            return fault
+        if fault is not None:
+            raise client_error(*FAULT_ERRORS[fault][:2], API_OPERATIONS[method], FAULT_ERRORS[fault][2])
+        return None
+
+    def _mutate(self, method, apply):
+        fault = self._request(method, mutating=True)
+        with self.cloud.lock:
+            response = apply()
+        if fault is not None:
+            # The change was applied but the caller never sees the response
+            raise client_error(*FAULT_ERRORS[fault][:2], API_OPERATIONS[method], FAULT_ERRORS[fault][2])
+        return response
+
+
+def _on_demand_count(group, capacity):
+    base = min(capacity, group['OnDemandBaseCapacity'])
+    return base + (capacity - base) * group['OnDemandPercentageAboveBaseCapacity'] // 100
+
+
+def simulated_autoscaling_client(region='us-east-1'):
+    """Return a simulated Auto Scaling client behind the same rate limiter and retry as a real one"""
+    cloud = get_simulated_cloud('aws', region)
+    return ThrottledClient(SimulatedAutoScalingClient(cloud, region), get_rate_limiter('aws', 'simulator', region))
@@ -0,0 +1,526 @@
+import base64
+import time
+import uuid
+from types import SimpleNamespace
+
+import yaml
+from azure.core.exceptions import HttpResponseError, ResourceNotFoundError, ResourceNotModifiedError
+
+from minisc.common.cloud_init import POWER_OFF
+from minisc.common.throttling import call_with_retry, get_rate_limiter
+from minisc.simulator.arm import TemplateEvaluator, resource_body, snake_to_camel
+from minisc.simulator.cloud import THROTTLED, TRANSIENT, FAILED, get_simulated_cloud
+
+FAULT_ERRORS = {
+    THROTTLED: ('TooManyRequests', 'The request is being throttled.', 429),
+    TRANSIENT: ('InternalServerError', 'The server encountered an internal error.', 503),
+    FAILED: ('SimulatedFailure', 'The simulator failed this request.', 400),
+}
+
+
+def http_error(code, message, status_code, error_class=HttpResponseError):
+    error = error_class(message=f"({code}) {message}")
+    error.status_code = status_code
+    error.error_code = code
+    return error
+
+
+def _field(obj, *path):
+    # Request bodies are either dicts or SDK models
+    for name in path:
+        if obj is None:
+            return None
+        obj = obj.get(name) if isinstance(obj, dict) else getattr(obj, name, None)
+    return obj
+
+
+def _identity(parameters):
+    identity = _field(parameters, "identity")
+    if identity is None:
+        return None
+    return SimpleNamespace(
+        type=_field(identity, "type"),
+        user_assigned_identities={key: {} for key in _field(identity, "user_assigned_identities") or {}},
+    )
+
+
+class SimulatedPoller:
+    """Long-running operation whose result is ready once the resource finishes provisioning"""
+
+    def __init__(self, cloud, resource):
+        self._cloud = cloud
+        self._resource = resource
+
+    def done(self):
+        return time.monotonic() >= self._resource.ready_at
+
+    def result(self, timeout=None):
+        self._cloud.wait_until(self._resource.ready_at)
+        self._resource.provisioning_state = "Succeeded"
+        return self._resource
+
+
+class SimulatedOperations:
+    """An operation group (``client.virtual_networks`` and so on) of a simulated ARM client.
+
+    Calls go through the shared rate limiter and ``call_with_retry``, standing
+    in for the rate-limit and retry policies of the real client pipeline.
+    Like ARM, a mutating call hit by a transient error may still be applied.
+    """
+
+    def __init__(self, arm, resource_type):
+        self.arm = arm
+        self.cloud = arm.cloud
+        self.resource_type = resource_type
+
+    def _call(self, operation, func, mutating=False):
+        return call_with_retry(
+            self._attempt, operation, func, mutating, limiter=self.arm.limiter,
+            provider="azure", operation=f"{self.resource_type.split('/', 1)[1]}.{operation}"
+        )
+
+    def _attempt(self, operation, func, mutating):
+        fault = self.cloud.request(f"arm:{self.resource_type}.{operation}", mutating)
+        if fault is not None and not (fault == TRANSIENT and mutating):
+            raise http_error(*FAULT_ERRORS[fault])
+        with self.cloud.lock:
+            result = func()
+        if fault is not None:
+            raise http_error(*FAULT_ERRORS[fault])
+        return result
+
+    def _id(self, group_name, *names):
+        return self.arm.resource_id(group_name, self.resource_type, *names)
+
+    def _lookup(self, group_name, *names):
+        self.arm.require_group(group_name)
+        resource = self.cloud.resources.get(("arm", self._id(group_name, *names).lower()))
+        if resource is None:
+            raise http_error("ResourceNotFound", f"The resource '{'/'.join(names)}' was not found.", 404,
+                             ResourceNotFoundError)
+        return resource
+
+    def _put(self, group_name, names, attributes, provision_time=None):
+        self.arm.require_group(group_name)
+        resource_id = self._id(group_name, *names)
+        key = ("arm", resource_id.lower())
+        resource = self.cloud.resources.get(key)
+        if resource is None:
+            ready_in = self.cloud.config.provision_time if provision_time is None else provision_time
+            resource = SimpleNamespace(
+                id=resource_id, name=names[-1], type=self.resource_type, provisioning_state="Creating",
+                ready_at=self.cloud.ready_at(ready_in)
+            )
+            self.cloud.resources[key] = resource
+        else:
+            resource.provisioning_state = "Updating"
+        resource.etag = f'W/"{uuid.uuid4()}"'
+        for name, value in attributes.items():
+            setattr(resource, name, value)
+        return resource
+
+    def get(self, group_name, *names, headers=None, **kwargs):
+        def get():
+            resource = self._lookup(group_name, *names)
+            # Conditional GET: unchanged resources answer 304 like ARM
+            etag = getattr(resource, "etag", None)
+            if etag is not None and (headers or {}).get("If-None-Match") == etag:
+                raise http_error("NotModified", "The resource has not been modified.", 304, ResourceNotModifiedError)
+            return resource
+        return self._call("get", get)
+
+
+class SimulatedResourceGroups(SimulatedOperations):
+    def __init__(self, arm):
+        super().__init__(arm, "Microsoft.Resources/resourceGroups")
+
+    def create_or_update(self, group_name, parameters):
+        def put():
+            key = ("arm", f"/subscriptions/{self.arm.subscription_id}/resourcegroups/{group_name.lower()}")
+            group = self.cloud.resources.get(key) or SimpleNamespace(
+                id=f"/subscriptions/{self.arm.subscription_id}/resourceGroups/{group_name}", name=group_name,
+                provisioning_state="Succeeded"
+            )
+            group.location = _field(parameters, "location")
+            self.cloud.resources[key] = group
+            return group
+        return self._call("create_or_update", put, mutating=True)
+
+
+class SimulatedNetworkOperations(SimulatedOperations):
+    def begin_create_or_update(self, group_name, *args):
+        *names, parameters = args
+        return self._call(
+            "begin_create_or_update",
+            lambda: SimulatedPoller(self.cloud, self._create(group_name, names, parameters)),
+            mutating=True
+        )
+
+    def _create(self, group_name, names, parameters):
+        # Also used by template deployments, which create several resources in one call
+        return self._put(group_name, names, self._attributes(parameters))
+
+    def _attributes(self, parameters):
+        return {"location": _field(parameters, "location")}
+
+
+class SimulatedVirtualNetworks(SimulatedNetworkOperations):
+    def __init__(self, arm):
+        super().__init__(arm, "Microsoft.Network/virtualNetworks")
+
+    def _attributes(self, parameters):
+        return {
+            "location": _field(parameters, "location"),
+            "address_space": SimpleNamespace(address_prefixes=_field(parameters, "address_space", "address_prefixes")),
+        }
+
+
+class SimulatedSubnets(SimulatedNetworkOperations):
+    def __init__(self, arm):
+        super().__init__(arm, "Microsoft.Network/virtualNetworks/subnets")
+
+    def _create(self, group_name, names, parameters):
+        self.arm.network_client.virtual_networks._lookup(group_name, names[0])
+        return self._put(group_name, names, {"address_prefix": _field(parameters, "address_prefix")})
+
+
+class SimulatedPublicIPAddresses(SimulatedNetworkOperations):
+    def __init__(self, arm):
+        super().__init__(arm, "Microsoft.Network/publicIPAddresses")
+
+    def _create(self, group_name, names, parameters):
+        resource = self._put(group_name, names, {"location": _field(parameters, "location")})
+        if getattr(resource, "ip_address", None) is None:
+            # Static addresses are kept across updates
+            index = self.cloud.next_index()
+            resource.ip_address = f"203.0.{(index >> 8) & 255}.{index & 255}"
+        label = _field(parameters, "dns_settings", "domain_name_label")
+        resource.dns_settings = label and SimpleNamespace(
+            domain_name_label=label, fqdn=f"{label}.{resource.location}.cloudapp.azure.com"
+        )
+        return resource
+
+
+class SimulatedNetworkInterfaces(SimulatedNetworkOperations):
+    def __init__(self, arm):
+        super().__init__(arm, "Microsoft.Network/networkInterfaces")
+
+    def _attributes(self, parameters):
+        return {
+            "location": _field(parameters, "location"),
+            "ip_configurations": [
+                SimpleNamespace(
+                    name=_field(configuration, "name"),
+                    load_balancer_backend_address_pools=[
+                        SimpleNamespace(id=_field(pool, "id"))
+                        for pool in _field(configuration, "load_balancer_backend_address_pools") or []
+                    ],
+                )
+                for configuration in _field(parameters, "ip_configurations") or []
+            ],
+        }
+
+
+class SimulatedLoadBalancers(SimulatedNetworkOperations):
+    def __init__(self, arm):
+        super().__init__(arm, "Microsoft.Network/loadBalancers")
+
+    def _attributes(self, parameters):
+        def named(kind):
+            return [SimpleNamespace(name=_field(item, "name")) for item in _field(parameters, kind) or []]
+        return {
+            "location": _field(parameters, "location"),
+            "sku": SimpleNamespace(name=_field(parameters, "sku", "name")),
+            "frontend_ip_configurations": named("frontend_ip_configurations"),
+            "backend_address_pools": named("backend_address_pools"),
+            "probes": named("probes"),
+            "load_balancing_rules": named("load_balancing_rules"),
+        }
+
+
+class SimulatedVirtualMachines(SimulatedOperations):
+    def __init__(self, arm):
+        super().__init__(arm, "Microsoft.Compute/virtualMachines")
+
+    def begin_create_or_update(self, group_name, vm_name, parameters):
+        return self._call(
+            "begin_create_or_update",
+            lambda: SimulatedPoller(self.cloud, self._create(group_name, (vm_name,), parameters)),
+            mutating=True
+        )
+
+    def _create(self, group_name, names, parameters):
+        self.arm.require_group(group_name)
+        existing = self.cloud.resources.get(("arm", self._id(group_name, *names).lower()))
+        if existing is None and self.cloud.reserve_instances(1) < 1:
+            raise http_error("OperationNotAllowed", "Operation could not be completed as it results in exceeding "
+                             "approved cores quota.", 409)
+        return self._put(group_name, names, {
+            "location": _field(parameters, "location"),
+            "hardware_profile": SimpleNamespace(vm_size=_field(parameters, "hardware_profile", "vm_size")),
+            "identity": _identity(parameters),
+        }, provision_time=self.cloud.config.boot_time)
+
+
+class SimulatedVirtualMachineScaleSets(SimulatedOperations):
+    def __init__(self, arm):
+        super().__init__(arm, "Microsoft.Compute/virtualMachineScaleSets")
+
+    def begin_create_or_update(self, group_name, vmss_name, parameters):
+        return self._call(
+            "begin_create_or_update",
+            lambda: SimulatedPoller(self.cloud, self._scale(group_name, vmss_name, parameters, create=True)),
+            mutating=True
+        )
+
+    def list(self, group_name, **kwargs):
+        def list_scale_sets():
+            self.arm.require_group(group_name)
+            prefix = self._id(group_name, "").lower()
+            return [
+                resource for (kind, resource_id), resource in self.cloud.resources.items()
+                if kind == "arm" and resource_id.startswith(prefix) and "/" not in resource_id[len(prefix):]
+            ]
+        return self._call("list", list_scale_sets)
+
+    def begin_update(self, group_name, vmss_name, parameters):
+        return self._call(
+            "begin_update",
+            lambda: SimulatedPoller(self.cloud, self._scale(group_name, vmss_name, parameters)),
+            mutating=True
+        )
+
+    def begin_start(self, group_name, vmss_name, vm_instance_i_ds=None):
+        return self._call(
+            "begin_start",
+            lambda: self._power(group_name, vmss_name, vm_instance_i_ds, "starting", "running",
+                                self.cloud.config.resume_time),
+            mutating=True
+        )
+
+    def begin_deallocate(self, group_name, vmss_name, vm_instance_i_ds=None, **kwargs):
+        return self._call(
+            "begin_deallocate",
+            lambda: self._power(group_name, vmss_name, vm_instance_i_ds, "deallocating", "deallocated",
+                                self.cloud.config.provision_time),
+            mutating=True
+        )
+
+    def begin_delete_instances(self, group_name, vmss_name, vm_instance_i_ds, **kwargs):
+        def delete():
+            scale_set = self._lookup(group_name, vmss_name)
+            deleted = self._instances(scale_set, vm_instance_i_ds)
+            scale_set.instances = [instance for instance in scale_set.instances if instance not in deleted]
+            scale_set.sku.capacity = len(scale_set.instances)
+            self.cloud.release_instances(len(deleted))
+            return SimulatedPoller(self.cloud, SimpleNamespace(ready_at=self.cloud.ready_at(self.cloud.config.provision_time)))
+        return self._call("begin_delete_instances", delete, mutating=True)
+
+    def _create(self, group_name, names, parameters):
+        return self._scale(group_name, names[0], parameters, create=True)
+
+    def _power(self, group_name, vmss_name, vm_instance_i_ds, transition, power_state, seconds):
+        operation = SimpleNamespace(ready_at=self.cloud.ready_at(seconds))
+        for instance in self._instances(self._lookup(group_name, vmss_name), vm_instance_i_ds):
+            if _power_state(instance) != power_state:
+                instance.power_state = transition
+                instance.next_power_state = (power_state, operation.ready_at)
+        return SimulatedPoller(self.cloud, operation)
+
+    def _instances(self, scale_set, vm_instance_i_ds):
+        instance_ids = _field(vm_instance_i_ds, "instance_ids")
+        if instance_ids is None:
+            return list(scale_set.instances)
+        return [instance for instance in scale_set.instances if instance.instance_id in instance_ids]
+
+    def evict_instances(self, group_name, vmss_name, count):
+        """Delete up to ``count`` Spot instances, as an eviction would; returns their computer names"""
+        with self.cloud.lock:
+            scale_set = self._lookup(group_name, vmss_name)
+            evicted = scale_set.instances[:count]
+            scale_set.instances = scale_set.instances[count:]
+            scale_set.sku.capacity = len(scale_set.instances)
+            self.cloud.release_instances(len(evicted))
+        return [instance.os_profile.computer_name for instance in evicted]
+
+    def _scale(self, group_name, vmss_name, parameters, create=False):
+        self.arm.require_group(group_name)
+        existing = self.cloud.resources.get(("arm", self._id(group_name, vmss_name).lower()))
+        if existing is None and not create:
+            self._lookup(group_name, vmss_name)
+
+        capacity = _field(parameters, "sku", "capacity")
+        current = len(existing.instances) if existing is not None else 0
+        if capacity is not None and capacity > current and self.cloud.reserve_instances(capacity - current) < capacity - current:
+            raise http_error("OperationNotAllowed", "Operation could not be completed as it results in exceeding "
+                             "approved cores quota.", 409)
+
+        attributes = {}
+        if existing is None:
+            attributes = {
+                "location": _field(parameters, "location"),
+                "sku": SimpleNamespace(name=_field(parameters, "sku", "name"), tier="Standard", capacity=0),
+                "priority": _field(parameters, "virtual_machine_profile", "priority") or "Regular",
+                "zones": _field(parameters, "zones"),
+                "computer_name_prefix": _field(parameters, "virtual_machine_profile", "os_profile", "computer_name_prefix")
+                or vmss_name,
+                "identity": _identity(parameters),
+                "powers_off": _powers_off(_field(parameters, "virtual_machine_profile", "os_profile", "custom_data")),
+                "instances": [],
+            }
+        tags = _field(parameters, "tags")
+        if tags is not None:
+            attributes["tags"] = dict(tags)
+        scale_set = self._put(group_name, (vmss_name,), attributes, provision_time=self.cloud.config.boot_time)
+        if capacity is not None:
+            while len(scale_set.instances) < capacity:
+                index = self.cloud.next_index()
+                ready_at = self.cloud.ready_at(self.cloud.config.boot_time)
+                scale_set.instances.append(SimpleNamespace(
+                    instance_id=str(index),
+                    name=f"{vmss_name}_{index}",
+                    os_profile=SimpleNamespace(computer_name=f"{scale_set.computer_name_prefix}{index:06x}"),
+                    # Running while cloud-init bootstraps it, then stopped if cloud-init powers it off
+                    power_state="running",
+                    next_power_state=("stopped", ready_at) if scale_set.powers_off else None,
+                ))
+            released = scale_set.instances[capacity:]
+            scale_set.instances = scale_set.instances[:capacity]
+            self.cloud.release_instances(len(released))
+            scale_set.sku.capacity = capacity
+        return scale_set
+
+
+class SimulatedVirtualMachineScaleSetVMs(SimulatedOperations):
+    def __init__(self, arm):
+        super().__init__(arm, "Microsoft.Compute/virtualMachineScaleSets/virtualMachines")
+
+    def list(self, group_name, vmss_name, expand=None, **kwargs):
+        scale_sets = self.arm.compute_client.virtual_machine_scale_sets
+
+        def list_instances():
+            instances = list(scale_sets._lookup(group_name, vmss_name).instances)
+            if expand == "instanceView":
+                for instance in instances:
+                    instance.instance_view = SimpleNamespace(statuses=[
+                        SimpleNamespace(code="ProvisioningState/succeeded"),
+                        SimpleNamespace(code=f"PowerState/{_power_state(instance)}"),
+                    ])
+            return instances
+        return self._call("list", list_instances)
+
+
+def _power_state(instance):
+    # Apply the instance's pending power transition once it is due
+    if instance.next_power_state is not None and time.monotonic() >= instance.next_power_state[1]:
+        instance.power_state, instance.next_power_state = instance.next_power_state[0], None
+    return instance.power_state
+
+
+def _powers_off(custom_data):
+    # Whether the cloud-init in a scale set's custom data ends by powering the instance off
+    if not custom_data:
+        return False
+    config = yaml.safe_load(base64.b64decode(custom_data)) or {}
+    return (config.get("runcmd") or [None])[-1] == POWER_OFF
+
+
+class SimulatedDeployments(SimulatedOperations):
+    """ARM template deployments.
+
+    The template's resources are created in template order by a single call,
+    and the deployment finishes when the slowest of them is provisioned.
+    """
+
+    def __init__(self, arm):
+        super().__init__(arm, "Microsoft.Resources/deployments")
+
+    def begin_create_or_update(self, group_name, deployment_name, parameters):
+        def put():
+            properties = _field(parameters, "properties")
+            template = TemplateEvaluator(
+                _field(properties, "template"), _field(properties, "parameters"),
+                resource_id=lambda resource_type, *names: self.arm.resource_id(group_name, resource_type, *names),
+                reference=self._reference
+            )
+            created = []
+            for resource in template.resources():
+                created.extend(self._deploy(group_name, resource))
+            deployment = self._put(group_name, (deployment_name,), {
+                "properties": SimpleNamespace(outputs=template.outputs(), provisioning_state="Succeeded")
+            })
+            deployment.ready_at = max([resource.ready_at for resource in created] + [time.monotonic()])
+            return SimulatedPoller(self.cloud, deployment)
+        return self._call("begin_create_or_update", put, mutating=True)
+
+    def _deploy(self, group_name, resource):
+        operations = self.arm.operations(resource["type"])
+        names = resource["name"].split("/")
+        body = resource_body(resource)
+        created = [operations._create(group_name, names, body)]
+        # Subnets declared inline in a VNet
+        for subnet in body.get("subnets", []) if resource["type"] == "Microsoft.Network/virtualNetworks" else []:
+            subnets = self.arm.network_client.subnets
+            created.append(subnets._create(group_name, names + [subnet["name"]], subnet))
+        return created
+
+    def _reference(self, resource_id):
+        resource = self.cloud.resources.get(("arm", resource_id.lower()))
+        if resource is None:
+            raise http_error("ResourceNotFound", f"The resource '{resource_id}' was not found.", 404,
+                             ResourceNotFoundError)
+        return {snake_to_camel(name): value for name, value in vars(resource).items()}
+
+
+class SimulatedArm:
+    """The simulated resource, compute and network clients of one subscription"""
+
+    def __init__(self, cloud, subscription_id="simulator", region=None):
+        self.cloud = cloud
+        self.subscription_id = subscription_id
+        self.limiter = get_rate_limiter("azure", f"simulator-{subscription_id}", region)
+        self.resource_client = SimpleNamespace(
+            resource_groups=SimulatedResourceGroups(self),
+            deployments=SimulatedDeployments(self),
+        )
+        self.network_client = SimpleNamespace(
+            virtual_networks=SimulatedVirtualNetworks(self),
+            subnets=SimulatedSubnets(self),
+            public_ip_addresses=SimulatedPublicIPAddresses(self),
+            network_interfaces=SimulatedNetworkInterfaces(self),
+            load_balancers=SimulatedLoadBalancers(self),
+        )
+        self.compute_client = SimpleNamespace(
+            virtual_machines=SimulatedVirtualMachines(self),
+            virtual_machine_scale_sets=SimulatedVirtualMachineScaleSets(self),
+            virtual_machine_scale_set_vms=SimulatedVirtualMachineScaleSetVMs(self),
+        )
+
+    def resource_id(self, group_name, resource_type, *names):
+        provider, *types = resource_type.split("/")
+        path = "/".join(f"{kind}/{name}" for kind, name in zip(types, names))
+        return f"/subscriptions/{self.subscription_id}/resourceGroups/{group_name}/providers/{provider}/{path}"
+
+    def operations(self, resource_type):
+        """The network or compute operation group managing ``resource_type``"""
+        for client in (self.network_client, self.compute_client):
+            for operations in vars(client).values():
+                if operations.resource_type.lower() == resource_type.lower():
+                    return operations
+        raise http_error("NoRegisteredProviderFound", f"The simulator does not support '{resource_type}'.", 400)
+
+    def require_group(self, group_name):
+        key = ("arm", f"/subscriptions/{self.subscription_id}/resourcegroups/{(group_name or '').lower()}")
+        if key not in self.cloud.resources:
+            raise http_error("ResourceGroupNotFound", f"Resource group '{group_name}' could not be found.", 404,
+                             ResourceNotFoundError)
+
+    def clients(self):
+        """The (resource, compute, network) clients in the order the Azure deployers take them"""
+        return self.resource_client, self.compute_client, self.network_client
+
+
+def simulated_azure_clients(subscription_id="simulator"):
+    """Return simulated (resource, compute, network) clients sharing one simulated subscription"""
+    cloud = get_simulated_cloud("azure", subscription_id)
+    return SimulatedArm(cloud, subscription_id).clients()
@@ -0,0 +1,155 @@
+import itertools
+import os
+import random
+import threading
+import time
+from typing import Optional
+
+from pydantic import BaseModel
+
+from minisc.azure.network_cache import network_cache
+from minisc.common.throttling import TokenBucket
+
+# Faults injected into a simulated API call
+THROTTLED = "throttled"
+TRANSIENT = "transient"
+FAILED = "failed"
+
+
+class SimulatorConfig(BaseModel):
+    """Behaviour of the offline cloud simulator; every field can be set with MINISC_SIM_<FIELD>"""
+    latency: float = 0.05  # Mean seconds per API call
+    latency_jitter: float = 0.5  # Latency varies uniformly by +/- this fraction
+    provision_time: float = 2.0  # Seconds until networks, VMs and scale sets finish provisioning
+    boot_time: float = 30.0  # Seconds an instance stays pending before it is running
+    resume_time: float = 10.0  # Seconds a stopped instance takes to start again
+    throttle_rate: float = 0.0  # Probability that a call is throttled
+    api_rate: Optional[float] = None  # Requests per second the cloud accepts before throttling
+    api_burst: Optional[int] = None
+    transient_error_rate: float = 0.0  # Probability of a retryable 5xx; mutating calls may still be applied
+    failure_rate: float = 0.0  # Probability that a mutating call fails permanently
+    instance_quota: Optional[int] = None  # Instances the region can run at once
+    time_scale: float = 1.0  # Multiplies every simulated delay, e.g. 0.01 to run 100x faster
+    seed: Optional[int] = None
+
+    @classmethod
+    def from_env(cls):
+        values = {}
+        for name in cls.model_fields:
+            value = os.environ.get(f"MINISC_SIM_{name.upper()}")
+            if value not in (None, ""):
+                values[name] = value
+        return cls(**values)
+
+
+class SimulatedCloud:
+    """Shared state and fault injection for one simulated provider region.
+
+    The EC2 and ARM fakes keep their resources in ``resources`` and call
+    ``request`` at the start of every API call, which sleeps for the sampled
+    latency and decides whether the call is throttled, fails transiently or
+    fails permanently. Per-operation counters are available from ``stats``.
+    """
+
+    def __init__(self, config=None):
+        self.config = config or SimulatorConfig()
+        self.resources = {}
+        self.client_tokens = {}
+        self.lock = threading.RLock()
+        self._random = random.Random(self.config.seed)
+        self._ids = itertools.count(1)
+        self._instances = 0
+        self._stats = {}
+        self._server_limiter = None
+        if self.config.api_rate:
+            # Server-side bucket in real (scaled) time
+            rate = self.config.api_rate / self.config.time_scale
+            self._server_limiter = TokenBucket(rate, self.config.api_burst or self.config.api_rate)
+
+    def request(self, operation, mutating=False):
+        """Simulate the round trip of one API call and return the injected fault, if any"""
+        config = self.config
+        jitter = config.latency * config.latency_jitter
+        with self.lock:
+            latency = max(0.0, self._random.uniform(config.latency - jitter, config.latency + jitter))
+            draw = self._random.random()
+            stats = self._stats.setdefault(
+                operation, {"calls": 0, "throttled": 0, "transient_errors": 0, "failures": 0}
+            )
+            stats["calls"] += 1
+        self.sleep(latency)
+
+        fault = None
+        if self._server_limiter is not None and not self._server_limiter.try_acquire():
+            fault = THROTTLED
+        elif draw < config.throttle_rate:
+            fault = THROTTLED
+        elif draw < config.throttle_rate + config.transient_error_rate:
+            fault = TRANSIENT
+        elif mutating and draw < config.throttle_rate + config.transient_error_rate + config.failure_rate:
+            fault = FAILED
+
+        if fault is not None:
+            key = {THROTTLED: "throttled", TRANSIENT: "transient_errors", FAILED: "failures"}[fault]
+            with self.lock:
+                stats[key] += 1
+        return fault
+
+    def stats(self):
+        with self.lock:
+            return {operation: dict(counts) for operation, counts in self._stats.items()}
+
+    def new_id(self, prefix):
+        return f"{prefix}-{next(self._ids):017x}"
+
+    def next_index(self):
+        return next(self._ids)
+
+    def sleep(self, seconds):
+        if seconds > 0:
+            time.sleep(seconds * self.config.time_scale)
+
+    def ready_at(self, seconds):
+        """Monotonic time at which a resource created now finishes a ``seconds``-long transition"""
+        return time.monotonic() + seconds * self.config.time_scale
+
+    def wait_until(self, deadline):
+        remaining = deadline - time.monotonic()
+        if remaining > 0:
+            time.sleep(remaining)
+
+    def reserve_instances(self, count):
+        """Take up to ``count`` instances from the quota and return how many were granted"""
+        with self.lock:
+            quota = self.config.instance_quota
+            granted = count if quota is None else max(0, min(count, quota - self._instances))
+            self._instances += granted
+            return granted
+
+    def release_instances(self, count):
+        with self.lock:
+            self._instances = max(0, self._instances - count)
+
+
+_clouds = {}
+_clouds_lock = threading.Lock()
+_config = None
+
+
+def get_simulated_cloud(provider, region):
+    """Return the simulated cloud shared by every client of ``provider`` in ``region``"""
+    key = (provider, region)
+    with _clouds_lock:
+        if key not in _clouds:
+            _clouds[key] = SimulatedCloud(_config or SimulatorConfig.from_env())
+        return _clouds[key]
+
+
+def configure_simulator(config=None):
+    """Discard every simulated cloud; new ones use ``config`` (default: MINISC_SIM_* variables)"""
+    global _config
+    with _clouds_lock:
+        _config = config
+        _clouds.clear()
+    # Subnets resolved in the discarded clouds no longer exist
+    network_cache.clear()
@@ -0,0 +1,598 @@
+import json
+import re
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+from minisc.common.throttling import ThrottledClient, get_rate_limiter
+from minisc.simulator.autoscaling import SimulatedAutoScalingClient
+from minisc.simulator.cloud import THROTTLED, TRANSIENT, FAILED, get_simulated_cloud
+from minisc.simulator.ec2 import SIMULATED_AMI, SimulatedEC2Client, client_error
+
+# Methods of the fake client and the CloudFormation API operation each one emulates
+API_OPERATIONS = {
+    'create_stack': 'CreateStack',
+    'update_stack': 'UpdateStack',
+    'delete_stack': 'DeleteStack',
+    'describe_stacks': 'DescribeStacks',
+    'describe_stack_events': 'DescribeStackEvents',
+}
+
+FAULT_ERRORS = {
+    THROTTLED: ('Throttling', 'Rate exceeded', 400),
+    TRANSIENT: ('InternalFailure', 'An internal error has occurred.', 500),
+    FAILED: ('SimulatedFailure', 'The simulator failed this request.', 400),
+}
+
+# Removes a property, like Ref AWS::NoValue
+NO_VALUE = object()
+
+
+class ResourceFailure(Exception):
+    """A resource the simulated stack could not create; the stack rolls back"""
+
+
+class SimulatedCloudFormationClient:
+    """In-memory stand-in for a boto3 CloudFormation client, covering what the stack deployer uses.
+
+    Templates are evaluated with the common intrinsic functions, and their
+    resources are created in the simulated EC2 region. Each resource becomes
+    ready once its dependencies are, so independent resources provision in
+    parallel, and stack events appear as the simulated clock reaches them.
+    A resource that cannot be created (e.g. past the instance quota) rolls
+    the operation back.
+    """
+
+    def __init__(self, cloud, region='us-east-1'):
+        self.cloud = cloud
+        self.region = region
+        self.ec2 = SimulatedEC2Client(cloud, region)
+        self.autoscaling = SimulatedAutoScalingClient(cloud, region)
+        self.meta = SimpleNamespace(region_name=region, method_to_api_mapping=dict(API_OPERATIONS))
+
+    # API
+
+    def create_stack(self, StackName, TemplateBody, Parameters=None, Tags=None, ClientRequestToken=None, **kwargs):
+        def create():
+            if self._find_stack(StackName) is not None:
+                raise client_error('AlreadyExistsException', f"Stack [{StackName}] already exists", 'CreateStack')
+            stack_id = f"arn:aws:cloudformation:{self.region}:000000000000:stack/{StackName}/{uuid.uuid4()}"
+            stack = {
+                'StackId': stack_id, 'StackName': StackName, 'Tags': Tags or [], 'Parameters': [],
+                'Template': None, 'Resources': {}, 'Events': [], 'Outputs': [],
+            }
+            self._apply(stack, TemplateBody, Parameters or [], 'CREATE')
+            self.cloud.resources[('cloudformation', self.region, 'stack', stack_id)] = stack
+            return {'StackId': stack_id}
+        return self._mutate('create_stack', create, ClientRequestToken)
+
+    def update_stack(self, StackName, TemplateBody, Parameters=None, ClientRequestToken=None, **kwargs):
+        def update():
+            stack = self._get_stack(StackName, 'update_stack')
+            status = self._status(stack)
+            if status.endswith('_IN_PROGRESS') or status == 'ROLLBACK_COMPLETE':
+                raise client_error('ValidationError', f"Stack:{stack['StackId']} is in {status} state and can not "
+                                   "be updated.", 'UpdateStack')
+            self._apply(stack, TemplateBody, Parameters or [], 'UPDATE')
+            return {'StackId': stack['StackId']}
+        return self._mutate('update_stack', update, ClientRequestToken)
+
+    def delete_stack(self, StackName, ClientRequestToken=None, **kwargs):
+        def delete():
+            stack = self._find_stack(StackName)
+            if stack is None or stack.get('Deleted'):
+                return {}
+            now = time.monotonic()
+            self._event(stack, stack['StackName'], 'AWS::CloudFormation::Stack', stack['StackId'], 'DELETE_IN_PROGRESS', now)
+            for logical_id in reversed(list(stack['Resources'])):
+                self._delete_resource(stack, logical_id, now)
+            stack['Deleted'] = True
+            stack['Operation'] = ('DELETE_IN_PROGRESS', 'DELETE_COMPLETE', self.cloud.ready_at(self.cloud.config.provision_time))
+            self._event(stack, stack['StackName'], 'AWS::CloudFormation::Stack', stack['StackId'], 'DELETE_COMPLETE',
+                        stack['Operation'][2])
+            return {}
+        return self._mutate('delete_stack', delete, ClientRequestToken)
+
+    def describe_stacks(self, StackName):
+        self._request('describe_stacks')
+        with self.cloud.lock:
+            stack = self._get_stack(StackName, 'describe_stacks')
+            view = {
+                'StackId': stack['StackId'],
+                'StackName': stack['StackName'],
+                'StackStatus': self._status(stack),
+                'Parameters': [dict(parameter) for parameter in stack['Parameters']],
+                'Tags': list(stack['Tags']),
+            }
+            if view['StackStatus'] in ('CREATE_COMPLETE', 'UPDATE_COMPLETE', 'UPDATE_ROLLBACK_COMPLETE'):
+                view['Outputs'] = [dict(output) for output in stack['Outputs']]
+            return {'Stacks': [view]}
+
+    def describe_stack_events(self, StackName):
+        self._request('describe_stack_events')
+        with self.cloud.lock:
+            stack = self._get_stack(StackName, 'describe_stack_events')
+            now = time.monotonic()
+            events = [_public(event) for event in stack['Events'] if event['ReadyAt'] <= now]
+        return {'StackEvents': sorted(events, key=lambda event: event['Timestamp'], reverse=True)}
+
+    # Stack operations
+
+    def _apply(self, stack, template_body, parameters, action):
+        template = json.loads(template_body)
+        values = self._parameter_values(template, parameters, stack)
+        if action == 'UPDATE' and template == stack['Template'] and values == _values(stack['Parameters']):
+            raise client_error('ValidationError', 'No updates are to be performed.', 'UpdateStack')
+
+        now = time.monotonic()
+        context = TemplateContext(self, stack, template, values)
+        self._event(stack, stack['StackName'], 'AWS::CloudFormation::Stack', stack['StackId'], f'{action}_IN_PROGRESS', now)
+        previous = {logical_id: dict(resource) for logical_id, resource in stack['Resources'].items()}
+        wanted = context.resources()
+        applied = []
+        try:
+            for logical_id in _dependency_order(wanted):
+                definition = wanted[logical_id]
+                started = max([now] + [stack['Resources'][dep]['ReadyAt'] for dep in _dependencies(definition)
+                                       if dep in stack['Resources']])
+                properties = context.evaluate(definition.get('Properties', {}))
+                existing = stack['Resources'].get(logical_id)
+                if existing is not None and existing['Type'] == definition['Type']:
+                    if existing['Properties'] != properties:
+                        self._update_resource(stack, logical_id, properties, started)
+                        applied.append(logical_id)
+                    continue
+                self._create_resource(stack, logical_id, definition['Type'], properties, started)
+                applied.append(logical_id)
+            for logical_id in reversed(list(stack['Resources'])):
+                if logical_id not in wanted:
+                    self._delete_resource(stack, logical_id, now)
+        except ResourceFailure as failure:
+            failed_at = time.monotonic()
+            self._event(stack, failure.args[0], failure.args[1], '', f'{action}_FAILED', failed_at, failure.args[2])
+            self._rollback(stack, previous, applied, failed_at)
+            final = 'ROLLBACK_COMPLETE' if action == 'CREATE' else 'UPDATE_ROLLBACK_COMPLETE'
+            stack['Operation'] = (f'{action}_IN_PROGRESS', final, failed_at)
+            self._event(stack, stack['StackName'], 'AWS::CloudFormation::Stack', stack['StackId'], final, failed_at)
+            if action == 'CREATE':
+                stack['Template'], stack['Parameters'] = template, _parameter_list(values)
+            return
+
+        ready_at = max([now] + [resource['ReadyAt'] for resource in stack['Resources'].values()])
+        stack['Template'], stack['Parameters'] = template, _parameter_list(values)
+        stack['Outputs'] = context.outputs()
+        stack['Operation'] = (f'{action}_IN_PROGRESS', f'{action}_COMPLETE', ready_at)
+        self._event(stack, stack['StackName'], 'AWS::CloudFormation::Stack', stack['StackId'], f'{action}_COMPLETE', ready_at)
+
+    def _rollback(self, stack, previous, applied, failed_at):
+        for logical_id in reversed(applied):
+            if logical_id in previous:
+                self._update_resource(stack, logical_id, previous[logical_id]['Properties'], failed_at)
+            else:
+                self._delete_resource(stack, logical_id, failed_at)
+
+    def _parameter_values(self, template, parameters, stack):
+        given = {parameter['ParameterKey']: parameter for parameter in parameters}
+        previous = _values(stack['Parameters'])
+        values = {}
+        for name, definition in template.get('Parameters', {}).items():
+            parameter = given.get(name)
+            if parameter is not None and parameter.get('UsePreviousValue'):
+                value = previous.get(name, definition.get('Default'))
+            elif parameter is not None:
+                value = parameter['ParameterValue']
+            elif 'Default' in definition:
+                value = definition['Default']
+            else:
+                raise client_error('ValidationError', f"Parameters: [{name}] must have values", 'CreateStack')
+            allowed = definition.get('AllowedValues')
+            if allowed and value not in allowed:
+                raise client_error('ValidationError', f"Parameter '{name}' must be one of AllowedValues", 'CreateStack')
+            values[name] = str(value)
+        return values
+
+    # Resources
+
+    def _create_resource(self, stack, logical_id, resource_type, properties, started):
+        handler = RESOURCE_HANDLERS.get(resource_type)
+        if handler is None:
+            raise ResourceFailure(logical_id, resource_type, f"Resource type {resource_type} is not simulated")
+        self._event(stack, logical_id, resource_type, '', 'CREATE_IN_PROGRESS', started)
+        physical_id, attributes, ready_at = handler.create(self, logical_id, properties, started)
+        stack['Resources'][logical_id] = {
+            'Type': resource_type, 'PhysicalId': physical_id, 'Attributes': attributes,
+            'Properties': properties, 'ReadyAt': ready_at,
+        }
+        self._event(stack, logical_id, resource_type, physical_id, 'CREATE_COMPLETE', ready_at)
+
+    def _update_resource(self, stack, logical_id, properties, started):
+        resource = stack['Resources'][logical_id]
+        self._event(stack, logical_id, resource['Type'], resource['PhysicalId'], 'UPDATE_IN_PROGRESS', started)
+        resource['ReadyAt'] = RESOURCE_HANDLERS[resource['Type']].update(self, resource, properties, started)
+        resource['Properties'] = properties
+        self._event(stack, logical_id, resource['Type'], resource['PhysicalId'], 'UPDATE_COMPLETE', resource['ReadyAt'])
+
+    def _delete_resource(self, stack, logical_id, started):
+        resource = stack['Resources'].pop(logical_id)
+        RESOURCE_HANDLERS[resource['Type']].delete(self, resource)
+        self._event(stack, logical_id, resource['Type'], resource['PhysicalId'], 'DELETE_COMPLETE', started)
+
+    # Helpers
+
+    def _status(self, stack):
+        in_progress, final, ready_at = stack['Operation']
+        return final if time.monotonic() >= ready_at else in_progress
+
+    def _event(self, stack, logical_id, resource_type, physical_id, status, at, reason=None):
+        # Events carry the wall-clock time at which the simulated clock reaches them
+        timestamp = datetime.now(timezone.utc) + timedelta(seconds=at - time.monotonic())
+        event = {
+            'EventId': str(uuid.uuid4()), 'StackId': stack['StackId'], 'StackName': stack['StackName'],
+            'LogicalResourceId': logical_id, 'PhysicalResourceId': physical_id, 'ResourceType': resource_type,
+            'ResourceStatus': status, 'Timestamp': timestamp, 'ReadyAt': at,
+        }
+        if reason:
+            event['ResourceStatusReason'] = reason
+        stack['Events'].append(event)
+
+    def _find_stack(self, name_or_id):
+        stacks = [stack for (service, region, *_), stack in self.cloud.resources.items()
+                  if service == 'cloudformation' and region == self.region]
+        for stack in stacks:
+            if stack['StackId'] == name_or_id:
+                return stack
+        for stack in stacks:
+            # Deleted stacks can only be described by their ID
+            if stack['StackName'] == name_or_id and not stack.get('Deleted'):
+                return stack
+        return None
+
+    def _get_stack(self, name_or_id, method):
+        stack = self._find_stack(name_or_id)
+        if stack is None:
+            raise client_error('ValidationError', f"Stack with id {name_or_id} does not exist", API_OPERATIONS[method])
+        return stack
+
+    def _request(self, method, mutating=False):
+        fault = self.cloud.request(f"cloudformation:{API_OPERATIONS[method]}", mutating)
+        if fault == TRANSIENT and mutating:
+            return fault
+        if fault is not None:
+            raise client_error(*FAULT_ERRORS[fault][:2], API_OPERATIONS[method], FAULT_ERRORS[fault][2])
+        return None
+
+    def _mutate(self, method, apply, client_token=None):
+        fault = self._request(method, mutating=True)
+        with self.cloud.lock:
+            token = client_token and ('cloudformation', method, client_token)
+            if token and token in self.cloud.client_tokens:
+                return self.cloud.client_tokens[token]
+            response = apply()
+            if token:
+                self.cloud.client_tokens[token] = response
+        if fault is not None:
+            # The change was applied but the caller never sees the response
+            raise client_error(*FAULT_ERRORS[fault][:2], API_OPERATIONS[method], FAULT_ERRORS[fault][2])
+        return response
+
+
+class TemplateContext:
+    """Evaluates a template's conditions and intrinsic functions against one stack"""
+
+    def __init__(self, client, stack, template, values):
+        self.client = client
+        self.stack = stack
+        self.template = template
+        self.values = values
+        self._conditions = {}
+
+    def resources(self):
+        return {
+            logical_id: definition for logical_id, definition in self.template.get('Resources', {}).items()
+            if 'Condition' not in definition or self.condition(definition['Condition'])
+        }
+
+    def outputs(self):
+        return [
+            {'OutputKey': name, 'OutputValue': str(self.evaluate(output['Value']))}
+            for name, output in self.template.get('Outputs', {}).items()
+            if 'Condition' not in output or self.condition(output['Condition'])
+        ]
+
+    def condition(self, name):
+        if name not in self._conditions:
+            self._conditions[name] = bool(self.evaluate(self.template['Conditions'][name]))
+        return self._conditions[name]
+
+    def evaluate(self, value):
+        if isinstance(value, list):
+            return [item for item in (self.evaluate(item) for item in value) if item is not NO_VALUE]
+        if not isinstance(value, dict):
+            return value
+        if len(value) == 1:
+            (function, argument), = value.items()
+            if function == 'Ref' or function.startswith('Fn::') or function == 'Condition':
+                return self._function(function, argument)
+        evaluated = {key: self.evaluate(item) for key, item in value.items()}
+        return {key: item for key, item in evaluated.items() if item is not NO_VALUE}
+
+    def _function(self, function, argument):
+        if function == 'Ref':
+            return self._ref(argument)
+        if function == 'Condition':
+            return self.condition(argument)
+        if function == 'Fn::GetAtt':
+            logical_id, attribute = argument if isinstance(argument, list) else argument.split('.', 1)
+            return self._resource(logical_id)['Attributes'][attribute]
+        if function == 'Fn::If':
+            name, then, otherwise = argument
+            return self.evaluate(then if self.condition(name) else otherwise)
+        if function == 'Fn::Equals':
+            first, second = (str(item) for item in self.evaluate(argument))
+            return first == second
+        if function == 'Fn::Not':
+            return not self.evaluate(argument)[0]
+        if function == 'Fn::And':
+            return all(self.evaluate(argument))
+        if function == 'Fn::Or':
+            return any(self.evaluate(argument))
+        if function == 'Fn::Join':
+            delimiter, items = argument
+            return delimiter.join(str(item) for item in self.evaluate(items))
+        if function == 'Fn::Base64':
+            # The simulated instances keep user data as given
+            return self.evaluate(argument)
+        if function == 'Fn::Sub':
+            return re.sub(r'\$\{([\w:.]+)\}', lambda match: str(self._sub(match.group(1))), argument)
+        raise client_error('ValidationError', f"Template function {function} is not simulated", 'CreateStack')
+
+    def _ref(self, name):
+        pseudo = {
+            'AWS::Region': self.client.region, 'AWS::StackName': self.stack['StackName'],
+            'AWS::StackId': self.stack['StackId'], 'AWS::AccountId': '000000000000', 'AWS::NoValue': NO_VALUE,
+        }
+        if name in pseudo:
+            return pseudo[name]
+        if name in self.values:
+            definition = self.template['Parameters'][name]
+            if definition['Type'].startswith('AWS::SSM::Parameter::Value'):
+                # The only SSM parameter the templates read is the latest AMI
+                return SIMULATED_AMI['ImageId']
+            return self.values[name]
+        return self._resource(name)['PhysicalId']
+
+    def _sub(self, name):
+        if '.' in name:
+            logical_id, attribute = name.split('.', 1)
+            return self._resource(logical_id)['Attributes'][attribute]
+        return self._ref(name)
+
+    def _resource(self, logical_id):
+        resource = self.stack['Resources'].get(logical_id)
+        if resource is None:
+            raise client_error('ValidationError', f"Unresolved resource dependency [{logical_id}]", 'CreateStack')
+        return resource
+
+
+def _dependencies(definition):
+    """Logical IDs a resource definition depends on, through DependsOn, Ref, GetAtt and Sub"""
+    found = set(definition.get('DependsOn', []) if isinstance(definition.get('DependsOn'), list)
+                else [definition['DependsOn']] if 'DependsOn' in definition else [])
+
+    def scan(value):
+        if isinstance(value, dict):
+            for key, item in value.items():
+                if key == 'Ref' and isinstance(item, str) and not item.startswith('AWS::'):
+                    found.add(item)
+                elif key == 'Fn::GetAtt':
+                    found.add(item[0] if isinstance(item, list) else item.split('.', 1)[0])
+                elif key == 'Fn::Sub' and isinstance(item, str):
+                    found.update(name.split('.', 1)[0] for name in re.findall(r'\$\{([\w:.]+)\}', item))
+                else:
+                    scan(item)
+        elif isinstance(value, list):
+            for item in value:
+                scan(item)
+    scan(definition.get('Properties', {}))
+    return found
+
+
+def _dependency_order(resources):
+    ordered, remaining = [], dict(resources)
+    while remaining:
+        ready = [logical_id for logical_id, definition in remaining.items()
+                 if not (_dependencies(definition) & set(remaining))]
+        if not ready:
+            raise client_error('ValidationError', f"Circular dependency between resources: {sorted(remaining)}",
+                               'CreateStack')
+        for logical_id in ready:
+            ordered.append(logical_id)
+            del remaining[logical_id]
+    return ordered
+
+
+def _values(parameters):
+    return {parameter['ParameterKey']: parameter['ParameterValue'] for parameter in parameters}
+
+
+def _parameter_list(values):
+    return [{'ParameterKey': name, 'ParameterValue': value} for name, value in values.items()]
+
+
+def _public(event):
+    return {key: value for key, value in event.items() if key != 'ReadyAt'}
+
+
+class ResourceHandler:
+    """Creates, updates and deletes one resource type in the simulated region.
+
+    ``create`` returns ``(physical ID, GetAtt attributes, ready_at)``; updates
+    that need no work are ready as soon as they start.
+    """
+
+    def create(self, client, logical_id, properties, started):
+        raise NotImplementedError
+
+    def update(self, client, resource, properties, started):
+        return started
+
+    def delete(self, client, resource):
+        pass
+
+
+class Ec2Resource(ResourceHandler):
+    """A resource kept by the EC2 simulator (VPC, subnet, security group, ...)"""
+
+    def __init__(self, kind, id_key, attributes, provisioned=False):
+        self.kind = kind
+        self.id_key = id_key
+        self.attributes = attributes
+        self.provisioned = provisioned
+
+    def create(self, client, logical_id, properties, started):
+        record = client.ec2._create(self.kind, self.attributes(properties, logical_id), id_key=self.id_key)
+        ready_at = started + (client.cloud.config.provision_time if self.provisioned else 0) * client.cloud.config.time_scale
+        client.ec2._get(self.kind, record[self.id_key], None)['ReadyAt'] = ready_at
+        return record[self.id_key], self.get_attributes(record), ready_at
+
+    def get_attributes(self, record):
+        return {}
+
+    def delete(self, client, resource):
+        client.cloud.resources.pop(('ec2', client.region, self.kind, resource['PhysicalId']), None)
+
+
+class LaunchTemplateResource(Ec2Resource):
+    def __init__(self):
+        super().__init__('lt', 'LaunchTemplateId', lambda properties, logical_id: {
+            'LaunchTemplateName': properties.get('LaunchTemplateName') or logical_id,
+            'LaunchTemplateData': properties['LaunchTemplateData'],
+            'LatestVersionNumber': 1,
+        })
+
+    def get_attributes(self, record):
+        return {'LatestVersionNumber': str(record['LatestVersionNumber']), 'DefaultVersionNumber': '1'}
+
+    def update(self, client, resource, properties, started):
+        # Changing the data adds a template version
+        record = client.ec2._get('lt', resource['PhysicalId'], None)
+        record['LaunchTemplateData'] = properties['LaunchTemplateData']
+        record['LatestVersionNumber'] += 1
+        resource['Attributes'] = self.get_attributes(record)
+        return started
+
+
+class GatewayAttachmentResource(ResourceHandler):
+    def create(self, client, logical_id, properties, started):
+        gateway = client.ec2._get('igw', properties['InternetGatewayId'], None)
+        gateway['Attachments'] = [{'VpcId': properties['VpcId'], 'State': 'available'}]
+        return f"IGW|{properties['VpcId']}", {}, started
+
+    def delete(self, client, resource):
+        gateway = client.cloud.resources.get(('ec2', client.region, 'igw', resource['Properties']['InternetGatewayId']))
+        if gateway is not None:
+            gateway['Attachments'] = []
+
+
+class RouteResource(ResourceHandler):
+    def create(self, client, logical_id, properties, started):
+        route_table = client.ec2._get('rtb', properties['RouteTableId'], None)
+        route_table['Routes'].append({
+            'DestinationCidrBlock': properties['DestinationCidrBlock'], 'GatewayId': properties.get('GatewayId')
+        })
+        return f"{properties['RouteTableId']}|{properties['DestinationCidrBlock']}", {}, started
+
+    def delete(self, client, resource):
+        route_table = client.cloud.resources.get(('ec2', client.region, 'rtb', resource['Properties']['RouteTableId']))
+        if route_table is not None:
+            route_table['Routes'] = [route for route in route_table['Routes']
+                                     if route['DestinationCidrBlock'] != resource['Properties']['DestinationCidrBlock']]
+
+
+class RouteTableAssociationResource(ResourceHandler):
+    def create(self, client, logical_id, properties, started):
+        return client.cloud.new_id('rtbassoc'), {}, started
+
+
+class InstanceResource(ResourceHandler):
+    def create(self, client, logical_id, properties, started):
+        if client.cloud.reserve_instances(1) < 1:
+            raise ResourceFailure(logical_id, 'AWS::EC2::Instance', "We currently do not have sufficient "
+                                  f"{properties['InstanceType']} capacity in the Availability Zone you requested.")
+        instance = client.ec2._launch_instance(properties['ImageId'], properties['InstanceType'],
+                                               properties.get('SubnetId'), 'on-demand')
+        # CloudFormation reports an instance complete once it is running
+        ready_at = started + client.cloud.config.boot_time * client.cloud.config.time_scale
+        client.ec2._get('instance', instance['InstanceId'], None)['ReadyAt'] = ready_at
+        return instance['InstanceId'], {
+            'PublicIp': instance['PublicIpAddress'], 'PrivateIp': instance['PrivateIpAddress'],
+            'PrivateDnsName': instance['PrivateDnsName'],
+        }, ready_at
+
+    def delete(self, client, resource):
+        instance = client.cloud.resources.get(('ec2', client.region, 'instance', resource['PhysicalId']))
+        if instance is not None and instance['State'] != 'terminated':
+            instance['State'] = 'terminated'
+            client.cloud.release_instances(1)
+
+
+class AutoScalingGroupResource(ResourceHandler):
+    """An Auto Scaling group kept by the Auto Scaling simulator"""
+
+    def create(self, client, logical_id, properties, started):
+        name = properties.get('AutoScalingGroupName') or f"{logical_id}-{uuid.uuid4().hex[:12]}"
+        group = client.autoscaling.new_group(name, LogicalResourceId=logical_id)
+        if client.autoscaling.configure(group, properties, started):
+            client.autoscaling.delete_group(group)
+            self._fail(group)
+        return name, {}, started + client.cloud.config.provision_time * client.cloud.config.time_scale
+
+    def update(self, client, resource, properties, started):
+        group = client.cloud.resources[('autoscaling', client.region, 'asg', resource['PhysicalId'])]
+        if client.autoscaling.configure(group, properties, started):
+            self._fail(group)
+        return started + client.cloud.config.provision_time * client.cloud.config.time_scale
+
+    def delete(self, client, resource):
+        group = client.cloud.resources.get(('autoscaling', client.region, 'asg', resource['PhysicalId']))
+        if group is not None:
+            client.autoscaling.delete_group(group)
+
+    def _fail(self, group):
+        raise ResourceFailure(group['LogicalResourceId'], 'AWS::AutoScaling::AutoScalingGroup',
+                              "Failed to launch instances: insufficient capacity.")
+
+
+RESOURCE_HANDLERS = {
+    'AWS::EC2::VPC': Ec2Resource('vpc', 'VpcId', lambda properties, logical_id: {
+        'CidrBlock': properties['CidrBlock'], 'Tags': properties.get('Tags', []),
+        'EnableDnsHostnames': {'Value': properties.get('EnableDnsHostnames', False)},
+    }, provisioned=True),
+    'AWS::EC2::InternetGateway': Ec2Resource('igw', 'InternetGatewayId', lambda properties, logical_id: {
+        'Attachments': []
+    }),
+    'AWS::EC2::VPCGatewayAttachment': GatewayAttachmentResource(),
+    'AWS::EC2::Subnet': Ec2Resource('subnet', 'SubnetId', lambda properties, logical_id: {
+        'VpcId': properties['VpcId'], 'CidrBlock': properties['CidrBlock'], 'Tags': properties.get('Tags', []),
+        'MapPublicIpOnLaunch': properties.get('MapPublicIpOnLaunch', False),
+    }),
+    'AWS::EC2::RouteTable': Ec2Resource('rtb', 'RouteTableId', lambda properties, logical_id: {
+        'VpcId': properties['VpcId'], 'Routes': []
+    }),
+    'AWS::EC2::Route': RouteResource(),
+    'AWS::EC2::SubnetRouteTableAssociation': RouteTableAssociationResource(),
+    'AWS::EC2::SecurityGroup': Ec2Resource('sg', 'GroupId', lambda properties, logical_id: {
+        'GroupName': properties.get('GroupName') or logical_id, 'VpcId': properties.get('VpcId'),
+        'IpPermissions': properties.get('SecurityGroupIngress', []),
+    }),
+    'AWS::EC2::Instance': InstanceResource(),
+    'AWS::EC2::LaunchTemplate': LaunchTemplateResource(),
+    'AWS::AutoScaling::AutoScalingGroup': AutoScalingGroupResource(),
+}
+
+
+def simulated_cloudformation_client(region='us-east-1'):
+    """Return a simulated CloudFormation client behind the same rate limiter and retry as a real one"""
+    cloud = get_simulated_cloud('aws', region)
+    return ThrottledClient(SimulatedCloudFormationClient(cloud, region), get_rate_limiter('aws', 'simulator', region))
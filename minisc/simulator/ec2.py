@@ -0,0 +1,380 @@
+import time
+from types import SimpleNamespace
+
+from botocore.exceptions import ClientError
+
+from minisc.common.throttling import ThrottledClient, get_rate_limiter
+from minisc.simulator.cloud import THROTTLED, TRANSIENT, FAILED, get_simulated_cloud
+
+SIMULATED_AMI = {
+    'ImageId': 'ami-0000000000000sim',
+    'Name': 'amzn2-ami-hvm-2.0.20250101.0-x86_64-gp2',
+    'CreationDate': '2025-01-01T00:00:00.000Z',
+    'State': 'available',
+}
+
+# Methods of the fake client and the EC2 API operation each one emulates
+API_OPERATIONS = {
+    'create_vpc': 'CreateVpc',
+    'describe_vpcs': 'DescribeVpcs',
+    'modify_vpc_attribute': 'ModifyVpcAttribute',
+    'create_internet_gateway': 'CreateInternetGateway',
+    'attach_internet_gateway': 'AttachInternetGateway',
+    'create_subnet': 'CreateSubnet',
+    'create_route_table': 'CreateRouteTable',
+    'create_route': 'CreateRoute',
+    'associate_route_table': 'AssociateRouteTable',
+    'create_security_group': 'CreateSecurityGroup',
+    'authorize_security_group_ingress': 'AuthorizeSecurityGroupIngress',
+    'describe_images': 'DescribeImages',
+    'run_instances': 'RunInstances',
+    'describe_instances': 'DescribeInstances',
+    'terminate_instances': 'TerminateInstances',
+    'create_launch_template': 'CreateLaunchTemplate',
+    'create_fleet': 'CreateFleet',
+    'describe_spot_instance_requests': 'DescribeSpotInstanceRequests',
+}
+
+FAULT_ERRORS = {
+    THROTTLED: ('RequestLimitExceeded', 'Request limit exceeded.', 503),
+    TRANSIENT: ('InternalError', 'An internal error has occurred.', 500),
+    FAILED: ('SimulatedFailure', 'The simulator failed this request.', 400),
+}
+
+
+def client_error(code, message, operation, status_code=400):
+    return ClientError(
+        {
+            'Error': {'Code': code, 'Message': message},
+            'ResponseMetadata': {'HTTPStatusCode': status_code, 'HTTPHeaders': {}},
+        },
+        operation
+    )
+
+
+class SimulatedEC2Client:
+    """In-memory stand-in for a boto3 EC2 client, covering the calls the AWS deployers make.
+
+    Created instances are ``pending`` for ``boot_time`` before they are
+    ``running``. ``ClientToken`` makes creates idempotent as in EC2, and a
+    transient error on a mutating call may arrive after the change was applied,
+    like a lost response.
+    """
+
+    def __init__(self, cloud, region='us-east-1'):
+        self.cloud = cloud
+        self.region = region
+        self.meta = SimpleNamespace(region_name=region, method_to_api_mapping=dict(API_OPERATIONS))
+
+    # Network
+
+    def create_vpc(self, CidrBlock, TagSpecifications=None):
+        return self._mutate('create_vpc', lambda: {
+            'Vpc': self._create('vpc', {'CidrBlock': CidrBlock, 'Tags': _tags(TagSpecifications)},
+                                ready_in=self.cloud.config.provision_time, id_key='VpcId')
+        })
+
+    def describe_vpcs(self, VpcIds=None):
+        self._request('describe_vpcs')
+        return {'Vpcs': [self._describe_ready(vpc, 'available') for vpc in self._find('vpc', VpcIds, 'describe_vpcs')]}
+
+    def modify_vpc_attribute(self, VpcId, **attributes):
+        def modify():
+            self._get('vpc', VpcId, 'modify_vpc_attribute').update(attributes)
+            return {}
+        return self._mutate('modify_vpc_attribute', modify)
+
+    def create_internet_gateway(self, TagSpecifications=None):
+        return self._mutate('create_internet_gateway', lambda: {
+            'InternetGateway': self._create('igw', {'Attachments': []}, id_key='InternetGatewayId')
+        })
+
+    def attach_internet_gateway(self, InternetGatewayId, VpcId):
+        def attach():
+            self._get('vpc', VpcId, 'attach_internet_gateway')
+            gateway = self._get('igw', InternetGatewayId, 'attach_internet_gateway')
+            if gateway['Attachments']:
+                raise client_error('Resource.AlreadyAssociated',
+                                   f"resource {InternetGatewayId} is already attached", 'AttachInternetGateway')
+            gateway['Attachments'].append({'VpcId': VpcId, 'State': 'available'})
+            return {}
+        return self._mutate('attach_internet_gateway', attach)
+
+    def create_subnet(self, VpcId, CidrBlock, TagSpecifications=None, **kwargs):
+        def create():
+            self._get('vpc', VpcId, 'create_subnet')
+            return {'Subnet': self._create('subnet', {
+                'VpcId': VpcId, 'CidrBlock': CidrBlock, 'Tags': _tags(TagSpecifications), **kwargs
+            }, id_key='SubnetId')}
+        return self._mutate('create_subnet', create)
+
+    def create_route_table(self, VpcId, ClientToken=None):
+        def create():
+            self._get('vpc', VpcId, 'create_route_table')
+            return {'RouteTable': self._create('rtb', {'VpcId': VpcId, 'Routes': []}, id_key='RouteTableId')}
+        return self._mutate('create_route_table', create, ClientToken)
+
+    def create_route(self, RouteTableId, DestinationCidrBlock, GatewayId=None):
+        def create():
+            route_table = self._get('rtb', RouteTableId, 'create_route')
+            route_table['Routes'].append({'DestinationCidrBlock': DestinationCidrBlock, 'GatewayId': GatewayId})
+            return {'Return': True}
+        return self._mutate('create_route', create)
+
+    def associate_route_table(self, RouteTableId, SubnetId):
+        def associate():
+            self._get('rtb', RouteTableId, 'associate_route_table')
+            self._get('subnet', SubnetId, 'associate_route_table')
+            return {'AssociationId': self.cloud.new_id('rtbassoc')}
+        return self._mutate('associate_route_table', associate)
+
+    def create_security_group(self, GroupName, Description, VpcId):
+        def create():
+            self._get('vpc', VpcId, 'create_security_group')
+            for group in self._find('sg'):
+                if group['VpcId'] == VpcId and group['GroupName'] == GroupName:
+                    raise client_error('InvalidGroup.Duplicate',
+                                       f"The security group '{GroupName}' already exists", 'CreateSecurityGroup')
+            group = self._create('sg', {'GroupName': GroupName, 'VpcId': VpcId, 'IpPermissions': []}, id_key='GroupId')
+            return {'GroupId': group['GroupId']}
+        return self._mutate('create_security_group', create)
+
+    def authorize_security_group_ingress(self, GroupId, IpPermissions):
+        def authorize():
+            self._get('sg', GroupId, 'authorize_security_group_ingress')['IpPermissions'].extend(IpPermissions)
+            return {'Return': True}
+        return self._mutate('authorize_security_group_ingress', authorize)
+
+    # Instances
+
+    def describe_images(self, Filters=None, Owners=None):
+        self._request('describe_images')
+        return {'Images': [dict(SIMULATED_AMI)]}
+
+    def run_instances(self, ImageId, InstanceType, MinCount, MaxCount, SubnetId=None, ClientToken=None, **kwargs):
+        def launch():
+            if SubnetId:
+                self._get('subnet', SubnetId, 'run_instances')
+            granted = self.cloud.reserve_instances(MaxCount)
+            if granted < MinCount:
+                self.cloud.release_instances(granted)
+                raise client_error('InsufficientInstanceCapacity',
+                                   f"There is no capacity for {MinCount} {InstanceType} instances", 'RunInstances', 500)
+            return {
+                'ReservationId': self.cloud.new_id('r'),
+                'Instances': [
+                    self._launch_instance(ImageId, InstanceType, SubnetId, 'on-demand', kwargs.get('IamInstanceProfile'))
+                    for _ in range(granted)
+                ],
+            }
+        return self._mutate('run_instances', launch, ClientToken)
+
+    def describe_instances(self, InstanceIds=None, Filters=None):
+        self._request('describe_instances')
+        instances = self._find('instance', InstanceIds, 'describe_instances')
+        return {'Reservations': [{'Instances': [self._instance_view(instance) for instance in instances]}]}
+
+    def terminate_instances(self, InstanceIds):
+        def terminate():
+            changes = []
+            for instance in self._find('instance', InstanceIds, 'terminate_instances'):
+                if instance['State'] != 'terminated':
+                    instance['State'] = 'terminated'
+                    self.cloud.release_instances(1)
+                changes.append({'InstanceId': instance['InstanceId'], 'CurrentState': {'Name': 'terminated'}})
+            return {'TerminatingInstances': changes}
+        return self._mutate('terminate_instances', terminate)
+
+    def create_launch_template(self, LaunchTemplateName, LaunchTemplateData, ClientToken=None):
+        def create():
+            for template in self._find('lt'):
+                if template['LaunchTemplateName'] == LaunchTemplateName:
+                    raise client_error('InvalidLaunchTemplateName.AlreadyExistsException',
+                                       f"Launch template name already in use: {LaunchTemplateName}", 'CreateLaunchTemplate')
+            return {'LaunchTemplate': self._create('lt', {
+                'LaunchTemplateName': LaunchTemplateName, 'LaunchTemplateData': LaunchTemplateData
+            }, id_key='LaunchTemplateId')}
+        return self._mutate('create_launch_template', create, ClientToken)
+
+    def create_fleet(self, LaunchTemplateConfigs, TargetCapacitySpecification, Type='instant', ClientToken=None, **kwargs):
+        def launch():
+            config = LaunchTemplateConfigs[0]
+            template = self._get('lt', config['LaunchTemplateSpecification']['LaunchTemplateId'], 'create_fleet')
+            override = (config.get('Overrides') or [{}])[0]
+            instance_type = override.get('InstanceType') or template['LaunchTemplateData'].get('InstanceType')
+            subnet_id = override.get('SubnetId')
+
+            total = TargetCapacitySpecification['TotalTargetCapacity']
+            on_demand = TargetCapacitySpecification.get('OnDemandTargetCapacity', 0)
+            granted = self.cloud.reserve_instances(total)
+            groups = []
+            for lifecycle, count in (('on-demand', min(on_demand, granted)), ('spot', max(0, granted - on_demand))):
+                if count:
+                    instances = [
+                        self._launch_instance(template['LaunchTemplateData'].get('ImageId'), instance_type, subnet_id,
+                                              lifecycle, template['LaunchTemplateData'].get('IamInstanceProfile'))
+                        for _ in range(count)
+                    ]
+                    groups.append({
+                        'Lifecycle': lifecycle,
+                        'InstanceType': instance_type,
+                        'InstanceIds': [instance['InstanceId'] for instance in instances],
+                    })
+            errors = []
+            if granted < total:
+                errors.append({
+                    'ErrorCode': 'InsufficientInstanceCapacity',
+                    'ErrorMessage': f"There is no capacity for {total - granted} {instance_type} instances",
+                })
+            return {'FleetId': self.cloud.new_id('fleet'), 'Instances': groups, 'Errors': errors}
+        return self._mutate('create_fleet', launch, ClientToken)
+
+    def describe_spot_instance_requests(self, Filters=None):
+        self._request('describe_spot_instance_requests')
+        filters = {f['Name']: set(f['Values']) for f in Filters or []}
+        requests = []
+        for instance in self._find('instance'):
+            if instance['Lifecycle'] != 'spot':
+                continue
+            request = {
+                'SpotInstanceRequestId': instance['SpotInstanceRequestId'],
+                'InstanceId': instance['InstanceId'],
+                'Status': {'Code': instance['SpotStatus']},
+            }
+            if 'status-code' in filters and instance['SpotStatus'] not in filters['status-code']:
+                continue
+            if 'instance-id' in filters and instance['InstanceId'] not in filters['instance-id']:
+                continue
+            requests.append(request)
+        return {'SpotInstanceRequests': requests}
+
+    def interrupt_spot_instances(self, count, status_code='instance-terminated-by-price'):
+        """Reclaim up to ``count`` running spot instances, as an interruption would; returns their IDs"""
+        interrupted = []
+        with self.cloud.lock:
+            for instance in self._find('instance'):
+                if len(interrupted) == count:
+                    break
+                if instance['Lifecycle'] == 'spot' and instance['State'] != 'terminated':
+                    instance['State'] = 'terminated'
+                    instance['SpotStatus'] = status_code
+                    self.cloud.release_instances(1)
+                    interrupted.append(instance['InstanceId'])
+        return interrupted
+
+    def get_waiter(self, waiter_name):
+        return SimulatedWaiter(self, waiter_name)
+
+    # Helpers
+
+    def _request(self, method, mutating=False):
+        fault = self.cloud.request(f"ec2:{API_OPERATIONS[method]}", mutating)
+        if fault == TRANSIENT and mutating:
+            return fault
+        if fault is not None:
+            raise client_error(*FAULT_ERRORS[fault][:2], API_OPERATIONS[method], FAULT_ERRORS[fault][2])
+        return None
+
+    def _mutate(self, method, apply, client_token=None):
+        fault = self._request(method, mutating=True)
+        with self.cloud.lock:
+            if client_token and client_token in self.cloud.client_tokens:
+                return self.cloud.client_tokens[client_token]
+            response = apply()
+            if client_token:
+                self.cloud.client_tokens[client_token] = response
+        if fault is not None:
+            # The change was applied but the caller never sees the response
+            raise client_error(*FAULT_ERRORS[fault][:2], API_OPERATIONS[method], FAULT_ERRORS[fault][2])
+        return response
+
+    def _create(self, kind, attributes, id_key, ready_in=0):
+        resource_id = self.cloud.new_id(kind)
+        resource = {id_key: resource_id, 'ReadyAt': self.cloud.ready_at(ready_in), **attributes}
+        self.cloud.resources[('ec2', self.region, kind, resource_id)] = resource
+        return _public(resource)
+
+    def _get(self, kind, resource_id, method):
+        resource = self.cloud.resources.get(('ec2', self.region, kind, resource_id))
+        if resource is None:
+            raise client_error(f"Invalid{_KIND_NAMES[kind]}ID.NotFound",
+                               f"The {kind} ID '{resource_id}' does not exist", API_OPERATIONS[method])
+        return resource
+
+    def _find(self, kind, resource_ids=None, method=None):
+        if resource_ids is not None:
+            return [self._get(kind, resource_id, method) for resource_id in resource_ids]
+        return [
+            resource for (service, region, resource_kind, _), resource in list(self.cloud.resources.items())
+            if service == 'ec2' and region == self.region and resource_kind == kind
+        ]
+
+    def _describe_ready(self, resource, ready_state):
+        view = _public(resource)
+        view['State'] = ready_state if time.monotonic() >= resource['ReadyAt'] else 'pending'
+        return view
+
+    def _launch_instance(self, image_id, instance_type, subnet_id, lifecycle, iam_instance_profile=None):
+        index = self.cloud.next_index()
+        profile = {}
+        if iam_instance_profile:
+            profile['IamInstanceProfile'] = {
+                'Arn': f"arn:aws:iam::000000000000:instance-profile/{iam_instance_profile['Name']}"
+            }
+        instance = self._create('instance', {
+            'ImageId': image_id,
+            'InstanceType': instance_type,
+            'SubnetId': subnet_id,
+            'Lifecycle': lifecycle,
+            'State': 'pending',
+            'PrivateIpAddress': f"10.0.{(index >> 8) & 255}.{index & 255}",
+            'PublicIpAddress': f"198.51.{(index >> 8) & 255}.{index & 255}",
+            'PrivateDnsName': f"ip-10-0-{(index >> 8) & 255}-{index & 255}.ec2.internal",
+            'SpotInstanceRequestId': f"sir-{index:08x}" if lifecycle == 'spot' else None,
+            'SpotStatus': 'fulfilled',
+            **profile,
+        }, id_key='InstanceId', ready_in=self.cloud.config.boot_time)
+        return instance
+
+    def _instance_view(self, instance):
+        view = self._describe_ready(instance, 'running')
+        if instance['State'] in ('stopped', 'terminated'):
+            view['State'] = instance['State']
+        view['State'] = {'Name': view['State']}
+        return view
+
+
+class SimulatedWaiter:
+    """Blocks until simulated resources reach the waiter's state"""
+
+    def __init__(self, client, name):
+        self.client = client
+        self.name = name
+
+    def wait(self, VpcIds=None, InstanceIds=None, **kwargs):
+        kind, ids = ('vpc', VpcIds) if self.name.startswith('vpc') else ('instance', InstanceIds)
+        for resource in self.client._find(kind, ids):
+            self.client.cloud.wait_until(resource['ReadyAt'])
+
+
+_KIND_NAMES = {
+    'vpc': 'Vpc', 'igw': 'InternetGateway', 'subnet': 'Subnet', 'rtb': 'RouteTable',
+    'sg': 'Group', 'instance': 'Instance', 'lt': 'LaunchTemplate',
+}
+
+
+def _tags(tag_specifications):
+    return [tag for spec in tag_specifications or [] for tag in spec.get('Tags', [])]
+
+
+def _public(resource):
+    return {key: value for key, value in resource.items() if key != 'ReadyAt'}
+
+
+def simulated_ec2_client(region='us-east-1'):
+    """Return a simulated EC2 client behind the same rate limiter and retry as a real one"""
+    cloud = get_simulated_cloud('aws', region)
+    return ThrottledClient(
+        SimulatedEC2Client(cloud, region), get_rate_limiter('aws', 'simulator', region),
+        get_rate_limiter('aws-mutating', 'simulator', region)
+    )
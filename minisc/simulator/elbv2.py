@@ -0,0 +1,174 @@
+import time
+from types import SimpleNamespace
+
+from minisc.common.throttling import ThrottledClient, get_rate_limiter
+from minisc.simulator.cloud import THROTTLED, TRANSIENT, FAILED, get_simulated_cloud
+from minisc.simulator.ec2 import client_error
+
+# Methods of the fake client and the Elastic Load Balancing API operation each one emulates
+API_OPERATIONS = {
+    'create_load_balancer': 'CreateLoadBalancer',
+    'describe_load_balancers': 'DescribeLoadBalancers',
+    'create_target_group': 'CreateTargetGroup',
+    'create_listener': 'CreateListener',
+    'register_targets': 'RegisterTargets',
+    'describe_target_health': 'DescribeTargetHealth',
+}
+
+FAULT_ERRORS = {
+    THROTTLED: ('Throttling', 'Rate exceeded', 400),
+    TRANSIENT: ('InternalFailure', 'An internal error has occurred.', 500),
+    FAILED: ('SimulatedFailure', 'The simulator failed this request.', 400),
+}
+
+ARN_PREFIX = "arn:aws:elasticloadbalancing"
+
+
+class SimulatedElbv2Client:
+    """In-memory stand-in for a boto3 Elastic Load Balancing v2 client, covering the calls the AWS deployers make.
+
+    Load balancers are ``provisioning`` for ``provision_time``. As in ELB,
+    creating a load balancer or target group with the name and settings of an
+    existing one returns it. IP targets are healthy once the instance with
+    that private address has booted.
+    """
+
+    def __init__(self, cloud, region='us-east-1'):
+        self.cloud = cloud
+        self.region = region
+        self.meta = SimpleNamespace(region_name=region, method_to_api_mapping=dict(API_OPERATIONS))
+
+    def create_load_balancer(self, Name, Subnets, Scheme='internet-facing', Type='application', **kwargs):
+        def create():
+            balancer = self._find('lb', Name)
+            if balancer is None:
+                balancer = self._create('lb', Name, {
+                    'LoadBalancerName': Name, 'Scheme': Scheme, 'Type': Type,
+                    'AvailabilityZones': [{'SubnetId': subnet_id} for subnet_id in Subnets],
+                    'DNSName': f"{Name}-{self.cloud.next_index():08x}.elb.{self.region}.amazonaws.com",
+                    'ReadyAt': self.cloud.ready_at(self.cloud.config.provision_time),
+                })
+            elif balancer['Type'] != Type or balancer['Scheme'] != Scheme:
+                raise client_error('DuplicateLoadBalancerName',
+                                   f"A load balancer with the name '{Name}' already exists", 'CreateLoadBalancer')
+            return {'LoadBalancers': [self._balancer_view(balancer)]}
+        return self._mutate('create_load_balancer', create)
+
+    def describe_load_balancers(self, LoadBalancerArns=None, Names=None):
+        self._request('describe_load_balancers')
+        balancers = [
+            balancer for balancer in self._all('lb')
+            if (LoadBalancerArns is None or balancer['LoadBalancerArn'] in LoadBalancerArns)
+            and (Names is None or balancer['LoadBalancerName'] in Names)
+        ]
+        if not balancers and (LoadBalancerArns or Names):
+            raise client_error('LoadBalancerNotFound', "One or more load balancers not found", 'DescribeLoadBalancers')
+        return {'LoadBalancers': [self._balancer_view(balancer) for balancer in balancers]}
+
+    def create_target_group(self, Name, Protocol, Port, VpcId, TargetType='instance', **kwargs):
+        def create():
+            group = self._find('tg', Name)
+            if group is None:
+                group = self._create('tg', Name, {
+                    'TargetGroupName': Name, 'Protocol': Protocol, 'Port': Port, 'VpcId': VpcId,
+                    'TargetType': TargetType, 'Targets': [],
+                })
+            elif (group['Protocol'], group['Port'], group['VpcId']) != (Protocol, Port, VpcId):
+                raise client_error('DuplicateTargetGroupName',
+                                   f"A target group with the name '{Name}' already exists", 'CreateTargetGroup')
+            return {'TargetGroups': [_public(group)]}
+        return self._mutate('create_target_group', create)
+
+    def create_listener(self, LoadBalancerArn, Protocol, Port, DefaultActions, **kwargs):
+        def create():
+            balancer = self._get('lb', LoadBalancerArn, 'CreateListener')
+            listener = balancer.setdefault('Listeners', {}).get(Port)
+            if listener is None:
+                listener_arn = LoadBalancerArn.replace(':loadbalancer/', ':listener/')
+                listener = balancer['Listeners'][Port] = {
+                    'ListenerArn': f"{listener_arn}/{self.cloud.next_index():016x}",
+                    'LoadBalancerArn': LoadBalancerArn, 'Protocol': Protocol, 'Port': Port,
+                    'DefaultActions': DefaultActions,
+                }
+            return {'Listeners': [dict(listener)]}
+        return self._mutate('create_listener', create)
+
+    def register_targets(self, TargetGroupArn, Targets):
+        def register():
+            group = self._get('tg', TargetGroupArn, 'RegisterTargets')
+            for target in Targets:
+                target = {'Port': group['Port'], **target}
+                if target not in group['Targets']:
+                    group['Targets'].append(target)
+            return {}
+        return self._mutate('register_targets', register)
+
+    def describe_target_health(self, TargetGroupArn):
+        self._request('describe_target_health')
+        group = self._get('tg', TargetGroupArn, 'DescribeTargetHealth')
+        booted = {
+            instance['PrivateIpAddress'] for (service, region, kind, _), instance in list(self.cloud.resources.items())
+            if (service, region, kind) == ('ec2', self.region, 'instance') and time.monotonic() >= instance['ReadyAt']
+        }
+        return {'TargetHealthDescriptions': [
+            {'Target': dict(target), 'TargetHealth': {'State': 'healthy' if target['Id'] in booted else 'initial'}}
+            for target in group['Targets']
+        ]}
+
+    # Helpers
+
+    def _request(self, method, mutating=False):
+        fault = self.cloud.request(f"elbv2:{API_OPERATIONS[method]}", mutating)
+        if fault == TRANSIENT and mutating:
+            return fault
+        if fault is not None:
+            raise client_error(*FAULT_ERRORS[fault][:2], API_OPERATIONS[method], FAULT_ERRORS[fault][2])
+        return None
+
+    def _mutate(self, method, apply):
+        fault = self._request(method, mutating=True)
+        with self.cloud.lock:
+            response = apply()
+        if fault is not None:
+            # The change was applied but the caller never sees the response
+            raise client_error(*FAULT_ERRORS[fault][:2], API_OPERATIONS[method], FAULT_ERRORS[fault][2])
+        return response
+
+    def _create(self, kind, name, attributes):
+        kind_name = 'loadbalancer/net' if kind == 'lb' else 'targetgroup'
+        arn = f"{ARN_PREFIX}:{self.region}:000000000000:{kind_name}/{name}/{self.cloud.next_index():016x}"
+        resource = {('LoadBalancerArn' if kind == 'lb' else 'TargetGroupArn'): arn, **attributes}
+        self.cloud.resources[('elbv2', self.region, kind, arn)] = resource
+        return resource
+
+    def _get(self, kind, arn, operation):
+        resource = self.cloud.resources.get(('elbv2', self.region, kind, arn))
+        if resource is None:
+            code = 'LoadBalancerNotFound' if kind == 'lb' else 'TargetGroupNotFound'
+            raise client_error(code, f"'{arn}' not found", operation)
+        return resource
+
+    def _all(self, kind):
+        return [
+            resource for (service, region, resource_kind, _), resource in list(self.cloud.resources.items())
+            if (service, region, resource_kind) == ('elbv2', self.region, kind)
+        ]
+
+    def _find(self, kind, name):
+        key = 'LoadBalancerName' if kind == 'lb' else 'TargetGroupName'
+        return next((resource for resource in self._all(kind) if resource[key] == name), None)
+
+    def _balancer_view(self, balancer):
+        view = _public(balancer)
+        view['State'] = {'Code': 'active' if time.monotonic() >= balancer['ReadyAt'] else 'provisioning'}
+        return view
+
+
+def _public(resource):
+    return {key: value for key, value in resource.items() if key not in ('ReadyAt', 'Listeners', 'Targets')}
+
+
+def simulated_elbv2_client(region='us-east-1'):
+    """Return a simulated Elastic Load Balancing v2 client behind the same rate limiter and retry as a real one"""
+    cloud = get_simulated_cloud('aws', region)
+    return ThrottledClient(SimulatedElbv2Client(cloud, region), get_rate_limiter('aws', 'simulator', region))
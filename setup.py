@@ -9,9 +9,16 @@ setup(
     author="minisc",
     author_email="ekremaksoy@gmail.com",
     url="https://github.com/eax/minisc",
-    packages=find_packages(),
+    packages=find_packages(exclude=["benchmarks", "benchmarks.*"]),
     include_package_data=True,
     install_requires=open("requirements.txt").read().splitlines(),
+    extras_require={
+        "tracing": [
+            "opentelemetry-api",
+            "opentelemetry-sdk",
+            "opentelemetry-exporter-otlp-proto-http",
+        ],
+    },
     python_requires=">=3.8",
     classifiers=[
         "Programming Language :: Python :: 3",
@@ -21,6 +28,7 @@ setup(
     entry_points={
         "console_scripts": [
             "minisc-api=minisc.api_runner:main",
+            "minisc-fleet=minisc.fleet:main",
         ],
     },
 )
\ No newline at end of file
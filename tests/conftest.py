@@ -0,0 +1,19 @@
+import pytest
+
+from minisc.simulator.cloud import SimulatorConfig, configure_simulator
+
+
+@pytest.fixture
+def simulator(monkeypatch, tmp_path):
+    """Run the offline simulator, fast and seeded, with state in a per-test directory.
+
+    Yields a function reconfiguring it with other ``SimulatorConfig`` settings.
+    """
+    monkeypatch.setenv("MINISC_STATE_DIR", str(tmp_path))
+    monkeypatch.setattr("minisc.common.throttling.time.sleep", lambda seconds: None)
+
+    def configure(**settings):
+        configure_simulator(SimulatorConfig(**{"time_scale": 0.001, "seed": 7, **settings}))
+    configure()
+    yield configure
+    configure_simulator()
@@ -0,0 +1,74 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from minisc.api.main import app
+from minisc.azure.kubernetes_deployer import load_cluster_template
+from minisc.simulator.arm import TemplateEvaluator
+from minisc.simulator.azure import simulated_azure_clients
+from minisc.simulator.cloud import get_simulated_cloud
+
+client = TestClient(app)
+
+AZURE_CLUSTER = {
+    "provider": "sim-azure", "region": "westeurope", "cluster_name": "arm", "node_size": "Standard_D2s_v3",
+    "resource_group_name": "arm-rg", "vnet_name": "arm-vnet", "subnet_name": "arm-subnet",
+    "admin_username": "azureuser", "admin_password": "Password1234!", "deployment_engine": "arm"
+}
+
+@pytest.fixture
+def cloud(simulator):
+    return get_simulated_cloud("azure", "simulator")
+
+def put_calls(cloud):
+    return {
+        operation.split(":", 1)[1]: counts["calls"] for operation, counts in cloud.stats().items()
+        if operation.endswith("create_or_update")
+    }
+
+def test_template_expressions():
+    """Test that template expressions resolve parameters, defaults, variables and references"""
+    template = load_cluster_template()
+    evaluator = TemplateEvaluator(
+        template, {"vnetName": {"value": "vnet"}, "subnetName": {"value": "subnet"}, "headNodeName": {"value": "head"}},
+        resource_id=lambda resource_type, *names: f"{resource_type}/{'/'.join(names)}",
+        reference=lambda resource_id: {"ipAddress": f"ip-of:{resource_id}"}
+    )
+
+    assert evaluator.evaluate("[variables('publicIpName')]") == "head-ip"
+    assert evaluator.evaluate("[variables('subnetId')]") == "Microsoft.Network/virtualNetworks/subnets/vnet/subnet"
+    assert evaluator.evaluate("[if(greater(parameters('workerCount'), 0), 'workers', 'none')]") == "none"
+    assert evaluator.evaluate("[concat('it''s ', string(lessOrEquals(3, 100)))]") == "it's True"
+    assert evaluator.evaluate("[[literal]") == "[literal]"
+    assert evaluator.outputs() == {"subnetId": {"type": "string", "value": "Microsoft.Network/virtualNetworks/subnets/vnet/subnet"}}
+
+@pytest.mark.api
+def test_head_node_is_deployed_by_one_template_deployment(cloud):
+    """Test that ARM mode creates the whole head node with a single deployment call"""
+    response = client.post("/deploy/head-node", json=AZURE_CLUSTER)
+
+    assert response.status_code == 200
+    assert response.json()["head_node_ip"].startswith("203.0.")
+    assert put_calls(cloud) == {
+        "Microsoft.Resources/resourceGroups.create_or_update": 1,
+        "Microsoft.Resources/deployments.begin_create_or_update": 1,
+    }
+    resource_client, compute_client, network_client = simulated_azure_clients()
+    assert compute_client.virtual_machines.get("arm-rg", "arm").hardware_profile.vm_size == "Standard_D2s_v3"
+    assert network_client.subnets.get("arm-rg", "arm-vnet", "arm-subnet").address_prefix == "10.0.0.0/24"
+
+@pytest.mark.api
+def test_mixed_worker_pool_template(cloud):
+    """Test that ARM mode creates a mixed pool's regular and Spot scale sets, and is Azure-only"""
+    client.post("/deploy/head-node", json=AZURE_CLUSTER)
+    response = client.post("/deploy/worker-nodes", json={
+        **AZURE_CLUSTER, "worker_count": 5, "capacity_type": "mixed", "on_demand_base": 2
+    })
+
+    assert response.status_code == 200
+    scale_sets = simulated_azure_clients()[1].virtual_machine_scale_sets
+    assert scale_sets.get("arm-rg", "arm-workers").sku.capacity == 2
+    spot = scale_sets.get("arm-rg", "arm-workers-spot")
+    assert spot.sku.capacity == 3 and spot.priority == "Spot"
+
+    aws = client.post("/deploy/head-node", json={**AZURE_CLUSTER, "provider": "sim-aws", "ssh_key_name": "key"})
+    assert aws.status_code == 422
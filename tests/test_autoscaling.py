@@ -0,0 +1,93 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from minisc.api.main import app
+from minisc.simulator.autoscaling import simulated_autoscaling_client
+from minisc.simulator.azure import simulated_azure_clients
+from minisc.simulator.cloud import get_simulated_cloud
+from minisc.simulator.ec2 import simulated_ec2_client
+
+client = TestClient(app)
+
+WORKERS = {
+    "provider": "sim-aws", "region": "us-east-1", "cluster_name": "pool", "node_size": "t3.medium",
+    "ssh_key_name": "key", "auto_scaling_group": True, "worker_count": 4
+}
+
+@pytest.fixture
+def cloud(simulator):
+    return get_simulated_cloud("aws", "us-east-1")
+
+def group_states():
+    group = simulated_autoscaling_client("us-east-1").describe_auto_scaling_groups(
+        AutoScalingGroupNames=["pool-workers"]
+    )["AutoScalingGroups"][0]
+    return sorted(instance["LifecycleState"] for instance in group["Instances"])
+
+@pytest.mark.api
+def test_worker_group_joins_every_worker(cloud):
+    """Test that an Auto Scaling group pool launches in one call and completes each worker's join hook"""
+    response = client.post("/deploy/worker-nodes", json={**WORKERS, "capacity_type": "mixed", "on_demand_base": 1})
+
+    assert response.status_code == 200
+    assert response.json()["auto_scaling_group"] == "pool-workers"
+    calls = {operation: counts["calls"] for operation, counts in cloud.stats().items()}
+    assert calls["autoscaling:CreateAutoScalingGroup"] == 1
+    assert calls["autoscaling:CompleteLifecycleAction"] == 4
+    assert "ec2:RunInstances" not in calls and "ec2:CreateFleet" not in calls
+    assert group_states() == ["InService"] * 4
+
+    group = cloud.resources[("autoscaling", "us-east-1", "asg", "pool-workers")]
+    lifecycles = sorted(cloud.resources[("ec2", "us-east-1", "instance", i)]["Lifecycle"] for i in group["Instances"])
+    assert lifecycles == ["on-demand", "spot", "spot", "spot"]
+
+@pytest.mark.api
+def test_scale_in_drains_removed_workers(cloud, monkeypatch):
+    """Test that scaling a pool in drains the removed workers on the master before they terminate"""
+    drained = []
+    monkeypatch.setattr("minisc.api.main.ssh_cordon_nodes", lambda master_ip, user, names, **kwargs: drained.extend(names))
+    client.post("/deploy/worker-nodes", json=WORKERS)
+
+    response = client.post("/scale/worker-nodes", json={
+        "provider": "sim-aws", "region": "us-east-1", "cluster_name": "pool", "worker_count": 2,
+        "master_ip": "10.0.0.1", "ssh_key_name": "key"
+    })
+
+    assert response.status_code == 200
+    assert response.json()["launched"] == 2
+    assert len(drained) == 2 and all(name.endswith(".ec2.internal") for name in drained)
+    assert group_states() == ["InService"] * 2
+    assert client.post("/scale/worker-nodes", json={
+        "provider": "sim-azure", "region": "westeurope", "cluster_name": "pool", "worker_count": 2
+    }).status_code == 422
+
+@pytest.mark.api
+def test_worker_group_replaces_reclaimed_workers(cloud):
+    """Test that the group launches a replacement for a reclaimed spot worker by itself"""
+    client.post("/deploy/worker-nodes", json={**WORKERS, "worker_count": 2, "capacity_type": "spot"})
+
+    reclaimed = simulated_ec2_client("us-east-1").interrupt_spot_instances(1)
+
+    group = cloud.resources[("autoscaling", "us-east-1", "asg", "pool-workers")]
+    assert len(group_states()) == 2
+    assert reclaimed[0] not in group["Instances"]
+
+@pytest.mark.api
+def test_chunked_azure_pool_scales_across_its_scale_sets(simulator):
+    """Test that scaling an Azure pool created in chunks spreads the capacity over its scale sets"""
+    resource_client, compute_client, _ = simulated_azure_clients()
+    resource_client.resource_groups.create_or_update("pool-rg", {"location": "westeurope"})
+    azure = {
+        "provider": "sim-azure", "region": "westeurope", "cluster_name": "pool", "resource_group_name": "pool-rg"
+    }
+    client.post("/deploy/worker-nodes", json={
+        **azure, "node_size": "Standard_D2s_v3", "vnet_name": "pool-vnet", "subnet_name": "pool-subnet",
+        "admin_username": "azureuser", "admin_password": "Password1234!", "worker_count": 6, "launch_batch_size": 3
+    })
+
+    response = client.post("/scale/worker-nodes", json={**azure, "worker_count": 9})
+
+    assert response.status_code == 200
+    assert response.json()["launched"] == 9
+    capacities = [compute_client.virtual_machine_scale_sets.get("pool-rg", f"pool-workers-{i}").sku.capacity for i in range(2)]
+    assert capacities == [5, 4]
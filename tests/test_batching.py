@@ -0,0 +1,76 @@
+import pytest
+from unittest.mock import MagicMock
+from botocore.exceptions import ClientError
+
+from minisc.aws.worker_nodes_deployer import WorkerNodesDeployer
+from minisc.common.batching import split_into_chunks, launch_in_chunks
+from minisc.common.exceptions import NodeDeploymentError
+
+def throttling_error():
+    return ClientError({"Error": {"Code": "RequestLimitExceeded", "Message": "Request limit exceeded."}}, "RunInstances")
+
+def test_split_into_chunks():
+    """Test that chunks cover the total without exceeding the chunk size"""
+    assert split_into_chunks(120, 50) == [50, 50, 20]
+    assert split_into_chunks(50, 50) == [50]
+    assert split_into_chunks(0, 50) == []
+
+def test_launch_in_chunks_all_succeed():
+    """Test that every chunk is launched and the results are combined"""
+    launch = MagicMock(side_effect=lambda index, count: [f"node-{index}-{i}" for i in range(count)])
+
+    result = launch_in_chunks(launch, 120, chunk_size=50, pace_seconds=0)
+
+    assert launch.call_count == 3
+    assert result["requested"] == 120
+    assert len(result["launched"]) == 120
+    assert result["failed"] == 0
+    assert result["errors"] == []
+
+def test_launch_in_chunks_partial_success():
+    """Test that a failed chunk and a short chunk are both counted as failures"""
+    def launch(index, count):
+        if index == 1:
+            raise Exception("InvalidParameterValue")
+        return ["node"] * (count - 5 if index == 2 else count)
+
+    result = launch_in_chunks(launch, 120, chunk_size=50, pace_seconds=0)
+
+    assert len(result["launched"]) == 65
+    assert result["failed"] == 55
+    assert result["errors"] == [{"chunk": 1, "count": 50, "error": "InvalidParameterValue"}]
+
+def test_launch_in_chunks_leaves_throttling_retries_to_the_client(monkeypatch):
+    """Test that a chunk still throttled after the client's own retries fails instead of being retried again"""
+    monkeypatch.setattr("minisc.common.batching.time.sleep", lambda seconds: None)
+    launch = MagicMock(side_effect=[throttling_error(), ["node"] * 10])
+
+    result = launch_in_chunks(launch, 20, chunk_size=10, max_parallel=1, pace_seconds=0)
+
+    assert launch.call_count == 2
+    assert len(result["launched"]) == 10
+    assert result["failed"] == 10
+    assert result["errors"][0]["chunk"] == 0
+
+def test_chunk_without_capacity_tries_the_next_zone_once(monkeypatch):
+    """Test that a zone without capacity is not retried as throttling but the chunk moves to the next zone"""
+    monkeypatch.setattr("minisc.common.batching.time.sleep", lambda seconds: None)
+    capacity_error = ClientError({"Error": {"Code": "InsufficientInstanceCapacity", "Message": "No capacity."}},
+                                 "RunInstances")
+    ec2 = MagicMock()
+    ec2.describe_images.return_value = {"Images": [{"ImageId": "ami-1", "CreationDate": "2024-01-01"}]}
+    ec2.run_instances.side_effect = [capacity_error, {"Instances": [{"InstanceId": "i-1"}]}]
+    deployer = WorkerNodesDeployer(ec2=ec2, autoscaling=MagicMock())
+
+    result = deployer.deploy_worker_nodes("sg-1", ["subnet-a", "subnet-b"], "key", num_workers=1)
+
+    assert result["launched"] == 1
+    assert [call.kwargs["SubnetId"] for call in ec2.run_instances.call_args_list] == ["subnet-a", "subnet-b"]
+
+    ec2.run_instances.reset_mock()
+    ec2.run_instances.side_effect = capacity_error
+    with pytest.raises(NodeDeploymentError):
+        WorkerNodesDeployer(ec2=ec2, autoscaling=MagicMock()).deploy_worker_nodes(
+            "sg-1", ["subnet-a", "subnet-b"], "key", num_workers=1
+        )
+    assert ec2.run_instances.call_count == 2
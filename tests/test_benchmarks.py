@@ -0,0 +1,42 @@
+import asyncio
+import pytest
+
+from benchmarks.compare import compare
+from benchmarks.deploy_benchmark import run_scenario
+from benchmarks.phases import PhaseRecorder, percentile
+
+def test_percentile_interpolates():
+    """Test that percentiles interpolate between samples"""
+    assert percentile([1.0, 2.0, 3.0, 4.0], 50) == 2.5
+    assert percentile([5.0], 99) == 5.0
+    assert percentile([], 50) is None
+
+def test_phase_recorder_merges_overlapping_calls():
+    """Test that concurrent calls of a phase are not double counted"""
+    recorder = PhaseRecorder()
+    recorder.record("launch", 0.0, 2.0)
+    recorder.record("launch", 1.0, 3.0)
+    recorder.record("launch", 5.0, 6.0)
+
+    assert recorder.durations(finished_at=6.0)["launch"] == pytest.approx(4.0)
+
+def test_compare_flags_regressions():
+    """Test that a slowdown beyond the threshold is reported as a regression"""
+    def result(p50):
+        return {"scenarios": [{
+            "provider": "sim-aws", "concurrency": 1, "workers": 3,
+            "latency": {"total": {"p50": p50, "p95": p50}}, "phases": {}
+        }]}
+
+    rows = compare(result(1.0), result(1.5), threshold=20)
+    assert all(row[-1] for row in rows)
+    assert not any(row[-1] for row in compare(result(1.0), result(1.1), threshold=20))
+
+def test_run_scenario_reports_phases(simulator):
+    """Test that a simulated scenario reports latency and per-phase percentiles"""
+    scenario = asyncio.run(run_scenario("sim-aws", 2, 3, 2, "test", {}))
+
+    assert scenario["succeeded"] == 2
+    assert scenario["latency"]["total"]["count"] == 2
+    assert scenario["phases"]["network"]["p50"] > 0
+    assert scenario["phases"]["launch"]["p50"] > 0
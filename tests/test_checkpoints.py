@@ -0,0 +1,81 @@
+import pytest
+from unittest.mock import patch, MagicMock
+
+from minisc.api.main import cluster_id, prepare_deployers
+from minisc.common.checkpoints import Checkpoint, run_step
+from minisc.common.models import ClusterConfig, WorkerNodesConfig
+from minisc.common.exceptions import NetworkDeploymentError
+from minisc.aws.kubernetes_deployer import KubernetesDeployer
+
+@pytest.fixture
+def checkpoint(tmp_path):
+    return Checkpoint("aws-us-east-1-test-cluster", state_dir=str(tmp_path))
+
+@pytest.fixture
+def mock_ec2():
+    ec2 = MagicMock()
+    ec2.create_vpc.return_value = {"Vpc": {"VpcId": "vpc-12345"}}
+    ec2.create_internet_gateway.return_value = {"InternetGateway": {"InternetGatewayId": "igw-12345"}}
+    ec2.create_subnet.return_value = {"Subnet": {"SubnetId": "subnet-12345"}}
+    ec2.create_route_table.return_value = {"RouteTable": {"RouteTableId": "rtb-12345"}}
+    ec2.associate_route_table.return_value = {"AssociationId": "rtbassoc-12345"}
+    return ec2
+
+@pytest.fixture
+def deployer(mock_ec2, checkpoint):
+    with patch("minisc.aws.kubernetes_deployer.throttled_boto3_client", return_value=mock_ec2):
+        deployer = KubernetesDeployer("us-east-1")
+    deployer.use_checkpoint(checkpoint)
+    return deployer
+
+def test_checkpoint_persists_steps(checkpoint, tmp_path):
+    """Test that recorded steps survive a new Checkpoint instance"""
+    checkpoint.record("vpc_id", "vpc-12345")
+
+    reloaded = Checkpoint("aws-us-east-1-test-cluster", state_dir=str(tmp_path))
+    assert reloaded.get("vpc_id") == "vpc-12345"
+
+    reloaded.clear()
+    assert Checkpoint("aws-us-east-1-test-cluster", state_dir=str(tmp_path)).completed() == {}
+
+def test_run_step_skips_recorded_step(checkpoint):
+    """Test that a recorded step is not run again"""
+    func = MagicMock(return_value="sg-12345")
+
+    assert run_step(checkpoint, "security_group_id", func) == "sg-12345"
+    assert run_step(checkpoint, "security_group_id", func) == "sg-12345"
+    func.assert_called_once()
+
+def test_create_vpc_and_subnet_resumes_after_failure(deployer, mock_ec2, checkpoint):
+    """Test that a failed network deploy raises a typed error and resumes where it stopped"""
+    mock_ec2.create_subnet.side_effect = Exception("InvalidSubnet.Conflict")
+
+    with pytest.raises(NetworkDeploymentError) as excinfo:
+        deployer.create_vpc_and_subnet()
+
+    assert excinfo.value.step == "create_vpc_and_subnet"
+    assert excinfo.value.completed["vpc_id"] == "vpc-12345"
+    assert excinfo.value.completed["internet_gateway_id"] == "igw-12345"
+
+    mock_ec2.create_subnet.side_effect = None
+    assert deployer.create_vpc_and_subnet() == ("vpc-12345", "subnet-12345")
+
+    mock_ec2.create_vpc.assert_called_once()
+    mock_ec2.create_internet_gateway.assert_called_once()
+    mock_ec2.attach_internet_gateway.assert_called_once()
+    assert checkpoint.get("route_table_association_id") == "rtbassoc-12345"
+
+def test_fresh_requests_only_discard_their_own_steps(tmp_path, monkeypatch):
+    """Test that a fresh worker deploy keeps the head node's steps and a fresh head deploy the workers'"""
+    monkeypatch.setenv("MINISC_STATE_DIR", str(tmp_path))
+    head = ClusterConfig(provider="aws", region="us-east-1", cluster_name="test", node_size="t3.medium", resume=False)
+    workers = WorkerNodesConfig(**head.model_dump(), worker_count=2)
+    checkpoint = Checkpoint(cluster_id("aws", head))
+    checkpoint.record("vpc_id", "vpc-1")
+    checkpoint.record("master_instance_id", "i-master")
+    checkpoint.record("worker_instance_ids", ["i-1", "i-2"])
+
+    assert prepare_deployers({}, "aws", workers).completed() == {"vpc_id": "vpc-1", "master_instance_id": "i-master"}
+
+    Checkpoint(cluster_id("aws", head)).record("worker_launch_template_id", "lt-1")
+    assert prepare_deployers({}, "aws", head).completed() == {"worker_launch_template_id": "lt-1"}
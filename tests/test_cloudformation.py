@@ -0,0 +1,71 @@
+import pytest
+from botocore.exceptions import ClientError
+from fastapi.testclient import TestClient
+
+from minisc.api.main import app
+from minisc.simulator.cloud import get_simulated_cloud
+from minisc.simulator.cloudformation import simulated_cloudformation_client
+from minisc.simulator.ec2 import simulated_ec2_client
+
+client = TestClient(app)
+
+CLUSTER = {
+    "provider": "sim-aws", "region": "us-east-1", "cluster_name": "stack", "node_size": "t3.medium",
+    "ssh_key_name": "key", "deployment_engine": "cloudformation"
+}
+
+@pytest.fixture
+def cloud(simulator):
+    return get_simulated_cloud("aws", "us-east-1")
+
+def running_instances():
+    reservations = simulated_ec2_client("us-east-1").describe_instances()["Reservations"]
+    return [instance for reservation in reservations for instance in reservation["Instances"]
+            if instance["State"]["Name"] != "terminated"]
+
+@pytest.mark.api
+def test_cluster_is_deployed_as_one_stack(cloud):
+    """Test that stack mode deploys the cluster with one create and one update call and no EC2 calls"""
+    head = client.post("/deploy/head-node", json=CLUSTER)
+    workers = client.post("/deploy/worker-nodes", json={
+        **CLUSTER, "worker_count": 4, "capacity_type": "mixed", "on_demand_base": 1
+    })
+
+    assert head.status_code == 200
+    assert head.json()["head_node_ip"].startswith("198.51.")
+    assert workers.status_code == 200
+    calls = {operation: counts["calls"] for operation, counts in cloud.stats().items()}
+    assert calls["cloudformation:CreateStack"] == 1 and calls["cloudformation:UpdateStack"] == 1
+    assert not [operation for operation in calls if operation.startswith("ec2:")]
+
+    group = cloud.resources[("autoscaling", "us-east-1", "asg", "stack-workers")]
+    lifecycles = sorted(instance["Lifecycle"] for instance in running_instances() if instance["InstanceId"] in group["Instances"])
+    assert lifecycles == ["on-demand", "spot", "spot", "spot"]
+
+@pytest.mark.api
+def test_teardown_deletes_the_stack(cloud):
+    """Test that tearing a stack cluster down deletes every instance with one delete call"""
+    client.post("/deploy/head-node", json=CLUSTER)
+    client.post("/deploy/worker-nodes", json={**CLUSTER, "worker_count": 2})
+    assert len(running_instances()) == 3
+
+    response = client.post("/teardown", json=CLUSTER)
+
+    assert response.status_code == 200
+    assert running_instances() == []
+    with pytest.raises(ClientError):
+        simulated_cloudformation_client("us-east-1").describe_stacks(StackName="minisc-stack")
+    assert client.post("/teardown", json={**CLUSTER, "deployment_engine": "sdk"}).status_code == 422
+
+@pytest.mark.api
+def test_failed_stack_reports_reason_and_is_replaced(cloud):
+    """Test that a rolled-back stack reports the failed resource and is replaced on retry"""
+    cloud.config.instance_quota = 0
+    failed = client.post("/deploy/head-node", json=CLUSTER)
+
+    assert failed.status_code == 500
+    assert "ROLLBACK_COMPLETE" in failed.json()["detail"]["error"]
+    assert "MasterInstance" in failed.json()["detail"]["error"]
+
+    cloud.config.instance_quota = None
+    assert client.post("/deploy/head-node", json=CLUSTER).status_code == 200
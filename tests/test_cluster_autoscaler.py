@@ -0,0 +1,92 @@
+import pytest
+import yaml
+from fastapi.testclient import TestClient
+
+from minisc.api.main import app
+from minisc.aws.kubernetes_deployer import KubernetesDeployer
+from minisc.common.cloud_init import AWS_PROVIDER_ID
+from minisc.common.cluster_autoscaler import aws_manifest
+from minisc.common.join import START_JOIN, SsmJoinStore
+from minisc.simulator.azure import simulated_azure_clients
+from minisc.simulator.cloud import get_simulated_cloud
+
+client = TestClient(app)
+
+AWS_WORKERS = {
+    "provider": "sim-aws", "region": "us-east-1", "cluster_name": "elastic", "node_size": "t3.medium",
+    "ssh_key_name": "key", "auto_scaling_group": True, "cluster_autoscaler": True,
+    "worker_count": 2, "min_workers": 1, "max_workers": 6
+}
+
+AZURE_WORKERS = {
+    "provider": "sim-azure", "region": "westeurope", "cluster_name": "elastic", "node_size": "Standard_D2s_v3",
+    "resource_group_name": "elastic-rg", "vnet_name": "elastic-vnet", "subnet_name": "elastic-subnet",
+    "admin_username": "azureuser", "admin_password": "Password1234!", "cluster_autoscaler": True,
+    "worker_count": 3, "min_workers": 0, "max_workers": 10, "capacity_type": "mixed", "on_demand_base": 1
+}
+
+def test_head_node_applies_autoscaler_manifest():
+    """Test that the master's cloud-init writes the autoscaler manifest and applies it after kubeadm init"""
+    user_data = KubernetesDeployer()._render_master_user_data({"cluster-autoscaler": aws_manifest("elastic", "us-east-1")})
+
+    assert user_data.startswith("#cloud-config\n")
+    config = yaml.safe_load(user_data)
+    manifest = next(f for f in config["write_files"] if f["path"] == "/etc/kubernetes/addons/cluster-autoscaler.yaml")
+    deployment = [doc for doc in yaml.safe_load_all(manifest["content"]) if doc["kind"] == "Deployment"][0]
+    container = deployment["spec"]["template"]["spec"]["containers"][0]
+    assert "--node-group-auto-discovery=asg:tag=k8s.io/cluster-autoscaler/enabled,k8s.io/cluster-autoscaler/elastic" \
+        in container["command"]
+    assert container["env"] == [{"name": "AWS_REGION", "value": "us-east-1"}]
+    assert config["runcmd"][-1].endswith("apply -f /etc/kubernetes/addons/cluster-autoscaler.yaml")
+
+@pytest.mark.api
+def test_aws_autoscaler_runs_with_the_head_nodes_instance_role(simulator):
+    """Test that an autoscaled AWS head node needs an instance profile and is launched with it"""
+    head = {
+        "provider": "sim-aws", "region": "us-east-1", "cluster_name": "elastic", "node_size": "t3.medium",
+        "ssh_key_name": "key", "cluster_autoscaler": True
+    }
+    assert client.post("/deploy/head-node", json=head).status_code == 422
+
+    assert client.post("/deploy/head-node", json={**head, "instance_profile": "minisc-autoscaler"}).status_code == 200
+    cloud = get_simulated_cloud("aws", "us-east-1")
+    master = next(instance for key, instance in cloud.resources.items() if key[2] == "instance")
+    assert master["IamInstanceProfile"]["Arn"].endswith("/minisc-autoscaler")
+
+def test_workers_register_their_provider_id():
+    """Test that workers set the kubelet's provider ID from the instance metadata before they join"""
+    deployer = KubernetesDeployer()
+    deployer.use_join_store(SsmJoinStore("elastic", "us-east-1", "minisc-nodes"))
+    runcmd = yaml.safe_load(deployer._render_worker_user_data(None, None))["runcmd"]
+
+    assert runcmd.index(AWS_PROVIDER_ID) < runcmd.index(START_JOIN)
+    assert "--provider-id=aws:///" in AWS_PROVIDER_ID
+
+@pytest.mark.api
+def test_worker_group_is_tagged_for_autoscaler(simulator):
+    """Test that an autoscaled Auto Scaling group gets the requested bounds and discovery tags"""
+    response = client.post("/deploy/worker-nodes", json=AWS_WORKERS)
+
+    assert response.status_code == 200
+    group = get_simulated_cloud("aws", "us-east-1").resources[("autoscaling", "us-east-1", "asg", "elastic-workers")]
+    assert (group["MinSize"], group["MaxSize"], group["DesiredCapacity"]) == (1, 6, 2)
+    tags = {tag["Key"]: tag["Value"] for tag in group["Tags"]}
+    assert tags["k8s.io/cluster-autoscaler/enabled"] == "true"
+    assert tags["k8s.io/cluster-autoscaler/elastic"] == "owned"
+
+    assert client.post("/deploy/worker-nodes", json={**AWS_WORKERS, "auto_scaling_group": False}).status_code == 422
+    assert client.post("/deploy/worker-nodes", json={**AWS_WORKERS, "max_workers": 1}).status_code == 422
+
+@pytest.mark.api
+def test_scale_sets_are_tagged_with_bounds(simulator):
+    """Test that a mixed Azure pool keeps its regular base fixed and lets the autoscaler size the Spot scale set"""
+    resource_client, compute_client, network_client = simulated_azure_clients()
+    resource_client.resource_groups.create_or_update("elastic-rg", {"location": "westeurope"})
+
+    response = client.post("/deploy/worker-nodes", json=AZURE_WORKERS)
+
+    assert response.status_code == 200
+    regular = compute_client.virtual_machine_scale_sets.get("elastic-rg", "elastic-workers")
+    spot = compute_client.virtual_machine_scale_sets.get("elastic-rg", "elastic-workers-spot")
+    assert regular.tags == {"cluster-autoscaler-enabled": "true", "cluster-autoscaler-name": "elastic", "min": "1", "max": "1"}
+    assert (spot.tags["min"], spot.tags["max"]) == ("0", "9")
@@ -0,0 +1,89 @@
+import pytest
+import yaml
+from fastapi.testclient import TestClient
+
+from minisc.api.main import app
+from minisc.aws.kubernetes_deployer import KubernetesDeployer
+from minisc.common.cloud_init import KUBEADM_CONFIG
+from minisc.common.join import JOIN_SCRIPT, PUBLISH_SCRIPT, SsmJoinStore
+from minisc.simulator.azure import simulated_azure_clients
+from minisc.simulator.cloud import get_simulated_cloud
+from minisc.simulator.elbv2 import simulated_elbv2_client
+
+client = TestClient(app)
+
+IDENTITY = "/subscriptions/sub/resourceGroups/ids/providers/Microsoft.ManagedIdentity/userAssignedIdentities/nodes"
+
+AWS_CLUSTER = {
+    "provider": "sim-aws", "region": "us-east-1", "cluster_name": "ha", "node_size": "t3.medium",
+    "ssh_key_name": "key", "auto_join": True, "instance_profile": "minisc-nodes", "control_plane_nodes": 3,
+    "availability_zones": ["us-east-1a", "us-east-1b", "us-east-1c"]
+}
+
+AZURE_CLUSTER = {
+    "provider": "sim-azure", "region": "westeurope", "cluster_name": "ha", "node_size": "Standard_D2s_v3",
+    "resource_group_name": "ha-rg", "vnet_name": "ha-vnet", "subnet_name": "ha-subnet",
+    "admin_username": "azureuser", "admin_password": "Password1234!", "control_plane_nodes": 3,
+    "auto_join": True, "key_vault_name": "ha-kv", "managed_identity_id": IDENTITY
+}
+
+def files(config):
+    return {f["path"]: f["content"] for f in config["write_files"]}
+
+def test_first_node_inits_and_the_others_join_the_endpoint():
+    """Test that the first control-plane node inits for the load balancer's endpoint and the others join it"""
+    deployer = KubernetesDeployer()
+    deployer.use_join_store(SsmJoinStore("ha", "us-east-1", "minisc-nodes"))
+
+    first = yaml.safe_load(deployer._render_master_user_data(endpoint="api.example.com", first=True))
+    cluster = next(d for d in yaml.safe_load_all(files(first)[KUBEADM_CONFIG]) if d["kind"] == "ClusterConfiguration")
+    assert cluster["controlPlaneEndpoint"] == "api.example.com:6443"
+    assert any(command.startswith("kubeadm init") for command in first["runcmd"])
+    assert "upload-certs" in files(first)[PUBLISH_SCRIPT]
+    assert "/minisc/ha/control-plane-join-command" in files(first)[PUBLISH_SCRIPT]
+
+    joiner = yaml.safe_load(deployer._render_master_user_data(endpoint="api.example.com", first=False))
+    assert not any(command.startswith("kubeadm init") for command in joiner["runcmd"])
+    assert JOIN_SCRIPT in joiner["runcmd"]
+    assert "/minisc/ha/control-plane-join-command" in files(joiner)[JOIN_SCRIPT]
+
+@pytest.mark.api
+def test_aws_control_plane_behind_network_load_balancer(simulator):
+    """Test that an AWS control plane is spread across zones and registered with the API load balancer"""
+    response = client.post("/deploy/head-node", json=AWS_CLUSTER)
+
+    assert response.status_code == 200
+    endpoint = response.json()["api_endpoint"]
+    cloud = get_simulated_cloud("aws", "us-east-1")
+    nodes = [instance for key, instance in cloud.resources.items() if key[2] == "instance"]
+    assert len(nodes) == 3 and len({node["SubnetId"] for node in nodes}) == 3
+
+    elbv2 = simulated_elbv2_client("us-east-1")
+    balancer = elbv2.describe_load_balancers(Names=["ha-api"])["LoadBalancers"][0]
+    assert (balancer["DNSName"], balancer["Type"]) == (endpoint, "network")
+    group_arn = next(arn for (service, _, kind, arn) in cloud.resources if (service, kind) == ("elbv2", "tg"))
+    targets = elbv2.describe_target_health(TargetGroupArn=group_arn)["TargetHealthDescriptions"]
+    assert sorted(t["Target"]["Id"] for t in targets) == sorted(node["PrivateIpAddress"] for node in nodes)
+
+    assert client.post("/deploy/head-node", json={**AWS_CLUSTER, "control_plane_nodes": 2}).status_code == 422
+    assert client.post("/deploy/head-node", json={**AWS_CLUSTER, "auto_join": False}).status_code == 422
+
+@pytest.mark.api
+def test_azure_control_plane_behind_load_balancer(simulator):
+    """Test that Azure control-plane VMs are in the backend pool of a load balancer with a DNS name"""
+    resource_client, compute_client, network_client = simulated_azure_clients()
+    resource_client.resource_groups.create_or_update("ha-rg", {"location": "westeurope"})
+
+    response = client.post("/deploy/head-node", json=AZURE_CLUSTER)
+
+    assert response.status_code == 200
+    assert response.json()["api_endpoint"].endswith(".westeurope.cloudapp.azure.com")
+    balancer = network_client.load_balancers.get("ha-rg", "ha-api-lb")
+    assert [rule.name for rule in balancer.load_balancing_rules] == ["api"]
+    for index in range(3):
+        assert compute_client.virtual_machines.get("ha-rg", f"ha-{index}").identity.type == "UserAssigned"
+        nic = network_client.network_interfaces.get("ha-rg", f"ha-{index}-nic")
+        pool = nic.ip_configurations[0].load_balancer_backend_address_pools[0]
+        assert pool.id == f"{balancer.id}/backendAddressPools/control-plane"
+
+    assert client.post("/deploy/head-node", json={**AZURE_CLUSTER, "deployment_engine": "arm"}).status_code == 422
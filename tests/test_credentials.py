@@ -0,0 +1,60 @@
+import threading
+import time
+from azure.core.credentials import AccessToken
+
+from minisc.azure.credentials import SharedTokenCredential, get_credential, persistence_options
+from minisc.common.provider_factory import CloudProviderFactory
+
+SCOPE = "https://management.azure.com/.default"
+
+class CountingCredential:
+    def __init__(self, lifetime=3600, delay=0):
+        self.calls = 0
+        self.lifetime = lifetime
+        self.delay = delay
+
+    def get_token(self, *scopes, **kwargs):
+        self.calls += 1
+        time.sleep(self.delay)
+        return AccessToken(f"token-{self.calls}", int(time.time()) + self.lifetime)
+
+def test_tokens_are_cached_until_near_expiry():
+    """Test that a token is reused until it is within the refresh margin of expiring"""
+    fresh = CountingCredential()
+    credential = SharedTokenCredential(fresh)
+    assert credential.get_token(SCOPE).token == credential.get_token(SCOPE).token == "token-1"
+    assert credential.get_token(SCOPE, claims="challenge").token == "token-2"
+
+    expiring = SharedTokenCredential(CountingCredential(lifetime=60))
+    assert expiring.get_token(SCOPE).token == "token-1"
+    assert expiring.get_token(SCOPE).token == "token-2"
+
+def test_concurrent_callers_share_one_acquisition():
+    """Test that concurrent requests for an expired token trigger a single acquisition"""
+    inner = CountingCredential(delay=0.05)
+    credential = SharedTokenCredential(inner)
+
+    threads = [threading.Thread(target=credential.get_token, args=(SCOPE,)) for _ in range(10)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert inner.calls == 1
+
+def test_deployers_share_the_service_principal_credential():
+    """Test that head and worker deployers for one service principal share a credential"""
+    settings = {"tenant_id": "tenant", "client_id": "client", "client_secret": "secret", "subscription_id": "sub"}
+    provider = CloudProviderFactory.get_provider("azure", settings)
+
+    assert provider["head_node_deployer"].credential is provider["worker_nodes_deployer"].credential
+    assert get_credential("tenant", "client", "other-secret") is not provider["head_node_deployer"].credential
+
+def test_persistent_cache_is_opt_in(monkeypatch):
+    """Test that the persistent token cache is only configured when requested"""
+    monkeypatch.delenv("MINISC_AZURE_TOKEN_CACHE", raising=False)
+    assert persistence_options() is None
+
+    monkeypatch.setenv("MINISC_AZURE_TOKEN_CACHE", "minisc")
+    options = persistence_options()
+    assert options.name == "minisc" and options.allow_unencrypted_storage is False
@@ -0,0 +1,64 @@
+import asyncio
+import io
+import pytest
+import httpx
+import yaml
+
+from minisc.api.main import app
+from minisc.fleet import DONE, FAILED, FleetSpec, load_fleet, main, run_fleet, summary
+from minisc.sdk import AsyncMiniscClient
+
+AZURE = {
+    "provider": "sim-azure", "region": "westeurope", "node_size": "Standard_D2s_v3",
+    "resource_group_name": "fleet-rg", "vnet_name": "fleet-vnet", "subnet_name": "fleet-subnet",
+    "admin_username": "azureuser", "admin_password": "Password1234!",
+}
+
+def write_spec(tmp_path, spec):
+    path = tmp_path / "fleet.yaml"
+    path.write_text(yaml.safe_dump(spec))
+    return str(path)
+
+def test_load_fleet_applies_defaults(tmp_path):
+    """Test that fleet defaults are merged into every cluster and worker_count defaults to 0"""
+    spec = load_fleet(write_spec(tmp_path, {
+        "defaults": {"provider": "aws", "node_size": "t3.medium", "ssh_key_name": "ops"},
+        "clusters": [{"region": "us-east-1", "cluster_name": "a"}, {"region": "eu-west-1", "cluster_name": "b", "node_size": "m5.large"}],
+    }))
+
+    configs = spec.cluster_configs()
+    assert [config.node_size for config in configs] == ["t3.medium", "m5.large"]
+    assert configs[0].worker_count == 0 and configs[1].ssh_key_name == "ops"
+
+def test_invalid_spec_exits_before_deploying(tmp_path, capsys):
+    """Test that a spec with invalid or duplicate clusters is rejected up front"""
+    missing = write_spec(tmp_path, {"clusters": [{"provider": "aws", "cluster_name": "a"}]})
+    assert main([missing]) == 2
+
+    duplicate = write_spec(tmp_path, {"defaults": {"provider": "aws", "region": "us-east-1", "node_size": "t3.medium"},
+                                      "clusters": [{"cluster_name": "a"}, {"cluster_name": "a"}]})
+    assert main([duplicate]) == 2
+    assert "duplicate cluster names a" in capsys.readouterr().err
+
+@pytest.mark.api
+def test_run_fleet_deploys_clusters_concurrently(simulator):
+    """Test that a multi-cloud fleet deploys every cluster and reports failures without stopping the rest"""
+    configs = FleetSpec(clusters=[
+        {"provider": "sim-aws", "region": "us-east-1", "cluster_name": "fleet-aws", "node_size": "t3.medium",
+         "ssh_key_name": "ops", "worker_count": 2},
+        {**AZURE, "cluster_name": "fleet-azure", "worker_count": 2},
+        {"provider": "gcp", "region": "us-central1", "cluster_name": "fleet-gcp", "node_size": "e2-medium"},
+    ]).cluster_configs()
+    out = io.StringIO()
+
+    async def deploy():
+        async with AsyncMiniscClient("http://minisc", transport=httpx.ASGITransport(app=app)) as client:
+            return await run_fleet(configs, client, concurrency=3, out=out)
+
+    clusters = asyncio.run(deploy())
+    result = summary(clusters, 1.0)
+
+    assert [cluster["status"] for cluster in result["clusters"]] == [DONE, DONE, FAILED]
+    assert result["succeeded"] == 2 and result["failed"] == 1
+    assert result["clusters"][1]["worker_nodes_seconds"] is not None
+    assert "fleet-aws: workers" in out.getvalue()
@@ -0,0 +1,88 @@
+import pytest
+from unittest.mock import MagicMock
+from fastapi import HTTPException
+
+from minisc.api import main
+from minisc.aws.worker_nodes_deployer import WorkerNodesDeployer
+from minisc.common.interruption_watcher import InterruptionWatcher
+from minisc.common.models import WorkerNodesConfig
+
+@pytest.fixture
+def interrupted_workers():
+    return [
+        {"id": "i-111", "node_name": "ip-10-0-1-11.ec2.internal"},
+        {"id": "i-222", "node_name": "ip-10-0-1-22.ec2.internal"}
+    ]
+
+def test_poll_once_cordons_and_replaces(interrupted_workers):
+    """Test that reclaimed workers are cordoned and replaced one for one"""
+    cordon = MagicMock()
+    replace = MagicMock()
+    watcher = InterruptionWatcher(lambda: interrupted_workers, cordon, replace)
+
+    handled = watcher.poll_once()
+
+    assert handled == interrupted_workers
+    cordon.assert_called_once_with(["ip-10-0-1-11.ec2.internal", "ip-10-0-1-22.ec2.internal"])
+    replace.assert_called_once_with(2)
+
+def test_poll_once_skips_handled_workers(interrupted_workers):
+    """Test that a worker still reported as interrupted is only replaced once"""
+    replace = MagicMock()
+    watcher = InterruptionWatcher(lambda: interrupted_workers, MagicMock(), replace)
+
+    watcher.poll_once()
+    assert watcher.poll_once() == []
+    replace.assert_called_once_with(2)
+
+def test_poll_once_replaces_when_cordon_fails(interrupted_workers):
+    """Test that an unreachable master does not block replacement"""
+    cordon = MagicMock(side_effect=Exception("connection refused"))
+    replace = MagicMock()
+    watcher = InterruptionWatcher(lambda: interrupted_workers, cordon, replace)
+
+    watcher.poll_once()
+
+    replace.assert_called_once_with(2)
+
+def test_watchers_are_kept_per_provider_and_region(monkeypatch):
+    """Test that a same-named cluster in another region does not stop the first cluster's watcher"""
+    monkeypatch.setattr(InterruptionWatcher, "start", lambda self: None)
+    monkeypatch.setattr(main, "interruption_watchers", {})
+    east = WorkerNodesConfig(provider="aws", region="us-east-1", cluster_name="spot", node_size="t3.medium",
+                             worker_count=2, capacity_type="spot")
+
+    first = main.start_interruption_watcher("aws", MagicMock(), east)
+    first.stop = MagicMock()
+    main.start_interruption_watcher("aws", MagicMock(), east.model_copy(update={"region": "us-west-2"}))
+
+    first.stop.assert_not_called()
+    assert set(main.interruption_watchers) == {"aws-us-east-1-spot", "aws-us-west-2-spot"}
+
+def test_resumed_deploy_watches_only_its_checkpointed_workers():
+    """Test that a resumed deploy watches its checkpointed workers, and no workers means no region-wide query"""
+    ec2 = MagicMock()
+    ec2.describe_spot_instance_requests.return_value = {"SpotInstanceRequests": []}
+    deployer = WorkerNodesDeployer(ec2=ec2, autoscaling=MagicMock())
+    assert deployer.find_interrupted_workers() == []
+    ec2.describe_spot_instance_requests.assert_not_called()
+    config = WorkerNodesConfig(provider="aws", region="us-east-1", cluster_name="spot", node_size="t3.medium",
+                               worker_count=2, capacity_type="spot", master_ip="10.0.0.1")
+    assert main.start_interruption_watcher("aws", deployer, config) is None
+
+    deployer.use_checkpoint(MagicMock(get=MagicMock(return_value=["i-111", "i-222"])))
+    deployer.deploy_worker_nodes("sg-1", "subnet-1", "key", num_workers=2, capacity_type="spot")
+
+    deployer.find_interrupted_workers()
+    filters = ec2.describe_spot_instance_requests.call_args.kwargs["Filters"]
+    assert {"Name": "instance-id", "Values": ["i-111", "i-222"]} in filters
+
+def test_watching_interruptions_needs_the_master():
+    """Test that watch_interruptions without master_ip is rejected, as the watcher drains nodes on the master"""
+    config = WorkerNodesConfig(provider="sim-aws", region="us-east-1", cluster_name="spot", node_size="t3.medium",
+                               worker_count=2, capacity_type="spot", watch_interruptions=True)
+
+    with pytest.raises(HTTPException) as excinfo:
+        main.check_interruption_watcher(config)
+    assert excinfo.value.status_code == 422
+    main.check_interruption_watcher(config.model_copy(update={"master_ip": "10.0.0.1"}))
@@ -0,0 +1,64 @@
+import pytest
+import yaml
+from fastapi.testclient import TestClient
+
+from minisc.api.main import app
+from minisc.aws.kubernetes_deployer import KubernetesDeployer
+from minisc.common.ipam import AddressManager, PodNetwork
+from minisc.simulator.cloud import get_simulated_cloud
+
+client = TestClient(app)
+
+CLUSTER = {
+    "provider": "sim-aws", "region": "us-east-1", "node_size": "t3.medium", "ssh_key_name": "key",
+    "ipam": True, "max_nodes": 500, "max_pods": 60
+}
+
+@pytest.fixture
+def cloud(simulator):
+    return get_simulated_cloud("aws", "us-east-1")
+
+def test_allocations_do_not_overlap_and_persist(tmp_path):
+    """Test that clusters get disjoint CIDRs sized for their nodes and pods, kept across restarts"""
+    ipam = AddressManager(state_dir=str(tmp_path))
+
+    large = ipam.allocate("aws-us-east-1-large", nodes=1000, zones=3)
+    small = ipam.allocate("aws-us-east-1-small", nodes=10, max_pods=250)
+
+    assert large.network == "10.0.0.0/21"
+    assert large.pods == PodNetwork("100.64.0.0/14", 24, 110)
+    assert small.network == "10.0.8.0/28"
+    assert small.pods == PodNetwork("100.68.0.0/19", 23, 250)
+    assert AddressManager(state_dir=str(tmp_path)).allocate("aws-us-east-1-small", nodes=99) == small
+
+    assert ipam.release("aws-us-east-1-large")
+    assert ipam.allocate("aws-us-east-1-next", nodes=250).network == "10.0.0.0/24"
+    with pytest.raises(ValueError):
+        AddressManager(state_dir=str(tmp_path), network_pool="100.64.0.0/16")
+
+def test_head_node_uses_pod_network():
+    """Test that the head node's kubeadm config and network plugin use the allocated pod network"""
+    user_data = KubernetesDeployer()._render_master_user_data(pod_network=PodNetwork("100.64.0.0/14", 25, 60))
+
+    config = yaml.safe_load(user_data)
+    kubeadm = next(f for f in config["write_files"] if f["path"] == "/etc/kubernetes/kubeadm-config.yaml")
+    cluster, kubelet = yaml.safe_load_all(kubeadm["content"])
+    assert cluster["networking"]["podSubnet"] == "100.64.0.0/14"
+    assert cluster["controllerManager"]["extraArgs"]["node-cidr-mask-size"] == "25"
+    assert kubelet["maxPods"] == 60
+    assert any("sed 's#10.244.0.0/16#100.64.0.0/14#'" in command for command in config["runcmd"])
+
+@pytest.mark.api
+def test_clusters_get_disjoint_vpcs(cloud):
+    """Test that clusters deployed with IPAM get their allocated, non-overlapping VPCs"""
+    for name in ("east", "west"):
+        assert client.post("/deploy/head-node", json={**CLUSTER, "cluster_name": name}).status_code == 200
+
+    allocations = client.get("/ipam/allocations").json()
+    vpcs = sorted(vpc["CidrBlock"] for key, vpc in cloud.resources.items() if key[2] == "vpc")
+    assert vpcs == sorted(allocations[f"sim-aws-us-east-1-{name}"]["network"] for name in ("east", "west"))
+    assert vpcs == ["10.0.0.0/23", "10.0.2.0/23"]
+    assert allocations["sim-aws-us-east-1-east"]["node_mask"] == 25
+
+    assert client.delete("/ipam/allocations/sim-aws-us-east-1-east").status_code == 200
+    assert client.delete("/ipam/allocations/sim-aws-us-east-1-east").status_code == 404
@@ -0,0 +1,100 @@
+import base64
+import pytest
+import yaml
+from fastapi.testclient import TestClient
+
+from minisc.api.main import app
+from minisc.aws.kubernetes_deployer import KubernetesDeployer
+from minisc.common.cloud_init import AWS_WARM_POOL_POWER_OFF
+from minisc.common.join import JOIN_SCRIPT, PUBLISH_SCRIPT, START_JOIN, KeyVaultJoinStore, SsmJoinStore
+from minisc.simulator.azure import simulated_azure_clients
+from minisc.simulator.cloud import get_simulated_cloud
+
+client = TestClient(app)
+
+IDENTITY = "/subscriptions/sub/resourceGroups/ids/providers/Microsoft.ManagedIdentity/userAssignedIdentities/nodes"
+
+AWS_CLUSTER = {
+    "provider": "sim-aws", "region": "us-east-1", "cluster_name": "joined", "node_size": "t3.medium",
+    "ssh_key_name": "key", "auto_join": True, "instance_profile": "minisc-nodes"
+}
+
+AZURE_CLUSTER = {
+    "provider": "sim-azure", "region": "westeurope", "cluster_name": "joined", "node_size": "Standard_D2s_v3",
+    "resource_group_name": "joined-rg", "vnet_name": "joined-vnet", "subnet_name": "joined-subnet",
+    "admin_username": "azureuser", "admin_password": "Password1234!",
+    "auto_join": True, "key_vault_name": "joined-kv", "managed_identity_id": IDENTITY
+}
+
+def files(config):
+    return {f["path"]: f["content"] for f in config["write_files"]}
+
+def test_head_publishes_and_workers_fetch_join_command():
+    """Test that the head node publishes a rotated join command right after kubeadm init and workers fetch it"""
+    deployer = KubernetesDeployer()
+    deployer.use_join_store(SsmJoinStore("joined", "us-east-1", "minisc-nodes", rotation_hours=6))
+
+    head = yaml.safe_load(deployer._render_master_user_data())
+    init = next(i for i, command in enumerate(head["runcmd"]) if command.startswith("kubeadm init"))
+    assert head["runcmd"][init + 3:init + 5] == [
+        "systemctl enable --now minisc-publish-join.timer", "systemctl start minisc-publish-join.service"
+    ]
+    assert "--ttl 12h --print-join-command" in files(head)[PUBLISH_SCRIPT]
+    assert "--name /minisc/joined/join-command --type SecureString" in files(head)[PUBLISH_SCRIPT]
+    assert "OnUnitActiveSec=6h" in files(head)["/etc/systemd/system/minisc-publish-join.timer"]
+
+    worker = yaml.safe_load(deployer._render_worker_user_data(None, None))
+    assert "aws ssm get-parameter --region us-east-1 --name /minisc/joined/join-command" in files(worker)[JOIN_SCRIPT]
+    assert worker["runcmd"][-2:] == ["systemctl enable minisc-join.service", START_JOIN]
+    warm = yaml.safe_load(deployer._render_worker_user_data(None, None, warm_pool=True))
+    assert warm["runcmd"][-2:] == [AWS_WARM_POOL_POWER_OFF, START_JOIN]
+
+    vault = KeyVaultJoinStore("joined", "joined-kv", IDENTITY)
+    assert any(f"msi_res_id={IDENTITY}" in command for command in vault.fetch())
+    assert "https://joined-kv.vault.azure.net/secrets/joined-join-command?" in vault.url()
+
+@pytest.mark.api
+def test_aws_nodes_get_the_instance_profile(simulator):
+    """Test that the master and workers of an auto-joining AWS cluster run with the store's instance profile"""
+    assert client.post("/deploy/head-node", json=AWS_CLUSTER).status_code == 200
+    workers = {**AWS_CLUSTER, "worker_count": 2, "auto_scaling_group": True}
+    assert client.post("/deploy/worker-nodes", json=workers).status_code == 200
+
+    cloud = get_simulated_cloud("aws", "us-east-1")
+    nodes = [instance for key, instance in cloud.resources.items() if key[2] == "instance"]
+    assert len(nodes) == 3
+    assert {node["IamInstanceProfile"]["Arn"].split("/")[-1] for node in nodes} == {"minisc-nodes"}
+
+    assert client.post("/deploy/head-node", json={**AWS_CLUSTER, "instance_profile": None}).status_code == 422
+    assert client.post("/deploy/head-node", json={**AWS_CLUSTER, "deployment_engine": "cloudformation"}).status_code == 422
+
+@pytest.mark.api
+def test_group_workers_complete_their_join_hook_once_joined(simulator):
+    """Test that auto-joining group workers complete the join hook from their join script rather than the deployer"""
+    workers = {**AWS_CLUSTER, "worker_count": 2, "auto_scaling_group": True}
+    assert client.post("/deploy/worker-nodes", json=workers).status_code == 200
+
+    cloud = get_simulated_cloud("aws", "us-east-1")
+    assert "autoscaling:CompleteLifecycleAction" not in cloud.stats()
+    template = next(resource for key, resource in cloud.resources.items() if key[2] == "lt")
+    join_script = files(yaml.safe_load(base64.b64decode(template["LaunchTemplateData"]["UserData"])))[JOIN_SCRIPT]
+    completion = join_script.split("\ndone\n", 1)[1]
+    assert "aws autoscaling complete-lifecycle-action --region us-east-1 --auto-scaling-group-name joined-workers" \
+        " --lifecycle-hook-name minisc-join" in completion
+
+@pytest.mark.api
+def test_azure_nodes_get_the_managed_identity(simulator):
+    """Test that the head node and scale set of an auto-joining Azure cluster run as the store's identity"""
+    resource_client, compute_client, network_client = simulated_azure_clients()
+    resource_client.resource_groups.create_or_update("joined-rg", {"location": "westeurope"})
+
+    assert client.post("/deploy/head-node", json=AZURE_CLUSTER).status_code == 200
+    assert client.post("/deploy/worker-nodes", json={**AZURE_CLUSTER, "worker_count": 2}).status_code == 200
+
+    head = compute_client.virtual_machines.get("joined-rg", "joined")
+    workers = compute_client.virtual_machine_scale_sets.get("joined-rg", "joined-workers")
+    for node in (head, workers):
+        assert node.identity.type == "UserAssigned"
+        assert list(node.identity.user_assigned_identities) == [IDENTITY]
+
+    assert client.post("/deploy/head-node", json={**AZURE_CLUSTER, "key_vault_name": None}).status_code == 422
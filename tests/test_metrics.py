@@ -0,0 +1,69 @@
+import pytest
+from unittest.mock import MagicMock
+from botocore.exceptions import ClientError
+from fastapi.testclient import TestClient
+
+from minisc.api.main import app
+from minisc.common.metrics import Counter, Histogram, MetricsRegistry, DEPLOY_STEP_SECONDS, CLOUD_RETRIES, CLOUD_THROTTLES, timed_step
+from minisc.common.throttling import azure_operation, call_with_retry
+
+client = TestClient(app)
+
+@pytest.fixture(autouse=True)
+def no_sleep(monkeypatch):
+    monkeypatch.setattr("minisc.common.throttling.time.sleep", lambda seconds: None)
+
+def test_registry_renders_prometheus_text():
+    """Test that counters and histograms render in the Prometheus text format"""
+    registry = MetricsRegistry()
+    counter = registry.register(Counter("test_total", "A counter.", ["operation"]))
+    histogram = registry.register(Histogram("test_seconds", "A histogram.", ["step"], buckets=(0.1, 1)))
+
+    counter.inc(operation='Run"Instances')
+    histogram.observe(0.5, step="launch")
+
+    text = registry.render()
+    assert "# TYPE test_total counter" in text
+    assert 'test_total{operation="Run\\"Instances"} 1' in text
+    assert 'test_seconds_bucket{step="launch",le="0.1"} 0' in text
+    assert 'test_seconds_bucket{step="launch",le="+Inf"} 1' in text
+    assert 'test_seconds_count{step="launch"} 1' in text
+
+def test_call_with_retry_counts_retries_and_throttles():
+    """Test that throttled attempts are counted as throttles and retries"""
+    error = ClientError({"Error": {"Code": "RequestLimitExceeded", "Message": ""}}, "CreateFleet")
+    func = MagicMock(side_effect=[error, "ok"])
+    retries = CLOUD_RETRIES.value(provider="aws", operation="CreateFleet", reason="throttled")
+    throttles = CLOUD_THROTTLES.value(provider="aws", operation="CreateFleet")
+
+    call_with_retry(func, provider="aws", operation="CreateFleet")
+
+    assert CLOUD_RETRIES.value(provider="aws", operation="CreateFleet", reason="throttled") == retries + 1
+    assert CLOUD_THROTTLES.value(provider="aws", operation="CreateFleet") == throttles + 1
+
+def test_timed_step_records_outcome():
+    """Test that a failing step is recorded with an error outcome"""
+    @timed_step("aws", "test_step")
+    def failing_step():
+        raise RuntimeError("boom")
+
+    with pytest.raises(RuntimeError):
+        failing_step()
+    assert DEPLOY_STEP_SECONDS.count(provider="aws", step="test_step", outcome="error") == 1
+
+def test_azure_operation_labels_by_resource_type():
+    """Test that ARM requests are labelled by method and resource type, not by name"""
+    request = MagicMock(method="PUT", url=(
+        "https://management.azure.com/subscriptions/s/resourceGroups/rg/providers/"
+        "Microsoft.Compute/virtualMachineScaleSets/workers-3?api-version=2024-07-01"
+    ))
+    assert azure_operation(request) == "PUT virtualMachineScaleSets"
+
+@pytest.mark.api
+def test_metrics_endpoint():
+    """Test that /metrics serves the registry"""
+    response = client.get("/metrics")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    assert "# TYPE minisc_cloud_retries_total counter" in response.text
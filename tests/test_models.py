@@ -79,4 +79,18 @@ def test_worker_nodes_config_missing_worker_count():
             node_size="Standard_D2s_v3"
         )
     
-    assert "worker_count" in str(excinfo.value)
\ No newline at end of file
+    assert "worker_count" in str(excinfo.value)
+
+def test_worker_nodes_config_rejects_unknown_capacity_type():
+    """Test that capacity_type must be on-demand, spot or mixed"""
+    with pytest.raises(ValidationError) as excinfo:
+        WorkerNodesConfig(
+            provider="aws",
+            region="us-east-1",
+            cluster_name="worker-cluster",
+            node_size="t3.medium",
+            worker_count=3,
+            capacity_type="spots"
+        )
+
+    assert "capacity_type" in str(excinfo.value)
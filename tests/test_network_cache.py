@@ -0,0 +1,51 @@
+import pytest
+from azure.core.exceptions import ResourceNotFoundError
+
+from minisc.azure.head_node import HeadNodeDeployer
+from minisc.azure.network_cache import NetworkCache, network_cache
+from minisc.simulator.azure import simulated_azure_clients
+from minisc.simulator.cloud import get_simulated_cloud
+
+@pytest.fixture
+def deployer(simulator):
+    deployer = HeadNodeDeployer("tenant", "client", "secret", "simulator", clients=simulated_azure_clients())
+    deployer.create_resource_group("net-rg", "westeurope")
+    return deployer
+
+def get_calls():
+    stats = get_simulated_cloud("azure", "simulator").stats()
+    return sum(counts["calls"] for operation, counts in stats.items() if operation.endswith(".get"))
+
+def test_repeated_deploys_reuse_the_resolved_subnet(deployer):
+    """Test that a second network resolution within the TTL makes no ARM calls"""
+    subnet = deployer._ensure_network_exists("net-rg", "westeurope", "net-vnet", "net-subnet")
+    calls = get_calls()
+
+    assert deployer._ensure_network_exists("NET-RG", "westeurope", "net-vnet", "net-subnet") is subnet
+    assert get_calls() == calls
+
+def test_stale_entries_are_revalidated_by_etag(deployer, monkeypatch):
+    """Test that an expired entry costs one conditional GET and picks up changes"""
+    monkeypatch.setattr(network_cache, "ttl", 0)
+    subnet = deployer._ensure_network_exists("net-rg", "westeurope", "net-vnet", "net-subnet")
+    calls = get_calls()
+
+    assert deployer._ensure_network_exists("net-rg", "westeurope", "net-vnet", "net-subnet") is subnet
+    assert get_calls() == calls + 1
+
+    etag = subnet.etag
+    deployer.network_client.subnets.begin_create_or_update("net-rg", "net-vnet", "net-subnet", {"address_prefix": "10.0.1.0/24"}).result()
+    updated = deployer._ensure_network_exists("net-rg", "westeurope", "net-vnet", "net-subnet")
+    assert updated.etag != etag and updated.address_prefix == "10.0.1.0/24"
+
+def test_missing_subnets_are_dropped_from_the_cache():
+    """Test that a subnet deleted since it was cached is resolved again"""
+    cache = NetworkCache(ttl=0)
+    key = cache.key("sub", "rg", "vnet", "subnet")
+    cache.put(key, object())
+
+    def deleted(etag):
+        raise ResourceNotFoundError("gone")
+
+    assert cache.get(key, deleted) is None
+    assert cache.get(key, deleted) is None
@@ -0,0 +1,70 @@
+from collections import Counter
+
+import pytest
+from fastapi.testclient import TestClient
+
+from minisc.api.main import app
+from minisc.common.network_plan import plan_subnets
+from minisc.simulator.azure import simulated_azure_clients
+from minisc.simulator.cloud import get_simulated_cloud
+
+client = TestClient(app)
+
+ZONES = ["us-east-1a", "us-east-1b", "us-east-1c"]
+
+AWS_CLUSTER = {
+    "provider": "sim-aws", "region": "us-east-1", "cluster_name": "zonal", "node_size": "t3.medium",
+    "ssh_key_name": "key", "availability_zones": ZONES, "max_nodes": 1000
+}
+
+AZURE_WORKERS = {
+    "provider": "sim-azure", "region": "westeurope", "cluster_name": "zonal", "node_size": "Standard_D2s_v3",
+    "resource_group_name": "zonal-rg", "vnet_name": "zonal-vnet", "subnet_name": "zonal-subnet",
+    "admin_username": "azureuser", "admin_password": "Password1234!", "worker_count": 3,
+    "availability_zones": ["1", "2", "3"], "max_nodes": 2000
+}
+
+def test_plan_subnets():
+    """Test that the planner sizes one subnet per zone for the nodes, or splits the network evenly"""
+    assert [subnet.cidr for subnet in plan_subnets("10.0.0.0/16", ZONES, max_nodes=1000)] == [
+        "10.0.0.0/23", "10.0.2.0/23", "10.0.4.0/23"
+    ]
+    assert [subnet.cidr for subnet in plan_subnets("10.0.0.0/16", ZONES)] == [
+        "10.0.0.0/18", "10.0.64.0/18", "10.0.128.0/18"
+    ]
+    assert plan_subnets("10.0.0.0/16", max_nodes=3)[0] == (None, "10.0.0.0/28")
+    with pytest.raises(ValueError):
+        plan_subnets("10.0.0.0/16", ZONES, max_nodes=200000)
+
+@pytest.mark.api
+def test_workers_are_spread_across_zones(simulator):
+    """Test that an AWS cluster gets a subnet per zone and its workers are launched evenly across them"""
+    assert client.post("/deploy/head-node", json=AWS_CLUSTER).status_code == 200
+    response = client.post("/deploy/worker-nodes", json={**AWS_CLUSTER, "worker_count": 6})
+
+    assert response.status_code == 200
+    cloud = get_simulated_cloud("aws", "us-east-1")
+    subnets = {key[3]: subnet for key, subnet in cloud.resources.items() if key[2] == "subnet"}
+    assert sorted((subnet["AvailabilityZone"], subnet["CidrBlock"]) for subnet in subnets.values()) == [
+        ("us-east-1a", "10.0.0.0/23"), ("us-east-1b", "10.0.2.0/23"), ("us-east-1c", "10.0.4.0/23")
+    ]
+    nodes = [instance for key, instance in cloud.resources.items()
+             if key[2] == "instance" and instance["InstanceType"] == "t3.medium"]
+    zones = Counter(subnets[instance["SubnetId"]]["AvailabilityZone"] for instance in nodes)
+    # Two workers per zone, plus the master in the first one
+    assert zones == {"us-east-1a": 3, "us-east-1b": 2, "us-east-1c": 2}
+
+    assert client.post("/deploy/head-node", json={**AWS_CLUSTER, "max_nodes": 10 ** 6}).status_code == 422
+
+@pytest.mark.api
+def test_scale_sets_are_zone_balanced(simulator):
+    """Test that an Azure pool's scale set spans the zones in a subnet sized for the cluster"""
+    resource_client, compute_client, network_client = simulated_azure_clients()
+    resource_client.resource_groups.create_or_update("zonal-rg", {"location": "westeurope"})
+
+    response = client.post("/deploy/worker-nodes", json=AZURE_WORKERS)
+
+    assert response.status_code == 200
+    assert compute_client.virtual_machine_scale_sets.get("zonal-rg", "zonal-workers").zones == ["1", "2", "3"]
+    assert network_client.subnets.get("zonal-rg", "zonal-vnet", "zonal-subnet").address_prefix == "10.0.0.0/21"
+    assert client.post("/deploy/worker-nodes", json={**AZURE_WORKERS, "deployment_engine": "arm"}).status_code == 422
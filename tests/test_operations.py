@@ -0,0 +1,94 @@
+import pytest
+from unittest.mock import patch, MagicMock
+from fastapi.testclient import TestClient
+
+from minisc.api.main import app
+from minisc.common.operations import OperationStore, OperationConflict, client_token, IN_PROGRESS, SUCCEEDED
+
+client = TestClient(app)
+
+@pytest.fixture
+def store(tmp_path):
+    return OperationStore(state_dir=str(tmp_path))
+
+@pytest.fixture
+def mock_provider(monkeypatch, tmp_path):
+    monkeypatch.setenv("MINISC_STATE_DIR", str(tmp_path))
+    provider = {
+        'kubernetes_deployer': MagicMock(),
+        'head_node_deployer': MagicMock(),
+        'worker_nodes_deployer': MagicMock()
+    }
+    provider['kubernetes_deployer'].create_vpc_and_subnet.return_value = ("vpc-12345", "subnet-12345")
+    provider['kubernetes_deployer'].create_security_group.return_value = "sg-12345"
+    provider['head_node_deployer'].deploy_master_node.return_value = None
+    with patch('minisc.api.main.CloudProviderFactory.get_provider', return_value=provider), \
+         patch('minisc.api.main.Checkpoint'):
+        yield provider
+
+def test_client_token_is_stable_per_step():
+    """Test that client tokens are deterministic and differ between steps"""
+    assert client_token("key-1", "master") == client_token("key-1", "master")
+    assert client_token("key-1", "master") != client_token("key-1", "workers")
+    assert len(client_token("key-1", "master")) <= 64
+
+def test_operation_store_returns_existing_operation(store):
+    """Test that a second begin attaches to the existing operation"""
+    operation, started = store.begin("key-1", "fingerprint")
+    assert started and operation["status"] == IN_PROGRESS
+
+    store.finish("key-1", result={"status": "success"})
+    operation, started = store.begin("key-1", "fingerprint")
+
+    assert not started
+    assert operation["status"] == SUCCEEDED
+    assert operation["result"] == {"status": "success"}
+
+def test_operation_store_rejects_reused_key(store):
+    """Test that reusing a key for a different request raises a conflict"""
+    store.begin("key-1", "fingerprint")
+
+    with pytest.raises(OperationConflict):
+        store.begin("key-1", "other-fingerprint")
+
+def test_operation_store_restarts_failed_operation(store):
+    """Test that a failed operation can be started again"""
+    store.begin("key-1", "fingerprint")
+    store.finish("key-1", error="boom", status_code=500)
+
+    operation, started = store.begin("key-1", "fingerprint")
+    assert started
+    assert operation["status"] == IN_PROGRESS
+
+def test_operation_store_follows_state_dir(monkeypatch, tmp_path):
+    """Test that a store without a state_dir writes under the MINISC_STATE_DIR of each call"""
+    store = OperationStore()
+    monkeypatch.setenv("MINISC_STATE_DIR", str(tmp_path))
+
+    store.begin("key-1", "fingerprint")
+
+    assert len(list((tmp_path / "operations").iterdir())) == 1
+
+def test_retried_deploy_request_runs_once(mock_provider):
+    """Test that repeating a request with the same Idempotency-Key does not deploy again"""
+    body = {"cluster_name": "test-cluster", "region": "us-east-1", "provider": "aws", "node_size": "t2.medium"}
+    headers = {"Idempotency-Key": "deploy-1"}
+
+    first = client.post("/deploy/head-node", json=body, headers=headers)
+    second = client.post("/deploy/head-node", json=body, headers=headers)
+
+    assert first.status_code == 200
+    assert second.json() == first.json()
+    mock_provider['kubernetes_deployer'].create_vpc_and_subnet.assert_called_once()
+    mock_provider['head_node_deployer'].use_idempotency_key.assert_called_with("deploy-1")
+
+    operation = client.get("/operations/deploy-1")
+    assert operation.json()["status"] == SUCCEEDED
+
+def test_reused_idempotency_key_with_different_body(mock_provider):
+    """Test that a key reused for a different request is rejected"""
+    headers = {"Idempotency-Key": "deploy-1"}
+    client.post("/deploy/head-node", json={"cluster_name": "a", "region": "us-east-1", "provider": "aws", "node_size": "t2.medium"}, headers=headers)
+
+    response = client.post("/deploy/head-node", json={"cluster_name": "b", "region": "us-east-1", "provider": "aws", "node_size": "t2.medium"}, headers=headers)
+    assert response.status_code == 422
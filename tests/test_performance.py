@@ -0,0 +1,80 @@
+import pytest
+import yaml
+from fastapi.testclient import TestClient
+
+from minisc.api.main import app
+from minisc.aws.kubernetes_deployer import KubernetesDeployer
+from minisc.aws.master_node_deployer import MasterNodeDeployer
+from minisc.common.cloud_init import KUBEADM_CONFIG
+from minisc.common.ipam import DEFAULT_POD_NETWORK, default_pod_network
+from minisc.common.performance import PROFILES
+
+client = TestClient(app)
+
+AWS_CLUSTER = {
+    "provider": "sim-aws", "region": "us-east-1", "cluster_name": "tuned", "node_size": "t3.medium",
+    "ssh_key_name": "key", "performance_profile": "batch"
+}
+
+def kubeadm_documents(user_data):
+    config = yaml.safe_load(user_data)
+    content = next(f["content"] for f in config["write_files"] if f["path"] == KUBEADM_CONFIG)
+    return {document["kind"]: document for document in yaml.safe_load_all(content)}
+
+def test_large_profile_raises_control_plane_limits_and_uses_ipvs():
+    """Test that the large profile renders API server, etcd and client limits and IPVS mode into kubeadm's config"""
+    deployer = KubernetesDeployer()
+    deployer.use_performance_profile(PROFILES["large"])
+
+    documents = kubeadm_documents(deployer._render_master_user_data())
+    cluster = documents["ClusterConfiguration"]
+    assert cluster["apiServer"]["extraArgs"] == {
+        "max-requests-inflight": "800", "max-mutating-requests-inflight": "400"
+    }
+    assert cluster["etcd"]["local"]["extraArgs"]["quota-backend-bytes"] == str(8 * 1024 ** 3)
+    assert cluster["controllerManager"]["extraArgs"] == {
+        "node-cidr-mask-size": "24", "kube-api-qps": "100", "kube-api-burst": "200"
+    }
+    assert documents["KubeProxyConfiguration"]["mode"] == "ipvs"
+
+    worker = yaml.safe_load(deployer._render_worker_user_data("10.0.0.1", "token"))
+    assert worker["runcmd"][2].startswith("modprobe -a ip_vs")
+
+def test_small_profile_keeps_iptables_and_default_client_limits():
+    """Test that the small profile lowers the API server's limits without IPVS or client limits"""
+    deployer = KubernetesDeployer()
+    deployer.use_performance_profile(PROFILES["small"])
+
+    user_data = deployer._render_master_user_data()
+    documents = kubeadm_documents(user_data)
+    assert documents["ClusterConfiguration"]["apiServer"]["extraArgs"]["max-requests-inflight"] == "200"
+    assert "scheduler" not in documents["ClusterConfiguration"]
+    assert documents["KubeProxyConfiguration"]["mode"] == "iptables"
+    assert "ip_vs" not in user_data
+    assert kubeadm_documents(KubernetesDeployer()._render_master_user_data()).keys() == {
+        "ClusterConfiguration", "KubeletConfiguration"
+    }
+
+@pytest.mark.api
+def test_batch_profile_sizes_pod_blocks_for_its_pods(simulator, monkeypatch):
+    """Test that the batch profile's pods per node reach the kubelet and the controller manager's node blocks"""
+    launched = []
+    launch = MasterNodeDeployer._launch_master
+
+    def record_user_data(self, *args):
+        launched.append(args[5])
+        return launch(self, *args)
+    monkeypatch.setattr(MasterNodeDeployer, "_launch_master", record_user_data)
+
+    assert client.post("/deploy/head-node", json=AWS_CLUSTER).status_code == 200
+
+    documents = kubeadm_documents(launched[0])
+    assert documents["KubeletConfiguration"]["maxPods"] == 250
+    assert documents["KubeletConfiguration"]["serializeImagePulls"] is False
+    assert documents["ClusterConfiguration"]["controllerManager"]["extraArgs"]["node-cidr-mask-size"] == "23"
+    assert default_pod_network(110) == DEFAULT_POD_NETWORK
+
+    assert client.post("/deploy/head-node", json={**AWS_CLUSTER, "performance_profile": "huge"}).status_code == 422
+    assert client.post(
+        "/deploy/head-node", json={**AWS_CLUSTER, "deployment_engine": "cloudformation"}
+    ).status_code == 422
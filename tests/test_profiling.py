@@ -0,0 +1,48 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from minisc.api.main import app
+from minisc.common.profiling import RequestProfile, profile_request, profiled
+
+client = TestClient(app)
+
+BODY = {"provider": "sim-aws", "region": "us-east-1", "cluster_name": "profiled", "node_size": "t3.medium", "ssh_key_name": "key"}
+
+def test_profiled_handlers_join_the_request_profile():
+    """Test that a profiled handler's thread is merged into the request's profile"""
+    @profiled
+    def handler():
+        return sum(range(1000))
+
+    with profile_request("POST /deploy/head-node") as profile:
+        handler()
+
+    functions = {name for _, _, name in profile.stats().stats}
+    assert "handler" in functions
+    assert RequestProfile("empty").save() is None
+
+@pytest.mark.api
+def test_profile_header_is_ignored_unless_enabled(simulator, monkeypatch):
+    """Test that the profile header does nothing unless the server enables profiling"""
+    monkeypatch.delenv("MINISC_PROFILING", raising=False)
+
+    response = client.post("/deploy/head-node", json=BODY, headers={"X-Minisc-Profile": "1"})
+
+    assert response.status_code == 200
+    assert "X-Minisc-Profile" not in response.headers
+
+@pytest.mark.api
+def test_profiled_deploy_is_stored_and_served(simulator, monkeypatch):
+    """Test that a profiled deploy returns a profile id whose stats include the deployer"""
+    monkeypatch.setenv("MINISC_PROFILING", "1")
+
+    response = client.post("/deploy/head-node?profile=1", json=BODY)
+    profile_id = response.headers["X-Minisc-Profile"]
+    text = client.get(f"/profiles/{profile_id}", params={"sort": "tottime", "limit": 500})
+    raw = client.get(f"/profiles/{profile_id}", params={"format": "raw"})
+
+    assert response.status_code == 200
+    assert text.status_code == 200
+    assert "deploy_master_node" in text.text
+    assert raw.content
+    assert client.get("/profiles/..%2Fcheckpoints").status_code == 404
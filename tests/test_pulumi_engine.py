@@ -0,0 +1,53 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from minisc.api.main import app
+from minisc.aws.pulumi_deployer import PulumiDeployer, pulumi_available
+
+client = TestClient(app)
+
+CLUSTER = {
+    "provider": "aws", "region": "us-east-1", "cluster_name": "declarative", "node_size": "t3.medium",
+    "ssh_key_name": "key", "deployment_engine": "pulumi"
+}
+
+@pytest.mark.api
+def test_pulumi_engine_is_rejected_where_unavailable():
+    """Test that the pulumi engine is rejected on the simulator, and on AWS when Pulumi is missing"""
+    simulated = client.post("/deploy/head-node", json={**CLUSTER, "provider": "sim-aws"})
+    assert simulated.status_code == 422
+
+    if not pulumi_available():
+        response = client.post("/deploy/head-node", json=CLUSTER)
+        assert response.status_code == 422
+        assert "pulumi CLI" in response.json()["detail"]
+
+def test_program_declares_cluster_resources():
+    """Test that the Pulumi program declares the network, master and mixed worker group from the stack config"""
+    pulumi = pytest.importorskip("pulumi")
+    pytest.importorskip("pulumi_aws")
+    resources = {}
+
+    class ClusterMocks(pulumi.runtime.Mocks):
+        def new_resource(self, args):
+            resources[args.typ] = args.inputs
+            return [f"{args.name}-id", {**args.inputs, "privateIp": "10.0.0.10", "latestVersion": 1}]
+
+        def call(self, args):
+            return {"name": args.args.get("name"), "value": "ami-0123456789"}
+
+    pulumi.runtime.set_mocks(ClusterMocks(), project="minisc", stack="minisc-declarative", preview=False)
+    pulumi.runtime.set_all_config({
+        "minisc:clusterName": "declarative", "minisc:deployMaster": "true", "minisc:workerCount": "3",
+        "minisc:onDemandBaseCapacity": "1", "minisc:onDemandPercentageAboveBase": "0",
+    })
+
+    @pulumi.runtime.test
+    def run_program():
+        PulumiDeployer(ec2=object()).program()
+
+    run_program()
+
+    assert {"aws:ec2/vpc:Vpc", "aws:ec2/instance:Instance", "aws:ec2/launchTemplate:LaunchTemplate"} <= set(resources)
+    distribution = resources["aws:autoscaling/group:Group"]["mixedInstancesPolicy"]["instancesDistribution"]
+    assert distribution["onDemandBaseCapacity"] == 1 and distribution["onDemandPercentageAboveBaseCapacity"] == 0
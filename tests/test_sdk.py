@@ -0,0 +1,78 @@
+import asyncio
+import json
+import pytest
+import httpx
+
+from minisc.api.main import app
+from minisc.sdk import AsyncMiniscClient, MiniscAPIError, MiniscClient
+
+BODY = {"provider": "sim-aws", "region": "us-east-1", "cluster_name": "sdk", "node_size": "t3.medium", "ssh_key_name": "key"}
+
+@pytest.fixture(autouse=True)
+def no_sleep(monkeypatch):
+    monkeypatch.setattr("minisc.sdk.time.sleep", lambda seconds: None)
+
+def mock_client(responses, requests):
+    """Client whose requests are answered in order from ``responses`` and recorded in ``requests``"""
+    responses = iter(responses)
+
+    def handler(request):
+        requests.append(request)
+        status, body = next(responses)
+        return httpx.Response(status, json=body)
+    return MiniscClient("http://minisc", transport=httpx.MockTransport(handler), poll_interval=0)
+
+def operation(status, result=None, error=None, status_code=None):
+    return {
+        "key": "k", "status": status, "created_at": 1, "updated_at": 1, "result": result, "error": error,
+        "status_code": status_code
+    }
+
+def test_deploy_retries_with_the_same_idempotency_key():
+    """Test that a 503 is retried with the Idempotency-Key of the first attempt"""
+    requests = []
+    client = mock_client([(503, {"detail": "busy"}), (200, {"message": "ok"})], requests)
+
+    assert client.deploy_head_node(BODY) == {"message": "ok"}
+    assert len(requests) == 2
+    assert requests[0].headers["Idempotency-Key"] == requests[1].headers["Idempotency-Key"]
+    assert json.loads(requests[1].content)["cluster_name"] == "sdk"
+
+def test_accepted_deploy_is_polled_until_it_finishes():
+    """Test that a 202 is polled through /operations until the deploy succeeds"""
+    requests = []
+    client = mock_client([
+        (202, operation("in_progress")),
+        (200, operation("in_progress")),
+        (200, operation("succeeded", result={"message": "done"})),
+    ], requests)
+
+    assert client.deploy_worker_nodes({**BODY, "worker_count": 3}, idempotency_key="k") == {"message": "done"}
+    assert [request.url.path for request in requests[1:]] == ["/operations/k", "/operations/k"]
+
+def test_errors_raise_without_retrying():
+    """Test that client errors and failed operations raise MiniscAPIError"""
+    requests = []
+    client = mock_client([(422, {"detail": "bad config"}), (202, operation("in_progress")),
+                          (200, operation("failed", error="launch failed", status_code=502))], requests)
+
+    with pytest.raises(MiniscAPIError) as excinfo:
+        client.deploy_head_node(BODY)
+    assert excinfo.value.status_code == 422 and len(requests) == 1
+
+    with pytest.raises(MiniscAPIError) as excinfo:
+        client.deploy_head_node(BODY)
+    assert excinfo.value.operation["error"] == "launch failed"
+    assert excinfo.value.status_code == 502
+
+@pytest.mark.api
+def test_async_client_deploys_clusters_concurrently(simulator):
+    """Test that the async client drives several simulated clusters over one pooled client"""
+    async def deploy_all():
+        async with AsyncMiniscClient("http://minisc", transport=httpx.ASGITransport(app=app)) as client:
+            return await asyncio.gather(*(
+                client.deploy_cluster({**BODY, "cluster_name": f"sdk-{index}"}, workers=2) for index in range(3)
+            ))
+
+    results = asyncio.run(deploy_all())
+    assert [workers["message"] for _, workers in results] == ["2 worker nodes deployment complete!"] * 3
@@ -0,0 +1,99 @@
+import pytest
+from botocore.exceptions import ClientError
+from fastapi.testclient import TestClient
+
+from minisc.api.main import app
+from minisc.common.provider_factory import CloudProviderFactory
+from minisc.simulator.azure import simulated_azure_clients
+from minisc.simulator.cloud import get_simulated_cloud
+from minisc.simulator.ec2 import simulated_ec2_client
+
+client = TestClient(app)
+
+def launch_args(**overrides):
+    return {"ImageId": "ami-1", "InstanceType": "t3.medium", "MinCount": 1, "MaxCount": 2, **overrides}
+
+def test_run_instances_client_token_is_idempotent(simulator):
+    """Test that repeating run_instances with the same ClientToken returns the original instances"""
+    ec2 = simulated_ec2_client("us-east-1")
+
+    first = ec2.run_instances(**launch_args(ClientToken="token-1"))
+    second = ec2.run_instances(**launch_args(ClientToken="token-1"))
+
+    assert [i["InstanceId"] for i in first["Instances"]] == [i["InstanceId"] for i in second["Instances"]]
+    described = ec2.describe_instances(InstanceIds=[first["Instances"][0]["InstanceId"]])
+    assert described["Reservations"][0]["Instances"][0]["State"]["Name"] in ("pending", "running")
+
+def test_run_instances_respects_instance_quota(simulator):
+    """Test that launches beyond the quota are partial and then fail with InsufficientInstanceCapacity"""
+    simulator(instance_quota=3)
+    ec2 = simulated_ec2_client("us-east-1")
+
+    assert len(ec2.run_instances(**launch_args(MaxCount=5))["Instances"]) == 3
+    with pytest.raises(ClientError) as excinfo:
+        ec2._client.run_instances(**launch_args())
+    assert excinfo.value.response["Error"]["Code"] == "InsufficientInstanceCapacity"
+
+def test_throttled_calls_are_retried_and_counted(simulator):
+    """Test that simulated throttling goes through the client's retry and shows in the stats"""
+    simulator(throttle_rate=0.5)
+    ec2 = simulated_ec2_client("us-east-1")
+
+    for _ in range(10):
+        ec2.describe_images(Owners=["amazon"])
+
+    stats = get_simulated_cloud("aws", "us-east-1").stats()["ec2:DescribeImages"]
+    assert stats["throttled"] > 0
+    assert stats["calls"] == 10 + stats["throttled"]
+
+def test_base_provider_maps_simulators():
+    """Test that simulator provider types map to the cloud they simulate"""
+    assert CloudProviderFactory.base_provider("sim-azure") == "azure"
+    assert CloudProviderFactory.base_provider("sim-aws") == "aws"
+    assert CloudProviderFactory.base_provider("aws") == "aws"
+
+@pytest.mark.api
+def test_deploy_cluster_on_simulated_aws(simulator):
+    """Test that the API deploys a head node and workers against the AWS simulator"""
+    body = {"provider": "sim-aws", "region": "us-east-1", "cluster_name": "sim", "node_size": "t3.medium", "ssh_key_name": "key"}
+
+    head = client.post("/deploy/head-node", json=body)
+    workers = client.post("/deploy/worker-nodes", json={**body, "worker_count": 5})
+
+    assert head.status_code == 200
+    assert workers.status_code == 200
+    assert workers.json()["message"] == "5 worker nodes deployment complete!"
+
+@pytest.mark.api
+def test_deploy_head_node_on_simulated_azure(simulator):
+    """Test that the API deploys an Azure head node against the ARM simulator"""
+    response = client.post("/deploy/head-node", json={
+        "provider": "sim-azure", "region": "westeurope", "cluster_name": "sim", "node_size": "Standard_D2s_v3",
+        "resource_group_name": "sim-rg", "vnet_name": "sim-vnet", "subnet_name": "sim-subnet",
+        "admin_username": "azureuser", "admin_password": "Password1234!"
+    })
+
+    assert response.status_code == 200
+    assert response.json()["head_node_ip"].startswith("203.0.")
+
+@pytest.mark.api
+def test_partial_worker_deploy_is_not_reported_as_complete(simulator):
+    """Test that workers cut short by the instance quota get a 207 with the launched and failed counts"""
+    simulator(instance_quota=10)
+    body = {"provider": "sim-aws", "region": "us-east-1", "cluster_name": "sim", "node_size": "t3.medium", "ssh_key_name": "key"}
+
+    response = client.post("/deploy/worker-nodes", json={**body, "worker_count": 30})
+
+    assert response.status_code == 207
+    result = response.json()
+    assert result["partial"] is True
+    assert (result["requested"], result["launched"], result["failed"]) == (30, 10, 20)
+
+    simulated_azure_clients()[0].resource_groups.create_or_update("sim-rg", {"location": "westeurope"})
+    azure = client.post("/deploy/worker-nodes", json={
+        "provider": "sim-azure", "region": "westeurope", "cluster_name": "sim", "node_size": "Standard_D2s_v3",
+        "resource_group_name": "sim-rg", "vnet_name": "sim-vnet", "subnet_name": "sim-subnet",
+        "admin_username": "azureuser", "admin_password": "Password1234!", "worker_count": 30, "launch_batch_size": 5
+    })
+    assert azure.status_code == 207
+    assert azure.json()["partial"] is True and azure.json()["launched"] < 30
@@ -0,0 +1,106 @@
+import pytest
+from unittest.mock import MagicMock
+from botocore.exceptions import ClientError
+
+from minisc.common.throttling import (
+    TokenBucket,
+    ThrottledClient,
+    call_with_retry,
+    get_rate_limiter,
+    retry_after_seconds
+)
+
+def client_error(code, headers=None):
+    return ClientError(
+        {"Error": {"Code": code, "Message": code}, "ResponseMetadata": {"HTTPHeaders": headers or {}}},
+        "RunInstances"
+    )
+
+@pytest.fixture(autouse=True)
+def no_sleep(monkeypatch):
+    sleeps = []
+    monkeypatch.setattr("minisc.common.throttling.time.sleep", sleeps.append)
+    return sleeps
+
+def test_call_with_retry_retries_throttled_call(no_sleep):
+    """Test that a throttled call is retried until it succeeds"""
+    func = MagicMock(side_effect=[client_error("RequestLimitExceeded"), client_error("Throttling"), "ok"])
+
+    assert call_with_retry(func, "a", key="b") == "ok"
+    assert func.call_count == 3
+    func.assert_called_with("a", key="b")
+    assert len(no_sleep) == 2
+
+def test_call_with_retry_honours_retry_after(no_sleep):
+    """Test that the provider's Retry-After header sets the delay"""
+    func = MagicMock(side_effect=[client_error("RequestLimitExceeded", {"retry-after": "7"}), "ok"])
+
+    call_with_retry(func)
+
+    assert no_sleep == [7.0]
+
+def test_call_with_retry_raises_non_retryable_error():
+    """Test that validation errors are raised without retrying"""
+    func = MagicMock(side_effect=client_error("InvalidParameterValue"))
+
+    with pytest.raises(ClientError):
+        call_with_retry(func)
+    assert func.call_count == 1
+
+def test_call_with_retry_gives_up_after_max_attempts():
+    """Test that a persistently throttled call eventually raises"""
+    func = MagicMock(side_effect=client_error("RequestLimitExceeded"))
+
+    with pytest.raises(ClientError):
+        call_with_retry(func, max_attempts=3)
+    assert func.call_count == 3
+
+def test_retry_after_seconds_azure_response():
+    """Test that Retry-After is read from an Azure HTTP response"""
+    error = Exception("Too many requests")
+    error.response = MagicMock(headers={"Retry-After": "12"})
+
+    assert retry_after_seconds(error) == 12.0
+
+def test_token_bucket_blocks_when_empty(no_sleep):
+    """Test that acquiring from an empty bucket waits for a refill"""
+    bucket = TokenBucket(rate=10, capacity=1)
+
+    bucket.acquire()
+    assert no_sleep == []
+
+    bucket.acquire()
+    assert no_sleep[0] == pytest.approx(0.1, abs=0.01)
+
+def test_rate_limiter_shared_per_account_and_region():
+    """Test that clients for the same account and region share one bucket"""
+    assert get_rate_limiter("aws", "AKIA1", "us-east-1") is get_rate_limiter("aws", "AKIA1", "us-east-1")
+    assert get_rate_limiter("aws", "AKIA1", "us-east-1") is not get_rate_limiter("aws", "AKIA1", "eu-west-1")
+
+def test_throttled_client_wraps_api_operations_only():
+    """Test that API operations go through the limiter and helpers pass through"""
+    boto_client = MagicMock()
+    boto_client.meta.method_to_api_mapping = {"run_instances": "RunInstances"}
+    limiter = MagicMock()
+    client = ThrottledClient(boto_client, limiter)
+
+    client.run_instances(MinCount=1)
+    client.get_waiter("vpc_available")
+
+    boto_client.run_instances.assert_called_once_with(MinCount=1)
+    limiter.acquire.assert_called_once()
+    boto_client.get_waiter.assert_called_once_with("vpc_available")
+
+def test_throttled_client_takes_mutating_calls_from_their_own_bucket():
+    """Test that mutating EC2 actions use the mutating limiter and Describe calls the shared one"""
+    boto_client = MagicMock()
+    boto_client.meta.method_to_api_mapping = {"run_instances": "RunInstances", "describe_instances": "DescribeInstances"}
+    limiter, mutating = MagicMock(), MagicMock()
+    client = ThrottledClient(boto_client, limiter, mutating)
+
+    client.run_instances(MinCount=1)
+    client.describe_instances()
+
+    mutating.acquire.assert_called_once()
+    limiter.acquire.assert_called_once()
+    assert get_rate_limiter("aws-mutating", "AKIA1", "us-east-1").rate < get_rate_limiter("aws", "AKIA1", "us-east-1").rate
@@ -0,0 +1,67 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from minisc.api.main import app
+from minisc.common import tracing
+from minisc.common.batching import launch_in_chunks
+from minisc.common.throttling import call_with_retry
+
+client = TestClient(app)
+
+@pytest.fixture(scope="module")
+def exporter():
+    """In-memory span exporter installed as the global tracer provider"""
+    pytest.importorskip("opentelemetry.sdk")
+    from opentelemetry import trace
+    from opentelemetry.sdk.trace import TracerProvider
+    from opentelemetry.sdk.trace.export import SimpleSpanProcessor
+    from opentelemetry.sdk.trace.export.in_memory_span_exporter import InMemorySpanExporter
+
+    memory = InMemorySpanExporter()
+    provider = TracerProvider()
+    provider.add_span_processor(SimpleSpanProcessor(memory))
+    trace.set_tracer_provider(provider)
+    return memory
+
+def test_configure_tracing_is_off_without_exporter(monkeypatch):
+    """Test that tracing stays off unless MINISC_TRACE_EXPORTER is set"""
+    monkeypatch.delenv("MINISC_TRACE_EXPORTER", raising=False)
+    assert tracing.configure_tracing() is False
+
+@pytest.mark.skipif(tracing.tracing_available(), reason="OpenTelemetry is installed")
+def test_spans_are_noops_without_opentelemetry():
+    """Test that spans and traced functions work when OpenTelemetry is not installed"""
+    with tracing.span("deploy", **{"minisc.step": "launch"}) as current:
+        assert current is None
+    tracing.end_span(tracing.start_span("azure PUT virtualMachines"))
+
+    @tracing.traced()
+    def deploy():
+        return "deployed"
+
+    assert deploy() == "deployed"
+    assert client.get("/metrics").status_code == 200
+
+def test_cloud_calls_are_child_spans(exporter):
+    """Test that cloud calls, including those from launch chunk threads, join the caller's trace"""
+    exporter.clear()
+    with tracing.span("deploy_worker_nodes") as parent:
+        call_with_retry(lambda: "ok", provider="aws", operation="DescribeImages")
+        launch_in_chunks(lambda index, count: call_with_retry(
+            lambda: ["node"] * count, provider="aws", operation="CreateFleet"
+        ), 4, chunk_size=2, max_parallel=2, pace_seconds=0)
+
+    spans = exporter.get_finished_spans()
+    trace_id = parent.get_span_context().trace_id
+    assert {span.name for span in spans} >= {"aws DescribeImages", "aws CreateFleet", "launch_chunk"}
+    assert all(span.context.trace_id == trace_id for span in spans)
+
+def test_request_continues_remote_trace(exporter):
+    """Test that an incoming traceparent header becomes the parent of the request span"""
+    exporter.clear()
+    trace_id = "4bf92f3577b34da6a3ce929d0e0e4736"
+    client.get("/metrics", headers={"traceparent": f"00-{trace_id}-00f067aa0ba902b7-01"})
+
+    server = [span for span in exporter.get_finished_spans() if span.name == "GET /metrics"]
+    assert server and format(server[0].context.trace_id, "032x") == trace_id
+    assert server[0].attributes["http.status_code"] == 200
@@ -0,0 +1,74 @@
+import pytest
+import yaml
+from fastapi.testclient import TestClient
+
+from minisc.api.main import app
+from minisc.aws.kubernetes_deployer import KubernetesDeployer
+from minisc.common.cloud_init import AWS_WARM_POOL_POWER_OFF
+from minisc.simulator.autoscaling import simulated_autoscaling_client
+from minisc.simulator.azure import simulated_azure_clients
+
+client = TestClient(app)
+
+AWS_WORKERS = {
+    "provider": "sim-aws", "region": "us-east-1", "cluster_name": "warm", "node_size": "t3.medium",
+    "ssh_key_name": "key", "auto_scaling_group": True, "worker_count": 2, "warm_pool_size": 2
+}
+
+AZURE_WORKERS = {
+    "provider": "sim-azure", "region": "westeurope", "cluster_name": "warm", "node_size": "Standard_D2s_v3",
+    "resource_group_name": "warm-rg", "vnet_name": "warm-vnet", "subnet_name": "warm-subnet",
+    "admin_username": "azureuser", "admin_password": "Password1234!", "worker_count": 3, "warm_pool_size": 2
+}
+
+def test_only_warm_pool_workers_stop_after_bootstrap():
+    """Test that workers of a group with a warm pool power off once bootstrapped if they were launched into the pool"""
+    deployer = KubernetesDeployer()
+
+    assert AWS_WARM_POOL_POWER_OFF not in deployer._render_worker_user_data("10.0.0.1", "token")
+    config = yaml.safe_load(deployer._render_worker_user_data("10.0.0.1", "token", warm_pool=True))
+    assert config["runcmd"][-1] == AWS_WARM_POOL_POWER_OFF
+    assert "target-lifecycle-state" in AWS_WARM_POOL_POWER_OFF
+
+@pytest.mark.api
+def test_group_scales_out_from_warm_pool(simulator):
+    """Test that an Auto Scaling group keeps stopped workers in its warm pool and starts them on scale-out"""
+    assert client.post("/deploy/worker-nodes", json=AWS_WORKERS).status_code == 200
+    autoscaling = simulated_autoscaling_client("us-east-1")
+    warm = autoscaling.describe_warm_pool(AutoScalingGroupName="warm-workers")["Instances"]
+    assert [instance["LifecycleState"] for instance in warm] == ["Warmed:Stopped", "Warmed:Stopped"]
+
+    response = client.post("/scale/worker-nodes", json={**AWS_WORKERS, "worker_count": 4})
+
+    assert response.status_code == 200
+    assert (response.json()["launched"], response.json()["warm"]) == (4, 2)
+    group = autoscaling.describe_auto_scaling_groups(AutoScalingGroupNames=["warm-workers"])["AutoScalingGroups"][0]
+    assert {instance["InstanceId"] for instance in warm} < {instance["InstanceId"] for instance in group["Instances"]}
+
+    assert client.post("/deploy/worker-nodes", json={**AWS_WORKERS, "auto_scaling_group": False}).status_code == 422
+    assert client.post("/deploy/worker-nodes", json={**AWS_WORKERS, "capacity_type": "spot"}).status_code == 422
+
+@pytest.mark.api
+def test_scale_set_starts_deallocated_instances(simulator):
+    """Test that an Azure warm pool is kept as deallocated instances, started before new ones are added"""
+    resource_client, compute_client, network_client = simulated_azure_clients()
+    resource_client.resource_groups.create_or_update("warm-rg", {"location": "westeurope"})
+    assert client.post("/deploy/worker-nodes", json=AZURE_WORKERS).status_code == 200
+
+    def power_states():
+        return {
+            vm.instance_id: vm.instance_view.statuses[-1].code
+            for vm in compute_client.virtual_machine_scale_set_vms.list("warm-rg", "warm-workers", expand="instanceView")
+        }
+    states = power_states()
+    warm = {i for i, code in states.items() if code == "PowerState/deallocated"}
+    assert sorted(states.values()).count("PowerState/running") == 3 and len(warm) == 2
+
+    response = client.post("/scale/worker-nodes", json={**AZURE_WORKERS, "worker_count": 5})
+
+    assert response.status_code == 200
+    assert (response.json()["launched"], response.json()["started"], response.json()["warm"]) == (5, 2, 2)
+    states = power_states()
+    assert all(states[i] == "PowerState/running" for i in warm)
+    assert sorted(states.values()).count("PowerState/deallocated") == 2
+    assert compute_client.virtual_machine_scale_sets.get("warm-rg", "warm-workers").tags == {"minisc-warm-pool": "2"}